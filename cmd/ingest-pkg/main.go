@@ -7,6 +7,7 @@ import (
 	"fmt"
 	"log/slog"
 	"os"
+	"path/filepath"
 	"slices"
 
 	"github.com/canonical/ubuntu-manpages-operator/internal/config"
@@ -61,13 +62,19 @@ func run(logger *slog.Logger, cfg *config.Config, release, pkgName string) error
 	defer func() { _ = os.RemoveAll(workDir) }()
 	logger.Info("using work directory", "path", workDir)
 
-	pkgFetcher := fetcher.New(
-		cfg.Archive, cfg.Repos, []string{cfg.Arch}, nil, workDir,
-	)
+	pkgFetcher := fetcher.NewFromConfig(cfg, workDir)
 	pkgFetcher.Logger = logger
 	converter := pipeline.NewConverter("")
 	extractor := pipeline.NewDebExtractor(workDir)
+	var packs *storage.PackWriter
+	if cfg.StorageBackend == config.StoragePacked {
+		packs = storage.NewPackWriter(filepath.Join(cfg.PublicHTMLDir, "manpages"))
+	}
 	storage := storage.NewFSStorage(cfg.PublicHTMLDir)
+	storage.Precompress = cfg.Precompress
+	storage.PlainText = cfg.PlainText
+	storage.Sync = cfg.Fsync
+	storage.Packs = packs
 
 	ctx := context.Background()
 
@@ -126,6 +133,9 @@ func run(logger *slog.Logger, cfg *config.Config, release, pkgName string) error
 			return fmt.Errorf("write cache: %w", err)
 		}
 	}
+	if err := storage.Commit(release); err != nil {
+		return fmt.Errorf("commit %s: %w", release, err)
+	}
 
 	_ = os.Remove(debPath)
 
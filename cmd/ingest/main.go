@@ -1,7 +1,9 @@
 package main
 
 import (
+	"bytes"
 	"context"
+	"encoding/json"
 	"fmt"
 	"log/slog"
 	"net/http"
@@ -16,6 +18,7 @@ import (
 	"github.com/canonical/ubuntu-manpages-operator/internal/launchpad"
 	"github.com/canonical/ubuntu-manpages-operator/internal/logging"
 	"github.com/canonical/ubuntu-manpages-operator/internal/pipeline"
+	"github.com/canonical/ubuntu-manpages-operator/internal/search"
 	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
 )
 
@@ -49,17 +52,39 @@ func ingest(logger *slog.Logger, cfg *config.Config) error {
 	defer func() { _ = os.RemoveAll(workDir) }()
 	logger.Info("using work directory", "path", workDir)
 
-	pkgFetcher := fetcher.New(
-		cfg.Archive,
-		cfg.Repos,
-		[]string{cfg.Arch},
-		nil,
-		workDir,
-	)
+	pkgFetcher := fetcher.NewFromConfig(cfg, workDir)
 	pkgFetcher.Logger = logger
 	converter := pipeline.NewConverter("")
+	if cfg.ConvertCacheSizeMB > 0 {
+		converter.Cache = pipeline.NewConvertCache(filepath.Join(cfg.PublicHTMLDir, "manpages", ".convert-cache"))
+		converter.Cache.Refresh = cfg.Force
+		converter.Cache.MaxBytes = int64(cfg.ConvertCacheSizeMB) << 20
+	}
+	converter.WorkDir = workDir
+	if cfg.Converter == config.ConverterBatch {
+		converter.BatchSize = pipeline.DefaultBatchSize
+	}
 	extractor := pipeline.NewDebExtractor(workDir)
+	var packs *storage.PackWriter
+	if cfg.StorageBackend == config.StoragePacked {
+		packs = storage.NewPackWriter(filepath.Join(cfg.PublicHTMLDir, "manpages"))
+	} else {
+		// Packed pages would shadow the files this run writes.
+		for _, release := range cfg.ReleaseKeys() {
+			n, err := storage.UnpackRelease(context.Background(), cfg.PublicHTMLDir, release)
+			if err != nil {
+				return fmt.Errorf("unpack %s: %w", release, err)
+			}
+			if n > 0 {
+				logger.Info("unpacked release", "release", release, "entries", n)
+			}
+		}
+	}
 	storage := storage.NewFSStorage(cfg.PublicHTMLDir)
+	storage.Precompress = cfg.Precompress
+	storage.PlainText = cfg.PlainText
+	storage.Sync = cfg.Fsync
+	storage.Packs = packs
 
 	runner := &pipeline.Runner{
 		Fetcher:      pkgFetcher,
@@ -70,6 +95,8 @@ func ingest(logger *slog.Logger, cfg *config.Config) error {
 		FailuresDir:  cfg.PublicHTMLDir,
 		ForceProcess: cfg.Force,
 		StoragePath:  filepath.Join(cfg.PublicHTMLDir, "manpages"),
+		Workers:      cfg.IngestWorkers,
+		Journal:      search.NewJournal(),
 	}
 
 	ctx := context.Background()
@@ -79,11 +106,91 @@ func ingest(logger *slog.Logger, cfg *config.Config) error {
 		}
 		return err
 	}
-	notifyReindex(logger, cfg.AdminAddr)
+	if !applyJournal(logger, cfg.AdminAddr, runner.Journal) {
+		writeSearchIndex(logger, cfg)
+		notifyReindex(logger, cfg.AdminAddr)
+	}
 	notifyRegenerateSitemaps(logger, cfg.AdminAddr)
+	return markDone(cfg)
+}
+
+// markDone records that the run the charm started as cfg.IngestRun
+// completed, which is when the charm counts its releases as ingested.
+func markDone(cfg *config.Config) error {
+	if cfg.IngestRun == "" {
+		return nil
+	}
+	path := cfg.IngestDonePath()
+	tmp := path + ".tmp"
+	if err := os.WriteFile(tmp, []byte(cfg.IngestRun), 0o644); err != nil {
+		return fmt.Errorf("record completed run: %w", err)
+	}
+	if err := os.Rename(tmp, path); err != nil {
+		_ = os.Remove(tmp)
+		return fmt.Errorf("record completed run: %w", err)
+	}
 	return nil
 }
 
+// writeSearchIndex writes the index the server maps at startup and on
+// reindex. The releases of this run, which may be a scoped subset of the
+// configured ones, are rescanned and the others kept from the index already
+// written. On failure the server falls back to scanning the filesystem.
+func writeSearchIndex(logger *slog.Logger, cfg *config.Config) {
+	pages := storage.OpenPages(cfg.PublicHTMLDir)
+	defer func() { _ = pages.Close() }()
+	previous, err := search.OpenIndex(cfg.IndexPath())
+	if err != nil && !errors.Is(err, os.ErrNotExist) {
+		logger.Warn("existing search index unreadable, rebuilding it for this run's releases", "error", err)
+	}
+	idx := search.UpdateIndexFS(pages, previous, cfg.ReleaseKeys())
+	if previous != nil {
+		_ = previous.Close()
+	}
+	if err := idx.WriteFile(cfg.IndexPath()); err != nil {
+		logger.Warn("failed to write search index", "error", err)
+		return
+	}
+	logger.Info("search index written", "path", cfg.IndexPath(), "entries", idx.Len())
+}
+
+// maxJournalPages is the largest journal sent to the server. Past this a
+// full rebuild costs about as much as re-reading the listed pages.
+const maxJournalPages = 50000
+
+// applyJournal sends the pages written by this run to the server, which
+// updates its search index with only those pages. It reports whether the
+// server applied the journal; if not, the caller rebuilds the index.
+func applyJournal(logger *slog.Logger, adminAddr string, journal *search.Journal) bool {
+	if n := journal.Len(); n > maxJournalPages {
+		logger.Info("journal too large for an incremental reindex", "pages", n)
+		return false
+	}
+	body, err := json.Marshal(journal)
+	if err != nil {
+		logger.Warn("failed to encode journal", "error", err)
+		return false
+	}
+	client := &http.Client{Timeout: 5 * time.Minute}
+	resp, err := client.Post("http://"+adminAddr+"/_/reindex", "application/json", bytes.NewReader(body))
+	if err != nil {
+		logger.Warn("failed to send journal to server", "error", err)
+		return false
+	}
+	defer func() { _ = resp.Body.Close() }()
+	var result struct {
+		Changed int    `json:"changed"`
+		Error   string `json:"error"`
+	}
+	_ = json.NewDecoder(resp.Body).Decode(&result)
+	if resp.StatusCode != http.StatusOK {
+		logger.Warn("server rejected journal", "status", resp.StatusCode, "error", result.Error)
+		return false
+	}
+	logger.Info("search index updated from journal", "pages", journal.Len(), "changed", result.Changed)
+	return true
+}
+
 func notifyReindex(logger *slog.Logger, adminAddr string) {
 	notifyAdmin(logger, adminAddr, "/_/reindex", "reindex")
 }
@@ -0,0 +1,103 @@
+package main
+
+import (
+	"context"
+	"flag"
+	"fmt"
+	"log/slog"
+	"net/http"
+	"os"
+	"path/filepath"
+	"strings"
+	"time"
+
+	"github.com/canonical/ubuntu-manpages-operator/internal/config"
+	"github.com/canonical/ubuntu-manpages-operator/internal/logging"
+	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
+)
+
+func main() {
+	release := flag.String("release", "", "Release to convert (default: every release on disk)")
+	unpack := flag.Bool("unpack", false, "Convert packed releases back to files")
+	keepFiles := flag.Bool("keep-files", false, "Leave the files of packed releases in place")
+	flag.Parse()
+
+	cfg := config.Load()
+	logger := logging.BuildLogger(cfg.LogLevel)
+	slog.SetDefault(logger)
+
+	if err := run(logger, cfg, *release, *unpack, *keepFiles); err != nil {
+		logger.Error("pack failed", "error", err)
+		os.Exit(1)
+	}
+}
+
+// run converts the manpages trees of the given release, or of every
+// release on disk, between files and packs. Pages stay served throughout:
+// packing writes the pack, has the server map it and only then removes the
+// files; unpacking writes the files before removing the pack.
+func run(logger *slog.Logger, cfg *config.Config, release string, unpack, keepFiles bool) error {
+	releases := []string{release}
+	if release == "" {
+		var err error
+		if releases, err = releasesOnDisk(filepath.Join(cfg.PublicHTMLDir, "manpages")); err != nil {
+			return err
+		}
+	}
+
+	ctx := context.Background()
+	for _, rel := range releases {
+		var n int
+		var err error
+		if unpack {
+			n, err = storage.UnpackRelease(ctx, cfg.PublicHTMLDir, rel)
+		} else {
+			n, err = storage.PackRelease(ctx, cfg.PublicHTMLDir, rel)
+		}
+		if err != nil {
+			return fmt.Errorf("%s: %w", rel, err)
+		}
+		logger.Info("release converted", "release", rel, "unpack", unpack, "entries", n)
+	}
+	notifyReindex(logger, cfg.AdminAddr)
+	if unpack || keepFiles {
+		return nil
+	}
+
+	for _, rel := range releases {
+		n, err := storage.RemovePackedFiles(ctx, cfg.PublicHTMLDir, rel)
+		if err != nil {
+			return fmt.Errorf("%s: remove packed files: %w", rel, err)
+		}
+		logger.Info("packed files removed", "release", rel, "removed", n)
+	}
+	return nil
+}
+
+// releasesOnDisk returns the release trees under the manpages directory.
+func releasesOnDisk(dir string) ([]string, error) {
+	entries, err := os.ReadDir(dir)
+	if err != nil {
+		return nil, err
+	}
+	var releases []string
+	for _, e := range entries {
+		if e.IsDir() && !strings.HasPrefix(e.Name(), ".") {
+			releases = append(releases, e.Name())
+		}
+	}
+	return releases, nil
+}
+
+// notifyReindex has the server map the packs as they now are. A server that
+// is not running maps them when it starts.
+func notifyReindex(logger *slog.Logger, adminAddr string) {
+	client := &http.Client{Timeout: 10 * time.Second}
+	resp, err := client.Post("http://"+adminAddr+"/_/reindex", "", nil)
+	if err != nil {
+		logger.Warn("failed to notify server of reindex", "error", err)
+		return
+	}
+	_ = resp.Body.Close()
+	logger.Info("server notified of reindex", "status", resp.StatusCode)
+}
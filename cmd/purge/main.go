@@ -0,0 +1,27 @@
+package main
+
+import (
+	"context"
+	"log/slog"
+	"os"
+	"path/filepath"
+
+	"github.com/canonical/ubuntu-manpages-operator/internal/config"
+	"github.com/canonical/ubuntu-manpages-operator/internal/logging"
+	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
+)
+
+func main() {
+	cfg := config.Load()
+	logger := logging.BuildLogger(cfg.LogLevel)
+	slog.SetDefault(logger)
+
+	err := storage.PurgeTombstones(context.Background(), logger,
+		filepath.Join(cfg.PublicHTMLDir, "manpages"),
+		filepath.Join(cfg.PublicHTMLDir, "manpages.gz"),
+	)
+	if err != nil {
+		logger.Error("purge failed", "error", err)
+		os.Exit(1)
+	}
+}
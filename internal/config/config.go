@@ -7,9 +7,11 @@ import (
 	"net/url"
 	"os"
 	"path/filepath"
+	"runtime"
 	"sort"
 	"strconv"
 	"strings"
+	"time"
 )
 
 // Config holds application configuration loaded from environment variables.
@@ -25,8 +27,75 @@ type Config struct {
 	AdminAddr       string
 	LogLevel        string
 	Force           bool
+	// IngestWorkers bounds the packages processed concurrently by ingest.
+	IngestWorkers int
+	// Converter selects how ingest runs mandoc: ConverterExec or ConverterBatch.
+	Converter string
+	// ConvertCacheSizeMB bounds the size of ingest's conversion cache; zero
+	// disables the cache.
+	ConvertCacheSizeMB int
+	// Precompress has ingest write a gzip copy of each manpage, which the
+	// server splices into its compressed responses.
+	Precompress bool
+	// PlainText has ingest write the plain-text rendering of each manpage,
+	// which the server streams for .txt requests.
+	PlainText bool
+	// Fsync has ingest sync each package's files to stable storage before
+	// marking the package done.
+	Fsync bool
+	// IngestRun identifies an ingest run started by the charm. Ingest records
+	// it in IngestDonePath once the run completes, so that the charm only
+	// counts its releases as ingested then.
+	IngestRun string
+	// StorageBackend selects how ingest stores manpage trees: StorageFiles
+	// or StoragePacked. The server reads either.
+	StorageBackend string
+
+	// Archive fetch tuning, used by the ingest binaries.
+	FetchConcurrency int
+	FetchTimeout     time.Duration
+	FetchRetries     int
+	FetchBackoff     string
+	FetchBackoffBase time.Duration
+	// FetchCacheDir keeps archive index files across runs for conditional
+	// requests; empty disables the cache. FetchCacheSizeMB bounds its size.
+	FetchCacheDir    string
+	FetchCacheSizeMB int
+
+	// PageCacheSizeMB bounds the server's in-memory cache of rendered
+	// manpages; 0 disables it.
+	PageCacheSizeMB int
+	// ListingCacheSizeMB bounds the server's in-memory cache of sorted
+	// directory listings for browse pages; 0 disables it.
+	ListingCacheSizeMB int
+	// Cache-Control policies of the server's route classes: rendered
+	// manpages, manpages.gz downloads and sitemaps.
+	CacheControlPages     string
+	CacheControlDownloads string
+	CacheControlSitemaps  string
+	// SitemapGzip has the server write the sitemaps of man sections
+	// gzip-compressed, as .xml.gz files.
+	SitemapGzip bool
 }
 
+// Backoff shapes accepted for FetchBackoff.
+const (
+	BackoffLinear      = "linear"
+	BackoffExponential = "exponential"
+)
+
+// Converter backends accepted for Converter.
+const (
+	ConverterExec  = "exec"
+	ConverterBatch = "batch"
+)
+
+// Storage backends accepted for StorageBackend.
+const (
+	StorageFiles  = "files"
+	StoragePacked = "packed"
+)
+
 // Load reads configuration from environment variables, applying defaults
 // for any that are unset. If a .env file exists in the current working
 // directory, its values are loaded first and override the real environment.
@@ -43,6 +112,31 @@ func Load() *Config {
 		AdminAddr:     envOrDefault("MANPAGES_ADMIN_ADDR", "127.0.0.1:9090"),
 		LogLevel:      envOrDefault("MANPAGES_LOG_LEVEL", "info"),
 		Force:         envBool("MANPAGES_FORCE"),
+		IngestWorkers: envInt("MANPAGES_INGEST_WORKERS", runtime.NumCPU()),
+		Converter:     envOrDefault("MANPAGES_CONVERTER", ConverterExec),
+		Precompress:   envBool("MANPAGES_PRECOMPRESS"),
+		PlainText:     envBool("MANPAGES_PLAIN_TEXT"),
+		Fsync:         envBool("MANPAGES_FSYNC"),
+
+		StorageBackend: envOrDefault("MANPAGES_STORAGE_BACKEND", StorageFiles),
+		IngestRun:      os.Getenv("MANPAGES_INGEST_RUN"),
+
+		FetchConcurrency: envInt("MANPAGES_FETCH_CONCURRENCY", 8),
+		FetchTimeout:     envDuration("MANPAGES_FETCH_TIMEOUT", 5*time.Minute),
+		FetchRetries:     envInt("MANPAGES_FETCH_RETRIES", 2),
+		FetchBackoff:     envOrDefault("MANPAGES_FETCH_BACKOFF", BackoffLinear),
+		FetchBackoffBase: envDuration("MANPAGES_FETCH_BACKOFF_BASE", time.Second),
+		FetchCacheDir:    os.Getenv("MANPAGES_FETCH_CACHE_DIR"),
+		FetchCacheSizeMB: envInt("MANPAGES_FETCH_CACHE_SIZE_MB", 2048),
+
+		ConvertCacheSizeMB: envInt("MANPAGES_CONVERT_CACHE_SIZE_MB", 4096),
+
+		PageCacheSizeMB:       envInt("MANPAGES_PAGE_CACHE_SIZE_MB", 64),
+		ListingCacheSizeMB:    envInt("MANPAGES_LISTING_CACHE_SIZE_MB", 32),
+		CacheControlPages:     envOrDefault("MANPAGES_CACHE_CONTROL_PAGES", "public, max-age=3600"),
+		CacheControlDownloads: envOrDefault("MANPAGES_CACHE_CONTROL_DOWNLOADS", "public, max-age=86400"),
+		CacheControlSitemaps:  envOrDefault("MANPAGES_CACHE_CONTROL_SITEMAPS", "public, max-age=3600"),
+		SitemapGzip:           envBool("MANPAGES_SITEMAP_GZIP"),
 	}
 	return cfg
 }
@@ -66,6 +160,51 @@ func (c *Config) Validate() error {
 	if c.Arch == "" {
 		return errors.New("config: arch is required")
 	}
+	if c.IngestWorkers < 1 {
+		return errors.New("config: ingest_workers must be a positive integer")
+	}
+	if c.Converter != ConverterExec && c.Converter != ConverterBatch {
+		return errors.New("config: converter must be exec or batch")
+	}
+	if c.ConvertCacheSizeMB < 0 {
+		return errors.New("config: convert_cache_size_mb must not be negative")
+	}
+	if c.StorageBackend != StorageFiles && c.StorageBackend != StoragePacked {
+		return errors.New("config: storage_backend must be files or packed")
+	}
+	if c.FetchConcurrency < 1 {
+		return errors.New("config: fetch_concurrency must be a positive integer")
+	}
+	if c.FetchTimeout <= 0 {
+		return errors.New("config: fetch_timeout must be a positive duration")
+	}
+	if c.FetchRetries < 0 {
+		return errors.New("config: fetch_retries must not be negative")
+	}
+	if c.FetchBackoff != BackoffLinear && c.FetchBackoff != BackoffExponential {
+		return errors.New("config: fetch_backoff must be linear or exponential")
+	}
+	if c.FetchBackoffBase < 0 {
+		return errors.New("config: fetch_backoff_base must not be negative")
+	}
+	if c.FetchCacheSizeMB < 0 {
+		return errors.New("config: fetch_cache_size_mb must not be negative")
+	}
+	if c.PageCacheSizeMB < 0 {
+		return errors.New("config: page_cache_size_mb must not be negative")
+	}
+	if c.ListingCacheSizeMB < 0 {
+		return errors.New("config: listing_cache_size_mb must not be negative")
+	}
+	for name, policy := range map[string]string{
+		"cache_control_pages":     c.CacheControlPages,
+		"cache_control_downloads": c.CacheControlDownloads,
+		"cache_control_sitemaps":  c.CacheControlSitemaps,
+	} {
+		if strings.ContainsAny(policy, "\r\n") {
+			return errors.New("config: " + name + " must be a single line")
+		}
+	}
 	return nil
 }
 
@@ -73,6 +212,12 @@ func (c *Config) IndexPath() string {
 	return filepath.Join(c.PublicHTMLDir, "search.db")
 }
 
+// IngestDonePath is the file ingest records the IngestRun of its last
+// completed run in.
+func (c *Config) IngestDonePath() string {
+	return filepath.Join(c.PublicHTMLDir, "manpages", ".ingest-done")
+}
+
 func (c *Config) SiteURL() string {
 	return strings.TrimRight(c.Site, "/")
 }
@@ -146,6 +291,34 @@ func envBool(key string) bool {
 	return v
 }
 
+// envInt parses an integer variable. Unparseable values yield -1 so that
+// Validate rejects them instead of silently applying the default.
+func envInt(key string, fallback int) int {
+	v := os.Getenv(key)
+	if v == "" {
+		return fallback
+	}
+	n, err := strconv.Atoi(strings.TrimSpace(v))
+	if err != nil {
+		return -1
+	}
+	return n
+}
+
+// envDuration parses a time.ParseDuration variable (e.g. "90s"). Unparseable
+// values yield -1 so that Validate rejects them.
+func envDuration(key string, fallback time.Duration) time.Duration {
+	v := os.Getenv(key)
+	if v == "" {
+		return fallback
+	}
+	d, err := time.ParseDuration(strings.TrimSpace(v))
+	if err != nil {
+		return -1
+	}
+	return d
+}
+
 // loadDotEnv reads a .env file from the current working directory and
 // sets each key-value pair into the process environment via os.Setenv.
 // If the file does not exist, the function returns silently.
@@ -3,8 +3,10 @@ package config
 import (
 	"os"
 	"path/filepath"
+	"runtime"
 	"strings"
 	"testing"
+	"time"
 )
 
 func TestParseDotEnvBasic(t *testing.T) {
@@ -315,3 +317,205 @@ func TestForceFromEnv(t *testing.T) {
 		})
 	}
 }
+
+func TestFetchTuningDefaults(t *testing.T) {
+	dir := t.TempDir()
+	origDir, _ := os.Getwd()
+	_ = os.Chdir(dir)
+	t.Cleanup(func() { os.Chdir(origDir) })
+
+	for _, key := range []string{"MANPAGES_FETCH_CONCURRENCY", "MANPAGES_FETCH_TIMEOUT", "MANPAGES_FETCH_RETRIES", "MANPAGES_FETCH_BACKOFF", "MANPAGES_FETCH_BACKOFF_BASE"} {
+		t.Setenv(key, "")
+	}
+
+	cfg := Load()
+	if cfg.FetchConcurrency != 8 {
+		t.Errorf("FetchConcurrency = %d, want 8", cfg.FetchConcurrency)
+	}
+	if cfg.FetchTimeout != 5*time.Minute {
+		t.Errorf("FetchTimeout = %v, want 5m", cfg.FetchTimeout)
+	}
+	if cfg.FetchRetries != 2 {
+		t.Errorf("FetchRetries = %d, want 2", cfg.FetchRetries)
+	}
+	if cfg.FetchBackoff != BackoffLinear {
+		t.Errorf("FetchBackoff = %q, want %q", cfg.FetchBackoff, BackoffLinear)
+	}
+	if cfg.FetchBackoffBase != time.Second {
+		t.Errorf("FetchBackoffBase = %v, want 1s", cfg.FetchBackoffBase)
+	}
+}
+
+func TestFetchTuningFromEnv(t *testing.T) {
+	dir := t.TempDir()
+	origDir, _ := os.Getwd()
+	_ = os.Chdir(dir)
+	t.Cleanup(func() { os.Chdir(origDir) })
+
+	t.Setenv("MANPAGES_FETCH_CONCURRENCY", "32")
+	t.Setenv("MANPAGES_FETCH_TIMEOUT", "90s")
+	t.Setenv("MANPAGES_FETCH_RETRIES", "5")
+	t.Setenv("MANPAGES_FETCH_BACKOFF", "exponential")
+	t.Setenv("MANPAGES_FETCH_BACKOFF_BASE", "500ms")
+
+	cfg := Load()
+	if cfg.FetchConcurrency != 32 {
+		t.Errorf("FetchConcurrency = %d, want 32", cfg.FetchConcurrency)
+	}
+	if cfg.FetchTimeout != 90*time.Second {
+		t.Errorf("FetchTimeout = %v, want 90s", cfg.FetchTimeout)
+	}
+	if cfg.FetchRetries != 5 {
+		t.Errorf("FetchRetries = %d, want 5", cfg.FetchRetries)
+	}
+	if cfg.FetchBackoff != BackoffExponential {
+		t.Errorf("FetchBackoff = %q, want %q", cfg.FetchBackoff, BackoffExponential)
+	}
+	if cfg.FetchBackoffBase != 500*time.Millisecond {
+		t.Errorf("FetchBackoffBase = %v, want 500ms", cfg.FetchBackoffBase)
+	}
+	if err := cfg.Validate(); err != nil {
+		t.Errorf("Validate() = %v, want nil", err)
+	}
+}
+
+func TestFetchTuningInvalid(t *testing.T) {
+	dir := t.TempDir()
+	origDir, _ := os.Getwd()
+	_ = os.Chdir(dir)
+	t.Cleanup(func() { os.Chdir(origDir) })
+
+	tests := []struct {
+		key, val string
+	}{
+		{"MANPAGES_FETCH_CONCURRENCY", "0"},
+		{"MANPAGES_FETCH_CONCURRENCY", "many"},
+		{"MANPAGES_FETCH_TIMEOUT", "300"},
+		{"MANPAGES_FETCH_RETRIES", "-1"},
+		{"MANPAGES_FETCH_BACKOFF", "random"},
+		{"MANPAGES_FETCH_BACKOFF_BASE", "soon"},
+	}
+	for _, tt := range tests {
+		t.Run(tt.key+"="+tt.val, func(t *testing.T) {
+			t.Setenv(tt.key, tt.val)
+			if err := Load().Validate(); err == nil {
+				t.Errorf("Validate() = nil with %s=%q, want error", tt.key, tt.val)
+			}
+		})
+	}
+}
+
+func TestIngestWorkers(t *testing.T) {
+	dir := t.TempDir()
+	origDir, _ := os.Getwd()
+	_ = os.Chdir(dir)
+	t.Cleanup(func() { os.Chdir(origDir) })
+
+	t.Setenv("MANPAGES_INGEST_WORKERS", "")
+	if got := Load().IngestWorkers; got != runtime.NumCPU() {
+		t.Errorf("IngestWorkers = %d, want %d", got, runtime.NumCPU())
+	}
+
+	t.Setenv("MANPAGES_INGEST_WORKERS", "16")
+	if got := Load().IngestWorkers; got != 16 {
+		t.Errorf("IngestWorkers = %d, want 16", got)
+	}
+
+	t.Setenv("MANPAGES_INGEST_WORKERS", "0")
+	if err := Load().Validate(); err == nil {
+		t.Error("Validate() = nil with MANPAGES_INGEST_WORKERS=0, want error")
+	}
+}
+
+func TestConverter(t *testing.T) {
+	dir := t.TempDir()
+	origDir, _ := os.Getwd()
+	_ = os.Chdir(dir)
+	t.Cleanup(func() { os.Chdir(origDir) })
+
+	t.Setenv("MANPAGES_CONVERTER", "")
+	if got := Load().Converter; got != ConverterExec {
+		t.Errorf("Converter = %q, want %q", got, ConverterExec)
+	}
+
+	t.Setenv("MANPAGES_CONVERTER", "batch")
+	cfg := Load()
+	if cfg.Converter != ConverterBatch {
+		t.Errorf("Converter = %q, want %q", cfg.Converter, ConverterBatch)
+	}
+	if err := cfg.Validate(); err != nil {
+		t.Errorf("Validate() = %v, want nil", err)
+	}
+
+	t.Setenv("MANPAGES_CONVERTER", "daemon")
+	if err := Load().Validate(); err == nil {
+		t.Error("Validate() = nil with MANPAGES_CONVERTER=daemon, want error")
+	}
+}
+
+func TestStorageBackend(t *testing.T) {
+	dir := t.TempDir()
+	origDir, _ := os.Getwd()
+	_ = os.Chdir(dir)
+	t.Cleanup(func() { os.Chdir(origDir) })
+
+	t.Setenv("MANPAGES_STORAGE_BACKEND", "")
+	if got := Load().StorageBackend; got != StorageFiles {
+		t.Errorf("StorageBackend = %q, want %q", got, StorageFiles)
+	}
+
+	t.Setenv("MANPAGES_STORAGE_BACKEND", "packed")
+	cfg := Load()
+	if cfg.StorageBackend != StoragePacked {
+		t.Errorf("StorageBackend = %q, want %q", cfg.StorageBackend, StoragePacked)
+	}
+	if err := cfg.Validate(); err != nil {
+		t.Errorf("Validate() = %v, want nil", err)
+	}
+
+	t.Setenv("MANPAGES_STORAGE_BACKEND", "sqlite")
+	if err := Load().Validate(); err == nil {
+		t.Error("Validate() = nil with MANPAGES_STORAGE_BACKEND=sqlite, want error")
+	}
+}
+
+func TestConvertCacheSize(t *testing.T) {
+	t.Setenv("MANPAGES_CONVERT_CACHE_SIZE_MB", "")
+	if got := Load().ConvertCacheSizeMB; got != 4096 {
+		t.Errorf("ConvertCacheSizeMB = %d, want 4096", got)
+	}
+	t.Setenv("MANPAGES_CONVERT_CACHE_SIZE_MB", "0")
+	if got := Load().ConvertCacheSizeMB; got != 0 {
+		t.Errorf("ConvertCacheSizeMB = %d, want 0", got)
+	}
+	t.Setenv("MANPAGES_CONVERT_CACHE_SIZE_MB", "-1")
+	if err := Load().Validate(); err == nil {
+		t.Error("Validate() = nil with MANPAGES_CONVERT_CACHE_SIZE_MB=-1, want error")
+	}
+}
+
+func TestFetchCache(t *testing.T) {
+	dir := t.TempDir()
+	origDir, _ := os.Getwd()
+	_ = os.Chdir(dir)
+	t.Cleanup(func() { os.Chdir(origDir) })
+
+	t.Setenv("MANPAGES_FETCH_CACHE_DIR", "")
+	t.Setenv("MANPAGES_FETCH_CACHE_SIZE_MB", "")
+	cfg := Load()
+	if cfg.FetchCacheDir != "" || cfg.FetchCacheSizeMB != 2048 {
+		t.Errorf("FetchCacheDir, FetchCacheSizeMB = %q, %d, want \"\", 2048", cfg.FetchCacheDir, cfg.FetchCacheSizeMB)
+	}
+
+	t.Setenv("MANPAGES_FETCH_CACHE_DIR", "/srv/cache")
+	t.Setenv("MANPAGES_FETCH_CACHE_SIZE_MB", "512")
+	cfg = Load()
+	if cfg.FetchCacheDir != "/srv/cache" || cfg.FetchCacheSizeMB != 512 {
+		t.Errorf("FetchCacheDir, FetchCacheSizeMB = %q, %d, want /srv/cache, 512", cfg.FetchCacheDir, cfg.FetchCacheSizeMB)
+	}
+
+	t.Setenv("MANPAGES_FETCH_CACHE_SIZE_MB", "lots")
+	if err := Load().Validate(); err == nil {
+		t.Error("Validate() = nil with MANPAGES_FETCH_CACHE_SIZE_MB=lots, want error")
+	}
+}
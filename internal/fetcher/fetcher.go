@@ -16,6 +16,8 @@ import (
 	"time"
 
 	debversion "pault.ag/go/debian/version"
+
+	"github.com/canonical/ubuntu-manpages-operator/internal/config"
 )
 
 type Package struct {
@@ -38,6 +40,13 @@ type Fetcher struct {
 	Client        *http.Client
 	Logger        *slog.Logger
 	MaxConcurrent int
+	// Attempts is the number of tries per request (default 3), waiting
+	// Backoff(attempt) between them (default LinearBackoff(time.Second)).
+	Attempts int
+	Backoff  func(attempt int) time.Duration
+	// Cache, if set, keeps index files across runs and revalidates them
+	// with conditional requests.
+	Cache *HTTPCache
 
 	// state holds concurrency control shared across shallow copies of the
 	// Fetcher (pipeline.go copies the struct to customise WorkDir per release;
@@ -49,7 +58,43 @@ type fetcherState struct {
 	sem chan struct{}
 }
 
-const defaultMaxConcurrent = 8
+const (
+	defaultMaxConcurrent = 8
+	defaultAttempts      = 3
+
+	maxIndexSize = 1024 * 1024 * 1024 // 1024 MB
+	maxDebSize   = 1024 * 1024 * 1024 // 1024 MB
+)
+
+// MaxBackoff caps the wait between two attempts, so that many retries of
+// a large base cannot stall a run on one file.
+const MaxBackoff = 5 * time.Minute
+
+// LinearBackoff waits base, 2*base, 3*base, ... between attempts, up to
+// MaxBackoff.
+func LinearBackoff(base time.Duration) func(int) time.Duration {
+	return func(attempt int) time.Duration {
+		if base > 0 && time.Duration(attempt) > MaxBackoff/base {
+			return MaxBackoff
+		}
+		return time.Duration(attempt) * base
+	}
+}
+
+// ExponentialBackoff waits base, 2*base, 4*base, ... between attempts, up
+// to MaxBackoff.
+func ExponentialBackoff(base time.Duration) func(int) time.Duration {
+	return func(attempt int) time.Duration {
+		if base <= 0 {
+			return 0
+		}
+		wait := base
+		for i := 1; i < attempt && wait < MaxBackoff; i++ {
+			wait <<= 1
+		}
+		return min(wait, MaxBackoff)
+	}
+}
 
 // stateInit guards lazy initialisation of Fetcher.state for Fetchers that were
 // constructed as a struct literal instead of via New.
@@ -68,6 +113,36 @@ func New(archive string, repos []string, archs []string, pockets []string, workD
 	return f
 }
 
+// SetMaxConcurrent replaces the concurrency budget. It must be called before
+// the Fetcher is used or copied.
+func (f *Fetcher) SetMaxConcurrent(n int) {
+	stateInit.Lock()
+	defer stateInit.Unlock()
+	f.MaxConcurrent = n
+	if n <= 0 {
+		n = defaultMaxConcurrent
+	}
+	f.state = &fetcherState{sem: make(chan struct{}, n)}
+}
+
+// NewFromConfig returns a Fetcher for cfg's archive, repos and arch, tuned
+// with its MANPAGES_FETCH_* settings.
+func NewFromConfig(cfg *config.Config, workDir string) *Fetcher {
+	f := New(cfg.Archive, cfg.Repos, []string{cfg.Arch}, nil, workDir)
+	f.Client.Timeout = cfg.FetchTimeout
+	f.SetMaxConcurrent(cfg.FetchConcurrency)
+	f.Attempts = cfg.FetchRetries + 1
+	if cfg.FetchBackoff == config.BackoffExponential {
+		f.Backoff = ExponentialBackoff(cfg.FetchBackoffBase)
+	} else {
+		f.Backoff = LinearBackoff(cfg.FetchBackoffBase)
+	}
+	if cfg.FetchCacheDir != "" {
+		f.Cache = NewHTTPCache(cfg.FetchCacheDir, int64(cfg.FetchCacheSizeMB)<<20)
+	}
+	return f
+}
+
 func (f *Fetcher) ensureState() {
 	stateInit.Lock()
 	defer stateInit.Unlock()
@@ -94,11 +169,19 @@ func (f *Fetcher) release() {
 	<-f.state.sem
 }
 
-// doWithRetry runs fn up to 3 times with linear backoff, returning the last
-// error. Context cancellation aborts immediately.
+// doWithRetry runs fn up to f.Attempts times with f.Backoff between
+// attempts, returning the last error. Context cancellation aborts immediately.
 func (f *Fetcher) doWithRetry(ctx context.Context, label, url string, fn func() error) error {
+	attempts := f.Attempts
+	if attempts <= 0 {
+		attempts = defaultAttempts
+	}
+	backoff := f.Backoff
+	if backoff == nil {
+		backoff = LinearBackoff(time.Second)
+	}
 	var lastErr error
-	for attempt := range 3 {
+	for attempt := range attempts {
 		if attempt > 0 {
 			if f.Logger != nil {
 				f.Logger.Warn("retrying "+label, "url", url, "attempt", attempt+1, "error", lastErr)
@@ -106,7 +189,7 @@ func (f *Fetcher) doWithRetry(ctx context.Context, label, url string, fn func()
 			select {
 			case <-ctx.Done():
 				return ctx.Err()
-			case <-time.After(time.Duration(attempt) * time.Second):
+			case <-time.After(backoff(attempt)):
 			}
 		}
 		lastErr = fn()
@@ -155,6 +238,7 @@ func (f *Fetcher) FetchPackages(ctx context.Context, release string) ([]Package,
 	}
 
 	results := make([]fetchResult, len(items))
+	var releases distReleases
 	var wg sync.WaitGroup
 	for _, item := range items {
 		wg.Add(1)
@@ -170,7 +254,7 @@ func (f *Fetcher) FetchPackages(ctx context.Context, release string) ([]Package,
 			}
 			var candidates []Package
 			err := f.doWithRetry(ctx, "packages fetch", f.packagesURL(it.dist, it.repo, it.arch), func() error {
-				reader, err := f.openPackages(ctx, it.dist, it.repo, it.arch)
+				reader, err := f.openPackages(ctx, &releases, it.dist, it.repo, it.arch)
 				if err != nil {
 					return err
 				}
@@ -225,69 +309,116 @@ func (f *Fetcher) FetchDeb(ctx context.Context, debURL string) (string, error) {
 		return "", fmt.Errorf("create work dir: %w", err)
 	}
 
+	// Deb downloads share the MaxConcurrent budget with index fetches.
+	f.ensureState()
+	if err := f.acquire(ctx); err != nil {
+		return "", fmt.Errorf("download deb: %w", err)
+	}
+	defer f.release()
+
+	// Each attempt resumes from whatever the previous ones wrote to the
+	// partial file, so a transient failure late in a large download does
+	// not start it over.
+	partPath := filepath.Join(f.WorkDir, "."+fileName+".part")
+	defer func() { _ = os.Remove(partPath) }()
+	var validator string
 	err := f.doWithRetry(ctx, "download", src, func() error {
-		req, err := http.NewRequestWithContext(ctx, http.MethodGet, src, nil)
-		if err != nil {
-			return fmt.Errorf("build request: %w", err)
+		return f.downloadResumable(ctx, src, partPath, &validator)
+	})
+	if err == nil {
+		if err = os.Rename(partPath, destPath); err != nil {
+			err = fmt.Errorf("rename deb file: %w", err)
 		}
+	}
+	if err != nil {
+		return "", err
+	}
+	return destPath, nil
+}
 
-		resp, err := f.Client.Do(req)
-		if err != nil {
-			return fmt.Errorf("download deb: %w", err)
-		}
-		defer func() { _ = resp.Body.Close() }()
+// downloadResumable downloads src to partPath, continuing an earlier
+// partial download with a Range request. validator holds the ETag or
+// Last-Modified of the first response; it is sent as If-Range so that a
+// file changed on the server is downloaded again from the start.
+func (f *Fetcher) downloadResumable(ctx context.Context, src, partPath string, validator *string) error {
+	req, err := http.NewRequestWithContext(ctx, http.MethodGet, src, nil)
+	if err != nil {
+		return fmt.Errorf("build request: %w", err)
+	}
+	var offset int64
+	if info, err := os.Stat(partPath); err == nil && *validator != "" {
+		offset = info.Size()
+	}
+	if offset > 0 {
+		req.Header.Set("Range", fmt.Sprintf("bytes=%d-", offset))
+		req.Header.Set("If-Range", *validator)
+	}
 
-		if resp.StatusCode < 200 || resp.StatusCode >= 300 {
-			return fmt.Errorf("download deb: status %s", resp.Status)
-		}
+	resp, err := f.Client.Do(req)
+	if err != nil {
+		return fmt.Errorf("download deb: %w", err)
+	}
+	defer func() { _ = resp.Body.Close() }()
 
-		tmp, err := os.CreateTemp(f.WorkDir, ".deb-*")
-		if err != nil {
-			return fmt.Errorf("create temp deb file: %w", err)
+	flags := os.O_CREATE | os.O_WRONLY | os.O_TRUNC
+	switch {
+	case resp.StatusCode == http.StatusPartialContent && offset > 0:
+		if !strings.HasPrefix(resp.Header.Get("Content-Range"), fmt.Sprintf("bytes %d-", offset)) {
+			return fmt.Errorf("download deb: unexpected content range %q", resp.Header.Get("Content-Range"))
 		}
-		tmpPath := tmp.Name()
-
-		const maxDebSize = 1024 * 1024 * 1024 // 1024 MB
-		if _, err := io.Copy(tmp, io.LimitReader(resp.Body, maxDebSize)); err != nil {
-			_ = tmp.Close()
-			_ = os.Remove(tmpPath)
-			return fmt.Errorf("write deb file: %w", err)
+		flags = os.O_WRONLY | os.O_APPEND
+	case resp.StatusCode == http.StatusRequestedRangeNotSatisfiable && offset > 0:
+		// The partial file is no prefix of the current file; start over.
+		*validator = ""
+		return fmt.Errorf("download deb: status %s", resp.Status)
+	case resp.StatusCode < 200 || resp.StatusCode >= 300:
+		return fmt.Errorf("download deb: status %s", resp.Status)
+	default:
+		offset = 0
+		*validator = resp.Header.Get("ETag")
+		if *validator == "" {
+			*validator = resp.Header.Get("Last-Modified")
 		}
-		_ = tmp.Close()
+	}
 
-		if err := os.Rename(tmpPath, destPath); err != nil {
-			_ = os.Remove(tmpPath)
-			return fmt.Errorf("rename deb file: %w", err)
-		}
-		return nil
-	})
+	out, err := os.OpenFile(partPath, flags, 0o644)
 	if err != nil {
-		return "", err
+		return fmt.Errorf("create temp deb file: %w", err)
 	}
-	return destPath, nil
+	if _, err := io.Copy(out, io.LimitReader(resp.Body, maxDebSize-offset)); err != nil {
+		_ = out.Close()
+		return fmt.Errorf("write deb file: %w", err)
+	}
+	return out.Close()
 }
 
 func (f *Fetcher) packagesURL(dist, repo, arch string) string {
 	return strings.TrimSuffix(f.Archive, "/") + "/dists/" + dist + "/" + repo + "/binary-" + arch + "/Packages.gz"
 }
 
-func (f *Fetcher) openPackages(ctx context.Context, dist string, repo string, arch string) (io.ReadCloser, error) {
-	url := f.packagesURL(dist, repo, arch)
-	request, err := http.NewRequestWithContext(ctx, http.MethodGet, url, nil)
-	if err != nil {
-		return nil, fmt.Errorf("build packages request: %w", err)
+// openPackages returns the uncompressed Packages index for dist, repo and
+// arch. With a Cache and a usable InRelease the index is resolved against
+// the published hashes (see openIndex); otherwise Packages.gz is fetched,
+// conditionally when a cached copy exists.
+func (f *Fetcher) openPackages(ctx context.Context, releases *distReleases, dist string, repo string, arch string) (io.ReadCloser, error) {
+	if f.Cache != nil {
+		if rel := releases.get(ctx, f, dist); rel != nil {
+			file := repo + "/binary-" + arch + "/Packages"
+			if want, ok := rel.sha256[file]; ok {
+				body, err := f.openIndex(ctx, rel, dist, file, want)
+				if err != nil {
+					return nil, fmt.Errorf("download packages: %w", err)
+				}
+				return body, nil
+			}
+		}
 	}
 
-	resp, err := f.Client.Do(request)
+	body, err := f.getCached(ctx, f.packagesURL(dist, repo, arch), maxIndexSize)
 	if err != nil {
 		return nil, fmt.Errorf("download packages: %w", err)
 	}
-	if resp.StatusCode < 200 || resp.StatusCode >= 300 {
-		_ = resp.Body.Close()
-		return nil, fmt.Errorf("download packages: status %s", resp.Status)
-	}
-
-	return wrapGzipReader(resp.Body)
+	return wrapGzipReader(body)
 }
 
 func wrapGzipReader(r io.ReadCloser) (io.ReadCloser, error) {
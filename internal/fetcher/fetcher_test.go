@@ -9,6 +9,7 @@ import (
 	"net/http"
 	"net/http/httptest"
 	"strings"
+	"sync"
 	"sync/atomic"
 	"testing"
 	"time"
@@ -242,6 +243,100 @@ func TestFetcher_MaxConcurrent(t *testing.T) {
 	}
 }
 
+func TestFetcher_Attempts(t *testing.T) {
+	var attempts atomic.Int32
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		attempts.Add(1)
+		w.WriteHeader(http.StatusServiceUnavailable)
+	}))
+	defer server.Close()
+
+	fetcher := &Fetcher{
+		Archive:  server.URL,
+		WorkDir:  t.TempDir(),
+		Client:   server.Client(),
+		Attempts: 5,
+		Backoff:  func(int) time.Duration { return 0 },
+	}
+
+	if _, err := fetcher.FetchDeb(context.Background(), "pool/f/foo.deb"); err == nil {
+		t.Fatal("expected error from FetchDeb")
+	}
+	if got := attempts.Load(); got != 5 {
+		t.Fatalf("expected 5 attempts, got %d", got)
+	}
+}
+
+func TestBackoff(t *testing.T) {
+	linear := LinearBackoff(time.Second)
+	exponential := ExponentialBackoff(time.Second)
+	for attempt, want := range map[int][2]time.Duration{
+		1: {time.Second, time.Second},
+		2: {2 * time.Second, 2 * time.Second},
+		3: {3 * time.Second, 4 * time.Second},
+		4: {4 * time.Second, 8 * time.Second},
+	} {
+		if got := linear(attempt); got != want[0] {
+			t.Errorf("LinearBackoff(1s)(%d) = %v, want %v", attempt, got, want[0])
+		}
+		if got := exponential(attempt); got != want[1] {
+			t.Errorf("ExponentialBackoff(1s)(%d) = %v, want %v", attempt, got, want[1])
+		}
+	}
+
+	// The largest base and retry count the charm allows stay within the cap.
+	linear, exponential = LinearBackoff(300*time.Second), ExponentialBackoff(300*time.Second)
+	for _, attempt := range []int{2, 20, 100} {
+		if got := linear(attempt); got != MaxBackoff {
+			t.Errorf("LinearBackoff(300s)(%d) = %v, want %v", attempt, got, MaxBackoff)
+		}
+		if got := exponential(attempt); got != MaxBackoff {
+			t.Errorf("ExponentialBackoff(300s)(%d) = %v, want %v", attempt, got, MaxBackoff)
+		}
+	}
+	if got := ExponentialBackoff(time.Second)(10); got != MaxBackoff {
+		t.Errorf("ExponentialBackoff(1s)(10) = %v, want %v", got, MaxBackoff)
+	}
+}
+
+func TestFetcher_SetMaxConcurrentBoundsDebDownloads(t *testing.T) {
+	var inFlight atomic.Int32
+	var maxSeen atomic.Int32
+
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		cur := inFlight.Add(1)
+		defer inFlight.Add(-1)
+		for {
+			prev := maxSeen.Load()
+			if cur <= prev || maxSeen.CompareAndSwap(prev, cur) {
+				break
+			}
+		}
+		<-time.After(20 * time.Millisecond)
+		_, _ = w.Write([]byte("deb"))
+	}))
+	defer server.Close()
+
+	fetcher := New(server.URL, []string{"main"}, []string{"amd64"}, nil, t.TempDir())
+	fetcher.Client = server.Client()
+	fetcher.SetMaxConcurrent(2)
+
+	var wg sync.WaitGroup
+	for i := range 8 {
+		wg.Add(1)
+		go func(n int) {
+			defer wg.Done()
+			if _, err := fetcher.FetchDeb(context.Background(), fmt.Sprintf("pool/p/pkg%d.deb", n)); err != nil {
+				t.Errorf("FetchDeb: %v", err)
+			}
+		}(i)
+	}
+	wg.Wait()
+	if got := maxSeen.Load(); got > 2 {
+		t.Fatalf("expected at most 2 in-flight, saw %d", got)
+	}
+}
+
 func TestVersionGreater(t *testing.T) {
 	tests := []struct {
 		left, right string
@@ -0,0 +1,291 @@
+package fetcher
+
+import (
+	"context"
+	"crypto/sha256"
+	"encoding/hex"
+	"encoding/json"
+	"fmt"
+	"io"
+	"net/http"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync/atomic"
+	"time"
+)
+
+// HTTPCache keeps downloaded archive index files on disk across ingest runs
+// together with their ETag and Last-Modified validators, so that unchanged
+// indices are revalidated with a conditional request instead of being
+// downloaded again.
+type HTTPCache struct {
+	Dir string
+	// MaxBytes bounds the total size of cached bodies. Prune evicts the least
+	// recently used entries above it; zero means unbounded.
+	MaxBytes int64
+
+	notModified atomic.Int64
+	downloaded  atomic.Int64
+	unchanged   atomic.Int64
+	patched     atomic.Int64
+}
+
+// CacheStats counts how archive indices were obtained during a run.
+type CacheStats struct {
+	// NotModified requests were answered with 304 and served from the cache.
+	NotModified int64
+	// Downloaded bodies were fetched in full and stored.
+	Downloaded int64
+	// Unchanged indices matched the hash published in InRelease and were
+	// not requested at all.
+	Unchanged int64
+	// Patched indices were brought up to date with pdiffs.
+	Patched int64
+}
+
+// cacheMeta is stored next to each cached body.
+type cacheMeta struct {
+	URL          string `json:"url"`
+	ETag         string `json:"etag,omitempty"`
+	LastModified string `json:"last_modified,omitempty"`
+	// SHA256 is the hash of the stored body, recorded for indices that are
+	// matched against InRelease.
+	SHA256 string `json:"sha256,omitempty"`
+}
+
+const cacheMetaSuffix = ".json"
+
+func NewHTTPCache(dir string, maxBytes int64) *HTTPCache {
+	return &HTTPCache{Dir: dir, MaxBytes: maxBytes}
+}
+
+func (c *HTTPCache) path(url string) string {
+	sum := sha256.Sum256([]byte(url))
+	return filepath.Join(c.Dir, hex.EncodeToString(sum[:]))
+}
+
+// lookup returns the validators recorded for url, if its body is cached.
+func (c *HTTPCache) lookup(url string) (cacheMeta, bool) {
+	p := c.path(url)
+	data, err := os.ReadFile(p + cacheMetaSuffix)
+	if err != nil {
+		return cacheMeta{}, false
+	}
+	var meta cacheMeta
+	if err := json.Unmarshal(data, &meta); err != nil || meta.URL != url {
+		return cacheMeta{}, false
+	}
+	if meta.ETag == "" && meta.LastModified == "" {
+		return cacheMeta{}, false
+	}
+	if _, err := os.Stat(p); err != nil {
+		return cacheMeta{}, false
+	}
+	return meta, true
+}
+
+// lookupHash returns the body hash recorded for url, if its body is cached.
+func (c *HTTPCache) lookupHash(url string) (string, bool) {
+	p := c.path(url)
+	data, err := os.ReadFile(p + cacheMetaSuffix)
+	if err != nil {
+		return "", false
+	}
+	var meta cacheMeta
+	if err := json.Unmarshal(data, &meta); err != nil || meta.URL != url || meta.SHA256 == "" {
+		return "", false
+	}
+	if _, err := os.Stat(p); err != nil {
+		return "", false
+	}
+	return meta.SHA256, true
+}
+
+// open returns the cached body for url and marks it as recently used.
+func (c *HTTPCache) open(url string) (io.ReadCloser, error) {
+	p := c.path(url)
+	now := time.Now()
+	_ = os.Chtimes(p, now, now)
+	return os.Open(p)
+}
+
+// store saves a 200 response body for url and returns a reader over the
+// stored copy.
+func (c *HTTPCache) store(url string, resp *http.Response, limit int64) (io.ReadCloser, error) {
+	meta := cacheMeta{
+		URL:          url,
+		ETag:         resp.Header.Get("ETag"),
+		LastModified: resp.Header.Get("Last-Modified"),
+	}
+	if err := c.storeReader(meta, resp.Body, limit); err != nil {
+		return nil, err
+	}
+	c.downloaded.Add(1)
+	return os.Open(c.path(url))
+}
+
+// storeReader saves the contents of r as the body for meta.URL. The body is
+// written to a temporary file and renamed into place, so a failed download
+// never replaces a good entry.
+func (c *HTTPCache) storeReader(meta cacheMeta, r io.Reader, limit int64) error {
+	if err := os.MkdirAll(c.Dir, 0o755); err != nil {
+		return fmt.Errorf("create cache dir: %w", err)
+	}
+	p := c.path(meta.URL)
+	tmp, err := os.CreateTemp(c.Dir, ".tmp-*")
+	if err != nil {
+		return fmt.Errorf("create cache entry: %w", err)
+	}
+	if _, err := io.Copy(tmp, io.LimitReader(r, limit)); err != nil {
+		_ = tmp.Close()
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("download: %w", err)
+	}
+	if err := tmp.Close(); err != nil {
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("write cache entry: %w", err)
+	}
+	// Drop the old validators first: a crash between the two renames must
+	// not pair the new body with stale validators.
+	_ = os.Remove(p + cacheMetaSuffix)
+	if err := os.Rename(tmp.Name(), p); err != nil {
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("rename cache entry: %w", err)
+	}
+	if data, err := json.Marshal(meta); err == nil {
+		_ = writeFileAtomic(p+cacheMetaSuffix, data)
+	}
+	return nil
+}
+
+func writeFileAtomic(path string, data []byte) error {
+	tmp, err := os.CreateTemp(filepath.Dir(path), ".tmp-*")
+	if err != nil {
+		return err
+	}
+	if _, err := tmp.Write(data); err != nil {
+		_ = tmp.Close()
+		_ = os.Remove(tmp.Name())
+		return err
+	}
+	if err := tmp.Close(); err != nil {
+		_ = os.Remove(tmp.Name())
+		return err
+	}
+	return os.Rename(tmp.Name(), path)
+}
+
+// Stats returns how indices were obtained since the cache was created.
+func (c *HTTPCache) Stats() CacheStats {
+	return CacheStats{
+		NotModified: c.notModified.Load(),
+		Downloaded:  c.downloaded.Load(),
+		Unchanged:   c.unchanged.Load(),
+		Patched:     c.patched.Load(),
+	}
+}
+
+// Prune evicts the least recently used entries until the cached bodies fit
+// in MaxBytes, and removes temporary files left by interrupted downloads.
+// It returns the number of entries removed.
+func (c *HTTPCache) Prune() (int, error) {
+	entries, err := os.ReadDir(c.Dir)
+	if err != nil {
+		if os.IsNotExist(err) {
+			return 0, nil
+		}
+		return 0, err
+	}
+
+	type body struct {
+		path    string
+		size    int64
+		modTime time.Time
+	}
+	var (
+		bodies []body
+		total  int64
+	)
+	for _, e := range entries {
+		name := e.Name()
+		p := filepath.Join(c.Dir, name)
+		if strings.HasPrefix(name, ".tmp-") {
+			_ = os.Remove(p)
+			continue
+		}
+		if strings.HasSuffix(name, cacheMetaSuffix) || e.IsDir() {
+			continue
+		}
+		info, err := e.Info()
+		if err != nil {
+			continue
+		}
+		bodies = append(bodies, body{p, info.Size(), info.ModTime()})
+		total += info.Size()
+	}
+	if c.MaxBytes <= 0 || total <= c.MaxBytes {
+		return 0, nil
+	}
+
+	sort.Slice(bodies, func(i, j int) bool { return bodies[i].modTime.Before(bodies[j].modTime) })
+	removed := 0
+	for _, b := range bodies {
+		if total <= c.MaxBytes {
+			break
+		}
+		_ = os.Remove(b.path + cacheMetaSuffix)
+		if err := os.Remove(b.path); err != nil && !os.IsNotExist(err) {
+			return removed, err
+		}
+		total -= b.size
+		removed++
+	}
+	return removed, nil
+}
+
+// getCached performs a GET for url through cache, sending a conditional
+// request when a cached copy exists and serving that copy on 304 Not
+// Modified. Without a cache it returns the response body directly. limit
+// bounds the size of a stored body.
+func (f *Fetcher) getCached(ctx context.Context, url string, limit int64) (io.ReadCloser, error) {
+	req, err := http.NewRequestWithContext(ctx, http.MethodGet, url, nil)
+	if err != nil {
+		return nil, fmt.Errorf("build request: %w", err)
+	}
+	meta, cached := cacheMeta{}, false
+	if f.Cache != nil {
+		meta, cached = f.Cache.lookup(url)
+	}
+	if cached {
+		if meta.ETag != "" {
+			req.Header.Set("If-None-Match", meta.ETag)
+		}
+		if meta.LastModified != "" {
+			req.Header.Set("If-Modified-Since", meta.LastModified)
+		}
+	}
+
+	resp, err := f.Client.Do(req)
+	if err != nil {
+		return nil, err
+	}
+	if cached && resp.StatusCode == http.StatusNotModified {
+		_ = resp.Body.Close()
+		if f.Logger != nil {
+			f.Logger.Debug("not modified, using cached copy", "url", url)
+		}
+		f.Cache.notModified.Add(1)
+		return f.Cache.open(url)
+	}
+	if resp.StatusCode < 200 || resp.StatusCode >= 300 {
+		_ = resp.Body.Close()
+		return nil, fmt.Errorf("status %s", resp.Status)
+	}
+	if f.Cache == nil {
+		return resp.Body, nil
+	}
+	defer func() { _ = resp.Body.Close() }()
+	return f.Cache.store(url, resp, limit)
+}
@@ -0,0 +1,243 @@
+package fetcher
+
+import (
+	"bytes"
+	"compress/gzip"
+	"context"
+	"fmt"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"strings"
+	"sync/atomic"
+	"testing"
+	"time"
+)
+
+func gzipPackages(t *testing.T, stanzas string) []byte {
+	t.Helper()
+	var gz bytes.Buffer
+	gw := gzip.NewWriter(&gz)
+	_, _ = gw.Write([]byte(stanzas))
+	if err := gw.Close(); err != nil {
+		t.Fatal(err)
+	}
+	return gz.Bytes()
+}
+
+func TestFetchPackages_ConditionalRequest(t *testing.T) {
+	payload := gzipPackages(t, "Package: foo\nVersion: 1.0-1\nFilename: pool/f/foo.deb\nSHA256: aaa\n\n")
+	var full, notModified atomic.Int32
+
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		if strings.HasSuffix(r.URL.Path, "/InRelease") {
+			http.NotFound(w, r)
+			return
+		}
+		if r.Header.Get("If-None-Match") == `"v1"` {
+			notModified.Add(1)
+			w.WriteHeader(http.StatusNotModified)
+			return
+		}
+		full.Add(1)
+		w.Header().Set("ETag", `"v1"`)
+		_, _ = w.Write(payload)
+	}))
+	defer server.Close()
+
+	cache := NewHTTPCache(t.TempDir(), 0)
+	for i := 0; i < 2; i++ {
+		fetcher := &Fetcher{
+			Archive: server.URL,
+			Repos:   []string{"main"},
+			Archs:   []string{"amd64"},
+			Pockets: []string{""},
+			WorkDir: t.TempDir(),
+			Client:  server.Client(),
+			Cache:   cache,
+		}
+		pkgs, err := fetcher.FetchPackages(context.Background(), "test")
+		if err != nil {
+			t.Fatalf("FetchPackages run %d: %v", i+1, err)
+		}
+		if len(pkgs) != 1 || pkgs[0].Name != "foo" {
+			t.Fatalf("FetchPackages run %d = %+v, want foo", i+1, pkgs)
+		}
+	}
+
+	if full.Load() != 1 || notModified.Load() != 1 {
+		t.Errorf("server sent %d full and %d 304 responses, want 1 and 1", full.Load(), notModified.Load())
+	}
+	if got := cache.Stats(); got.NotModified != 1 || got.Downloaded != 1 {
+		t.Errorf("Stats() = %+v, want 1 not modified and 1 downloaded", got)
+	}
+}
+
+func TestFetchPackages_NoValidatorsNotConditional(t *testing.T) {
+	payload := gzipPackages(t, "Package: foo\nVersion: 1.0-1\nFilename: pool/f/foo.deb\nSHA256: aaa\n\n")
+	var conditional atomic.Int32
+
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		if r.Header.Get("If-None-Match") != "" || r.Header.Get("If-Modified-Since") != "" {
+			conditional.Add(1)
+		}
+		_, _ = w.Write(payload)
+	}))
+	defer server.Close()
+
+	fetcher := &Fetcher{
+		Archive: server.URL,
+		Repos:   []string{"main"},
+		Archs:   []string{"amd64"},
+		Pockets: []string{""},
+		WorkDir: t.TempDir(),
+		Client:  server.Client(),
+		Cache:   NewHTTPCache(t.TempDir(), 0),
+	}
+	for i := 0; i < 2; i++ {
+		if _, err := fetcher.FetchPackages(context.Background(), "test"); err != nil {
+			t.Fatalf("FetchPackages: %v", err)
+		}
+	}
+	if got := conditional.Load(); got != 0 {
+		t.Errorf("sent %d conditional requests without validators, want 0", got)
+	}
+}
+
+func TestFetchDeb_ResumesWithRange(t *testing.T) {
+	content := bytes.Repeat([]byte("0123456789"), 1000)
+	half := len(content) / 2
+	var attempts atomic.Int32
+	var gotRange, gotIfRange string
+
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Header().Set("ETag", `"deb1"`)
+		if attempts.Add(1) == 1 {
+			// Send half the body, then drop the connection.
+			w.Header().Set("Content-Length", fmt.Sprint(len(content)))
+			w.WriteHeader(http.StatusOK)
+			_, _ = w.Write(content[:half])
+			w.(http.Flusher).Flush()
+			panic(http.ErrAbortHandler)
+		}
+		gotRange, gotIfRange = r.Header.Get("Range"), r.Header.Get("If-Range")
+		var start int
+		if _, err := fmt.Sscanf(gotRange, "bytes=%d-", &start); err != nil {
+			w.WriteHeader(http.StatusOK)
+			_, _ = w.Write(content)
+			return
+		}
+		w.Header().Set("Content-Range", fmt.Sprintf("bytes %d-%d/%d", start, len(content)-1, len(content)))
+		w.WriteHeader(http.StatusPartialContent)
+		_, _ = w.Write(content[start:])
+	}))
+	defer server.Close()
+
+	fetcher := &Fetcher{
+		Archive: server.URL,
+		WorkDir: t.TempDir(),
+		Client:  server.Client(),
+		Backoff: func(int) time.Duration { return 0 },
+	}
+	path, err := fetcher.FetchDeb(context.Background(), "pool/test.deb")
+	if err != nil {
+		t.Fatalf("FetchDeb: %v", err)
+	}
+	got, err := os.ReadFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if !bytes.Equal(got, content) {
+		t.Errorf("downloaded %d bytes, want the original %d", len(got), len(content))
+	}
+	if want := fmt.Sprintf("bytes=%d-", half); gotRange != want {
+		t.Errorf("retry Range = %q, want %q", gotRange, want)
+	}
+	if gotIfRange != `"deb1"` {
+		t.Errorf("retry If-Range = %q, want %q", gotIfRange, `"deb1"`)
+	}
+	if _, err := os.Stat(filepath.Join(fetcher.WorkDir, ".test.deb.part")); !os.IsNotExist(err) {
+		t.Errorf("partial file left behind: %v", err)
+	}
+}
+
+func TestFetchDeb_RangeIgnoredRestarts(t *testing.T) {
+	content := bytes.Repeat([]byte("abcdefghij"), 1000)
+	var attempts atomic.Int32
+
+	server := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Header().Set("Last-Modified", "Mon, 02 Jan 2006 15:04:05 GMT")
+		w.Header().Set("Content-Length", fmt.Sprint(len(content)))
+		w.WriteHeader(http.StatusOK)
+		if attempts.Add(1) == 1 {
+			_, _ = w.Write(content[:100])
+			w.(http.Flusher).Flush()
+			panic(http.ErrAbortHandler)
+		}
+		// A server without range support answers with the whole file.
+		_, _ = w.Write(content)
+	}))
+	defer server.Close()
+
+	fetcher := &Fetcher{
+		Archive: server.URL,
+		WorkDir: t.TempDir(),
+		Client:  server.Client(),
+		Backoff: func(int) time.Duration { return 0 },
+	}
+	path, err := fetcher.FetchDeb(context.Background(), "pool/test.deb")
+	if err != nil {
+		t.Fatalf("FetchDeb: %v", err)
+	}
+	got, err := os.ReadFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if !bytes.Equal(got, content) {
+		t.Errorf("downloaded %d bytes, want the original %d", len(got), len(content))
+	}
+}
+
+func TestHTTPCachePrune(t *testing.T) {
+	dir := t.TempDir()
+	cache := NewHTTPCache(dir, 250)
+
+	now := time.Now()
+	for i, url := range []string{"http://a", "http://b", "http://c"} {
+		p := cache.path(url)
+		if err := os.WriteFile(p, make([]byte, 100), 0o644); err != nil {
+			t.Fatal(err)
+		}
+		if err := os.WriteFile(p+cacheMetaSuffix, []byte(`{}`), 0o644); err != nil {
+			t.Fatal(err)
+		}
+		mtime := now.Add(time.Duration(i-3) * time.Hour)
+		if err := os.Chtimes(p, mtime, mtime); err != nil {
+			t.Fatal(err)
+		}
+	}
+	if err := os.WriteFile(filepath.Join(dir, ".tmp-123"), nil, 0o644); err != nil {
+		t.Fatal(err)
+	}
+
+	removed, err := cache.Prune()
+	if err != nil {
+		t.Fatalf("Prune: %v", err)
+	}
+	if removed != 1 {
+		t.Errorf("Prune() removed %d, want 1", removed)
+	}
+	for url, want := range map[string]bool{"http://a": false, "http://b": true, "http://c": true} {
+		_, err := os.Stat(cache.path(url))
+		if got := err == nil; got != want {
+			t.Errorf("%s cached = %v, want %v", url, got, want)
+		}
+	}
+	if _, err := os.Stat(cache.path("http://a") + cacheMetaSuffix); !os.IsNotExist(err) {
+		t.Error("evicted entry kept its metadata")
+	}
+	if _, err := os.Stat(filepath.Join(dir, ".tmp-123")); !os.IsNotExist(err) {
+		t.Error("Prune kept a leftover temp file")
+	}
+}
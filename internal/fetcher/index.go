@@ -0,0 +1,448 @@
+package fetcher
+
+import (
+	"bufio"
+	"bytes"
+	"compress/gzip"
+	"context"
+	"crypto/sha256"
+	"encoding/hex"
+	"errors"
+	"fmt"
+	"hash"
+	"io"
+	"net/http"
+	"path"
+	"regexp"
+	"strconv"
+	"strings"
+	"sync"
+)
+
+// With a Cache, FetchPackages reads each dist's InRelease first and keeps
+// an uncompressed copy of every Packages index it has seen. An index whose
+// SHA256 in InRelease matches the local copy is not requested at all; one
+// that changed is brought up to date with the archive's pdiffs when they
+// cover the local copy, and downloaded in full otherwise. Downloads use the
+// by-hash paths when the archive advertises them, and everything fetched
+// is checked against the hashes published in InRelease.
+//
+// The InRelease signature is not verified here, as before for Packages.gz;
+// the hashes only guard against stale or torn mirror content.
+
+// releaseFile holds the parts of a dist's InRelease used to fetch indices.
+type releaseFile struct {
+	byHash bool
+	sha256 map[string]hashEntry
+}
+
+// hashEntry is one "hash size name" line of a Release or pdiff Index file.
+type hashEntry struct {
+	hash string
+	size int64
+	name string
+}
+
+// distReleases memoises the InRelease of each dist for one FetchPackages
+// call. A nil releaseFile means the dist is fetched without it.
+type distReleases struct {
+	mu    sync.Mutex
+	dists map[string]*distRelease
+}
+
+type distRelease struct {
+	once sync.Once
+	rel  *releaseFile
+}
+
+func (d *distReleases) get(ctx context.Context, f *Fetcher, dist string) *releaseFile {
+	d.mu.Lock()
+	if d.dists == nil {
+		d.dists = make(map[string]*distRelease)
+	}
+	dr, ok := d.dists[dist]
+	if !ok {
+		dr = &distRelease{}
+		d.dists[dist] = dr
+	}
+	d.mu.Unlock()
+
+	dr.once.Do(func() {
+		rel, err := f.fetchRelease(ctx, dist)
+		if err != nil {
+			if f.Logger != nil {
+				f.Logger.Debug("InRelease unavailable, fetching indices directly", "dist", dist, "error", err)
+			}
+			return
+		}
+		dr.rel = rel
+	})
+	return dr.rel
+}
+
+func (f *Fetcher) distURL(dist, file string) string {
+	return strings.TrimSuffix(f.Archive, "/") + "/dists/" + dist + "/" + file
+}
+
+// fileURL returns the URL of a file listed in a dist's InRelease, using the
+// by-hash path when the archive provides one.
+func (f *Fetcher) fileURL(rel *releaseFile, dist, file, sha string) string {
+	if rel.byHash && sha != "" {
+		return f.distURL(dist, path.Dir(file)+"/by-hash/SHA256/"+sha)
+	}
+	return f.distURL(dist, file)
+}
+
+func (f *Fetcher) fetchRelease(ctx context.Context, dist string) (*releaseFile, error) {
+	body, err := f.getCached(ctx, f.distURL(dist, "InRelease"), maxIndexSize)
+	if err != nil {
+		return nil, err
+	}
+	defer func() { _ = body.Close() }()
+	fields, err := readParagraph(body)
+	if err != nil {
+		return nil, err
+	}
+	entries := parseHashList(fields["SHA256"])
+	if len(entries) == 0 {
+		return nil, errors.New("no SHA256 entries")
+	}
+	rel := &releaseFile{
+		byHash: strings.EqualFold(fields["Acquire-By-Hash"], "yes"),
+		sha256: make(map[string]hashEntry, len(entries)),
+	}
+	for _, e := range entries {
+		rel.sha256[e.name] = e
+	}
+	return rel, nil
+}
+
+// openIndex returns the uncompressed Packages index file (e.g.
+// "main/binary-amd64/Packages") of dist, whose current hash is want.
+func (f *Fetcher) openIndex(ctx context.Context, rel *releaseFile, dist, file string, want hashEntry) (io.ReadCloser, error) {
+	key := f.distURL(dist, file)
+	if have, ok := f.Cache.lookupHash(key); ok {
+		if have == want.hash {
+			if f.Logger != nil {
+				f.Logger.Debug("index unchanged", "dist", dist, "file", file)
+			}
+			f.Cache.unchanged.Add(1)
+			return f.Cache.open(key)
+		}
+		if _, ok := rel.sha256[file+".diff/Index"]; ok {
+			err := f.patchIndex(ctx, rel, dist, file, have, want)
+			if err == nil {
+				if f.Logger != nil {
+					f.Logger.Debug("index patched", "dist", dist, "file", file)
+				}
+				f.Cache.patched.Add(1)
+				return f.Cache.open(key)
+			}
+			if f.Logger != nil {
+				f.Logger.Debug("pdiff failed, downloading index", "dist", dist, "file", file, "error", err)
+			}
+		}
+	}
+
+	if err := f.downloadIndex(ctx, rel, dist, file, want); err != nil {
+		return nil, err
+	}
+	f.Cache.downloaded.Add(1)
+	return f.Cache.open(key)
+}
+
+// downloadIndex fetches the compressed index and stores it uncompressed.
+func (f *Fetcher) downloadIndex(ctx context.Context, rel *releaseFile, dist, file string, want hashEntry) error {
+	gz := rel.sha256[file+".gz"]
+	body, err := f.get(ctx, f.fileURL(rel, dist, file+".gz", gz.hash))
+	if err != nil {
+		return err
+	}
+	defer func() { _ = body.Close() }()
+	r, err := gzip.NewReader(body)
+	if err != nil {
+		return fmt.Errorf("gzip reader: %w", err)
+	}
+	defer func() { _ = r.Close() }()
+	meta := cacheMeta{URL: f.distURL(dist, file), SHA256: want.hash}
+	return f.Cache.storeReader(meta, newHashCheckReader(r, want.hash), maxIndexSize)
+}
+
+// patchIndex brings the local copy of an index from hash have to want by
+// applying the pdiffs listed in its Packages.diff/Index.
+func (f *Fetcher) patchIndex(ctx context.Context, rel *releaseFile, dist, file, have string, want hashEntry) error {
+	indexFile := file + ".diff/Index"
+	indexEntry := rel.sha256[indexFile]
+	body, err := f.get(ctx, f.fileURL(rel, dist, indexFile, indexEntry.hash))
+	if err != nil {
+		return err
+	}
+	fields, err := readParagraph(newHashCheckReader(body, indexEntry.hash))
+	_ = body.Close()
+	if err != nil {
+		return err
+	}
+
+	if current := strings.Fields(fields["SHA256-Current"]); len(current) == 0 || current[0] != want.hash {
+		return errors.New("pdiff index does not lead to the current index")
+	}
+	history := parseHashList(fields["SHA256-History"])
+	start := -1
+	for i, h := range history {
+		if h.hash == have {
+			start = i
+			break
+		}
+	}
+	if start < 0 {
+		return errors.New("local index is not in the pdiff history")
+	}
+	// Merged patches each lead straight to the current index; otherwise
+	// every patch from the local version onwards is applied in turn.
+	names := []string{history[start].name}
+	if fields["X-Patch-Precedence"] != "merged" {
+		names = names[:0]
+		for _, h := range history[start:] {
+			names = append(names, h.name)
+		}
+	}
+	patchHashes := make(map[string]string)
+	for _, p := range parseHashList(fields["SHA256-Patches"]) {
+		patchHashes[p.name] = p.hash
+	}
+	downloadHashes := make(map[string]string)
+	for _, d := range parseHashList(fields["SHA256-Download"]) {
+		downloadHashes[strings.TrimSuffix(d.name, ".gz")] = d.hash
+	}
+
+	local, err := f.Cache.open(f.distURL(dist, file))
+	if err != nil {
+		return err
+	}
+	data, err := io.ReadAll(local)
+	_ = local.Close()
+	if err != nil {
+		return err
+	}
+	lines := splitLines(data)
+
+	for _, name := range names {
+		patchHash, ok := patchHashes[name]
+		if !ok {
+			return fmt.Errorf("pdiff %s has no hash", name)
+		}
+		diffFile := file + ".diff/" + name + ".gz"
+		script, err := f.fetchPatch(ctx, f.fileURL(rel, dist, diffFile, downloadHashes[name]), patchHash)
+		if err != nil {
+			return fmt.Errorf("pdiff %s: %w", name, err)
+		}
+		if lines, err = applyEdScript(lines, script); err != nil {
+			return fmt.Errorf("pdiff %s: %w", name, err)
+		}
+	}
+
+	meta := cacheMeta{URL: f.distURL(dist, file), SHA256: want.hash}
+	return f.Cache.storeReader(meta, newHashCheckReader(joinLines(lines), want.hash), maxIndexSize)
+}
+
+func (f *Fetcher) fetchPatch(ctx context.Context, url, sha string) ([]byte, error) {
+	body, err := f.get(ctx, url)
+	if err != nil {
+		return nil, err
+	}
+	defer func() { _ = body.Close() }()
+	r, err := gzip.NewReader(body)
+	if err != nil {
+		return nil, fmt.Errorf("gzip reader: %w", err)
+	}
+	defer func() { _ = r.Close() }()
+	return io.ReadAll(newHashCheckReader(r, sha))
+}
+
+// get performs a plain GET and returns the body of a 2xx response.
+func (f *Fetcher) get(ctx context.Context, url string) (io.ReadCloser, error) {
+	req, err := http.NewRequestWithContext(ctx, http.MethodGet, url, nil)
+	if err != nil {
+		return nil, fmt.Errorf("build request: %w", err)
+	}
+	resp, err := f.Client.Do(req)
+	if err != nil {
+		return nil, err
+	}
+	if resp.StatusCode < 200 || resp.StatusCode >= 300 {
+		_ = resp.Body.Close()
+		return nil, fmt.Errorf("%s: status %s", url, resp.Status)
+	}
+	return resp.Body, nil
+}
+
+// hashCheckReader fails the read that reaches EOF if the stream's SHA256
+// differs from want, so a consumer never commits corrupt content.
+type hashCheckReader struct {
+	r    io.Reader
+	h    hash.Hash
+	want string
+}
+
+func newHashCheckReader(r io.Reader, want string) io.Reader {
+	return &hashCheckReader{r: r, h: sha256.New(), want: want}
+}
+
+func (c *hashCheckReader) Read(p []byte) (int, error) {
+	n, err := c.r.Read(p)
+	c.h.Write(p[:n])
+	if errors.Is(err, io.EOF) {
+		if got := hex.EncodeToString(c.h.Sum(nil)); got != c.want {
+			return n, fmt.Errorf("sha256 mismatch: got %s, want %s", got, c.want)
+		}
+	}
+	return n, err
+}
+
+// readParagraph reads the first paragraph of a deb822 file such as Release
+// or a pdiff Index, skipping an OpenPGP clear-signing armor if present.
+// Continuation lines are joined to their field's value with newlines.
+func readParagraph(r io.Reader) (map[string]string, error) {
+	scanner := bufio.NewScanner(r)
+	scanner.Buffer(make([]byte, 0, 64*1024), 10*1024*1024)
+	fields := make(map[string]string)
+	var key string
+	armored, inHeader := false, false
+	for scanner.Scan() {
+		line := scanner.Text()
+		switch {
+		case !armored && len(fields) == 0 && line == "-----BEGIN PGP SIGNED MESSAGE-----":
+			armored, inHeader = true, true
+			continue
+		case inHeader:
+			// Armor headers (e.g. "Hash: SHA512") end at the first blank line.
+			inHeader = line != ""
+			continue
+		case armored && strings.HasPrefix(line, "-----BEGIN PGP SIGNATURE-----"):
+			return fields, nil
+		case armored && strings.HasPrefix(line, "- "):
+			line = line[2:]
+		}
+		if line == "" {
+			if len(fields) > 0 {
+				break
+			}
+			continue
+		}
+		if line[0] == ' ' || line[0] == '\t' {
+			if key != "" {
+				fields[key] += "\n" + strings.TrimSpace(line)
+			}
+			continue
+		}
+		k, v, ok := strings.Cut(line, ":")
+		if !ok {
+			continue
+		}
+		key = k
+		fields[key] = strings.TrimSpace(v)
+	}
+	if err := scanner.Err(); err != nil {
+		return nil, fmt.Errorf("read paragraph: %w", err)
+	}
+	return fields, nil
+}
+
+// parseHashList parses a multi-line "hash size name" field value.
+func parseHashList(value string) []hashEntry {
+	var entries []hashEntry
+	for _, line := range strings.Split(value, "\n") {
+		parts := strings.Fields(line)
+		if len(parts) != 3 {
+			continue
+		}
+		size, err := strconv.ParseInt(parts[1], 10, 64)
+		if err != nil {
+			continue
+		}
+		entries = append(entries, hashEntry{hash: parts[0], size: size, name: parts[2]})
+	}
+	return entries
+}
+
+func splitLines(data []byte) [][]byte {
+	if len(data) == 0 {
+		return nil
+	}
+	return bytes.Split(bytes.TrimSuffix(data, []byte("\n")), []byte("\n"))
+}
+
+func joinLines(lines [][]byte) io.Reader {
+	var buf bytes.Buffer
+	for _, line := range lines {
+		buf.Write(line)
+		buf.WriteByte('\n')
+	}
+	return &buf
+}
+
+var edCommand = regexp.MustCompile(`^(\d+)(?:,(\d+))?([acd])$`)
+
+type edCmd struct {
+	op         byte
+	start, end int
+	text       [][]byte
+}
+
+// applyEdScript applies a pdiff, an ed script as written by "diff --ed",
+// to lines. Only the a, c and d commands diff emits are supported, in
+// the descending line order it emits them.
+func applyEdScript(lines [][]byte, script []byte) ([][]byte, error) {
+	var cmds []edCmd
+	scriptLines := splitLines(script)
+	for i := 0; i < len(scriptLines); i++ {
+		m := edCommand.FindSubmatch(scriptLines[i])
+		if m == nil {
+			return nil, fmt.Errorf("unsupported ed command %q", scriptLines[i])
+		}
+		cmd := edCmd{op: m[3][0]}
+		cmd.start, _ = strconv.Atoi(string(m[1]))
+		cmd.end = cmd.start
+		if len(m[2]) > 0 {
+			cmd.end, _ = strconv.Atoi(string(m[2]))
+		}
+		if cmd.op != 'a' {
+			if cmd.start < 1 || cmd.end < cmd.start {
+				return nil, fmt.Errorf("bad ed range %q", scriptLines[i])
+			}
+		}
+		if cmd.op == 'a' || cmd.op == 'c' {
+			for i++; ; i++ {
+				if i >= len(scriptLines) {
+					return nil, errors.New("unterminated ed text")
+				}
+				if string(scriptLines[i]) == "." {
+					break
+				}
+				cmd.text = append(cmd.text, scriptLines[i])
+			}
+		}
+		cmds = append(cmds, cmd)
+	}
+
+	// Rebuild the file front to back, walking the commands in reverse.
+	out := make([][]byte, 0, len(lines))
+	pos := 0
+	for i := len(cmds) - 1; i >= 0; i-- {
+		cmd := cmds[i]
+		keep := cmd.start - 1
+		if cmd.op == 'a' {
+			keep = cmd.start
+		}
+		if keep < pos || cmd.end > len(lines) {
+			return nil, errors.New("ed commands out of order or out of range")
+		}
+		out = append(out, lines[pos:keep]...)
+		out = append(out, cmd.text...)
+		pos = keep
+		if cmd.op != 'a' {
+			pos = cmd.end
+		}
+	}
+	return append(out, lines[pos:]...), nil
+}
@@ -0,0 +1,249 @@
+package fetcher
+
+import (
+	"bytes"
+	"context"
+	"crypto/sha256"
+	"encoding/hex"
+	"fmt"
+	"net/http"
+	"net/http/httptest"
+	"strings"
+	"sync"
+	"testing"
+)
+
+const (
+	packagesV1 = "Package: foo\nVersion: 1.0-1\nFilename: pool/f/foo_1.0-1.deb\nSHA256: aaa\n\n"
+	packagesV2 = "Package: foo\nVersion: 1.0-2\nFilename: pool/f/foo_1.0-2.deb\nSHA256: bbb\n\n" +
+		"Package: bar\nVersion: 2.0-1\nFilename: pool/b/bar_2.0-1.deb\nSHA256: ccc\n\n"
+	// edV1toV2 is "diff --ed" output turning packagesV1 into packagesV2.
+	edV1toV2 = "2,4c\nVersion: 1.0-2\nFilename: pool/f/foo_1.0-2.deb\nSHA256: bbb\n\n" +
+		"Package: bar\nVersion: 2.0-1\nFilename: pool/b/bar_2.0-1.deb\nSHA256: ccc\n.\n"
+)
+
+func sha256hex(data []byte) string {
+	sum := sha256.Sum256(data)
+	return hex.EncodeToString(sum[:])
+}
+
+// fakeArchive serves a single dist with main/binary-amd64 indices by hash,
+// counting requests per path.
+type fakeArchive struct {
+	t        *testing.T
+	mu       sync.Mutex
+	files    map[string][]byte
+	requests map[string]int
+}
+
+func newFakeArchive(t *testing.T) *fakeArchive {
+	return &fakeArchive{t: t, files: map[string][]byte{}, requests: map[string]int{}}
+}
+
+func (a *fakeArchive) ServeHTTP(w http.ResponseWriter, r *http.Request) {
+	a.mu.Lock()
+	defer a.mu.Unlock()
+	a.requests[r.URL.Path]++
+	data, ok := a.files[r.URL.Path]
+	if !ok {
+		http.NotFound(w, r)
+		return
+	}
+	_, _ = w.Write(data)
+}
+
+func (a *fakeArchive) count(path string) int {
+	a.mu.Lock()
+	defer a.mu.Unlock()
+	return a.requests[path]
+}
+
+// publish replaces the archive contents with packages, plus a pdiff Index
+// and patch when patch is set.
+func (a *fakeArchive) publish(packages string, patch map[string]string) {
+	a.mu.Lock()
+	defer a.mu.Unlock()
+	const dir = "/dists/test/main/binary-amd64/"
+	gz := gzipPackages(a.t, packages)
+	a.files = map[string][]byte{}
+	a.files[dir+"by-hash/SHA256/"+sha256hex(gz)] = gz
+
+	var release strings.Builder
+	release.WriteString("-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA512\n\n")
+	release.WriteString("Origin: Ubuntu\nAcquire-By-Hash: yes\nSHA256:\n")
+	fmt.Fprintf(&release, " %s %d main/binary-amd64/Packages\n", sha256hex([]byte(packages)), len(packages))
+	fmt.Fprintf(&release, " %s %d main/binary-amd64/Packages.gz\n", sha256hex(gz), len(gz))
+	if patch != nil {
+		var index strings.Builder
+		fmt.Fprintf(&index, "SHA256-Current: %s %d\nSHA256-History:\n", sha256hex([]byte(packages)), len(packages))
+		from := patch["from"]
+		fmt.Fprintf(&index, " %s %d T-1-F-1\n", sha256hex([]byte(from)), len(from))
+		script := []byte(patch["script"])
+		scriptGz := gzipPackages(a.t, patch["script"])
+		fmt.Fprintf(&index, "SHA256-Patches:\n %s %d T-1-F-1\n", sha256hex(script), len(script))
+		fmt.Fprintf(&index, "SHA256-Download:\n %s %d T-1-F-1.gz\n", sha256hex(scriptGz), len(scriptGz))
+		index.WriteString("X-Patch-Precedence: merged\n")
+		indexData := []byte(index.String())
+		a.files[dir+"Packages.diff/by-hash/SHA256/"+sha256hex(indexData)] = indexData
+		a.files[dir+"Packages.diff/by-hash/SHA256/"+sha256hex(scriptGz)] = scriptGz
+		fmt.Fprintf(&release, " %s %d main/binary-amd64/Packages.diff/Index\n", sha256hex(indexData), len(indexData))
+	}
+	release.WriteString("-----BEGIN PGP SIGNATURE-----\n\nc2lnbmF0dXJl\n-----END PGP SIGNATURE-----\n")
+	a.files["/dists/test/InRelease"] = []byte(release.String())
+}
+
+func (a *fakeArchive) fetch(t *testing.T, url string, cache *HTTPCache) []Package {
+	t.Helper()
+	fetcher := &Fetcher{
+		Archive: url,
+		Repos:   []string{"main"},
+		Archs:   []string{"amd64"},
+		Pockets: []string{""},
+		WorkDir: t.TempDir(),
+		Client:  http.DefaultClient,
+		Cache:   cache,
+	}
+	pkgs, err := fetcher.FetchPackages(context.Background(), "test")
+	if err != nil {
+		t.Fatalf("FetchPackages: %v", err)
+	}
+	return pkgs
+}
+
+func packageVersions(pkgs []Package) map[string]string {
+	versions := make(map[string]string)
+	for _, p := range pkgs {
+		versions[p.Name] = p.Version
+	}
+	return versions
+}
+
+func TestFetchPackages_InReleaseSkipsUnchangedIndex(t *testing.T) {
+	archive := newFakeArchive(t)
+	archive.publish(packagesV1, nil)
+	server := httptest.NewServer(archive)
+	defer server.Close()
+	cache := NewHTTPCache(t.TempDir(), 0)
+
+	for i := 0; i < 2; i++ {
+		if got := packageVersions(archive.fetch(t, server.URL, cache)); got["foo"] != "1.0-1" {
+			t.Fatalf("run %d packages = %v, want foo 1.0-1", i+1, got)
+		}
+	}
+
+	gzPath := "/dists/test/main/binary-amd64/by-hash/SHA256/" + sha256hex(gzipPackages(t, packagesV1))
+	if got := archive.count(gzPath); got != 1 {
+		t.Errorf("Packages.gz requested %d times, want 1", got)
+	}
+	if got := cache.Stats(); got.Unchanged != 1 {
+		t.Errorf("Stats() = %+v, want 1 unchanged", got)
+	}
+}
+
+func TestFetchPackages_PDiff(t *testing.T) {
+	archive := newFakeArchive(t)
+	archive.publish(packagesV1, nil)
+	server := httptest.NewServer(archive)
+	defer server.Close()
+	cache := NewHTTPCache(t.TempDir(), 0)
+	archive.fetch(t, server.URL, cache)
+
+	archive.publish(packagesV2, map[string]string{"from": packagesV1, "script": edV1toV2})
+	got := packageVersions(archive.fetch(t, server.URL, cache))
+	if got["foo"] != "1.0-2" || got["bar"] != "2.0-1" {
+		t.Errorf("packages after pdiff = %v, want foo 1.0-2 and bar 2.0-1", got)
+	}
+	gzPath := "/dists/test/main/binary-amd64/by-hash/SHA256/" + sha256hex(gzipPackages(t, packagesV2))
+	if n := archive.count(gzPath); n != 0 {
+		t.Errorf("new Packages.gz requested %d times, want 0", n)
+	}
+	if stats := cache.Stats(); stats.Patched != 1 {
+		t.Errorf("Stats() = %+v, want 1 patched", stats)
+	}
+
+	// The patched copy is now current.
+	archive.fetch(t, server.URL, cache)
+	if stats := cache.Stats(); stats.Unchanged != 1 {
+		t.Errorf("Stats() = %+v, want 1 unchanged", stats)
+	}
+}
+
+func TestFetchPackages_BadPDiffDownloadsIndex(t *testing.T) {
+	archive := newFakeArchive(t)
+	archive.publish(packagesV1, nil)
+	server := httptest.NewServer(archive)
+	defer server.Close()
+	cache := NewHTTPCache(t.TempDir(), 0)
+	archive.fetch(t, server.URL, cache)
+
+	// A patch that does not produce the published index.
+	archive.publish(packagesV2, map[string]string{"from": packagesV1, "script": "1d\n"})
+	got := packageVersions(archive.fetch(t, server.URL, cache))
+	if got["foo"] != "1.0-2" || got["bar"] != "2.0-1" {
+		t.Errorf("packages = %v, want foo 1.0-2 and bar 2.0-1", got)
+	}
+	gzPath := "/dists/test/main/binary-amd64/by-hash/SHA256/" + sha256hex(gzipPackages(t, packagesV2))
+	if n := archive.count(gzPath); n != 1 {
+		t.Errorf("new Packages.gz requested %d times, want 1", n)
+	}
+	if stats := cache.Stats(); stats.Patched != 0 {
+		t.Errorf("Stats() = %+v, want 0 patched", stats)
+	}
+}
+
+func TestApplyEdScript(t *testing.T) {
+	tests := []struct {
+		name, in, script, want string
+		wantErr                bool
+	}{
+		{name: "change and append", in: packagesV1, script: edV1toV2, want: packagesV2},
+		{name: "delete", in: "a\nb\nc\n", script: "2d\n", want: "a\nc\n"},
+		{name: "append at start", in: "b\n", script: "0a\na\n.\n", want: "a\nb\n"},
+		{name: "descending commands", in: "a\nb\nc\nd\n", script: "4c\nD\n.\n1,2d\n", want: "c\nD\n"},
+		{name: "empty script", in: "a\n", script: "", want: "a\n"},
+		{name: "out of range", in: "a\n", script: "3d\n", wantErr: true},
+		{name: "ascending commands", in: "a\nb\nc\n", script: "1d\n3d\n", wantErr: true},
+		{name: "unsupported command", in: "a\n", script: "s/a/b/\n", wantErr: true},
+		{name: "unterminated text", in: "a\n", script: "1a\nb\n", wantErr: true},
+	}
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			lines, err := applyEdScript(splitLines([]byte(tt.in)), []byte(tt.script))
+			if tt.wantErr {
+				if err == nil {
+					t.Error("applyEdScript() error = nil, want error")
+				}
+				return
+			}
+			if err != nil {
+				t.Fatalf("applyEdScript(): %v", err)
+			}
+			var got bytes.Buffer
+			_, _ = got.ReadFrom(joinLines(lines))
+			if got.String() != tt.want {
+				t.Errorf("applyEdScript() = %q, want %q", got.String(), tt.want)
+			}
+		})
+	}
+}
+
+func TestReadParagraph(t *testing.T) {
+	input := "-----BEGIN PGP SIGNED MESSAGE-----\nHash: SHA512\n\n" +
+		"Origin: Ubuntu\nAcquire-By-Hash: yes\nSHA256:\n abc 10 main/Packages\n def 20 main/Packages.gz\n" +
+		"- Dashed: escaped\n" +
+		"-----BEGIN PGP SIGNATURE-----\n\nSignature: not a field\n-----END PGP SIGNATURE-----\n"
+	fields, err := readParagraph(strings.NewReader(input))
+	if err != nil {
+		t.Fatalf("readParagraph: %v", err)
+	}
+	if fields["Origin"] != "Ubuntu" || fields["Acquire-By-Hash"] != "yes" || fields["Dashed"] != "escaped" {
+		t.Errorf("readParagraph() = %v", fields)
+	}
+	if _, ok := fields["Signature"]; ok {
+		t.Error("readParagraph() read past the signature armor")
+	}
+	entries := parseHashList(fields["SHA256"])
+	if len(entries) != 2 || entries[1] != (hashEntry{"def", 20, "main/Packages.gz"}) {
+		t.Errorf("parseHashList() = %+v", entries)
+	}
+}
@@ -0,0 +1,149 @@
+package pipeline
+
+import (
+	"bytes"
+	"context"
+	"fmt"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"strconv"
+	"strings"
+	"time"
+)
+
+// DefaultBatchSize is the number of pages converted per mandoc process by
+// the batch converter backend.
+const DefaultBatchSize = 64
+
+// mandocFootOpen starts the footer table mandoc emits after every page.
+// Page text is always HTML-escaped, so the tag cannot occur inside a page
+// and reliably marks the end of each page in batched output.
+const mandocFootOpen = `<table class="foot">`
+
+// ConvertManpages converts several manpages and returns their HTML and
+// conversion errors by index.
+//
+// With BatchSize above one, pages that miss the cache are written to a
+// temporary directory and passed to a single mandoc invocation per batch,
+// which resets its HTML state between input files. Pages with tbl tables
+// are converted on their own so that the tbl(1) fallback still applies. If
+// a batch fails or times out as a whole, each of its pages is retried on
+// its own, so per-page errors and timeouts match ConvertManpage. A batch's
+// timeout grows with its size (see batchTimeout).
+func (c *Converter) ConvertManpages(ctx context.Context, paths []string) ([]string, []error) {
+	htmls := make([]string, len(paths))
+	errs := make([]error, len(paths))
+	if c.BatchSize <= 1 {
+		for i, path := range paths {
+			htmls[i], errs[i] = c.ConvertManpage(ctx, path)
+		}
+		return htmls, errs
+	}
+
+	contents := make([]string, len(paths))
+	keys := make([]string, len(paths))
+	var pending []int
+	for i, path := range paths {
+		content, err := readManpageContent(path)
+		if err != nil {
+			errs[i] = err
+			continue
+		}
+		key, html, ok := c.lookup(content)
+		if ok {
+			htmls[i] = html
+			continue
+		}
+		if needsTblPreprocessing(content) {
+			htmls[i], errs[i] = c.convert(ctx, content)
+			if errs[i] == nil {
+				c.store(key, htmls[i])
+			}
+			continue
+		}
+		contents[i], keys[i] = content, key
+		pending = append(pending, i)
+	}
+
+	for start := 0; start < len(pending); start += c.BatchSize {
+		batch := pending[start:min(start+c.BatchSize, len(pending))]
+		sources := make([]string, len(batch))
+		for j, i := range batch {
+			sources[j] = contents[i]
+		}
+		raws, err := c.runMandocBatch(ctx, sources)
+		for j, i := range batch {
+			if err != nil {
+				htmls[i], errs[i] = c.convert(ctx, contents[i])
+			} else {
+				htmls[i] = postProcess(raws[j])
+			}
+			if errs[i] == nil {
+				c.store(keys[i], htmls[i])
+			}
+		}
+	}
+	return htmls, errs
+}
+
+// runMandocBatch converts page sources with one mandoc process and returns
+// the raw fragment of each page.
+func (c *Converter) runMandocBatch(ctx context.Context, sources []string) ([]string, error) {
+	dir, err := os.MkdirTemp(c.WorkDir, "mandoc-batch-")
+	if err != nil {
+		return nil, fmt.Errorf("create batch dir: %w", err)
+	}
+	defer func() { _ = os.RemoveAll(dir) }()
+
+	args := []string{"-T", "html", "-O", "fragment"}
+	for i, source := range sources {
+		name := filepath.Join(dir, strconv.Itoa(i))
+		if err := os.WriteFile(name, []byte(source), 0o644); err != nil {
+			return nil, fmt.Errorf("write batch source: %w", err)
+		}
+		args = append(args, name)
+	}
+
+	ctx, cancel := context.WithTimeout(ctx, batchTimeout(len(sources)))
+	defer cancel()
+	cmd := exec.CommandContext(ctx, c.Binary, args...)
+	cmd.WaitDelay = 5 * time.Second
+	var stdout, stderr bytes.Buffer
+	cmd.Stdout = &stdout
+	cmd.Stderr = &stderr
+
+	if err := cmd.Run(); err != nil {
+		return nil, fmt.Errorf("mandoc failed: %w: %s", err, strings.TrimSpace(stderr.String()))
+	}
+	return splitMandocBatch(stdout.String(), len(sources))
+}
+
+// batchTimeout returns the time a mandoc process converting n pages gets
+// before the batch is retried page by page.
+func batchTimeout(n int) time.Duration {
+	return max(convertTimeout, time.Duration(n)*batchPageTimeout)
+}
+
+// splitMandocBatch splits the concatenated output of a batched mandoc run
+// into n page fragments, each ending with its footer table.
+func splitMandocBatch(out string, n int) ([]string, error) {
+	pages := make([]string, 0, n)
+	for len(pages) < n {
+		start := strings.Index(out, mandocFootOpen)
+		if start < 0 {
+			break
+		}
+		end := strings.Index(out[start:], "</table>")
+		if end < 0 {
+			break
+		}
+		end += start + len("</table>")
+		pages = append(pages, out[:end])
+		out = strings.TrimLeft(out[end:], " \t\r\n")
+	}
+	if len(pages) != n || out != "" {
+		return nil, fmt.Errorf("mandoc batch produced %d pages, want %d", len(pages), n)
+	}
+	return pages, nil
+}
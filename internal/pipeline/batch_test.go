@@ -0,0 +1,193 @@
+package pipeline
+
+import (
+	"context"
+	"fmt"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"testing"
+)
+
+// fakeBatchMandoc writes a mandoc stand-in that appends a line to calls for
+// every invocation and, like mandoc, converts each file argument (or stdin)
+// to a fragment with head and foot tables. With failBatches set it exits
+// non-zero whenever it is given more than one file.
+func fakeBatchMandoc(t testing.TB, calls string, failBatches bool) string {
+	t.Helper()
+	script := "#!/bin/sh\n"
+	if calls != "" {
+		script += "echo run >> " + calls + "\n"
+	}
+	script += "shift 4\n"
+	if failBatches {
+		script += "if [ $# -gt 1 ]; then echo 'batch refused' >&2; exit 3; fi\n"
+	}
+	script += `if [ $# -eq 0 ]; then set -- -; fi
+for f in "$@"; do
+  printf '<table class="head"><tr><td>HEAD</td></tr></table>\n<div class="manual-text">\n<p>%s</p>\n</div>\n<table class="foot"><tr><td>FOOT</td></tr></table>\n' "$(cat "$f")"
+done
+`
+	path := filepath.Join(t.TempDir(), "fake-mandoc")
+	if err := os.WriteFile(path, []byte(script), 0o755); err != nil {
+		t.Fatal(err)
+	}
+	return path
+}
+
+func writePages(t testing.TB, dir string, n int) []string {
+	t.Helper()
+	paths := make([]string, n)
+	for i := range paths {
+		paths[i] = filepath.Join(dir, fmt.Sprintf("page%d.1", i))
+		content := fmt.Sprintf(".TH PAGE%d 1\n.SH NAME\npage%d \\- test page %d\n", i, i, i)
+		if err := os.WriteFile(paths[i], []byte(content), 0o644); err != nil {
+			t.Fatal(err)
+		}
+	}
+	return paths
+}
+
+func TestConvertManpagesBatchMatchesSingle(t *testing.T) {
+	dir := t.TempDir()
+	calls := filepath.Join(dir, "calls")
+	paths := writePages(t, dir, 5)
+
+	single := NewConverter(fakeBatchMandoc(t, "", false))
+	batched := NewConverter(fakeBatchMandoc(t, calls, false))
+	batched.BatchSize = 3
+	batched.WorkDir = dir
+
+	htmls, errs := batched.ConvertManpages(context.Background(), paths)
+	for i, path := range paths {
+		if errs[i] != nil {
+			t.Fatalf("ConvertManpages(%s): %v", path, errs[i])
+		}
+		want, err := single.ConvertManpage(context.Background(), path)
+		if err != nil {
+			t.Fatal(err)
+		}
+		if htmls[i] != want {
+			t.Errorf("batched %s = %q, want %q", path, htmls[i], want)
+		}
+	}
+	if got := countLines(t, calls); got != 2 {
+		t.Errorf("mandoc ran %d times for 5 pages in batches of 3, want 2", got)
+	}
+
+	entries, err := os.ReadDir(dir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(entries) != len(paths)+1 {
+		t.Errorf("work dir has %d entries, want batch sources cleaned up", len(entries))
+	}
+}
+
+func TestConvertManpagesBatchFailureFallsBack(t *testing.T) {
+	dir := t.TempDir()
+	calls := filepath.Join(dir, "calls")
+	paths := writePages(t, dir, 3)
+	missing := filepath.Join(dir, "missing.1")
+
+	c := NewConverter(fakeBatchMandoc(t, calls, true))
+	c.BatchSize = 8
+
+	htmls, errs := c.ConvertManpages(context.Background(), append(paths, missing))
+	for i := range paths {
+		if errs[i] != nil {
+			t.Errorf("ConvertManpages(%s): %v", paths[i], errs[i])
+		}
+		want := fmt.Sprintf("<p>.TH PAGE%d 1\n.SH NAME\npage%d \\- test page %d</p>", i, i, i)
+		if htmls[i] != want {
+			t.Errorf("ConvertManpages(%s) = %q, want %q", paths[i], htmls[i], want)
+		}
+	}
+	if errs[3] == nil {
+		t.Error("ConvertManpages(missing) error = nil, want read error")
+	}
+	// One refused batch, then one process per page.
+	if got := countLines(t, calls); got != 4 {
+		t.Errorf("mandoc ran %d times, want 4", got)
+	}
+}
+
+func TestConvertManpagesUsesCache(t *testing.T) {
+	dir := t.TempDir()
+	calls := filepath.Join(dir, "calls")
+	paths := writePages(t, dir, 4)
+
+	c := NewConverter(fakeBatchMandoc(t, calls, false))
+	c.BatchSize = 8
+	c.Cache = NewConvertCache(filepath.Join(dir, "cache"))
+
+	if _, errs := c.ConvertManpages(context.Background(), paths[:2]); errs[0] != nil || errs[1] != nil {
+		t.Fatalf("ConvertManpages: %v", errs)
+	}
+	if _, errs := c.ConvertManpages(context.Background(), paths); errs[2] != nil || errs[3] != nil {
+		t.Fatalf("ConvertManpages: %v", errs)
+	}
+	if hits, misses := c.Cache.Stats(); hits != 2 || misses != 4 {
+		t.Errorf("Stats() = %d hits, %d misses, want 2, 4", hits, misses)
+	}
+	if got := countLines(t, calls); got != 2 {
+		t.Errorf("mandoc ran %d times, want 2", got)
+	}
+}
+
+func TestSplitMandocBatch(t *testing.T) {
+	page := `<table class="head"><tr><td>H</td></tr></table>
+<div class="manual-text">x</div>
+<table class="foot"><tr><td>F</td></tr></table>
+`
+	pages, err := splitMandocBatch(page+page+page, 3)
+	if err != nil {
+		t.Fatalf("splitMandocBatch: %v", err)
+	}
+	for i, got := range pages {
+		if want := page[:len(page)-1]; got != want {
+			t.Errorf("page %d = %q, want %q", i, got, want)
+		}
+	}
+
+	if _, err := splitMandocBatch(page+page, 3); err == nil {
+		t.Error("splitMandocBatch with a missing page: error = nil")
+	}
+	if _, err := splitMandocBatch(page+page+"trailing", 2); err == nil {
+		t.Error("splitMandocBatch with trailing output: error = nil")
+	}
+}
+
+// BenchmarkConvertManpages reports pages/s for each converter backend with
+// the installed mandoc.
+func BenchmarkConvertManpages(b *testing.B) {
+	binary, err := exec.LookPath("mandoc")
+	if err != nil {
+		b.Skip("mandoc not available")
+	}
+	paths := writePages(b, b.TempDir(), 256)
+
+	for _, bc := range []struct {
+		name  string
+		batch int
+	}{
+		{"exec", 0},
+		{"batch", DefaultBatchSize},
+	} {
+		b.Run(bc.name, func(b *testing.B) {
+			c := NewConverter(binary)
+			c.BatchSize = bc.batch
+			c.WorkDir = b.TempDir()
+			b.ResetTimer()
+			for i := 0; i < b.N; i++ {
+				_, errs := c.ConvertManpages(context.Background(), paths)
+				for _, err := range errs {
+					if err != nil {
+						b.Fatal(err)
+					}
+				}
+			}
+			b.ReportMetric(float64(len(paths)*b.N)/b.Elapsed().Seconds(), "pages/s")
+		})
+	}
+}
@@ -0,0 +1,236 @@
+package pipeline
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"fmt"
+	"io"
+	"io/fs"
+	"os"
+	"path/filepath"
+	"sort"
+	"strconv"
+	"strings"
+	"sync/atomic"
+	"time"
+)
+
+const (
+	// convertCacheTouchAge is how old an entry's modification time must be
+	// before a hit refreshes it, so that most hits do not write metadata.
+	convertCacheTouchAge = 24 * time.Hour
+	// convertCachePruneInterval is how often Prune walks the cache to remove
+	// expired entries. It walks sooner when the cache may exceed MaxBytes.
+	convertCachePruneInterval = 24 * time.Hour
+	// convertCachePruneState records the cache size found by the last walk.
+	// Its modification time is the time of that walk.
+	convertCachePruneState = ".prune-state"
+)
+
+// ConvertCache is a content-addressed, on-disk cache of converter output.
+// Entries are keyed on the SHA-256 of the decompressed roff source plus the
+// converter version, so byte-identical pages are converted once no matter
+// which package version or release ships them.
+//
+// Only the converter output is cached: the transform pipeline embeds the
+// release and package version in every page, so its output is cheap to
+// recompute and rarely identical.
+type ConvertCache struct {
+	Dir string
+	// Refresh skips lookups (forcing reconversion) but still stores results.
+	Refresh bool
+	// MaxBytes bounds the size of the cached entries; Prune evicts the least
+	// recently used ones above it. Zero or less means no limit.
+	MaxBytes int64
+
+	hits   atomic.Int64
+	misses atomic.Int64
+	// stored counts the bytes Put since the cache was opened.
+	stored atomic.Int64
+}
+
+// NewConvertCache returns a cache rooted at dir. The directory is created
+// on the first store.
+func NewConvertCache(dir string) *ConvertCache {
+	return &ConvertCache{Dir: dir}
+}
+
+// Key returns the cache key for a manpage source converted by a converter
+// identified by version.
+func (c *ConvertCache) Key(version, content string) string {
+	h := sha256.New()
+	h.Write([]byte(version))
+	h.Write([]byte{0})
+	h.Write([]byte(content))
+	return hex.EncodeToString(h.Sum(nil))
+}
+
+func (c *ConvertCache) path(key string) string {
+	return filepath.Join(c.Dir, key[:2], key+".html")
+}
+
+// Get returns the cached converter output for key. A hit refreshes the
+// entry's modification time, at most once per convertCacheTouchAge, so
+// that Prune keeps it.
+func (c *ConvertCache) Get(key string) (string, bool) {
+	if c.Refresh {
+		c.misses.Add(1)
+		return "", false
+	}
+	p := c.path(key)
+	data, modTime, err := readEntry(p)
+	if err != nil {
+		c.misses.Add(1)
+		return "", false
+	}
+	if now := time.Now(); now.Sub(modTime) > convertCacheTouchAge {
+		_ = os.Chtimes(p, now, now)
+	}
+	c.hits.Add(1)
+	return string(data), true
+}
+
+// readEntry returns the contents and modification time of a cache entry.
+func readEntry(path string) ([]byte, time.Time, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, time.Time{}, err
+	}
+	defer func() { _ = f.Close() }()
+	info, err := f.Stat()
+	if err != nil {
+		return nil, time.Time{}, err
+	}
+	data := make([]byte, info.Size())
+	if _, err := io.ReadFull(f, data); err != nil {
+		return nil, time.Time{}, err
+	}
+	return data, info.ModTime(), nil
+}
+
+// Put stores converter output under key. The entry is written to a
+// temporary file and renamed into place so concurrent workers converting
+// the same page never observe a partial entry.
+func (c *ConvertCache) Put(key, html string) error {
+	p := c.path(key)
+	if err := os.MkdirAll(filepath.Dir(p), 0o755); err != nil {
+		return fmt.Errorf("mkdir: %w", err)
+	}
+	tmp, err := os.CreateTemp(filepath.Dir(p), ".tmp-*")
+	if err != nil {
+		return fmt.Errorf("create cache entry: %w", err)
+	}
+	if _, err := tmp.WriteString(html); err != nil {
+		_ = tmp.Close()
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("write cache entry: %w", err)
+	}
+	if err := tmp.Close(); err != nil {
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("write cache entry: %w", err)
+	}
+	if err := os.Rename(tmp.Name(), p); err != nil {
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("rename cache entry: %w", err)
+	}
+	c.stored.Add(int64(len(html)))
+	return nil
+}
+
+// Stats returns the number of lookups that hit and missed the cache.
+func (c *ConvertCache) Stats() (hits, misses int64) {
+	return c.hits.Load(), c.misses.Load()
+}
+
+// Prune removes entries that have not been stored or hit for maxAge, then
+// evicts the least recently used entries until the cache fits in MaxBytes,
+// and returns how many were removed. Since a hit refreshes an entry at most
+// once per convertCacheTouchAge, entries used within that window are
+// evicted in no particular order.
+//
+// Prune only walks the cache once per convertCachePruneInterval, or sooner
+// when the size found by the last walk plus what was stored since may
+// exceed MaxBytes.
+func (c *ConvertCache) Prune(maxAge time.Duration) (int, error) {
+	if size, at, ok := c.pruneState(); ok && time.Since(at) < convertCachePruneInterval &&
+		(c.MaxBytes <= 0 || size+c.stored.Load() <= c.MaxBytes) {
+		return 0, nil
+	}
+
+	type entry struct {
+		path    string
+		size    int64
+		modTime time.Time
+	}
+	var (
+		entries []entry
+		total   int64
+	)
+	cutoff := time.Now().Add(-maxAge)
+	removed := 0
+	err := filepath.WalkDir(c.Dir, func(path string, d fs.DirEntry, err error) error {
+		if err != nil {
+			if os.IsNotExist(err) {
+				return nil
+			}
+			return err
+		}
+		if d.IsDir() || d.Name() == convertCachePruneState {
+			return nil
+		}
+		// Temporary files are left by interrupted stores; Prune runs once
+		// all conversions are done.
+		if strings.HasPrefix(d.Name(), ".tmp-") {
+			_ = os.Remove(path)
+			return nil
+		}
+		info, err := d.Info()
+		if err != nil {
+			return nil
+		}
+		if info.ModTime().Before(cutoff) {
+			if err := os.Remove(path); err == nil {
+				removed++
+			}
+			return nil
+		}
+		entries = append(entries, entry{path, info.Size(), info.ModTime()})
+		total += info.Size()
+		return nil
+	})
+	if err != nil {
+		return removed, err
+	}
+
+	if c.MaxBytes > 0 && total > c.MaxBytes {
+		sort.Slice(entries, func(i, j int) bool { return entries[i].modTime.Before(entries[j].modTime) })
+		for _, e := range entries {
+			if total <= c.MaxBytes {
+				break
+			}
+			if err := os.Remove(e.path); err != nil && !os.IsNotExist(err) {
+				return removed, err
+			}
+			total -= e.size
+			removed++
+		}
+	}
+	c.stored.Store(0)
+	// A missing cache directory has nothing to record.
+	_ = os.WriteFile(filepath.Join(c.Dir, convertCachePruneState), []byte(strconv.FormatInt(total, 10)), 0o644)
+	return removed, nil
+}
+
+// pruneState returns the cache size recorded by the last walk of Prune and
+// when it happened.
+func (c *ConvertCache) pruneState() (int64, time.Time, bool) {
+	data, modTime, err := readEntry(filepath.Join(c.Dir, convertCachePruneState))
+	if err != nil {
+		return 0, time.Time{}, false
+	}
+	size, err := strconv.ParseInt(strings.TrimSpace(string(data)), 10, 64)
+	if err != nil {
+		return 0, time.Time{}, false
+	}
+	return size, modTime, true
+}
@@ -0,0 +1,224 @@
+package pipeline
+
+import (
+	"context"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+)
+
+// fakeMandoc writes a mandoc stand-in that appends a line to calls for
+// every invocation and emits a fixed fragment.
+func fakeMandoc(t *testing.T, calls string) string {
+	t.Helper()
+	script := "#!/bin/sh\necho run >> " + calls + "\ncat >/dev/null\necho '<p>converted</p>'\n"
+	path := filepath.Join(t.TempDir(), "fake-mandoc")
+	if err := os.WriteFile(path, []byte(script), 0o755); err != nil {
+		t.Fatal(err)
+	}
+	return path
+}
+
+func countLines(t *testing.T, path string) int {
+	t.Helper()
+	data, err := os.ReadFile(path)
+	if err != nil {
+		if os.IsNotExist(err) {
+			return 0
+		}
+		t.Fatal(err)
+	}
+	return strings.Count(string(data), "\n")
+}
+
+func TestConvertManpageUsesCache(t *testing.T) {
+	dir := t.TempDir()
+	calls := filepath.Join(dir, "calls")
+	c := NewConverter(fakeMandoc(t, calls))
+	c.Cache = NewConvertCache(filepath.Join(dir, "cache"))
+
+	// The same source shipped by two packages (or releases) converts once.
+	for _, name := range []string{"a.1", "b.1"} {
+		mp := filepath.Join(dir, name)
+		if err := os.WriteFile(mp, []byte(".TH SAME 1\n.SH NAME\nsame\n"), 0o644); err != nil {
+			t.Fatal(err)
+		}
+		html, err := c.ConvertManpage(context.Background(), mp)
+		if err != nil {
+			t.Fatalf("ConvertManpage(%s): %v", name, err)
+		}
+		if html != "<p>converted</p>" {
+			t.Errorf("ConvertManpage(%s) = %q, want %q", name, html, "<p>converted</p>")
+		}
+	}
+	if got := countLines(t, calls); got != 1 {
+		t.Errorf("mandoc ran %d times, want 1", got)
+	}
+	if hits, misses := c.Cache.Stats(); hits != 1 || misses != 1 {
+		t.Errorf("Stats() = %d hits, %d misses, want 1, 1", hits, misses)
+	}
+
+	// Different source misses.
+	mp := filepath.Join(dir, "c.1")
+	if err := os.WriteFile(mp, []byte(".TH OTHER 1\n"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := c.ConvertManpage(context.Background(), mp); err != nil {
+		t.Fatal(err)
+	}
+	if got := countLines(t, calls); got != 2 {
+		t.Errorf("mandoc ran %d times, want 2", got)
+	}
+}
+
+func TestConvertCacheKeyIncludesVersion(t *testing.T) {
+	c := NewConvertCache(t.TempDir())
+	if c.Key("1", "src") == c.Key("2", "src") {
+		t.Error("keys for different converter versions must differ")
+	}
+	if c.Key("1", "src") != c.Key("1", "src") {
+		t.Error("keys must be deterministic")
+	}
+}
+
+func TestConvertCacheRefresh(t *testing.T) {
+	c := NewConvertCache(t.TempDir())
+	key := c.Key("1", "src")
+	if err := c.Put(key, "<p>old</p>"); err != nil {
+		t.Fatal(err)
+	}
+	c.Refresh = true
+	if _, ok := c.Get(key); ok {
+		t.Error("Get hit with Refresh set")
+	}
+	c.Refresh = false
+	if html, ok := c.Get(key); !ok || html != "<p>old</p>" {
+		t.Errorf("Get = %q, %v, want %q, true", html, ok, "<p>old</p>")
+	}
+}
+
+func TestConvertCachePrune(t *testing.T) {
+	c := NewConvertCache(t.TempDir())
+	oldKey, newKey := c.Key("1", "old"), c.Key("1", "new")
+	for _, key := range []string{oldKey, newKey} {
+		if err := c.Put(key, "<p></p>"); err != nil {
+			t.Fatal(err)
+		}
+	}
+	past := time.Now().Add(-48 * time.Hour)
+	if err := os.Chtimes(c.path(oldKey), past, past); err != nil {
+		t.Fatal(err)
+	}
+
+	removed, err := c.Prune(24 * time.Hour)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if removed != 1 {
+		t.Errorf("Prune removed %d entries, want 1", removed)
+	}
+	if _, ok := c.Get(oldKey); ok {
+		t.Error("stale entry survived Prune")
+	}
+	if _, ok := c.Get(newKey); !ok {
+		t.Error("fresh entry removed by Prune")
+	}
+}
+
+func TestConvertCachePruneMissingDir(t *testing.T) {
+	c := NewConvertCache(filepath.Join(t.TempDir(), "missing"))
+	if _, err := c.Prune(time.Hour); err != nil {
+		t.Errorf("Prune on missing dir: %v", err)
+	}
+}
+
+func TestConvertCachePruneEvictsOldestAboveMaxBytes(t *testing.T) {
+	c := NewConvertCache(t.TempDir())
+	c.MaxBytes = 250
+	keys := []string{c.Key("1", "a"), c.Key("1", "b"), c.Key("1", "c")}
+	for i, key := range keys {
+		if err := c.Put(key, strings.Repeat("x", 100)); err != nil {
+			t.Fatal(err)
+		}
+		used := time.Now().Add(time.Duration(i-3) * time.Hour)
+		if err := os.Chtimes(c.path(key), used, used); err != nil {
+			t.Fatal(err)
+		}
+	}
+
+	removed, err := c.Prune(24 * time.Hour)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if removed != 1 {
+		t.Errorf("Prune removed %d entries, want 1", removed)
+	}
+	if _, err := os.Stat(c.path(keys[0])); !os.IsNotExist(err) {
+		t.Error("least recently used entry survived Prune")
+	}
+	for _, key := range keys[1:] {
+		if _, err := os.Stat(c.path(key)); err != nil {
+			t.Errorf("recently used entry removed: %v", err)
+		}
+	}
+}
+
+func TestConvertCachePruneSkipsRecentWalk(t *testing.T) {
+	c := NewConvertCache(t.TempDir())
+	c.MaxBytes = 250
+	if err := c.Put(c.Key("1", "a"), strings.Repeat("x", 100)); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := c.Prune(24 * time.Hour); err != nil {
+		t.Fatal(err)
+	}
+
+	// An entry expired since the last walk is left to the next one while
+	// the cache stays within MaxBytes.
+	old := c.Key("1", "old")
+	if err := c.Put(old, strings.Repeat("x", 100)); err != nil {
+		t.Fatal(err)
+	}
+	past := time.Now().Add(-48 * time.Hour)
+	if err := os.Chtimes(c.path(old), past, past); err != nil {
+		t.Fatal(err)
+	}
+	if removed, err := c.Prune(24 * time.Hour); err != nil || removed != 0 {
+		t.Errorf("Prune = %d, %v, want no walk within the prune interval", removed, err)
+	}
+
+	// Stores that may take the cache above MaxBytes walk it again.
+	if err := c.Put(c.Key("1", "b"), strings.Repeat("x", 100)); err != nil {
+		t.Fatal(err)
+	}
+	if removed, err := c.Prune(24 * time.Hour); err != nil || removed != 1 {
+		t.Errorf("Prune = %d, %v, want the expired entry removed", removed, err)
+	}
+}
+
+func TestConvertCacheGetRefreshesOnlyStaleEntries(t *testing.T) {
+	c := NewConvertCache(t.TempDir())
+	fresh, stale := c.Key("1", "fresh"), c.Key("1", "stale")
+	recent := time.Now().Add(-time.Hour).Truncate(time.Second)
+	past := time.Now().Add(-48 * time.Hour)
+	for key, mtime := range map[string]time.Time{fresh: recent, stale: past} {
+		if err := c.Put(key, "<p></p>"); err != nil {
+			t.Fatal(err)
+		}
+		if err := os.Chtimes(c.path(key), mtime, mtime); err != nil {
+			t.Fatal(err)
+		}
+		if _, ok := c.Get(key); !ok {
+			t.Fatalf("Get(%s) missed", key)
+		}
+	}
+
+	if info, err := os.Stat(c.path(fresh)); err != nil || !info.ModTime().Equal(recent) {
+		t.Errorf("recently used entry touched on hit")
+	}
+	if info, err := os.Stat(c.path(stale)); err != nil || time.Since(info.ModTime()) > time.Minute {
+		t.Errorf("stale entry not refreshed on hit")
+	}
+}
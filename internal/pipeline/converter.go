@@ -5,15 +5,34 @@ import (
 	"context"
 	"fmt"
 	"io"
+	"os"
 	"os/exec"
 	"path/filepath"
 	"regexp"
 	"strings"
+	"sync"
 	"time"
 )
 
+// converterVersion identifies the post-processing applied to mandoc output
+// below. Bump it whenever that output changes so ConvertCache entries made
+// by older code are not reused.
+const converterVersion = "1"
+
 type Converter struct {
 	Binary string
+	// Cache, if set, is consulted before running mandoc.
+	Cache *ConvertCache
+	// BatchSize selects the conversion backend used by ConvertManpages.
+	// Values above one convert up to that many pages per mandoc process;
+	// zero or one runs mandoc once per page.
+	BatchSize int
+	// WorkDir holds the temporary page sources of batched conversions.
+	// Empty means the system temporary directory.
+	WorkDir string
+
+	versionOnce sync.Once
+	version     string
 }
 
 func NewConverter(binary string) *Converter {
@@ -34,21 +53,67 @@ var (
 	mandocBreakTag = regexp.MustCompile(`\n<br/>\n`)
 )
 
-func (c *Converter) ConvertManpage(ctx context.Context, inputPath string) (string, error) {
-	ctx, cancel := context.WithTimeout(ctx, 30*time.Second)
-	defer cancel()
+// Conversion timeouts. A page gets convertTimeout overall; pages with tbl
+// tables get tblTimeout with mandoc's own tbl support before falling back to
+// tbl(1) piping. A batch gets batchPageTimeout per page, and at least
+// convertTimeout.
+const (
+	convertTimeout   = 30 * time.Second
+	tblTimeout       = 10 * time.Second
+	batchPageTimeout = 5 * time.Second
+)
 
+func (c *Converter) ConvertManpage(ctx context.Context, inputPath string) (string, error) {
 	content, err := readManpageContent(inputPath)
 	if err != nil {
 		return "", err
 	}
 
+	key, html, ok := c.lookup(content)
+	if ok {
+		return html, nil
+	}
+	html, err = c.convert(ctx, content)
+	if err != nil {
+		return "", err
+	}
+	c.store(key, html)
+	return html, nil
+}
+
+// lookup returns the cache key for content and, on a hit, the cached output.
+func (c *Converter) lookup(content string) (key, html string, ok bool) {
+	if c.Cache == nil {
+		return "", "", false
+	}
+	key = c.Cache.Key(c.Version(), content)
+	html, ok = c.Cache.Get(key)
+	return key, html, ok
+}
+
+// store records converter output under a key returned by lookup.
+func (c *Converter) store(key, html string) {
+	if c.Cache == nil {
+		return
+	}
+	// A failed store only costs a future conversion.
+	_ = c.Cache.Put(key, html)
+}
+
+// convert runs mandoc on a single page source and post-processes its output.
+func (c *Converter) convert(ctx context.Context, content string) (string, error) {
+	ctx, cancel := context.WithTimeout(ctx, convertTimeout)
+	defer cancel()
+
 	// Always try mandoc first — its built-in tbl handling produces
 	// better HTML than the external tbl(1) preprocessor.  If mandoc
 	// hangs (some complex tables cause this), fall back to tbl piping.
-	var raw string
+	var (
+		raw string
+		err error
+	)
 	if needsTblPreprocessing(content) {
-		tblCtx, tblCancel := context.WithTimeout(ctx, 10*time.Second)
+		tblCtx, tblCancel := context.WithTimeout(ctx, tblTimeout)
 		raw, err = c.runMandoc(tblCtx, content)
 		tblCancel()
 		if err != nil {
@@ -60,7 +125,12 @@ func (c *Converter) ConvertManpage(ctx context.Context, inputPath string) (strin
 	if err != nil {
 		return "", err
 	}
+	return postProcess(raw), nil
+}
 
+// postProcess strips mandoc's page chrome from a fragment and rewrites the
+// constructs the site styles differently.
+func postProcess(raw string) string {
 	html := raw
 	html = mandocHeadTable.ReplaceAllString(html, "")
 	html = mandocFootTable.ReplaceAllString(html, "")
@@ -68,7 +138,24 @@ func (c *Converter) ConvertManpage(ctx context.Context, inputPath string) (strin
 	html = mandocManualEnd.ReplaceAllString(html, "")
 	html = stripBreaksInPre(html)
 	html = convertBulletLists(html)
-	return strings.TrimSpace(html), nil
+	return strings.TrimSpace(html)
+}
+
+// Version identifies the converter for cache keys: the post-processing
+// version plus the size and modification time of the mandoc binary, so a
+// mandoc upgrade invalidates cached output.
+func (c *Converter) Version() string {
+	c.versionOnce.Do(func() {
+		c.version = converterVersion
+		path, err := exec.LookPath(c.Binary)
+		if err != nil {
+			return
+		}
+		if info, err := os.Stat(path); err == nil {
+			c.version += fmt.Sprintf(":%d:%d", info.Size(), info.ModTime().Unix())
+		}
+	})
+	return c.version
 }
 
 // needsTblPreprocessing reports whether a manpage source contains tbl
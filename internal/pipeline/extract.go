@@ -1,17 +1,36 @@
 package pipeline
 
 import (
+	"archive/tar"
+	"bufio"
+	"bytes"
+	"compress/bzip2"
+	"compress/gzip"
 	"context"
+	"errors"
 	"fmt"
+	"io"
 	"io/fs"
 	"os"
 	"os/exec"
+	"path"
 	"path/filepath"
+	"sort"
+	"strconv"
 	"strings"
 
 	"github.com/canonical/ubuntu-manpages-operator/internal/transform"
+	"github.com/canonical/ubuntu-manpages-operator/internal/xz"
+	"github.com/canonical/ubuntu-manpages-operator/internal/zstd"
 )
 
+// DebExtractor pulls manpages and control metadata out of .deb packages.
+//
+// The package is streamed in-process: the ar archive is walked member by
+// member, control fields are parsed from control.tar in memory, and only
+// data.tar entries under a man/ directory are written to a small per-package
+// temp directory. Everything else in the package is skipped without
+// touching the disk.
 type DebExtractor struct {
 	WorkDir string
 }
@@ -21,6 +40,12 @@ func NewDebExtractor(workDir string) *DebExtractor {
 }
 
 func (e *DebExtractor) ExtractManpages(ctx context.Context, debPath string) ([]ManpageFile, func() error, error) {
+	f, err := os.Open(debPath)
+	if err != nil {
+		return nil, nil, fmt.Errorf("open deb: %w", err)
+	}
+	defer func() { _ = f.Close() }()
+
 	tempDir, err := os.MkdirTemp(e.WorkDir, "manpages-deb-")
 	if err != nil {
 		return nil, nil, fmt.Errorf("create temp dir: %w", err)
@@ -30,22 +55,37 @@ func (e *DebExtractor) ExtractManpages(ctx context.Context, debPath string) ([]M
 		return os.RemoveAll(tempDir)
 	}
 
-	cmd := exec.CommandContext(ctx, "dpkg-deb", "-x", debPath, tempDir)
-	if output, err := cmd.CombinedOutput(); err != nil {
-		_ = cleanup()
-		return nil, nil, fmt.Errorf("extract deb: %w: %s", err, strings.TrimSpace(string(output)))
+	var (
+		manpages          []ManpageFile
+		meta              transform.ManpageMeta
+		haveControl, data bool
+	)
+	err = readAr(f, func(name string, member io.Reader) error {
+		switch {
+		case strings.HasPrefix(name, "control.tar"):
+			haveControl = true
+			return withDecompressed(ctx, name, member, func(r io.Reader) error {
+				meta, err = readControlTar(r)
+				return err
+			})
+		case strings.HasPrefix(name, "data.tar"):
+			data = true
+			return withDecompressed(ctx, name, member, func(r io.Reader) error {
+				manpages, err = extractManTree(ctx, r, tempDir)
+				return err
+			})
+		}
+		return nil
+	})
+	if err == nil && !data {
+		err = errors.New("no data.tar member")
 	}
-
-	manpages, err := findManpages(tempDir)
-	if err != nil {
-		_ = cleanup()
-		return nil, nil, err
+	if err == nil && !haveControl {
+		err = errors.New("no control.tar member")
 	}
-
-	meta, err := readDebMetadata(ctx, debPath)
 	if err != nil {
 		_ = cleanup()
-		return nil, nil, err
+		return nil, nil, fmt.Errorf("extract deb: %w", err)
 	}
 
 	for i := range manpages {
@@ -55,91 +95,329 @@ func (e *DebExtractor) ExtractManpages(ctx context.Context, debPath string) ([]M
 	return manpages, cleanup, nil
 }
 
-func readDebMetadata(ctx context.Context, debPath string) (transform.ManpageMeta, error) {
-	cmd := exec.CommandContext(ctx, "dpkg-deb", "-f", debPath, "Package", "Version", "Source")
-	output, err := cmd.Output()
+const (
+	arMagic      = "!<arch>\n"
+	arHeaderSize = 60
+)
+
+// readAr calls fn for each member of an ar archive with a reader limited to
+// the member's contents. Members fn does not consume are skipped.
+func readAr(r io.Reader, fn func(name string, member io.Reader) error) error {
+	br := bufio.NewReader(r)
+	magic := make([]byte, len(arMagic))
+	if _, err := io.ReadFull(br, magic); err != nil || string(magic) != arMagic {
+		return errors.New("not an ar archive")
+	}
+
+	header := make([]byte, arHeaderSize)
+	for {
+		if _, err := io.ReadFull(br, header); err != nil {
+			if errors.Is(err, io.EOF) {
+				return nil
+			}
+			return fmt.Errorf("read ar header: %w", err)
+		}
+		if string(header[58:60]) != "`\n" {
+			return errors.New("corrupt ar header")
+		}
+		name := strings.TrimSuffix(strings.TrimSpace(string(header[0:16])), "/")
+		size, err := strconv.ParseInt(strings.TrimSpace(string(header[48:58])), 10, 64)
+		if err != nil || size < 0 {
+			return fmt.Errorf("corrupt ar member size for %s", name)
+		}
+
+		member := io.LimitReader(br, size)
+		if err := fn(name, member); err != nil {
+			return fmt.Errorf("%s: %w", name, err)
+		}
+		// Skip whatever fn left unread, plus the padding to an even offset.
+		if _, err := io.Copy(io.Discard, member); err != nil {
+			return fmt.Errorf("skip ar member %s: %w", name, err)
+		}
+		if size%2 == 1 {
+			if _, err := br.Discard(1); err != nil && !errors.Is(err, io.EOF) {
+				return fmt.Errorf("skip ar padding: %w", err)
+			}
+		}
+	}
+}
+
+// withDecompressed calls fn with the decompressed stream of a control.tar
+// or data.tar member, chosen by the member's extension. Every compressor
+// dpkg produces is decoded in-process; xz, lzma and zstd members that the
+// in-process decoders reject (e.g. xz with a BCJ filter) are piped through
+// the system decompressor instead.
+func withDecompressed(ctx context.Context, name string, member io.Reader, fn func(io.Reader) error) error {
+	switch ext := path.Ext(name); ext {
+	case ".tar":
+		return fn(member)
+	case ".gz":
+		gz, err := gzip.NewReader(member)
+		if err != nil {
+			return fmt.Errorf("gzip reader: %w", err)
+		}
+		defer func() { _ = gz.Close() }()
+		return fn(gz)
+	case ".bz2":
+		return fn(bzip2.NewReader(member))
+	case ".xz":
+		return withDecoder(ctx, member, fn, func(r io.Reader) (io.Reader, error) {
+			return xz.NewReader(r)
+		}, "xz", "-dc")
+	case ".lzma":
+		return withDecoder(ctx, member, fn, func(r io.Reader) (io.Reader, error) {
+			return xz.NewLZMAReader(r)
+		}, "xz", "--format=lzma", "-dc")
+	case ".zst":
+		return withDecoder(ctx, member, fn, func(r io.Reader) (io.Reader, error) {
+			return zstd.NewReader(r)
+		}, "zstd", "-dc")
+	default:
+		return fmt.Errorf("unsupported compression %q", ext)
+	}
+}
+
+// withDecoder calls fn with input decoded by the in-process decoder open.
+// If the decoder fails before producing any output, input is decoded by
+// the given system command instead, replaying what the decoder consumed.
+func withDecoder(ctx context.Context, input io.Reader, fn func(io.Reader) error, open func(io.Reader) (io.Reader, error), name string, args ...string) error {
+	rec := &recordingReader{r: input}
+	dec, err := open(rec)
+	var br *bufio.Reader
+	if err == nil {
+		br = bufio.NewReader(dec)
+		// Decoding the first byte reads the stream and block headers, so
+		// unsupported streams are caught before fn sees any output.
+		if _, err = br.Peek(1); errors.Is(err, io.EOF) {
+			err = nil
+		}
+	}
 	if err != nil {
-		return transform.ManpageMeta{}, fmt.Errorf("read deb metadata: %w", err)
+		replay := io.MultiReader(bytes.NewReader(rec.buf), input)
+		rec.stop()
+		return withCommand(ctx, replay, fn, name, args...)
 	}
-	lines := strings.Split(strings.TrimSpace(string(output)), "\n")
-	meta := transform.ManpageMeta{}
-	if len(lines) > 0 {
-		meta.PackageName = normalizePackageField(lines[0], "Package")
+	rec.stop()
+	return fn(br)
+}
+
+// recordingReader keeps a copy of what is read through it until stopped.
+type recordingReader struct {
+	r       io.Reader
+	buf     []byte
+	stopped bool
+}
+
+func (r *recordingReader) Read(p []byte) (int, error) {
+	n, err := r.r.Read(p)
+	if !r.stopped {
+		r.buf = append(r.buf, p[:n]...)
 	}
-	if len(lines) > 1 {
-		meta.PackageVersion = strings.TrimSpace(lines[1])
+	return n, err
+}
+
+func (r *recordingReader) stop() {
+	r.stopped = true
+	r.buf = nil
+}
+
+func withCommand(ctx context.Context, input io.Reader, fn func(io.Reader) error, name string, args ...string) error {
+	cmd := exec.CommandContext(ctx, name, args...)
+	cmd.Stdin = input
+	var stderr bytes.Buffer
+	cmd.Stderr = &stderr
+	out, err := cmd.StdoutPipe()
+	if err != nil {
+		return err
 	}
-	if len(lines) > 2 {
-		meta.SourcePackage = normalizeSourceField(lines[2])
+	if err := cmd.Start(); err != nil {
+		return fmt.Errorf("start %s: %w", name, err)
 	}
-	if meta.SourcePackage == "" {
-		meta.SourcePackage = meta.PackageName
+
+	fnErr := fn(out)
+	// Drain so the decompressor is not blocked writing when fn stops early.
+	_, _ = io.Copy(io.Discard, out)
+	if err := cmd.Wait(); err != nil && fnErr == nil {
+		return fmt.Errorf("%s: %w: %s", name, err, strings.TrimSpace(stderr.String()))
 	}
-	return meta, nil
+	return fnErr
 }
 
-func normalizePackageField(value string, label string) string {
-	value = strings.TrimSpace(value)
-	prefix := label + ":"
-	if strings.HasPrefix(value, prefix) {
-		value = strings.TrimSpace(strings.TrimPrefix(value, prefix))
+// readControlTar returns the package metadata from the control file in a
+// control.tar stream.
+func readControlTar(r io.Reader) (transform.ManpageMeta, error) {
+	tr := tar.NewReader(r)
+	for {
+		hdr, err := tr.Next()
+		if errors.Is(err, io.EOF) {
+			return transform.ManpageMeta{}, errors.New("no control file")
+		}
+		if err != nil {
+			return transform.ManpageMeta{}, fmt.Errorf("read control.tar: %w", err)
+		}
+		if path.Clean(hdr.Name) == "control" {
+			return parseControl(tr)
+		}
 	}
-	return value
 }
 
+// parseControl reads the Package, Version and Source fields of a binary
+// package control file.
+func parseControl(r io.Reader) (transform.ManpageMeta, error) {
+	meta := transform.ManpageMeta{}
+	scanner := bufio.NewScanner(r)
+	for scanner.Scan() {
+		line := scanner.Text()
+		// Continuation lines belong to multi-line fields like Description.
+		if line == "" || line[0] == ' ' || line[0] == '\t' {
+			continue
+		}
+		key, value, ok := strings.Cut(line, ":")
+		if !ok {
+			continue
+		}
+		value = strings.TrimSpace(value)
+		switch key {
+		case "Package":
+			meta.PackageName = value
+		case "Version":
+			meta.PackageVersion = value
+		case "Source":
+			meta.SourcePackage = normalizeSourceField(value)
+		}
+	}
+	if err := scanner.Err(); err != nil {
+		return transform.ManpageMeta{}, fmt.Errorf("read control: %w", err)
+	}
+	if meta.SourcePackage == "" {
+		meta.SourcePackage = meta.PackageName
+	}
+	return meta, nil
+}
+
+// normalizeSourceField drops the version that a Source field carries when
+// the source version differs from the binary one, e.g. "foo (1.2-3)".
 func normalizeSourceField(value string) string {
-	value = normalizePackageField(value, "Source")
+	value = strings.TrimSpace(value)
 	if idx := strings.Index(value, " ("); idx > 0 {
 		value = strings.TrimSpace(value[:idx])
 	}
 	return value
 }
 
-func findManpages(root string) ([]ManpageFile, error) {
+// isManpageEntry reports whether a package-relative path is a compressed
+// manpage, i.e. a .gz file somewhere below a man/ directory.
+func isManpageEntry(rel string) bool {
+	return strings.Contains("/"+rel, "/man/") && strings.HasSuffix(rel, ".gz")
+}
+
+// extractManTree writes the manpage entries of a data.tar stream below
+// root and returns them sorted by relative path. Other entries are skipped.
+func extractManTree(ctx context.Context, r io.Reader, root string) ([]ManpageFile, error) {
 	var results []ManpageFile
-	err := filepath.WalkDir(root, func(path string, d fs.DirEntry, err error) error {
-		if err != nil {
-			return err
-		}
-		if d.IsDir() {
-			return nil
-		}
-		if !strings.Contains(path, "/man/") {
-			return nil
+	extracted := make(map[string]int) // relative path -> index in results
+	symlinks := make(map[string]bool)
+
+	tr := tar.NewReader(r)
+	for {
+		if err := ctx.Err(); err != nil {
+			return nil, err
 		}
-		if !strings.HasSuffix(path, ".gz") {
-			return nil
+		hdr, err := tr.Next()
+		if errors.Is(err, io.EOF) {
+			break
 		}
-		rel, err := filepath.Rel(root, path)
 		if err != nil {
-			return fmt.Errorf("rel path: %w", err)
+			return nil, fmt.Errorf("read data.tar: %w", err)
 		}
 
-		info, err := d.Info()
-		if err != nil {
-			return fmt.Errorf("stat manpage: %w", err)
+		rel := path.Clean(strings.TrimPrefix(hdr.Name, "./"))
+		if rel == "." || rel == ".." || strings.HasPrefix(rel, "../") || !isManpageEntry(rel) || underSymlink(rel, symlinks) {
+			continue
 		}
+		dest := filepath.Join(root, filepath.FromSlash(rel))
+		item := ManpageFile{Path: dest, RelativePath: rel}
 
-		item := ManpageFile{
-			Path:         path,
-			RelativePath: filepath.ToSlash(rel),
-		}
-
-		if info.Mode()&os.ModeSymlink != 0 {
+		switch hdr.Typeflag {
+		case tar.TypeReg:
+			if err := writeEntry(dest, tr); err != nil {
+				return nil, err
+			}
+		case tar.TypeSymlink:
+			if err := prepareDest(dest); err != nil {
+				return nil, err
+			}
+			if err := os.Symlink(hdr.Linkname, dest); err != nil {
+				return nil, fmt.Errorf("write symlink: %w", err)
+			}
 			item.IsSymlink = true
-			target, err := os.Readlink(path)
-			if err != nil {
-				return fmt.Errorf("read symlink: %w", err)
+			item.SymlinkTarget = hdr.Linkname
+		case tar.TypeLink:
+			// Hard links name an earlier entry; only links to manpages we
+			// kept can be materialised.
+			target := path.Clean(strings.TrimPrefix(hdr.Linkname, "./"))
+			if _, ok := extracted[target]; !ok || target == rel {
+				continue
+			}
+			if err := prepareDest(dest); err != nil {
+				return nil, err
+			}
+			if err := os.Link(filepath.Join(root, filepath.FromSlash(target)), dest); err != nil {
+				return nil, fmt.Errorf("write hard link: %w", err)
 			}
-			item.SymlinkTarget = target
+		default:
+			continue
 		}
 
+		symlinks[rel] = item.IsSymlink
+		// A later member with the same name replaces the earlier one.
+		if i, ok := extracted[rel]; ok {
+			results[i] = item
+			continue
+		}
+		extracted[rel] = len(results)
 		results = append(results, item)
-		return nil
-	})
-	if err != nil {
-		return nil, fmt.Errorf("walk manpages: %w", err)
 	}
 
+	sort.Slice(results, func(i, j int) bool { return results[i].RelativePath < results[j].RelativePath })
 	return results, nil
 }
+
+// underSymlink reports whether a parent directory of rel is a symlink
+// written by an earlier member. Writing through it could leave root.
+func underSymlink(rel string, symlinks map[string]bool) bool {
+	for dir := path.Dir(rel); dir != "."; dir = path.Dir(dir) {
+		if symlinks[dir] {
+			return true
+		}
+	}
+	return false
+}
+
+// prepareDest creates the parent directories of dest and removes whatever
+// an earlier member left at dest, so a duplicate member replaces it rather
+// than failing or being written through a symlink.
+func prepareDest(dest string) error {
+	if err := os.MkdirAll(filepath.Dir(dest), 0o755); err != nil {
+		return fmt.Errorf("mkdir: %w", err)
+	}
+	if err := os.Remove(dest); err != nil && !errors.Is(err, fs.ErrNotExist) {
+		return fmt.Errorf("replace manpage: %w", err)
+	}
+	return nil
+}
+
+func writeEntry(dest string, r io.Reader) error {
+	if err := prepareDest(dest); err != nil {
+		return err
+	}
+	out, err := os.OpenFile(dest, os.O_CREATE|os.O_EXCL|os.O_WRONLY, 0o644)
+	if err != nil {
+		return fmt.Errorf("create manpage: %w", err)
+	}
+	if _, err := io.Copy(out, r); err != nil {
+		_ = out.Close()
+		return fmt.Errorf("write manpage: %w", err)
+	}
+	return out.Close()
+}
@@ -0,0 +1,426 @@
+package pipeline
+
+import (
+	"archive/tar"
+	"bytes"
+	"compress/gzip"
+	"context"
+	"errors"
+	"fmt"
+	"io"
+	"io/fs"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+
+	"github.com/canonical/ubuntu-manpages-operator/internal/transform"
+)
+
+// debEntry is one data.tar entry of a test package.
+type debEntry struct {
+	name     string
+	body     string
+	typeflag byte
+	linkname string
+}
+
+const testControl = "Package: foo-utils\nVersion: 1.2-3ubuntu1\nSource: foo (1.2-3)\nDescription: test package\n multi-line description\n"
+
+// buildTar returns an uncompressed tar stream of entries.
+func buildTar(t testing.TB, entries []debEntry) []byte {
+	t.Helper()
+	var buf bytes.Buffer
+	tw := tar.NewWriter(&buf)
+	now := time.Unix(1700000000, 0)
+	for _, e := range entries {
+		hdr := &tar.Header{Name: e.name, Mode: 0o644, ModTime: now, Typeflag: e.typeflag, Linkname: e.linkname}
+		switch e.typeflag {
+		case tar.TypeReg:
+			hdr.Size = int64(len(e.body))
+		case tar.TypeDir:
+			hdr.Mode = 0o755
+		}
+		if err := tw.WriteHeader(hdr); err != nil {
+			t.Fatal(err)
+		}
+		if e.typeflag == tar.TypeReg {
+			if _, err := tw.Write([]byte(e.body)); err != nil {
+				t.Fatal(err)
+			}
+		}
+	}
+	if err := tw.Close(); err != nil {
+		t.Fatal(err)
+	}
+	return buf.Bytes()
+}
+
+// compress encodes data with the compressor matching ext (".gz", ".xz",
+// ".zst" or "" for none), skipping the test if the tool is unavailable.
+func compress(t testing.TB, data []byte, ext string) []byte {
+	t.Helper()
+	switch ext {
+	case "":
+		return data
+	case ".gz":
+		var buf bytes.Buffer
+		gw := gzip.NewWriter(&buf)
+		_, _ = gw.Write(data)
+		_ = gw.Close()
+		return buf.Bytes()
+	}
+	tool := map[string]string{".xz": "xz", ".zst": "zstd"}[ext]
+	if _, err := exec.LookPath(tool); err != nil {
+		t.Skipf("%s not available", tool)
+	}
+	cmd := exec.Command(tool, "-c", "-q")
+	cmd.Stdin = bytes.NewReader(data)
+	out, err := cmd.Output()
+	if err != nil {
+		t.Fatalf("%s: %v", tool, err)
+	}
+	return out
+}
+
+// writeDeb writes a .deb with the given data.tar entries, compressing
+// data.tar with ext, and returns its path.
+func writeDeb(t testing.TB, dir string, entries []debEntry, ext string) string {
+	t.Helper()
+	control := compress(t, buildTar(t, []debEntry{
+		{name: "./", typeflag: tar.TypeDir},
+		{name: "./control", body: testControl, typeflag: tar.TypeReg},
+	}), ".gz")
+	data := compress(t, buildTar(t, entries), ext)
+
+	var buf bytes.Buffer
+	buf.WriteString(arMagic)
+	for _, m := range []struct {
+		name string
+		body []byte
+	}{
+		{"debian-binary", []byte("2.0\n")},
+		{"control.tar.gz", control},
+		{"data.tar" + ext, data},
+	} {
+		fmt.Fprintf(&buf, "%-16s%-12d%-6d%-6d%-8s%-10d`\n", m.name, 1700000000, 0, 0, "100644", len(m.body))
+		buf.Write(m.body)
+		if len(m.body)%2 == 1 {
+			buf.WriteByte('\n')
+		}
+	}
+
+	path := filepath.Join(dir, "foo-utils_1.2-3ubuntu1_amd64.deb")
+	if err := os.WriteFile(path, buf.Bytes(), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	return path
+}
+
+func testDebEntries() []debEntry {
+	return []debEntry{
+		{name: "./", typeflag: tar.TypeDir},
+		{name: "./usr/", typeflag: tar.TypeDir},
+		{name: "./usr/bin/foo", body: "#!/bin/sh\n", typeflag: tar.TypeReg},
+		{name: "./usr/share/doc/foo-utils/changelog.gz", body: "changes", typeflag: tar.TypeReg},
+		{name: "./usr/share/man/man1/foo.1.gz", body: "foo page", typeflag: tar.TypeReg},
+		{name: "./usr/share/man/man1/bar.1.gz", typeflag: tar.TypeSymlink, linkname: "foo.1.gz"},
+		{name: "./usr/share/man/man1/baz.1.gz", typeflag: tar.TypeLink, linkname: "./usr/share/man/man1/foo.1.gz"},
+		{name: "./usr/share/man/de/man1/foo.1.gz", body: "foo Seite", typeflag: tar.TypeReg},
+		{name: "./usr/share/man/man1/README", body: "not a manpage", typeflag: tar.TypeReg},
+	}
+}
+
+func TestExtractManpages(t *testing.T) {
+	for _, ext := range []string{"", ".gz", ".xz", ".zst"} {
+		t.Run("data.tar"+ext, func(t *testing.T) {
+			dir := t.TempDir()
+			debPath := writeDeb(t, dir, testDebEntries(), ext)
+
+			manpages, cleanup, err := NewDebExtractor(dir).ExtractManpages(context.Background(), debPath)
+			if err != nil {
+				t.Fatalf("ExtractManpages: %v", err)
+			}
+			defer func() { _ = cleanup() }()
+
+			var got []string
+			for _, m := range manpages {
+				got = append(got, m.RelativePath)
+			}
+			want := []string{
+				"usr/share/man/de/man1/foo.1.gz",
+				"usr/share/man/man1/bar.1.gz",
+				"usr/share/man/man1/baz.1.gz",
+				"usr/share/man/man1/foo.1.gz",
+			}
+			if strings.Join(got, ",") != strings.Join(want, ",") {
+				t.Fatalf("manpages = %v, want %v", got, want)
+			}
+
+			bar := manpages[1]
+			if !bar.IsSymlink || bar.SymlinkTarget != "foo.1.gz" {
+				t.Errorf("bar.1.gz: symlink = %v target = %q, want symlink to foo.1.gz", bar.IsSymlink, bar.SymlinkTarget)
+			}
+			for _, m := range []ManpageFile{manpages[2], manpages[3]} {
+				content, err := os.ReadFile(m.Path)
+				if err != nil {
+					t.Fatal(err)
+				}
+				if string(content) != "foo page" {
+					t.Errorf("%s content = %q, want %q", m.RelativePath, content, "foo page")
+				}
+			}
+
+			wantMeta := transform.ManpageMeta{PackageName: "foo-utils", PackageVersion: "1.2-3ubuntu1", SourcePackage: "foo"}
+			for _, m := range manpages {
+				if m.Meta != wantMeta {
+					t.Errorf("%s meta = %+v, want %+v", m.RelativePath, m.Meta, wantMeta)
+				}
+			}
+		})
+	}
+}
+
+func TestExtractManpages_OnlyWritesManpages(t *testing.T) {
+	dir := t.TempDir()
+	debPath := writeDeb(t, dir, testDebEntries(), ".gz")
+
+	_, cleanup, err := NewDebExtractor(dir).ExtractManpages(context.Background(), debPath)
+	if err != nil {
+		t.Fatalf("ExtractManpages: %v", err)
+	}
+	defer func() { _ = cleanup() }()
+
+	_ = filepath.WalkDir(dir, func(path string, d fs.DirEntry, err error) error {
+		if err == nil && !d.IsDir() && path != debPath && !strings.Contains(path, "/man/") {
+			t.Errorf("unexpected file extracted: %s", path)
+		}
+		return nil
+	})
+}
+
+func TestExtractManpages_DuplicateMembersDoNotFollowSymlinks(t *testing.T) {
+	dir := t.TempDir()
+	outside := filepath.Join(t.TempDir(), "outside")
+	if err := os.Mkdir(outside, 0o755); err != nil {
+		t.Fatal(err)
+	}
+	victim := filepath.Join(outside, "victim.gz")
+	if err := os.WriteFile(victim, []byte("untouched"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	debPath := writeDeb(t, dir, []debEntry{
+		{name: "./usr/share/man/man1/foo.1.gz", typeflag: tar.TypeSymlink, linkname: victim},
+		{name: "./usr/share/man/man1/foo.1.gz", body: "foo page", typeflag: tar.TypeReg},
+		{name: "./usr/share/man/man1/bar.1.gz", typeflag: tar.TypeSymlink, linkname: "foo.1.gz"},
+		{name: "./usr/share/man/man1/bar.1.gz", typeflag: tar.TypeSymlink, linkname: "foo.1.gz"},
+		{name: "./usr/share/man/man1/baz.1.gz", typeflag: tar.TypeLink, linkname: "./usr/share/man/man1/foo.1.gz"},
+		{name: "./usr/share/man/man1/baz.1.gz", typeflag: tar.TypeLink, linkname: "./usr/share/man/man1/foo.1.gz"},
+		{name: "./usr/share/man/escape.gz", typeflag: tar.TypeSymlink, linkname: outside},
+		{name: "./usr/share/man/escape.gz/man/victim.gz", body: "overwritten", typeflag: tar.TypeReg},
+	}, ".gz")
+
+	manpages, cleanup, err := NewDebExtractor(dir).ExtractManpages(context.Background(), debPath)
+	if err != nil {
+		t.Fatalf("ExtractManpages: %v", err)
+	}
+	defer func() { _ = cleanup() }()
+
+	if content, err := os.ReadFile(victim); err != nil || string(content) != "untouched" {
+		t.Errorf("file outside the extraction root = %q, %v, want untouched", content, err)
+	}
+	if _, err := os.Stat(filepath.Join(outside, "man")); !os.IsNotExist(err) {
+		t.Errorf("member below a symlink was written outside the extraction root: %v", err)
+	}
+
+	var got []string
+	for _, m := range manpages {
+		got = append(got, m.RelativePath)
+	}
+	want := []string{
+		"usr/share/man/escape.gz",
+		"usr/share/man/man1/bar.1.gz",
+		"usr/share/man/man1/baz.1.gz",
+		"usr/share/man/man1/foo.1.gz",
+	}
+	if strings.Join(got, ",") != strings.Join(want, ",") {
+		t.Fatalf("manpages = %v, want %v", got, want)
+	}
+	foo := manpages[3]
+	if foo.IsSymlink {
+		t.Error("foo.1.gz still a symlink after a regular member replaced it")
+	}
+	if content, err := os.ReadFile(foo.Path); err != nil || string(content) != "foo page" {
+		t.Errorf("foo.1.gz content = %q, %v, want %q", content, err, "foo page")
+	}
+}
+
+func TestExtractManpages_NotADeb(t *testing.T) {
+	dir := t.TempDir()
+	path := filepath.Join(dir, "broken.deb")
+	if err := os.WriteFile(path, []byte("garbage"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if _, _, err := NewDebExtractor(dir).ExtractManpages(context.Background(), path); err == nil {
+		t.Fatal("expected error for non-ar input")
+	}
+	entries, _ := os.ReadDir(dir)
+	if len(entries) != 1 {
+		t.Errorf("temp dir not cleaned up: %v", entries)
+	}
+}
+
+func TestWithDecompressedFallsBackToCommand(t *testing.T) {
+	if _, err := exec.LookPath("xz"); err != nil {
+		t.Skip("xz not available")
+	}
+	// The in-process xz decoder only supports the LZMA2 filter, so a stream
+	// with a BCJ filter is decoded by the xz command.
+	want := strings.Repeat("branch converted payload ", 1000)
+	cmd := exec.Command("xz", "-c", "-q", "--x86", "--lzma2")
+	cmd.Stdin = strings.NewReader(want)
+	data, err := cmd.Output()
+	if err != nil {
+		t.Fatalf("xz: %v", err)
+	}
+
+	var got []byte
+	err = withDecompressed(context.Background(), "data.tar.xz", bytes.NewReader(data), func(r io.Reader) error {
+		got, err = io.ReadAll(r)
+		return err
+	})
+	if err != nil {
+		t.Fatalf("withDecompressed: %v", err)
+	}
+	if string(got) != want {
+		t.Errorf("decoded %d bytes, want %d", len(got), len(want))
+	}
+}
+
+func TestWithDecoderReplaysConsumedInput(t *testing.T) {
+	if _, err := exec.LookPath("cat"); err != nil {
+		t.Skip("cat not available")
+	}
+	want := strings.Repeat("0123456789", 1000)
+	reject := func(r io.Reader) (io.Reader, error) {
+		_, _ = io.ReadFull(r, make([]byte, 4096))
+		return nil, errors.New("unsupported stream")
+	}
+
+	var got []byte
+	err := withDecoder(context.Background(), strings.NewReader(want), func(r io.Reader) error {
+		var err error
+		got, err = io.ReadAll(r)
+		return err
+	}, reject, "cat")
+	if err != nil {
+		t.Fatalf("withDecoder: %v", err)
+	}
+	if string(got) != want {
+		t.Errorf("command got %d bytes, want %d", len(got), len(want))
+	}
+}
+
+func TestParseControlSourceDefaultsToPackage(t *testing.T) {
+	meta, err := parseControl(strings.NewReader("Package: bash\nVersion: 5.2-1\n"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	if meta.SourcePackage != "bash" {
+		t.Errorf("SourcePackage = %q, want %q", meta.SourcePackage, "bash")
+	}
+}
+
+// dpkgExtractManpages is the previous extractor, kept as the benchmark
+// baseline: it unpacks the whole package with dpkg-deb -x, walks the tree
+// and reads the control fields with a second dpkg-deb call.
+func dpkgExtractManpages(ctx context.Context, workDir, debPath string) ([]ManpageFile, func() error, error) {
+	tempDir, err := os.MkdirTemp(workDir, "manpages-deb-")
+	if err != nil {
+		return nil, nil, err
+	}
+	cleanup := func() error { return os.RemoveAll(tempDir) }
+	if out, err := exec.CommandContext(ctx, "dpkg-deb", "-x", debPath, tempDir).CombinedOutput(); err != nil {
+		_ = cleanup()
+		return nil, nil, fmt.Errorf("extract deb: %w: %s", err, out)
+	}
+	var results []ManpageFile
+	err = filepath.WalkDir(tempDir, func(path string, d fs.DirEntry, err error) error {
+		if err != nil || d.IsDir() || !strings.Contains(path, "/man/") || !strings.HasSuffix(path, ".gz") {
+			return err
+		}
+		rel, _ := filepath.Rel(tempDir, path)
+		results = append(results, ManpageFile{Path: path, RelativePath: filepath.ToSlash(rel)})
+		return nil
+	})
+	if err != nil {
+		_ = cleanup()
+		return nil, nil, err
+	}
+	if _, err := exec.CommandContext(ctx, "dpkg-deb", "-f", debPath, "Package", "Version", "Source").Output(); err != nil {
+		_ = cleanup()
+		return nil, nil, err
+	}
+	return results, cleanup, nil
+}
+
+// benchDebEntries models a documentation-heavy package: a few manpages
+// alongside a large payload that the extractor should never write out.
+func benchDebEntries() []debEntry {
+	entries := []debEntry{{name: "./", typeflag: tar.TypeDir}}
+	payload := strings.Repeat("lorem ipsum dolor sit amet ", 1200) // ~32 KiB
+	for i := range 1500 {
+		entries = append(entries, debEntry{name: fmt.Sprintf("./usr/share/doc/big-doc/html/page%04d.html", i), body: payload, typeflag: tar.TypeReg})
+	}
+	for i := range 20 {
+		entries = append(entries, debEntry{name: fmt.Sprintf("./usr/share/man/man1/tool%02d.1.gz", i), body: "manpage", typeflag: tar.TypeReg})
+	}
+	return entries
+}
+
+func benchmarkExtract(b *testing.B, ext string, extract func(ctx context.Context, workDir, debPath string) ([]ManpageFile, func() error, error)) {
+	dir := b.TempDir()
+	debPath := writeDeb(b, dir, benchDebEntries(), ext)
+	info, _ := os.Stat(debPath)
+	b.SetBytes(info.Size())
+
+	b.ResetTimer()
+	for i := 0; i < b.N; i++ {
+		manpages, cleanup, err := extract(context.Background(), dir, debPath)
+		if err != nil {
+			b.Fatal(err)
+		}
+		if len(manpages) != 20 {
+			b.Fatalf("got %d manpages, want 20", len(manpages))
+		}
+		_ = cleanup()
+	}
+}
+
+func streamExtractManpages(ctx context.Context, workDir, debPath string) ([]ManpageFile, func() error, error) {
+	return NewDebExtractor(workDir).ExtractManpages(ctx, debPath)
+}
+
+func BenchmarkExtractManpages_Stream_Gzip(b *testing.B) {
+	benchmarkExtract(b, ".gz", streamExtractManpages)
+}
+
+func BenchmarkExtractManpages_Stream_Zstd(b *testing.B) {
+	benchmarkExtract(b, ".zst", streamExtractManpages)
+}
+
+func BenchmarkExtractManpages_DpkgDeb_Gzip(b *testing.B) {
+	if _, err := exec.LookPath("dpkg-deb"); err != nil {
+		b.Skip("dpkg-deb not available")
+	}
+	benchmarkExtract(b, ".gz", dpkgExtractManpages)
+}
+
+func BenchmarkExtractManpages_DpkgDeb_Zstd(b *testing.B) {
+	if _, err := exec.LookPath("dpkg-deb"); err != nil {
+		b.Skip("dpkg-deb not available")
+	}
+	benchmarkExtract(b, ".zst", dpkgExtractManpages)
+}
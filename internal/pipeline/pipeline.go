@@ -7,10 +7,13 @@ import (
 	"log/slog"
 	"os"
 	"path/filepath"
+	"runtime"
 	"strings"
 	"sync"
+	"time"
 
 	"github.com/canonical/ubuntu-manpages-operator/internal/fetcher"
+	"github.com/canonical/ubuntu-manpages-operator/internal/search"
 	"github.com/canonical/ubuntu-manpages-operator/internal/sitemap"
 	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
 	"github.com/canonical/ubuntu-manpages-operator/internal/transform"
@@ -26,10 +29,25 @@ type Runner struct {
 	FailuresDir      string
 	ForceProcess     bool
 	StoragePath      string // checked for available disk space per package
+	// Workers bounds the number of packages processed concurrently across
+	// all releases. Zero means runtime.NumCPU().
+	Workers int
+	// Journal, when set, records every manpage written so that the server
+	// can update its search index with only those pages.
+	Journal *search.Journal
 
 	mu              sync.Mutex
 	statuses        []ReleaseStatus
 	releaseFailures [][]string
+	slots           chan struct{}
+}
+
+// failure is a non-fatal pipeline error, buffered per package so that a
+// package's failures are logged together and in order.
+type failure struct {
+	stage string
+	path  string
+	err   error
 }
 
 func (r *Runner) Run(ctx context.Context, releases []string) error {
@@ -37,6 +55,12 @@ func (r *Runner) Run(ctx context.Context, releases []string) error {
 		return errors.New("pipeline runner missing dependencies")
 	}
 
+	workers := r.Workers
+	if workers <= 0 {
+		workers = runtime.NumCPU()
+	}
+	r.slots = make(chan struct{}, workers)
+
 	r.statuses = make([]ReleaseStatus, len(releases))
 	r.releaseFailures = make([][]string, len(releases))
 	for i, rel := range releases {
@@ -75,6 +99,9 @@ func (r *Runner) Run(ctx context.Context, releases []string) error {
 		}
 	}
 
+	r.finishConvertCache()
+	r.finishFetchCache()
+
 	var totalFailures int
 	for _, failures := range r.releaseFailures {
 		totalFailures += len(failures)
@@ -86,6 +113,49 @@ func (r *Runner) Run(ctx context.Context, releases []string) error {
 	return firstErr
 }
 
+// convertCacheMaxAge is how long a conversion cache entry survives without
+// being stored or hit before Run prunes it.
+const convertCacheMaxAge = 30 * 24 * time.Hour
+
+// finishConvertCache logs the conversion cache hit rate for the run and
+// prunes entries no run has used recently.
+func (r *Runner) finishConvertCache() {
+	cache := r.Converter.Cache
+	if cache == nil {
+		return
+	}
+	pruned, err := cache.Prune(convertCacheMaxAge)
+	if err != nil && r.Logger != nil {
+		r.Logger.Warn("conversion cache prune failed", "error", err)
+	}
+	hits, misses := cache.Stats()
+	if r.Logger != nil {
+		r.Logger.Info("conversion cache", "hits", hits, "misses", misses, "pruned", pruned)
+	}
+}
+
+// finishFetchCache logs how many archive indices were revalidated rather
+// than downloaded and trims the HTTP cache to its size limit.
+func (r *Runner) finishFetchCache() {
+	cache := r.Fetcher.Cache
+	if cache == nil {
+		return
+	}
+	evicted, err := cache.Prune()
+	if err != nil && r.Logger != nil {
+		r.Logger.Warn("fetch cache prune failed", "error", err)
+	}
+	stats := cache.Stats()
+	if r.Logger != nil {
+		r.Logger.Info("fetch cache",
+			"unchanged", stats.Unchanged,
+			"patched", stats.Patched,
+			"not_modified", stats.NotModified,
+			"downloaded", stats.Downloaded,
+			"evicted", evicted)
+	}
+}
+
 func (r *Runner) runRelease(ctx context.Context, idx int, release string) error {
 	// Create a per-release work subdirectory for downloads and extraction.
 	releaseDir := filepath.Join(r.Fetcher.WorkDir, release)
@@ -123,6 +193,46 @@ func (r *Runner) runRelease(ctx context.Context, idx int, release string) error
 	r.statuses[idx].Total = len(packages)
 	r.mu.Unlock()
 
+	err = r.dispatch(ctx, release, packages, func(pkg fetcher.Package, next func() (fetcher.Package, bool)) {
+		r.processPackages(ctx, idx, release, pkg, next, &relFetcher, extractor)
+	})
+	// Publish what was stored even when the run stops early: each package's
+	// pages are committed together with its checksum cache entry.
+	if commitErr := r.Storage.Commit(release); commitErr != nil && err == nil {
+		err = fmt.Errorf("commit %s: %w", release, commitErr)
+	}
+	if err != nil {
+		return err
+	}
+
+	r.mu.Lock()
+	s := r.statuses[idx]
+	r.mu.Unlock()
+	if r.Logger != nil {
+		r.Logger.Info("release done", "release", release, "total", s.Total, "skipped", s.Skipped, "errors", s.Errors)
+	}
+	return nil
+}
+
+// dispatch runs work for each package on the shared worker pool, in order,
+// and waits for it to finish. Each worker starts with one package and may
+// take the following ones with next, which only returns a package that is
+// already waiting to be dispatched. It stops dispatching when ctx is
+// cancelled or the disk fills up; packages already in flight still complete.
+func (r *Runner) dispatch(ctx context.Context, release string, packages []fetcher.Package, work func(pkg fetcher.Package, next func() (fetcher.Package, bool))) error {
+	var wg sync.WaitGroup
+	defer wg.Wait()
+
+	queue := make(chan fetcher.Package)
+	next := func() (fetcher.Package, bool) {
+		select {
+		case pkg := <-queue:
+			return pkg, true
+		default:
+			return fetcher.Package{}, false
+		}
+	}
+
 	for i, pkg := range packages {
 		if ctx.Err() != nil {
 			r.Logger.Error("release cancelled", "release", release, "remaining", len(packages)-i)
@@ -134,24 +244,97 @@ func (r *Runner) runRelease(ctx context.Context, idx int, release string) error
 				return fmt.Errorf("ingest %s: %s: %w", release, reason, ErrDiskFull)
 			}
 		}
-		if err := r.processPackage(ctx, idx, release, pkg, &relFetcher, extractor); err != nil {
-			r.recordFailure(idx, "package", pkg.Name, err)
+		select {
+		case queue <- pkg:
+		case r.slots <- struct{}{}:
+			wg.Add(1)
+			go func(pkg fetcher.Package) {
+				defer wg.Done()
+				defer func() { <-r.slots }()
+				work(pkg, next)
+			}(pkg)
+		case <-ctx.Done():
+			r.Logger.Error("release cancelled", "release", release, "remaining", len(packages)-i)
+			return ctx.Err()
 		}
-		r.mu.Lock()
-		r.statuses[idx].Done++
-		r.mu.Unlock()
 	}
+	return nil
+}
 
-	r.mu.Lock()
-	s := r.statuses[idx]
-	r.mu.Unlock()
-	if r.Logger != nil {
-		r.Logger.Info("release done", "release", release, "total", s.Total, "skipped", s.Skipped, "errors", s.Errors)
+// pendingPackage is an extracted package whose manpages are waiting to be
+// converted and stored.
+type pendingPackage struct {
+	pkg      fetcher.Package
+	manpages []ManpageFile
+	cleanup  func() error
+	// store syncs the package's files together before it is marked done.
+	store    *storage.FSStorage
+	failures []failure
+	err      error
+}
+
+// processPackages processes pkg and, when the converter batches, the
+// packages next hands over until their manpages fill a batch, so that the
+// pages of small packages share mandoc processes. Each package is still
+// recorded as done, with its checksum cache entry, on its own.
+func (r *Runner) processPackages(ctx context.Context, idx int, release string, pkg fetcher.Package, next func() (fetcher.Package, bool), f *fetcher.Fetcher, extractor *DebExtractor) {
+	chunk := max(r.Converter.BatchSize, 1)
+	var pending []*pendingPackage
+	var queued int
+	for {
+		p, err := r.extractPackage(ctx, idx, release, pkg, f, extractor)
+		switch {
+		case err != nil:
+			r.packageDone(idx, []failure{{"package", pkg.Name, err}})
+		case p == nil:
+			r.packageDone(idx, nil)
+		default:
+			pending = append(pending, p)
+			queued += len(p.manpages)
+		}
+		if chunk == 1 || queued >= chunk {
+			break
+		}
+		var ok bool
+		if pkg, ok = next(); !ok {
+			break
+		}
+	}
+
+	// Convert the queued manpages in groups of up to chunk, crossing
+	// package boundaries.
+	var group []ManpageFile
+	var owners []*pendingPackage
+	flush := func() {
+		converted := r.preconvert(ctx, group)
+		for i, manpage := range group {
+			if p := owners[i]; p.err == nil {
+				p.err = r.processManpage(ctx, release, manpage, p.store, converted, &p.failures)
+			}
+		}
+		group, owners = group[:0], owners[:0]
+	}
+	for _, p := range pending {
+		for _, manpage := range p.manpages {
+			group = append(group, manpage)
+			owners = append(owners, p)
+			if len(group) == chunk {
+				flush()
+			}
+		}
+	}
+	if len(group) > 0 {
+		flush()
+	}
+
+	for _, p := range pending {
+		r.packageDone(idx, r.finishPackage(ctx, release, p))
 	}
-	return nil
 }
 
-func (r *Runner) processPackage(ctx context.Context, idx int, release string, pkg fetcher.Package, f *fetcher.Fetcher, extractor *DebExtractor) error {
+// extractPackage fetches and extracts one package. It returns nil when the
+// package is unchanged since it was last processed.
+func (r *Runner) extractPackage(ctx context.Context, idx int, release string, pkg fetcher.Package, f *fetcher.Fetcher, extractor *DebExtractor) (*pendingPackage, error) {
 	if r.Logger != nil {
 		r.Logger.Info("processing package", "release", release, "package", pkg.Name)
 	}
@@ -164,46 +347,101 @@ func (r *Runner) processPackage(ctx context.Context, idx int, release string, pk
 			r.mu.Lock()
 			r.statuses[idx].Skipped++
 			r.mu.Unlock()
-			return nil
+			return nil, nil
 		}
 	}
 
 	debPath, err := f.FetchDeb(ctx, pkg.Filename)
 	if err != nil {
-		return fmt.Errorf("fetch deb %s: %w", pkg.Filename, err)
+		return nil, fmt.Errorf("fetch deb %s: %w", pkg.Filename, err)
 	}
 	defer func() { _ = os.Remove(debPath) }()
 
 	manpages, cleanup, err := extractor.ExtractManpages(ctx, debPath)
 	if err != nil {
-		return fmt.Errorf("extract manpages for %s: %w", pkg.Filename, err)
+		return nil, fmt.Errorf("extract manpages for %s: %w", pkg.Filename, err)
 	}
-	defer func() { _ = cleanup() }()
+	return &pendingPackage{pkg: pkg, manpages: manpages, cleanup: cleanup, store: r.Storage.Batch()}, nil
+}
 
-	for _, manpage := range manpages {
-		if err := r.processManpage(ctx, idx, release, manpage); err != nil {
-			return err
+// finishPackage syncs a package's stored files and writes its checksum
+// cache entry, returning the package's failures.
+func (r *Runner) finishPackage(ctx context.Context, release string, p *pendingPackage) []failure {
+	defer func() { _ = p.cleanup() }()
+
+	err := p.err
+	if err == nil && p.pkg.Name != "" && p.pkg.Hash != "" {
+		if err = p.store.WriteCache(ctx, release, p.pkg.Name, p.pkg.Hash); err != nil {
+			err = fmt.Errorf("write cache for %s: %w", p.pkg.Name, err)
+		}
+	} else if err == nil {
+		if err = p.store.Flush(); err != nil {
+			err = fmt.Errorf("sync %s: %w", p.pkg.Filename, err)
 		}
 	}
+	if err != nil {
+		return append(p.failures, failure{"package", p.pkg.Name, err})
+	}
+	return p.failures
+}
 
-	if pkg.Name != "" && pkg.Hash != "" {
-		if err := r.Storage.WriteCache(ctx, release, pkg.Name, pkg.Hash); err != nil {
-			return fmt.Errorf("write cache for %s: %w", pkg.Name, err)
+// packageDone records a package's failures and counts it as done.
+func (r *Runner) packageDone(idx int, failures []failure) {
+	r.recordFailures(idx, failures)
+	r.mu.Lock()
+	r.statuses[idx].Done++
+	r.mu.Unlock()
+}
+
+// conversion is the result of converting one manpage ahead of storing it.
+type conversion struct {
+	html string
+	err  error
+}
+
+// preconvert converts the regular manpages of a group with a single
+// ConvertManpages call when the converter batches, keyed by path. Symlinks
+// and .so links are left out since they are stored without conversion.
+// It returns nil when the converter runs once per page.
+func (r *Runner) preconvert(ctx context.Context, manpages []ManpageFile) map[string]conversion {
+	if r.Converter.BatchSize <= 1 {
+		return nil
+	}
+	var paths []string
+	for _, manpage := range manpages {
+		if manpage.IsSymlink {
+			continue
 		}
+		if _, ok, err := DetectSoLink(manpage.Path); err != nil || ok {
+			continue
+		}
+		paths = append(paths, manpage.Path)
 	}
-
-	return nil
+	if len(paths) == 0 {
+		return nil
+	}
+	htmls, errs := r.Converter.ConvertManpages(ctx, paths)
+	converted := make(map[string]conversion, len(paths))
+	for i, path := range paths {
+		converted[path] = conversion{htmls[i], errs[i]}
+	}
+	return converted
 }
 
-func (r *Runner) processManpage(ctx context.Context, idx int, release string, manpage ManpageFile) error {
+func (r *Runner) processManpage(ctx context.Context, release string, manpage ManpageFile, store *storage.FSStorage, converted map[string]conversion, failures *[]failure) error {
 	if r.Logger != nil {
 		r.Logger.Debug("processing", "path", manpage.RelativePath, "symlink", manpage.IsSymlink)
 	}
-	err := ProcessSingleManpage(ctx, release, manpage, r.Converter, r.Storage)
+	err := storeManpage(ctx, release, manpage, store, r.Journal, func() (string, error) {
+		if c, ok := converted[manpage.Path]; ok {
+			return c.html, c.err
+		}
+		return r.Converter.ConvertManpage(ctx, manpage.Path)
+	})
 	if err != nil {
 		var ce *ConvertError
 		if errors.As(err, &ce) {
-			r.recordFailure(idx, "convert", manpage.Path, ce.Unwrap())
+			*failures = append(*failures, failure{"convert", manpage.Path, ce.Unwrap()})
 			return nil
 		}
 		return err
@@ -215,16 +453,30 @@ func (r *Runner) processManpage(ctx context.Context, idx int, release string, ma
 // the provided pipeline components. Conversion failures are returned as
 // *ConvertError so callers can decide whether they are fatal.
 func ProcessSingleManpage(ctx context.Context, release string, manpage ManpageFile, converter *Converter, storage *storage.FSStorage) error {
+	return storeManpage(ctx, release, manpage, storage, nil, func() (string, error) {
+		return converter.ConvertManpage(ctx, manpage.Path)
+	})
+}
+
+// storeManpage writes a manpage's HTML and gzip copies, calling convert
+// for the HTML of pages that are neither symlinks nor .so links. Each HTML
+// page written is recorded in journal, which may be nil.
+func storeManpage(ctx context.Context, release string, manpage ManpageFile, storage *storage.FSStorage, journal *search.Journal, convert func() (string, error)) error {
 	paths, err := ParseManpagePath(release, manpage.RelativePath)
 	if err != nil {
 		return fmt.Errorf("parse manpage path %s: %w", manpage.RelativePath, err)
 	}
+	var existed bool
+	if journal != nil {
+		existed = storage.Exists(paths.HTMLPath)
+	}
 
 	if manpage.IsSymlink {
 		target := ConvertSymlinkTarget(manpage.SymlinkTarget)
 		if err := storage.WriteSymlink(ctx, paths.HTMLPath, target); err != nil {
 			return fmt.Errorf("write html symlink: %w", err)
 		}
+		journal.Record(release, paths.HTMLPath, existed)
 		if err := storage.WriteGzipSymlink(ctx, paths.GzipPath, manpage.SymlinkTarget); err != nil {
 			return fmt.Errorf("write gzip symlink: %w", err)
 		}
@@ -238,10 +490,11 @@ func ProcessSingleManpage(ctx context.Context, release string, manpage ManpageFi
 		if err := storage.WriteSymlink(ctx, paths.HTMLPath, soTarget); err != nil {
 			return fmt.Errorf("write html symlink: %w", err)
 		}
+		journal.Record(release, paths.HTMLPath, existed)
 		return nil
 	}
 
-	rawHTML, err := converter.ConvertManpage(ctx, manpage.Path)
+	rawHTML, err := convert()
 	if err != nil {
 		return &ConvertError{Err: fmt.Errorf("convert %s: %w", manpage.Path, err)}
 	}
@@ -255,6 +508,7 @@ func ProcessSingleManpage(ctx context.Context, release string, manpage ManpageFi
 	if err := storage.WriteHTML(ctx, paths.HTMLPath, tdoc.Body); err != nil {
 		return fmt.Errorf("write html %s: %w", paths.HTMLPath, err)
 	}
+	journal.Record(release, paths.HTMLPath, existed)
 
 	content, err := os.ReadFile(manpage.Path)
 	if err != nil {
@@ -268,24 +522,35 @@ func ProcessSingleManpage(ctx context.Context, release string, manpage ManpageFi
 	return nil
 }
 
-func (r *Runner) recordFailure(idx int, stage string, path string, err error) {
-	message := strings.TrimSpace(fmt.Sprintf("%s %s: %v", stage, path, err))
+// recordFailures appends one package's failures to the release's failure
+// list and log file as a contiguous block, so that output from concurrent
+// workers never interleaves within a package.
+func (r *Runner) recordFailures(idx int, failures []failure) {
+	if len(failures) == 0 {
+		return
+	}
 	r.mu.Lock()
-	r.releaseFailures[idx] = append(r.releaseFailures[idx], message)
-	r.statuses[idx].Errors++
-	failPath := r.statuses[idx].FailuresPath
-	r.mu.Unlock()
+	defer r.mu.Unlock()
+
+	messages := make([]string, len(failures))
+	for i, fl := range failures {
+		messages[i] = strings.TrimSpace(fmt.Sprintf("%s %s: %v", fl.stage, fl.path, fl.err))
+	}
+	r.releaseFailures[idx] = append(r.releaseFailures[idx], messages...)
+	r.statuses[idx].Errors += len(failures)
 
 	// Append to the failure log immediately so users can tail it.
-	if failPath != "" {
+	if failPath := r.statuses[idx].FailuresPath; failPath != "" {
 		f, ferr := os.OpenFile(failPath, os.O_APPEND|os.O_CREATE|os.O_WRONLY, 0o644)
 		if ferr == nil {
-			_, _ = fmt.Fprintln(f, message)
+			_, _ = fmt.Fprintln(f, strings.Join(messages, "\n"))
 			_ = f.Close()
 		}
 	}
 
 	if r.Logger != nil {
-		r.Logger.Warn("pipeline failure", "stage", stage, "path", path, "error", err)
+		for _, fl := range failures {
+			r.Logger.Warn("pipeline failure", "stage", fl.stage, "path", fl.path, "error", fl.err)
+		}
 	}
 }
@@ -0,0 +1,234 @@
+package pipeline
+
+import (
+	"archive/tar"
+	"context"
+	"errors"
+	"fmt"
+	"io"
+	"log/slog"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"strings"
+	"sync/atomic"
+	"testing"
+	"time"
+
+	"github.com/canonical/ubuntu-manpages-operator/internal/fetcher"
+	"github.com/canonical/ubuntu-manpages-operator/internal/search"
+	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
+)
+
+func testRunner(workers, releases int) *Runner {
+	r := &Runner{
+		Logger:          slog.New(slog.NewTextHandler(io.Discard, nil)),
+		slots:           make(chan struct{}, workers),
+		statuses:        make([]ReleaseStatus, releases),
+		releaseFailures: make([][]string, releases),
+	}
+	return r
+}
+
+func testPackages(n int) []fetcher.Package {
+	pkgs := make([]fetcher.Package, n)
+	for i := range pkgs {
+		pkgs[i] = fetcher.Package{Name: "pkg" + string(rune('a'+i%26))}
+	}
+	return pkgs
+}
+
+func TestDispatchBoundsWorkers(t *testing.T) {
+	r := testRunner(3, 1)
+
+	var inFlight, maxSeen, done atomic.Int32
+	err := r.dispatch(context.Background(), "noble", testPackages(20), func(fetcher.Package, func() (fetcher.Package, bool)) {
+		cur := inFlight.Add(1)
+		defer inFlight.Add(-1)
+		for {
+			prev := maxSeen.Load()
+			if cur <= prev || maxSeen.CompareAndSwap(prev, cur) {
+				break
+			}
+		}
+		time.Sleep(5 * time.Millisecond)
+		done.Add(1)
+	})
+	if err != nil {
+		t.Fatalf("dispatch: %v", err)
+	}
+	if got := done.Load(); got != 20 {
+		t.Errorf("processed %d packages, want 20", got)
+	}
+	if got := maxSeen.Load(); got > 3 {
+		t.Errorf("expected at most 3 in-flight, saw %d", got)
+	}
+	if got := maxSeen.Load(); got < 2 {
+		t.Errorf("expected packages to overlap, saw %d in flight", got)
+	}
+}
+
+func TestDispatchCancelledWaitsForInFlight(t *testing.T) {
+	r := testRunner(2, 1)
+	ctx, cancel := context.WithCancel(context.Background())
+
+	var started, finished atomic.Int32
+	err := r.dispatch(ctx, "noble", testPackages(10), func(fetcher.Package, func() (fetcher.Package, bool)) {
+		if started.Add(1) == 2 {
+			cancel()
+		}
+		time.Sleep(5 * time.Millisecond)
+		finished.Add(1)
+	})
+	if !errors.Is(err, context.Canceled) {
+		t.Fatalf("dispatch error = %v, want context.Canceled", err)
+	}
+	if started.Load() == 10 {
+		t.Error("expected dispatch to stop before all packages started")
+	}
+	if started.Load() != finished.Load() {
+		t.Errorf("dispatch returned with %d of %d packages still running", started.Load()-finished.Load(), started.Load())
+	}
+}
+
+func TestDispatchHandsWaitingPackagesToWorkers(t *testing.T) {
+	r := testRunner(1, 1)
+
+	var got []string
+	var workers int
+	err := r.dispatch(context.Background(), "noble", testPackages(10), func(pkg fetcher.Package, next func() (fetcher.Package, bool)) {
+		workers++
+		for ok := true; ok; pkg, ok = next() {
+			got = append(got, pkg.Name)
+			time.Sleep(time.Millisecond)
+		}
+	})
+	if err != nil {
+		t.Fatalf("dispatch: %v", err)
+	}
+	if want := "pkga,pkgb,pkgc,pkgd,pkge,pkgf,pkgg,pkgh,pkgi,pkgj"; strings.Join(got, ",") != want {
+		t.Errorf("processed %v, want %s in order", got, want)
+	}
+	if workers >= 10 {
+		t.Errorf("started %d workers for 10 packages, want waiting packages handed over with next", workers)
+	}
+}
+
+func TestRecordFailuresGroupedPerPackage(t *testing.T) {
+	r := testRunner(4, 1)
+	failPath := filepath.Join(t.TempDir(), "noble-failures.log")
+	r.statuses[0].FailuresPath = failPath
+
+	err := r.dispatch(context.Background(), "noble", testPackages(8), func(pkg fetcher.Package, _ func() (fetcher.Package, bool)) {
+		var failures []failure
+		for i := range 3 {
+			failures = append(failures, failure{"convert", pkg.Name + "/" + string(rune('0'+i)), errors.New("bad roff")})
+			time.Sleep(time.Millisecond)
+		}
+		r.recordFailures(0, failures)
+	})
+	if err != nil {
+		t.Fatalf("dispatch: %v", err)
+	}
+
+	if got := r.statuses[0].Errors; got != 24 {
+		t.Errorf("Errors = %d, want 24", got)
+	}
+	data, err := os.ReadFile(failPath)
+	if err != nil {
+		t.Fatal(err)
+	}
+	lines := strings.Split(strings.TrimSpace(string(data)), "\n")
+	if len(lines) != 24 {
+		t.Fatalf("got %d failure lines, want 24", len(lines))
+	}
+	for i := 0; i < len(lines); i += 3 {
+		pkg := strings.Split(strings.TrimPrefix(lines[i], "convert "), "/")[0]
+		for j := range 3 {
+			want := "convert " + pkg + "/" + string(rune('0'+j)) + ": bad roff"
+			if lines[i+j] != want {
+				t.Errorf("line %d = %q, want %q", i+j, lines[i+j], want)
+			}
+		}
+	}
+}
+
+func TestStoreManpageRecordsJournal(t *testing.T) {
+	store := storage.NewFSStorage(t.TempDir())
+	manpage := ManpageFile{
+		RelativePath:  "./usr/share/man/man1/vi.1.gz",
+		IsSymlink:     true,
+		SymlinkTarget: "vim.1.gz",
+	}
+	convert := func() (string, error) { return "", errors.New("symlinks are not converted") }
+
+	for _, want := range []string{"added", "updated"} {
+		journal := search.NewJournal()
+		if err := storeManpage(context.Background(), "noble", manpage, store, journal, convert); err != nil {
+			t.Fatalf("storeManpage: %v", err)
+		}
+		changes := journal.Releases["noble"]
+		got := map[string][]string{"added": changes.Added, "updated": changes.Updated}
+		if journal.Len() != 1 || len(got[want]) != 1 || got[want][0] != "manpages/noble/man1/vi.1.html" {
+			t.Errorf("journal = %+v, want vi.1.html %s", changes, want)
+		}
+	}
+}
+
+func TestProcessPackagesBatchesAcrossPackages(t *testing.T) {
+	archive := t.TempDir()
+	var pkgs []fetcher.Package
+	for i := range 4 {
+		dir := filepath.Join(archive, fmt.Sprintf("pool%d", i))
+		if err := os.MkdirAll(dir, 0o755); err != nil {
+			t.Fatal(err)
+		}
+		writeDeb(t, dir, []debEntry{
+			{name: fmt.Sprintf("./usr/share/man/man1/tool%d.1.gz", i), body: string(compress(t, []byte(".TH TOOL 1\n"), ".gz")), typeflag: tar.TypeReg},
+			{name: fmt.Sprintf("./usr/share/man/man8/tool%dd.8.gz", i), body: string(compress(t, []byte(".TH TOOLD 8\n"), ".gz")), typeflag: tar.TypeReg},
+		}, ".gz")
+		pkgs = append(pkgs, fetcher.Package{
+			Name:     fmt.Sprintf("tool%d", i),
+			Hash:     fmt.Sprintf("hash%d", i),
+			Filename: fmt.Sprintf("pool%d/foo-utils_1.2-3ubuntu1_amd64.deb", i),
+		})
+	}
+	srv := httptest.NewServer(http.FileServer(http.Dir(archive)))
+	defer srv.Close()
+
+	calls := filepath.Join(t.TempDir(), "calls")
+	r := testRunner(1, 1)
+	r.Converter = NewConverter(fakeBatchMandoc(t, calls, false))
+	r.Converter.BatchSize = DefaultBatchSize
+	r.Converter.WorkDir = t.TempDir()
+	r.Storage = storage.NewFSStorage(t.TempDir())
+	f := fetcher.New(srv.URL, nil, nil, nil, t.TempDir())
+	extractor := NewDebExtractor(t.TempDir())
+
+	err := r.dispatch(context.Background(), "noble", pkgs, func(pkg fetcher.Package, next func() (fetcher.Package, bool)) {
+		r.processPackages(context.Background(), 0, "noble", pkg, next, f, extractor)
+	})
+	if err != nil {
+		t.Fatalf("dispatch: %v", err)
+	}
+
+	if s := r.statuses[0]; s.Done != 4 || s.Errors != 0 {
+		t.Fatalf("status = %+v, want 4 packages done without errors", s)
+	}
+	for _, pkg := range pkgs {
+		if !r.Storage.CheckCache("noble", pkg.Name, pkg.Hash) {
+			t.Errorf("%s not recorded in the package cache", pkg.Name)
+		}
+	}
+	data, err := os.ReadFile(calls)
+	if err != nil {
+		t.Fatal(err)
+	}
+	// The first package starts a worker that takes the other three while
+	// it downloads, so their eight pages share fewer mandoc runs than the
+	// four a batch per package would need.
+	if runs := strings.Count(string(data), "run"); runs >= 4 {
+		t.Errorf("mandoc ran %d times for 4 packages, want pages batched across packages", runs)
+	}
+}
@@ -3,9 +3,12 @@ package search
 import (
 	"context"
 	"encoding/json"
+	"errors"
 	"fmt"
+	"io/fs"
 	"log/slog"
 	"os"
+	"path"
 	"path/filepath"
 	"sort"
 	"strings"
@@ -13,85 +16,133 @@ import (
 	"time"
 )
 
-// indexEntry is a single manpage stored in the in-memory search index.
+// indexEntry is a single manpage stored in the search index.
 type indexEntry struct {
-	lower    string // lowercased command name (e.g. "ls")
-	filename string // original filename (e.g. "ls.1.html")
-	section  int    // man section (1-9)
+	lower       string // lowercased command name (e.g. "ls")
+	filename    string // original filename (e.g. "ls.1.html")
+	title       string // title from the META header
+	description string // description from the META header
+	section     int    // man section (1-9)
 }
 
-// FSSearcher searches for manpages using an in-memory index of filenames.
-// The index is built at construction by scanning the filesystem once, and
-// can be refreshed with Rebuild. Searches with a language filter fall back
-// to filesystem scanning since translated manpages are rare.
+// FSSearcher searches for manpages using an index of filenames. The index is
+// either mapped from the search.db file written by ingest or built by
+// scanning the filesystem once, and can be refreshed with Rebuild. It covers
+// the default language and every language subtree of each release.
 type FSSearcher struct {
-	root     string
-	releases []string
+	pages     fs.FS
+	releases  []string
+	indexPath string
+
+	// update serializes Rebuild and Apply, which derive the next index
+	// from the current one.
+	update sync.Mutex
 
 	mu    sync.RWMutex
-	index map[string][]indexEntry // release → entries (default language only)
+	index *Index
 }
 
 // NewFSSearcher creates a new filesystem-based searcher and eagerly builds
 // the in-memory filename index by scanning all configured releases.
 func NewFSSearcher(root string, releases []string) *FSSearcher {
-	s := &FSSearcher{root: root, releases: releases}
-	s.index = s.buildIndex()
+	return NewFSSearcherWithIndex(root, releases, "")
+}
+
+// NewFSSearcherWithIndex creates a searcher backed by the index file at
+// indexPath. The file is mapped rather than rebuilt, so startup does not
+// depend on the number of manpages on disk. When the file is missing or
+// unreadable, the filesystem is scanned and the result written to indexPath
+// for the next start.
+func NewFSSearcherWithIndex(root string, releases []string, indexPath string) *FSSearcher {
+	return NewFSSearcherFS(os.DirFS(root), releases, indexPath)
+}
+
+// NewFSSearcherFS is NewFSSearcherWithIndex for the tree below a public
+// HTML root given as a file system, such as a storage.Pages.
+func NewFSSearcherFS(pages fs.FS, releases []string, indexPath string) *FSSearcher {
+	s := &FSSearcher{pages: pages, releases: releases, indexPath: indexPath}
+	s.index = s.load(nil)
 	return s
 }
 
-// Rebuild rescans the filesystem and replaces the in-memory index. It is
-// safe to call concurrently with Search.
+// Rebuild replaces the index. When ingest has written a new index file since
+// the current one was mapped, that file is mapped; otherwise the filesystem
+// is rescanned. It is safe to call concurrently with Search.
 func (s *FSSearcher) Rebuild() {
-	idx := s.buildIndex()
+	s.update.Lock()
+	defer s.update.Unlock()
+	s.swap(s.load(s.index.file))
+}
+
+// swap replaces the index with idx and releases the old one.
+func (s *FSSearcher) swap(idx *Index) {
 	s.mu.Lock()
+	old := s.index
 	s.index = idx
 	s.mu.Unlock()
+	// Searches hold the read lock while they use the index, so none can
+	// still be reading the old mapping.
+	if err := old.Close(); err != nil {
+		slog.Warn("unmap search index", "error", err)
+	}
 }
 
-// buildIndex scans all release directories for HTML manpage files and
-// returns the index map.
-func (s *FSSearcher) buildIndex() map[string][]indexEntry {
-	start := time.Now()
-
-	idx := make(map[string][]indexEntry, len(s.releases))
-	for _, rel := range s.releases {
-		var entries []indexEntry
-		for section := 1; section <= 9; section++ {
-			dir := sectionDir(s.root, rel, "", section)
-			files, err := os.ReadDir(dir)
-			if err != nil {
-				continue
-			}
-			for _, f := range files {
-				if f.IsDir() || !strings.HasSuffix(f.Name(), ".html") {
-					continue
-				}
-				entries = append(entries, indexEntry{
-					lower:    strings.ToLower(commandName(f.Name())),
-					filename: f.Name(),
-					section:  section,
-				})
-			}
+// load returns the index file at indexPath unless it is the file already
+// mapped as current, and otherwise scans the filesystem and writes the
+// result to indexPath.
+func (s *FSSearcher) load(current os.FileInfo) *Index {
+	if s.indexPath == "" {
+		return BuildIndexFS(s.pages, s.releases)
+	}
+	if info, err := os.Stat(s.indexPath); err == nil && (current == nil || !os.SameFile(info, current)) {
+		start := time.Now()
+		idx, err := OpenIndex(s.indexPath)
+		if err == nil && !s.covers(idx) {
+			_ = idx.Close()
+			err = errors.New("search index does not cover all configured releases")
 		}
-		idx[rel] = entries
+		if err == nil {
+			slog.Info("search index loaded",
+				"path", s.indexPath,
+				"entries", idx.Len(),
+				"duration", time.Since(start).Round(time.Millisecond),
+			)
+			return idx
+		}
+		slog.Warn("search index unreadable, rescanning", "error", err)
 	}
 
-	var totalEntries int
-	for _, entries := range idx {
-		totalEntries += len(entries)
+	idx := BuildIndexFS(s.pages, s.releases)
+	if err := idx.WriteFile(s.indexPath); err != nil {
+		slog.Warn("write search index", "error", err)
+		return idx
+	}
+	// Map the file just written so the index lives in the page cache rather
+	// than on the heap.
+	if mapped, err := OpenIndex(s.indexPath); err == nil {
+		return mapped
 	}
-	slog.Info("search index built",
-		"entries", totalEntries,
-		"releases", len(idx),
-		"duration", time.Since(start).Round(time.Millisecond),
-	)
-
 	return idx
 }
 
-// Close is a no-op for the filesystem searcher.
-func (s *FSSearcher) Close() error { return nil }
+// covers reports whether idx was built for every configured release, so
+// that adding a release does not leave it unsearchable until the next
+// ingest run.
+func (s *FSSearcher) covers(idx *Index) bool {
+	for _, rel := range s.releases {
+		if _, ok := idx.groups[indexKey{release: rel}]; !ok {
+			return false
+		}
+	}
+	return true
+}
+
+// Close unmaps the index.
+func (s *FSSearcher) Close() error {
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	return s.index.Close()
+}
 
 // scoredResult wraps a Result with a Damerau-Levenshtein distance used for
 // sorting fuzzy matches before the distance is discarded.
@@ -155,12 +206,11 @@ func (b *matchBuckets) classify(cmdLower, queryLower string, threshold int, r Re
 // returned in four tiers: exact matches (case-insensitive), prefix matches,
 // substring (contains) matches, and fuzzy matches (within a Damerau-Levenshtein
 // distance threshold). Each result carries a MatchType indicating how it
-// matched. The results are enriched with title and description read from each
-// file's META header.
+// matched. Each result's title and description come from the index, which
+// captured them from the file's META header.
 //
-// When language is empty, Search uses the in-memory index (no filesystem I/O
-// during matching). When language is set, it falls back to scanning the
-// filesystem directly.
+// Search does no filesystem I/O; a language filter selects the index of that
+// language subtree.
 func (s *FSSearcher) Search(ctx context.Context, query, distro, language string, limit, offset int) (SearchResponse, error) {
 	name := cleanQuery(query)
 	if name == "" {
@@ -170,12 +220,6 @@ func (s *FSSearcher) Search(ctx context.Context, query, distro, language string,
 		limit = 100
 	}
 
-	// Language-filtered searches fall back to filesystem scanning because
-	// translated manpages are rare and not worth indexing.
-	if language != "" {
-		return s.searchFilesystem(name, distro, language, limit, offset)
-	}
-
 	releases := s.releases
 	if distro != "" {
 		releases = []string{distro}
@@ -186,66 +230,38 @@ func (s *FSSearcher) Search(ctx context.Context, query, distro, language string,
 
 	var buckets matchBuckets
 
+	// Titles point into the mapped index, so hold the read lock until they
+	// have been copied into the returned results.
 	s.mu.RLock()
-	idx := s.index
-	s.mu.RUnlock()
-
+	defer s.mu.RUnlock()
 	for _, rel := range releases {
-		entries := idx[rel]
-		for i := range entries {
-			e := &entries[i]
-			r := Result{
-				Path:    urlPath(rel, "", e.section, e.filename),
-				Distro:  rel,
-				Section: e.section,
-			}
-			buckets.classify(e.lower, nameLower, threshold, r)
-		}
+		s.index.match(rel, language, nameLower, threshold, &buckets)
 	}
 
-	return s.assembleResults(buckets, limit, offset)
+	resp := s.assembleResults(buckets, limit, offset)
+	for i := range resp.Results {
+		r := &resp.Results[i]
+		r.Title = resultTitle(r.Title, r.description, r.Path)
+		r.description = ""
+	}
+	return resp, nil
 }
 
-// searchFilesystem performs a search by scanning the filesystem directly.
-// Used for language-filtered queries that are not covered by the in-memory index.
-func (s *FSSearcher) searchFilesystem(name, distro, language string, limit, offset int) (SearchResponse, error) {
-	releases := s.releases
-	if distro != "" {
-		releases = []string{distro}
+// resultTitle formats a result title as "title - description", falling back
+// to the command name when the page has no title. The result never shares
+// memory with title or description, which may point into a mapped index.
+func resultTitle(title, description, path string) string {
+	if title == "" {
+		title = commandName(filepath.Base(path))
 	}
-
-	nameLower := strings.ToLower(name)
-	threshold := fuzzyThreshold(len(nameLower))
-
-	var buckets matchBuckets
-
-	for _, rel := range releases {
-		for section := 1; section <= 9; section++ {
-			dir := sectionDir(s.root, rel, language, section)
-			entries, err := os.ReadDir(dir)
-			if err != nil {
-				continue
-			}
-
-			for _, e := range entries {
-				if e.IsDir() || !strings.HasSuffix(e.Name(), ".html") {
-					continue
-				}
-				r := Result{
-					Path:    urlPath(rel, language, section, e.Name()),
-					Distro:  rel,
-					Section: section,
-				}
-				buckets.classify(strings.ToLower(commandName(e.Name())), nameLower, threshold, r)
-			}
-		}
+	if description != "" {
+		return title + " - " + description
 	}
-
-	return s.assembleResults(buckets, limit, offset)
+	return strings.Clone(title)
 }
 
-// assembleResults sorts, combines, paginates, and enriches search results.
-func (s *FSSearcher) assembleResults(b matchBuckets, limit, offset int) (SearchResponse, error) {
+// assembleResults sorts, combines, and paginates search results.
+func (s *FSSearcher) assembleResults(b matchBuckets, limit, offset int) SearchResponse {
 	// Sort each tier.
 	sort.Slice(b.exact, func(i, j int) bool {
 		if b.exact[i].Section != b.exact[j].Section {
@@ -284,36 +300,18 @@ func (s *FSSearcher) assembleResults(b matchBuckets, limit, offset int) (SearchR
 
 	// Paginate.
 	if offset >= len(results) {
-		return SearchResponse{Total: total, Results: []Result{}}, nil
+		return SearchResponse{Total: total, Results: []Result{}}
 	}
 	results = results[offset:]
 	if len(results) > limit {
 		results = results[:limit]
 	}
-
-	// Enrich the paginated results with titles from the META header.
-	for i := range results {
-		fsPath := filepath.Join(s.root, results[i].Path[1:]) // strip leading /
-		title, desc := readMeta(fsPath)
-		if title == "" {
-			title = commandName(filepath.Base(results[i].Path))
-		}
-		if desc != "" {
-			results[i].Title = title + " - " + desc
-		} else {
-			results[i].Title = title
-		}
-	}
-
-	return SearchResponse{Total: total, Results: results}, nil
+	return SearchResponse{Total: total, Results: results}
 }
 
 // sectionDir returns the filesystem path to a man section directory.
-func sectionDir(root, release, language string, section int) string {
-	if language == "" {
-		return filepath.Join(root, "manpages", release, fmt.Sprintf("man%d", section))
-	}
-	return filepath.Join(root, "manpages", release, language, fmt.Sprintf("man%d", section))
+func sectionDir(release, language string, section int) string {
+	return path.Join("manpages", release, language, fmt.Sprintf("man%d", section))
 }
 
 // urlPath builds the URL path for a manpage result.
@@ -346,8 +344,8 @@ const (
 // readMeta reads the <!--META:{...}--> header from a manpage HTML file and
 // returns the title and description. It reads at most 4 KB to avoid loading
 // the entire file.
-func readMeta(path string) (title, description string) {
-	f, err := os.Open(path)
+func readMeta(pages fs.FS, name string) (title, description string) {
+	f, err := pages.Open(name)
 	if err != nil {
 		return "", ""
 	}
@@ -0,0 +1,460 @@
+package search
+
+import (
+	"bytes"
+	"encoding/binary"
+	"errors"
+	"fmt"
+	"io/fs"
+	"log/slog"
+	"os"
+	"path"
+	"path/filepath"
+	"sort"
+	"strings"
+	"time"
+	"unsafe"
+)
+
+// An Index is a read-only snapshot of the manpage tree in the search.db
+// format. Ingest writes it next to the HTML tree and the server maps it at
+// startup, so a cold start costs one mmap regardless of how many manpages
+// are on disk. The file is little-endian:
+//
+//	header    magic, u32 group, entry, trigram and posting counts
+//	groups    one per (release, language): u32 release, u32 language,
+//	          u32 first entry, u32 entry count, u32 first trigram,
+//	          u32 trigram count
+//	entries   one per manpage, sorted by command name within a group:
+//	          u32 name, u32 filename, u32 title, u32 description, u32 section
+//	trigrams  sorted by key within a group: u32 key (three name bytes),
+//	          u32 first posting, u32 posting count
+//	postings  u32 entry numbers, ascending for each trigram
+//	strings   uvarint length-prefixed strings, referenced by their offset
+//	          from the start of the string table
+//
+// The sorted names answer exact and prefix lookups by binary search, and the
+// trigram postings answer substring lookups; see match.go.
+type Index struct {
+	data     []byte
+	entries  []byte
+	trigrams []byte
+	postings []byte
+	strings  []byte
+	groups   map[indexKey]indexGroup
+	count    int
+
+	// file identifies the mapped file; it is nil for an index built in
+	// memory.
+	file  os.FileInfo
+	unmap func() error
+
+	variantTables variantTables
+}
+
+const (
+	indexMagic       = "MPSRCH\x00\x02"
+	indexHeaderSize  = len(indexMagic) + 16
+	indexGroupSize   = 24
+	indexEntrySize   = 20
+	indexTrigramSize = 12
+)
+
+type indexKey struct {
+	release, language string
+}
+
+type indexGroup struct {
+	start, count               int
+	trigramStart, trigramCount int
+}
+
+// BuildIndex scans the section directories of each release under root, in
+// the default language and every language subtree, and returns an in-memory
+// index of the manpages found, with the title and description from each
+// page's META header.
+func BuildIndex(root string, releases []string) *Index {
+	return BuildIndexFS(os.DirFS(root), releases)
+}
+
+// BuildIndexFS is BuildIndex for the tree below a public HTML root given as
+// a file system, such as a storage.Pages.
+func BuildIndexFS(pages fs.FS, releases []string) *Index {
+	start := time.Now()
+
+	groups := make(map[indexKey][]indexEntry, len(releases))
+	var total int
+	for _, rel := range releases {
+		for _, lang := range append([]string{""}, languages(pages, rel)...) {
+			entries := scanSections(pages, rel, lang)
+			groups[indexKey{release: rel, language: lang}] = entries
+			total += len(entries)
+		}
+	}
+
+	slog.Info("search index built",
+		"entries", total,
+		"releases", len(releases),
+		"groups", len(groups),
+		"duration", time.Since(start).Round(time.Millisecond),
+	)
+
+	idx, err := parseIndex(encodeIndex(groups))
+	if err != nil {
+		// encodeIndex always produces a well-formed index.
+		panic(err)
+	}
+	return idx
+}
+
+// UpdateIndexFS is BuildIndexFS for releases, keeping the entries of every
+// other release from previous, such as the index file an earlier run wrote,
+// so that a run scoped to some releases leaves the others searchable.
+// Releases whose tree has been removed are dropped. previous may be nil; it
+// is not used once UpdateIndexFS returns.
+func UpdateIndexFS(pages fs.FS, previous *Index, releases []string) *Index {
+	rebuilt := BuildIndexFS(pages, releases)
+	if previous == nil {
+		return rebuilt
+	}
+	groups := make(map[indexKey][]indexEntry, len(previous.groups)+len(rebuilt.groups))
+	for key, g := range rebuilt.groups {
+		groups[key] = rebuilt.groupEntries(g)
+	}
+	for key, g := range previous.groups {
+		if _, ok := groups[indexKey{release: key.release}]; ok {
+			continue
+		}
+		if info, err := fs.Stat(pages, path.Join("manpages", key.release)); err != nil || !info.IsDir() {
+			continue
+		}
+		groups[key] = previous.groupEntries(g)
+	}
+	idx, err := parseIndex(encodeIndex(groups))
+	if err != nil {
+		// encodeIndex always produces a well-formed index.
+		panic(err)
+	}
+	return idx
+}
+
+// groupEntries returns the entries of g. They point into the index data.
+func (x *Index) groupEntries(g indexGroup) []indexEntry {
+	entries := make([]indexEntry, 0, g.count)
+	for i := g.start; i < g.start+g.count; i++ {
+		entries = append(entries, x.entry(i))
+	}
+	return entries
+}
+
+// languages returns the translated-manpage subtrees of a release: every
+// directory other than the man1-9 sections and dot-prefixed bookkeeping.
+func languages(pages fs.FS, release string) []string {
+	dirs, err := fs.ReadDir(pages, path.Join("manpages", release))
+	if err != nil {
+		return nil
+	}
+	var langs []string
+	for _, d := range dirs {
+		name := d.Name()
+		if !d.IsDir() || strings.HasPrefix(name, ".") || isSectionDir(name) {
+			continue
+		}
+		langs = append(langs, name)
+	}
+	return langs
+}
+
+// isSectionDir reports whether name is a man section directory such as man1.
+func isSectionDir(name string) bool {
+	return len(name) == 4 && strings.HasPrefix(name, "man") && name[3] >= '1' && name[3] <= '9'
+}
+
+// scanSections returns an entry for each HTML manpage in the section
+// directories of a release and language.
+func scanSections(pages fs.FS, release, language string) []indexEntry {
+	var entries []indexEntry
+	for section := 1; section <= 9; section++ {
+		dir := sectionDir(release, language, section)
+		files, err := fs.ReadDir(pages, dir)
+		if err != nil {
+			continue
+		}
+		for _, f := range files {
+			if f.IsDir() || !strings.HasSuffix(f.Name(), ".html") {
+				continue
+			}
+			title, desc := readMeta(pages, path.Join(dir, f.Name()))
+			entries = append(entries, indexEntry{
+				lower:       strings.ToLower(commandName(f.Name())),
+				filename:    f.Name(),
+				title:       title,
+				description: desc,
+				section:     section,
+			})
+		}
+	}
+	return entries
+}
+
+// OpenIndex maps the index file at path.
+func OpenIndex(path string) (*Index, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer func() { _ = f.Close() }()
+	info, err := f.Stat()
+	if err != nil {
+		return nil, err
+	}
+	if info.Size() < int64(indexHeaderSize) || info.Size() > int64(^uint32(0)) {
+		return nil, fmt.Errorf("search index %s: bad size %d", path, info.Size())
+	}
+	data, unmap, err := mapFile(f, int(info.Size()))
+	if err != nil {
+		return nil, fmt.Errorf("map search index: %w", err)
+	}
+	idx, err := parseIndex(data)
+	if err != nil {
+		_ = unmap()
+		return nil, fmt.Errorf("search index %s: %w", path, err)
+	}
+	idx.file = info
+	idx.unmap = unmap
+	return idx, nil
+}
+
+// WriteFile writes the index to path. The file is written under a
+// temporary name and renamed into place, so a running server never maps a
+// partial index.
+func (x *Index) WriteFile(path string) error {
+	tmp, err := os.CreateTemp(filepath.Dir(path), "."+filepath.Base(path)+".tmp-*")
+	if err != nil {
+		return fmt.Errorf("create search index: %w", err)
+	}
+	if _, err := tmp.Write(x.data); err != nil {
+		_ = tmp.Close()
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("write search index: %w", err)
+	}
+	if err := tmp.Close(); err != nil {
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("write search index: %w", err)
+	}
+	if err := os.Chmod(tmp.Name(), 0o644); err != nil {
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("write search index: %w", err)
+	}
+	if err := os.Rename(tmp.Name(), path); err != nil {
+		_ = os.Remove(tmp.Name())
+		return fmt.Errorf("rename search index: %w", err)
+	}
+	return nil
+}
+
+// Len returns the number of manpages in the index.
+func (x *Index) Len() int { return x.count }
+
+// Close unmaps the index file. Strings obtained from the index must not be
+// used after Close.
+func (x *Index) Close() error {
+	if x == nil || x.unmap == nil {
+		return nil
+	}
+	unmap := x.unmap
+	x.unmap = nil
+	return unmap()
+}
+
+// group returns the entry range for a release and language.
+func (x *Index) group(release, language string) indexGroup {
+	return x.groups[indexKey{release: release, language: language}]
+}
+
+// entry decodes entry i. Its strings point into the index data and are only
+// valid until the index is closed.
+func (x *Index) entry(i int) indexEntry {
+	rec := x.entries[i*indexEntrySize : (i+1)*indexEntrySize]
+	return indexEntry{
+		lower:       x.str(binary.LittleEndian.Uint32(rec[0:])),
+		filename:    x.str(binary.LittleEndian.Uint32(rec[4:])),
+		title:       x.str(binary.LittleEndian.Uint32(rec[8:])),
+		description: x.str(binary.LittleEndian.Uint32(rec[12:])),
+		section:     int(binary.LittleEndian.Uint32(rec[16:])),
+	}
+}
+
+// name returns the lowercased command name of entry i.
+func (x *Index) name(i int) string {
+	return x.str(binary.LittleEndian.Uint32(x.entries[i*indexEntrySize:]))
+}
+
+// str returns the string at off in the string table without copying it.
+// Offsets outside the table yield "".
+func (x *Index) str(off uint32) string {
+	if int64(off) >= int64(len(x.strings)) {
+		return ""
+	}
+	rest := x.strings[off:]
+	n, k := binary.Uvarint(rest)
+	if k <= 0 || n == 0 || n > uint64(len(rest)-k) {
+		return ""
+	}
+	return unsafe.String(&rest[k], int(n))
+}
+
+// parseIndex validates the header and group table of data and returns an
+// index over it.
+func parseIndex(data []byte) (*Index, error) {
+	if len(data) < indexHeaderSize || string(data[:len(indexMagic)]) != indexMagic {
+		return nil, errors.New("not a search index")
+	}
+	counts := data[len(indexMagic):]
+	ngroups := int64(binary.LittleEndian.Uint32(counts[0:]))
+	nentries := int64(binary.LittleEndian.Uint32(counts[4:]))
+	ntrigrams := int64(binary.LittleEndian.Uint32(counts[8:]))
+	npostings := int64(binary.LittleEndian.Uint32(counts[12:]))
+	entriesOff := int64(indexHeaderSize) + ngroups*indexGroupSize
+	trigramsOff := entriesOff + nentries*indexEntrySize
+	postingsOff := trigramsOff + ntrigrams*indexTrigramSize
+	stringsOff := postingsOff + npostings*4
+	if stringsOff > int64(len(data)) {
+		return nil, errors.New("truncated search index")
+	}
+
+	x := &Index{
+		data:     data,
+		entries:  data[entriesOff:trigramsOff],
+		trigrams: data[trigramsOff:postingsOff],
+		postings: data[postingsOff:stringsOff],
+		strings:  data[stringsOff:],
+		groups:   make(map[indexKey]indexGroup, ngroups),
+		count:    int(nentries),
+	}
+	for i := int64(0); i < ngroups; i++ {
+		rec := data[int64(indexHeaderSize)+i*indexGroupSize:]
+		start := int64(binary.LittleEndian.Uint32(rec[8:]))
+		count := int64(binary.LittleEndian.Uint32(rec[12:]))
+		tstart := int64(binary.LittleEndian.Uint32(rec[16:]))
+		tcount := int64(binary.LittleEndian.Uint32(rec[20:]))
+		if start+count > nentries || tstart+tcount > ntrigrams {
+			return nil, errors.New("search index group out of range")
+		}
+		key := indexKey{
+			release:  strings.Clone(x.str(binary.LittleEndian.Uint32(rec[0:]))),
+			language: strings.Clone(x.str(binary.LittleEndian.Uint32(rec[4:]))),
+		}
+		x.groups[key] = indexGroup{
+			start:        int(start),
+			count:        int(count),
+			trigramStart: int(tstart),
+			trigramCount: int(tcount),
+		}
+	}
+	return x, nil
+}
+
+// encodeIndex serializes groups in the search.db format. Entries are sorted
+// by command name, then section and filename; equal strings are stored once.
+func encodeIndex(groups map[indexKey][]indexEntry) []byte {
+	keys := make([]indexKey, 0, len(groups))
+	for k := range groups {
+		keys = append(keys, k)
+	}
+	sort.Slice(keys, func(i, j int) bool {
+		if keys[i].release != keys[j].release {
+			return keys[i].release < keys[j].release
+		}
+		return keys[i].language < keys[j].language
+	})
+
+	var strs bytes.Buffer
+	offsets := make(map[string]uint32)
+	intern := func(s string) uint32 {
+		if off, ok := offsets[s]; ok {
+			return off
+		}
+		off := uint32(strs.Len())
+		strs.Write(binary.AppendUvarint(nil, uint64(len(s))))
+		strs.WriteString(s)
+		offsets[s] = off
+		return off
+	}
+	// An empty string at offset 0 keeps unset fields valid.
+	intern("")
+
+	var groupTable, entryTable, trigramTable, postingTable []byte
+	var nentries, ntrigrams, npostings int
+	for _, k := range keys {
+		entries := groups[k]
+		sort.Slice(entries, func(i, j int) bool {
+			a, b := &entries[i], &entries[j]
+			if a.lower != b.lower {
+				return a.lower < b.lower
+			}
+			if a.section != b.section {
+				return a.section < b.section
+			}
+			return a.filename < b.filename
+		})
+
+		grams := make(map[uint32][]uint32)
+		for i, e := range entries {
+			entryTable = binary.LittleEndian.AppendUint32(entryTable, intern(e.lower))
+			entryTable = binary.LittleEndian.AppendUint32(entryTable, intern(e.filename))
+			entryTable = binary.LittleEndian.AppendUint32(entryTable, intern(e.title))
+			entryTable = binary.LittleEndian.AppendUint32(entryTable, intern(e.description))
+			entryTable = binary.LittleEndian.AppendUint32(entryTable, uint32(e.section))
+			n := uint32(nentries + i)
+			for j := 0; j+3 <= len(e.lower); j++ {
+				key := trigramKey(e.lower[j:])
+				if p := grams[key]; len(p) == 0 || p[len(p)-1] != n {
+					grams[key] = append(p, n)
+				}
+			}
+		}
+		gramKeys := make([]uint32, 0, len(grams))
+		for key := range grams {
+			gramKeys = append(gramKeys, key)
+		}
+		sort.Slice(gramKeys, func(i, j int) bool { return gramKeys[i] < gramKeys[j] })
+
+		groupTable = binary.LittleEndian.AppendUint32(groupTable, intern(k.release))
+		groupTable = binary.LittleEndian.AppendUint32(groupTable, intern(k.language))
+		groupTable = binary.LittleEndian.AppendUint32(groupTable, uint32(nentries))
+		groupTable = binary.LittleEndian.AppendUint32(groupTable, uint32(len(entries)))
+		groupTable = binary.LittleEndian.AppendUint32(groupTable, uint32(ntrigrams))
+		groupTable = binary.LittleEndian.AppendUint32(groupTable, uint32(len(gramKeys)))
+		for _, key := range gramKeys {
+			trigramTable = binary.LittleEndian.AppendUint32(trigramTable, key)
+			trigramTable = binary.LittleEndian.AppendUint32(trigramTable, uint32(npostings))
+			trigramTable = binary.LittleEndian.AppendUint32(trigramTable, uint32(len(grams[key])))
+			for _, n := range grams[key] {
+				postingTable = binary.LittleEndian.AppendUint32(postingTable, n)
+			}
+			npostings += len(grams[key])
+		}
+		nentries += len(entries)
+		ntrigrams += len(gramKeys)
+	}
+
+	data := make([]byte, indexHeaderSize, indexHeaderSize+len(groupTable)+len(entryTable)+
+		len(trigramTable)+len(postingTable)+strs.Len())
+	copy(data, indexMagic)
+	counts := data[len(indexMagic):]
+	binary.LittleEndian.PutUint32(counts[0:], uint32(len(keys)))
+	binary.LittleEndian.PutUint32(counts[4:], uint32(nentries))
+	binary.LittleEndian.PutUint32(counts[8:], uint32(ntrigrams))
+	binary.LittleEndian.PutUint32(counts[12:], uint32(npostings))
+	data = append(data, groupTable...)
+	data = append(data, entryTable...)
+	data = append(data, trigramTable...)
+	data = append(data, postingTable...)
+	return append(data, strs.Bytes()...)
+}
+
+// trigramKey packs the first three bytes of s.
+func trigramKey(s string) uint32 {
+	return uint32(s[0])<<16 | uint32(s[1])<<8 | uint32(s[2])
+}
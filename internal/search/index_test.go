@@ -0,0 +1,275 @@
+package search
+
+import (
+	"context"
+	"fmt"
+	"os"
+	"path/filepath"
+	"sort"
+	"testing"
+	"time"
+)
+
+func TestIndexWriteAndOpen(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 8, "mount.8.html", "mount", "mount a filesystem")
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list directory contents")
+	writeManpage(t, root, "noble", "", 2, "mount.2.html", "mount", "mount filesystem")
+	path := filepath.Join(root, "search.db")
+
+	if err := BuildIndex(root, []string{"noble", "jammy"}).WriteFile(path); err != nil {
+		t.Fatalf("WriteFile: %v", err)
+	}
+	idx, err := OpenIndex(path)
+	if err != nil {
+		t.Fatalf("OpenIndex: %v", err)
+	}
+	defer func() { _ = idx.Close() }()
+
+	if idx.Len() != 3 {
+		t.Errorf("Len() = %d, want 3", idx.Len())
+	}
+	g := idx.group("noble", "")
+	want := []indexEntry{
+		{lower: "ls", filename: "ls.1.html", title: "ls", description: "list directory contents", section: 1},
+		{lower: "mount", filename: "mount.2.html", title: "mount", description: "mount filesystem", section: 2},
+		{lower: "mount", filename: "mount.8.html", title: "mount", description: "mount a filesystem", section: 8},
+	}
+	if g.count != len(want) {
+		t.Fatalf("noble has %d entries, want %d", g.count, len(want))
+	}
+	for i, w := range want {
+		if got := idx.entry(g.start + i); got != w {
+			t.Errorf("entry %d = %+v, want %+v", i, got, w)
+		}
+	}
+	if _, ok := idx.groups[indexKey{release: "jammy"}]; !ok {
+		t.Error("index has no group for jammy, which has no manpages")
+	}
+
+	entries, err := os.ReadDir(root)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(entries) != 2 {
+		t.Errorf("root has %d entries, want manpages and search.db only", len(entries))
+	}
+}
+
+func TestUpdateIndexFSKeepsOtherReleases(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list directory contents")
+	writeManpage(t, root, "jammy", "", 1, "cat.1.html", "cat", "concatenate files")
+	writeManpage(t, root, "focal", "", 1, "cp.1.html", "cp", "copy files")
+	path := filepath.Join(root, "search.db")
+	if err := BuildIndex(root, []string{"focal", "jammy", "noble"}).WriteFile(path); err != nil {
+		t.Fatal(err)
+	}
+	previous, err := OpenIndex(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+
+	// A run scoped to noble, after focal was removed.
+	writeManpage(t, root, "noble", "", 1, "grep.1.html", "grep", "print lines that match patterns")
+	if err := os.RemoveAll(filepath.Join(root, "manpages", "focal")); err != nil {
+		t.Fatal(err)
+	}
+	idx := UpdateIndexFS(os.DirFS(root), previous, []string{"noble"})
+	if err := previous.Close(); err != nil {
+		t.Fatal(err)
+	}
+
+	for rel, want := range map[string]int{"noble": 2, "jammy": 1} {
+		if g, ok := idx.groups[indexKey{release: rel}]; !ok || g.count != want {
+			t.Errorf("%s has %d entries (group %v), want %d", rel, g.count, ok, want)
+		}
+	}
+	if g := idx.group("jammy", ""); idx.entry(g.start).filename != "cat.1.html" {
+		t.Errorf("jammy entry = %+v, want cat.1.html", idx.entry(g.start))
+	}
+	if _, ok := idx.groups[indexKey{release: "focal"}]; ok {
+		t.Error("index keeps the removed release focal")
+	}
+}
+
+func TestOpenIndex_Invalid(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "search.db")
+	for name, data := range map[string]string{
+		"empty":     "",
+		"magic":     "not a search index file",
+		"truncated": indexMagic + "\x01\x00\x00\x00\x05\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00",
+	} {
+		if err := os.WriteFile(path, []byte(data), 0o644); err != nil {
+			t.Fatal(err)
+		}
+		if idx, err := OpenIndex(path); err == nil {
+			_ = idx.Close()
+			t.Errorf("OpenIndex(%s) error = nil, want error", name)
+		}
+	}
+}
+
+func TestFSSearcherWithIndex_MapsFile(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list directory contents")
+	path := filepath.Join(root, "search.db")
+	if err := BuildIndex(root, []string{"noble"}).WriteFile(path); err != nil {
+		t.Fatal(err)
+	}
+	// Without a scan the searcher can only find ls through the file.
+	if err := os.RemoveAll(filepath.Join(root, "manpages")); err != nil {
+		t.Fatal(err)
+	}
+
+	s := NewFSSearcherWithIndex(root, []string{"noble"}, path)
+	defer func() { _ = s.Close() }()
+	resp, err := s.Search(context.Background(), "ls", "", "", 50, 0)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if resp.Total != 1 || resp.Results[0].Path != "/manpages/noble/man1/ls.1.html" {
+		t.Fatalf("Search(ls) = %+v, want ls from the index file", resp)
+	}
+	if got := resp.Results[0].Title; got != "ls - list directory contents" {
+		t.Errorf("Title = %q, want the title stored in the index", got)
+	}
+}
+
+func TestFSSearcherWithIndex_Languages(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list directory contents")
+	writeManpage(t, root, "noble", "de", 1, "ls.1.html", "ls", "Verzeichnisinhalte auflisten")
+	writeManpage(t, root, "noble", "zh_CN", 8, "mount.8.html", "mount", "挂载文件系统")
+	writeManpage(t, root, "noble", ".cache", 1, "ls.1.html", "ls", "not a language")
+	path := filepath.Join(root, "search.db")
+	if err := BuildIndex(root, []string{"noble"}).WriteFile(path); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.RemoveAll(filepath.Join(root, "manpages")); err != nil {
+		t.Fatal(err)
+	}
+
+	s := NewFSSearcherWithIndex(root, []string{"noble"}, path)
+	defer func() { _ = s.Close() }()
+	for _, tt := range []struct {
+		query, language, want string
+	}{
+		{"ls", "de", "/manpages/noble/de/man1/ls.1.html"},
+		{"mount", "zh_CN", "/manpages/noble/zh_CN/man8/mount.8.html"},
+		{"mnt", "zh_CN", ""},
+		{"ls", ".cache", ""},
+		{"ls", "../noble", ""},
+	} {
+		resp, err := s.Search(context.Background(), tt.query, "", tt.language, 50, 0)
+		if err != nil {
+			t.Fatal(err)
+		}
+		var got string
+		if len(resp.Results) > 0 {
+			got = resp.Results[0].Path
+		}
+		if got != tt.want {
+			t.Errorf("Search(%q, lang %q) = %q, want %q", tt.query, tt.language, got, tt.want)
+		}
+	}
+}
+
+func TestFSSearcherWithIndex_RebuildMapsNewFile(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list directory contents")
+	path := filepath.Join(root, "search.db")
+	s := NewFSSearcherWithIndex(root, []string{"noble"}, path)
+	defer func() { _ = s.Close() }()
+
+	// Ingest adds a page and writes a new index file.
+	writeManpage(t, root, "noble", "", 1, "grep.1.html", "grep", "print lines that match patterns")
+	if err := BuildIndex(root, []string{"noble"}).WriteFile(path); err != nil {
+		t.Fatal(err)
+	}
+	s.Rebuild()
+
+	resp, err := s.Search(context.Background(), "grep", "", "", 50, 0)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if resp.Total != 1 {
+		t.Errorf("Search(grep) after Rebuild found %d results, want 1", resp.Total)
+	}
+}
+
+func TestFSSearcherWithIndex_RescansStaleFile(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list directory contents")
+	writeManpage(t, root, "jammy", "", 1, "ls.1.html", "ls", "list directory contents")
+	path := filepath.Join(root, "search.db")
+
+	for name, write := range map[string]func() error{
+		"corrupt":         func() error { return os.WriteFile(path, []byte("garbage"), 0o644) },
+		"missing release": func() error { return BuildIndex(root, []string{"noble"}).WriteFile(path) },
+	} {
+		if err := write(); err != nil {
+			t.Fatal(err)
+		}
+		s := NewFSSearcherWithIndex(root, []string{"noble", "jammy"}, path)
+		resp, err := s.Search(context.Background(), "ls", "jammy", "", 50, 0)
+		if err != nil {
+			t.Fatal(err)
+		}
+		if resp.Total != 1 {
+			t.Errorf("%s: Search(ls, jammy) found %d results, want 1", name, resp.Total)
+		}
+		_ = s.Close()
+
+		// The rescan replaced the file.
+		idx, err := OpenIndex(path)
+		if err != nil {
+			t.Fatalf("%s: OpenIndex after rescan: %v", name, err)
+		}
+		if idx.Len() != 2 {
+			t.Errorf("%s: rewritten index has %d entries, want 2", name, idx.Len())
+		}
+		_ = idx.Close()
+	}
+}
+
+// BenchmarkFSSearcher_SearchLatency reports p99 latency for a query with a
+// full page of prefix hits. The readMeta variant adds the per-hit META reads
+// that search did before titles were stored in the index.
+func BenchmarkFSSearcher_SearchLatency(b *testing.B) {
+	root := b.TempDir()
+	for i := 0; i < 2000; i++ {
+		name := fmt.Sprintf("cmd%04d", i)
+		writeManpageBench(b, root, "noble", 1+i%9, fmt.Sprintf("%s.%d.html", name, 1+i%9), name, "description of "+name)
+	}
+	s := NewFSSearcherWithIndex(root, []string{"noble"}, filepath.Join(root, "search.db"))
+	defer func() { _ = s.Close() }()
+
+	for _, bc := range []struct {
+		name     string
+		readMeta bool
+	}{
+		{"index", false},
+		{"readMeta", true},
+	} {
+		b.Run(bc.name, func(b *testing.B) {
+			latencies := make([]time.Duration, b.N)
+			b.ResetTimer()
+			for i := 0; i < b.N; i++ {
+				start := time.Now()
+				resp, err := s.Search(context.Background(), "cmd1", "", "", 50, 0)
+				if err != nil {
+					b.Fatal(err)
+				}
+				if bc.readMeta {
+					for _, r := range resp.Results {
+						readMeta(os.DirFS(root), r.Path[1:])
+					}
+				}
+				latencies[i] = time.Since(start)
+			}
+			sort.Slice(latencies, func(i, j int) bool { return latencies[i] < latencies[j] })
+			b.ReportMetric(float64(latencies[len(latencies)*99/100].Nanoseconds()), "p99-ns")
+		})
+	}
+}
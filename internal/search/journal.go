@@ -0,0 +1,240 @@
+package search
+
+import (
+	"fmt"
+	"io/fs"
+	"log/slog"
+	"slices"
+	"strconv"
+	"strings"
+	"sync"
+	"time"
+)
+
+// A Journal lists the manpages an ingest run added, updated or removed, per
+// release, so that the server can update its index with only those pages
+// instead of rescanning the tree. Paths are relative to the public HTML
+// root, for example "manpages/noble/man1/ls.1.html".
+type Journal struct {
+	Releases map[string]*ReleaseChanges `json:"releases"`
+
+	mu   sync.Mutex
+	seen map[string]bool
+}
+
+// ReleaseChanges holds the changed manpage paths of one release.
+type ReleaseChanges struct {
+	Added   []string `json:"added,omitempty"`
+	Updated []string `json:"updated,omitempty"`
+	Removed []string `json:"removed,omitempty"`
+}
+
+// NewJournal returns an empty journal.
+func NewJournal() *Journal {
+	return &Journal{Releases: make(map[string]*ReleaseChanges), seen: make(map[string]bool)}
+}
+
+// Record notes that the page at path was written; existed reports whether a
+// page was there before. Pages written more than once are recorded once. A
+// nil Journal records nothing.
+func (j *Journal) Record(release, path string, existed bool) {
+	if j == nil {
+		return
+	}
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	if j.seen[path] {
+		return
+	}
+	j.seen[path] = true
+	rc := j.Releases[release]
+	if rc == nil {
+		rc = &ReleaseChanges{}
+		j.Releases[release] = rc
+	}
+	if existed {
+		rc.Updated = append(rc.Updated, path)
+	} else {
+		rc.Added = append(rc.Added, path)
+	}
+}
+
+// Len returns the number of pages listed in the journal.
+func (j *Journal) Len() int {
+	if j == nil {
+		return 0
+	}
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	var n int
+	for _, rc := range j.Releases {
+		n += len(rc.Added) + len(rc.Updated) + len(rc.Removed)
+	}
+	return n
+}
+
+// pageKey identifies a manpage within an index group.
+type pageKey struct {
+	section  int
+	filename string
+}
+
+// groupChanges maps each changed page of a group to its new entry, or to
+// nil when the page is gone.
+type groupChanges map[pageKey]*indexEntry
+
+// Apply updates the index with the pages listed in journal and returns the
+// number of index entries added, updated or removed. Only the listed pages
+// are read from disk. The updated index is swapped in under the searcher's
+// lock and written to the index file. It fails without changing the index
+// when the journal names a release that is not configured or a path outside
+// the manpage tree; callers should then fall back to Rebuild.
+func (s *FSSearcher) Apply(journal *Journal) (int, error) {
+	start := time.Now()
+	s.update.Lock()
+	defer s.update.Unlock()
+
+	changes, err := s.readChanges(journal)
+	if err != nil {
+		return 0, err
+	}
+
+	s.mu.RLock()
+	groups, changed := s.index.merge(changes)
+	var data []byte
+	if changed > 0 {
+		// Encoding copies every string, so the result outlives the current
+		// mapping.
+		data = encodeIndex(groups)
+	}
+	s.mu.RUnlock()
+	if changed == 0 {
+		return 0, nil
+	}
+
+	idx, err := parseIndex(data)
+	if err != nil {
+		return 0, err
+	}
+	if s.indexPath != "" {
+		if err := idx.WriteFile(s.indexPath); err != nil {
+			slog.Warn("write search index", "error", err)
+		} else if mapped, err := OpenIndex(s.indexPath); err == nil {
+			idx = mapped
+		}
+	}
+	s.swap(idx)
+	slog.Info("search index updated",
+		"changed", changed,
+		"entries", idx.Len(),
+		"duration", time.Since(start).Round(time.Millisecond),
+	)
+	return changed, nil
+}
+
+// readChanges resolves the journal against the filesystem: the META header
+// of each added or updated page is read, and pages no longer on disk count
+// as removed.
+func (s *FSSearcher) readChanges(journal *Journal) (map[indexKey]groupChanges, error) {
+	changes := make(map[indexKey]groupChanges)
+	for rel, rc := range journal.Releases {
+		if !slices.Contains(s.releases, rel) {
+			return nil, fmt.Errorf("journal release %q is not configured", rel)
+		}
+		for _, paths := range [][]string{rc.Added, rc.Updated, rc.Removed} {
+			for _, p := range paths {
+				key, page, err := parsePagePath(rel, p)
+				if err != nil {
+					return nil, err
+				}
+				if changes[key] == nil {
+					changes[key] = make(groupChanges)
+				}
+				changes[key][page] = s.readEntry(p, page)
+			}
+		}
+	}
+	return changes, nil
+}
+
+// readEntry returns the index entry for the page at path, or nil when there
+// is no manpage there.
+func (s *FSSearcher) readEntry(path string, page pageKey) *indexEntry {
+	if info, err := fs.Stat(s.pages, path); err != nil || info.IsDir() {
+		return nil
+	}
+	title, desc := readMeta(s.pages, path)
+	return &indexEntry{
+		lower:       strings.ToLower(commandName(page.filename)),
+		filename:    page.filename,
+		title:       title,
+		description: desc,
+		section:     page.section,
+	}
+}
+
+// parsePagePath splits a journal path of the form
+// manpages/{release}/[{language}/]man{N}/{file}.html.
+func parsePagePath(release, path string) (indexKey, pageKey, error) {
+	parts := strings.Split(path, "/")
+	bad := func() (indexKey, pageKey, error) {
+		return indexKey{}, pageKey{}, fmt.Errorf("journal path %q is not a %s manpage", path, release)
+	}
+	if len(parts) < 4 || len(parts) > 5 || parts[0] != "manpages" || parts[1] != release {
+		return bad()
+	}
+	key := indexKey{release: release}
+	if len(parts) == 5 {
+		key.language = parts[2]
+		if key.language == "" || strings.HasPrefix(key.language, ".") || isSectionDir(key.language) {
+			return bad()
+		}
+	}
+	dir, file := parts[len(parts)-2], parts[len(parts)-1]
+	if !isSectionDir(dir) || !strings.HasSuffix(file, ".html") || strings.HasPrefix(file, ".") {
+		return bad()
+	}
+	section, _ := strconv.Atoi(dir[3:])
+	return key, pageKey{section: section, filename: file}, nil
+}
+
+// merge returns the entries of every group with changes applied, and the
+// number of entries that changed. The entries point into the index data.
+func (x *Index) merge(changes map[indexKey]groupChanges) (map[indexKey][]indexEntry, int) {
+	groups := make(map[indexKey][]indexEntry, len(x.groups)+len(changes))
+	indexed := make(map[indexKey]map[pageKey]bool, len(changes))
+	var changed int
+	for key, g := range x.groups {
+		entries := make([]indexEntry, 0, g.count)
+		pending := changes[key]
+		for i := g.start; i < g.start+g.count; i++ {
+			e := x.entry(i)
+			page := pageKey{section: e.section, filename: e.filename}
+			next, ok := pending[page]
+			if !ok {
+				entries = append(entries, e)
+				continue
+			}
+			if indexed[key] == nil {
+				indexed[key] = make(map[pageKey]bool)
+			}
+			indexed[key][page] = true
+			if next == nil || *next != e {
+				changed++
+			}
+		}
+		groups[key] = entries
+	}
+	for key, pending := range changes {
+		for page, next := range pending {
+			if next == nil {
+				continue
+			}
+			if !indexed[key][page] {
+				changed++
+			}
+			groups[key] = append(groups[key], *next)
+		}
+	}
+	return groups, changed
+}
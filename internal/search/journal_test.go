@@ -0,0 +1,120 @@
+package search
+
+import (
+	"context"
+	"os"
+	"path/filepath"
+	"testing"
+)
+
+func TestJournalRecord(t *testing.T) {
+	j := NewJournal()
+	j.Record("noble", "manpages/noble/man1/ls.1.html", false)
+	j.Record("noble", "manpages/noble/man1/ls.1.html", true)
+	j.Record("noble", "manpages/noble/man8/mount.8.html", true)
+	j.Record("jammy", "manpages/jammy/man1/ls.1.html", false)
+
+	if j.Len() != 3 {
+		t.Errorf("Len() = %d, want 3", j.Len())
+	}
+	noble := j.Releases["noble"]
+	if len(noble.Added) != 1 || len(noble.Updated) != 1 {
+		t.Errorf("noble = %+v, want ls added and mount updated", noble)
+	}
+
+	var nilJournal *Journal
+	nilJournal.Record("noble", "manpages/noble/man1/ls.1.html", false)
+	if nilJournal.Len() != 0 {
+		t.Error("nil journal recorded a page")
+	}
+}
+
+func TestFSSearcherApply(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list directory contents")
+	writeManpage(t, root, "noble", "", 8, "mount.8.html", "mount", "mount a filesystem")
+	path := filepath.Join(root, "search.db")
+	s := NewFSSearcherWithIndex(root, []string{"noble"}, path)
+	defer func() { _ = s.Close() }()
+
+	// An ingest run adds grep and a German page, rewrites ls with a new
+	// description and leaves mount as it was; mount.8 is then removed.
+	writeManpage(t, root, "noble", "", 1, "grep.1.html", "grep", "print lines that match patterns")
+	writeManpage(t, root, "noble", "de", 1, "grep.1.html", "grep", "Zeilen ausgeben")
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list files")
+	if err := os.Remove(filepath.Join(root, "manpages", "noble", "man8", "mount.8.html")); err != nil {
+		t.Fatal(err)
+	}
+	journal := &Journal{Releases: map[string]*ReleaseChanges{
+		"noble": {
+			Added:   []string{"manpages/noble/man1/grep.1.html", "manpages/noble/de/man1/grep.1.html"},
+			Updated: []string{"manpages/noble/man1/ls.1.html"},
+			Removed: []string{"manpages/noble/man8/mount.8.html"},
+		},
+	}}
+	changed, err := s.Apply(journal)
+	if err != nil {
+		t.Fatalf("Apply: %v", err)
+	}
+	if changed != 4 {
+		t.Errorf("Apply() = %d, want 4", changed)
+	}
+
+	for _, tt := range []struct {
+		query, language, want string
+	}{
+		{"grep", "", "grep - print lines that match patterns"},
+		{"grep", "de", "grep - Zeilen ausgeben"},
+		{"ls", "", "ls - list files"},
+		{"mount", "", ""},
+	} {
+		resp, err := s.Search(context.Background(), tt.query, "", tt.language, 50, 0)
+		if err != nil {
+			t.Fatal(err)
+		}
+		var got string
+		if len(resp.Results) > 0 {
+			got = resp.Results[0].Title
+		}
+		if got != tt.want {
+			t.Errorf("Search(%q, lang %q) = %q, want %q", tt.query, tt.language, got, tt.want)
+		}
+	}
+
+	// The update is persisted for the next startup.
+	idx, err := OpenIndex(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer func() { _ = idx.Close() }()
+	if idx.Len() != 3 {
+		t.Errorf("index file has %d entries, want 3", idx.Len())
+	}
+
+	// Applying the same journal again changes nothing.
+	if changed, err := s.Apply(journal); err != nil || changed != 0 {
+		t.Errorf("second Apply() = %d, %v, want 0, nil", changed, err)
+	}
+}
+
+func TestFSSearcherApply_Rejects(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 1, "ls.1.html", "ls", "list directory contents")
+	s := NewFSSearcherWithIndex(root, []string{"noble"}, "")
+	defer func() { _ = s.Close() }()
+
+	for name, changes := range map[string]map[string]*ReleaseChanges{
+		"unknown release": {"jammy": {Added: []string{"manpages/jammy/man1/ls.1.html"}}},
+		"other release":   {"noble": {Added: []string{"manpages/jammy/man1/ls.1.html"}}},
+		"gzip path":       {"noble": {Added: []string{"manpages.gz/noble/man1/ls.1.gz"}}},
+		"no section":      {"noble": {Added: []string{"manpages/noble/ls.1.html"}}},
+		"traversal":       {"noble": {Added: []string{"manpages/noble/../man1/ls.1.html"}}},
+	} {
+		if _, err := s.Apply(&Journal{Releases: changes}); err == nil {
+			t.Errorf("Apply(%s) error = nil, want error", name)
+		}
+	}
+	if s.index.Len() != 1 {
+		t.Errorf("index has %d entries after rejected journals, want 1", s.index.Len())
+	}
+}
@@ -0,0 +1,224 @@
+package search
+
+import (
+	"encoding/binary"
+	"sort"
+	"strings"
+)
+
+// match classifies the entries of a release and language that can match
+// query into b. Rather than classifying every entry, it collects candidates
+// from the index and classifies only those, which yields the same buckets
+// as a full scan:
+//
+//   - exact and prefix matches form a contiguous run of the sorted names,
+//     found by binary search;
+//   - substring matches contain every trigram of the query, so they are
+//     among the intersected trigram postings;
+//   - fuzzy matches are found by walking the sorted names as a trie,
+//     sharing the edit-distance rows of common prefixes and skipping every
+//     name under a prefix that can no longer come within threshold.
+//
+// Queries shorter than a trigram have no fuzzy tier and are matched by
+// substring against every name.
+func (x *Index) match(release, language, query string, threshold int, b *matchBuckets) {
+	g := x.group(release, language)
+	var candidates []int
+	if len(query) < 3 {
+		for i := g.start; i < g.start+g.count; i++ {
+			if strings.Contains(x.name(i), query) {
+				candidates = append(candidates, i)
+			}
+		}
+	} else {
+		candidates = x.prefixMatches(g, query)
+		candidates = append(candidates, x.trigramMatches(g, query)...)
+		if threshold > 0 {
+			candidates = append(candidates, x.fuzzyMatches(g, query, threshold)...)
+		}
+		sort.Ints(candidates)
+	}
+
+	last := -1
+	for _, i := range candidates {
+		if i == last || i < g.start || i >= g.start+g.count {
+			continue
+		}
+		last = i
+		e := x.entry(i)
+		r := Result{
+			Title:       e.title,
+			Path:        urlPath(release, language, e.section, e.filename),
+			Distro:      release,
+			Section:     e.section,
+			description: e.description,
+		}
+		b.classify(e.lower, query, threshold, r)
+	}
+}
+
+// prefixMatches returns the entries of g whose names start with query.
+func (x *Index) prefixMatches(g indexGroup, query string) []int {
+	first := g.start + sort.Search(g.count, func(i int) bool {
+		return x.name(g.start+i) >= query
+	})
+	var out []int
+	for i := first; i < g.start+g.count && strings.HasPrefix(x.name(i), query); i++ {
+		out = append(out, i)
+	}
+	return out
+}
+
+// trigramMatches returns the entries of g whose names contain every trigram
+// of query, a superset of the names containing query.
+func (x *Index) trigramMatches(g indexGroup, query string) []int {
+	var lists [][]byte
+	for j := 0; j+3 <= len(query); j++ {
+		postings, ok := x.trigramPostings(g, trigramKey(query[j:]))
+		if !ok {
+			return nil
+		}
+		lists = append(lists, postings)
+	}
+	sort.Slice(lists, func(i, j int) bool { return len(lists[i]) < len(lists[j]) })
+
+	out := make([]int, 0, len(lists[0])/4)
+	for k := 0; k < len(lists[0]); k += 4 {
+		out = append(out, int(binary.LittleEndian.Uint32(lists[0][k:])))
+	}
+	for _, list := range lists[1:] {
+		kept := out[:0]
+		k := 0
+		for _, n := range out {
+			for k < len(list) && int(binary.LittleEndian.Uint32(list[k:])) < n {
+				k += 4
+			}
+			if k < len(list) && int(binary.LittleEndian.Uint32(list[k:])) == n {
+				kept = append(kept, n)
+			}
+		}
+		out = kept
+	}
+	return out
+}
+
+// trigramPostings returns the encoded posting list for key in g.
+func (x *Index) trigramPostings(g indexGroup, key uint32) ([]byte, bool) {
+	rec := func(i int) []byte {
+		off := (g.trigramStart + i) * indexTrigramSize
+		return x.trigrams[off : off+indexTrigramSize]
+	}
+	i := sort.Search(g.trigramCount, func(i int) bool {
+		return binary.LittleEndian.Uint32(rec(i)) >= key
+	})
+	if i == g.trigramCount || binary.LittleEndian.Uint32(rec(i)) != key {
+		return nil, false
+	}
+	start := int64(binary.LittleEndian.Uint32(rec(i)[4:])) * 4
+	end := start + int64(binary.LittleEndian.Uint32(rec(i)[8:]))*4
+	if end > int64(len(x.postings)) {
+		return nil, false
+	}
+	return x.postings[start:end], true
+}
+
+// fuzzyMatches returns the entries of g that have a prefix, or are a whole
+// name, within threshold edits of query. These are the only names classify
+// can place in the fuzzy tier: it compares the whole name and prefixes of
+// length len(query)±threshold.
+//
+// Names are visited in sorted order as the leaves of a trie. rows[d] is the
+// optimal string alignment distance row (as in damerauLevenshteinBounded)
+// between the first d bytes of the current name and query, so moving to the
+// next name only recomputes the rows past their common prefix.
+func (x *Index) fuzzyMatches(g indexGroup, query string, threshold int) []int {
+	maxDepth := len(query) + threshold
+	minDepth := max(len(query)-threshold, 1)
+	rows := make([][]int, maxDepth+1)
+	rowMin := make([]int, maxDepth+1)
+	for d := range rows {
+		rows[d] = make([]int, len(query)+1)
+	}
+	for j := range rows[0] {
+		rows[0][j] = j
+	}
+
+	var out []int
+	end := g.start + g.count
+	prev, valid := "", 0
+	for i := g.start; i < end; {
+		name := x.name(i)
+		d := min(commonPrefixLen(prev, name), valid)
+		prev = name
+
+		matched, pruned := false, false
+		for depth := min(len(name), maxDepth); d < depth; {
+			d++
+			rowMin[d] = distanceRow(rows, d, name, query)
+			if d >= minDepth && rows[d][len(query)] <= threshold {
+				matched = true
+				break
+			}
+			// A row can only be lowered from the two rows above it, so
+			// once both exceed the threshold every longer prefix does too.
+			if rowMin[d] > threshold && rowMin[d-1] > threshold {
+				pruned = true
+				break
+			}
+		}
+		valid = d
+
+		switch {
+		case matched:
+			// Every name under this prefix shares the matching row.
+			next := x.prefixEnd(i, end, name[:d])
+			for ; i < next; i++ {
+				out = append(out, i)
+			}
+		case pruned || d == maxDepth:
+			i = x.prefixEnd(i, end, name[:d])
+		default:
+			i++
+		}
+	}
+	return out
+}
+
+// distanceRow computes rows[d] from the two rows above it and returns its
+// minimum.
+func distanceRow(rows [][]int, d int, name, query string) int {
+	prev2, prev, curr := rows[max(d-2, 0)], rows[d-1], rows[d]
+	curr[0] = d
+	rowMin := d
+	for j := 1; j <= len(query); j++ {
+		cost := 1
+		if name[d-1] == query[j-1] {
+			cost = 0
+		}
+		best := min(prev[j]+1, curr[j-1]+1, prev[j-1]+cost)
+		if d > 1 && j > 1 && name[d-1] == query[j-2] && name[d-2] == query[j-1] {
+			best = min(best, prev2[j-2]+cost)
+		}
+		curr[j] = best
+		rowMin = min(rowMin, best)
+	}
+	return rowMin
+}
+
+// prefixEnd returns the first entry in [i, end) whose name does not start
+// with prefix, given that the name of entry i does.
+func (x *Index) prefixEnd(i, end int, prefix string) int {
+	return i + sort.Search(end-i, func(k int) bool {
+		return !strings.HasPrefix(x.name(i+k), prefix)
+	})
+}
+
+func commonPrefixLen(a, b string) int {
+	n := min(len(a), len(b))
+	for i := 0; i < n; i++ {
+		if a[i] != b[i] {
+			return i
+		}
+	}
+	return n
+}
@@ -0,0 +1,153 @@
+package search
+
+import (
+	"context"
+	"fmt"
+	"math/rand"
+	"reflect"
+	"strings"
+	"testing"
+)
+
+var nameParts = []string{
+	"ls", "cat", "grep", "git", "lib", "sys", "ctl", "xml", "ssl", "conf", "add", "user",
+	"mk", "fs", "dev", "net", "ip", "x", "-", "_", "2", "tset", "test", "mount", "a", "e",
+}
+
+// syntheticIndex returns an index of n generated manpages per release.
+func syntheticIndex(releases []string, n int, seed int64) *Index {
+	rng := rand.New(rand.NewSource(seed))
+	groups := make(map[indexKey][]indexEntry, len(releases))
+	for _, rel := range releases {
+		entries := make([]indexEntry, 0, n)
+		seen := make(map[string]bool, n)
+		for len(entries) < n {
+			var name strings.Builder
+			for k := 1 + rng.Intn(4); k > 0; k-- {
+				name.WriteString(nameParts[rng.Intn(len(nameParts))])
+			}
+			section := 1 + rng.Intn(9)
+			filename := fmt.Sprintf("%s.%d.html", name.String(), section)
+			if seen[filename] {
+				// Longer random suffixes keep large indices from running
+				// out of distinct names.
+				filename = fmt.Sprintf("%s%d.%d.html", name.String(), rng.Intn(1000), section)
+				if seen[filename] {
+					continue
+				}
+			}
+			seen[filename] = true
+			entries = append(entries, indexEntry{
+				lower:    strings.ToLower(commandName(filename)),
+				filename: filename,
+				title:    commandName(filename),
+				section:  section,
+			})
+		}
+		groups[indexKey{release: rel}] = entries
+	}
+	idx, err := parseIndex(encodeIndex(groups))
+	if err != nil {
+		panic(err)
+	}
+	return idx
+}
+
+// scanMatch is the reference for Index.match: it classifies every entry.
+func scanMatch(x *Index, release, query string, threshold int, b *matchBuckets) {
+	g := x.group(release, "")
+	for i := g.start; i < g.start+g.count; i++ {
+		e := x.entry(i)
+		r := Result{
+			Title:       e.title,
+			Path:        urlPath(release, "", e.section, e.filename),
+			Distro:      release,
+			Section:     e.section,
+			description: e.description,
+		}
+		b.classify(e.lower, query, threshold, r)
+	}
+}
+
+// mutate applies one random typo to s.
+func mutate(rng *rand.Rand, s string) string {
+	if len(s) < 2 {
+		return s + "x"
+	}
+	i := rng.Intn(len(s) - 1)
+	switch rng.Intn(4) {
+	case 0:
+		return s[:i] + s[i+1:]
+	case 1:
+		return s[:i] + "q" + s[i:]
+	case 2:
+		return s[:i] + "z" + s[i+1:]
+	default:
+		return s[:i] + string(s[i+1]) + string(s[i]) + s[i+2:]
+	}
+}
+
+func TestIndexMatchEqualsScan(t *testing.T) {
+	releases := []string{"jammy", "noble"}
+	x := syntheticIndex(releases, 3000, 1)
+	s := &FSSearcher{}
+	rng := rand.New(rand.NewSource(2))
+
+	queries := []string{"l", "ls", "gi", "grep", "grpe", "test", "tset", "libxml", "sysctl", "zzz", "mount-x"}
+	for i := 0; i < 300; i++ {
+		name := x.name(rng.Intn(x.Len()))
+		switch i % 4 {
+		case 0:
+			queries = append(queries, name)
+		case 1:
+			queries = append(queries, mutate(rng, name))
+		case 2:
+			queries = append(queries, mutate(rng, mutate(rng, name)))
+		default:
+			start := rng.Intn(len(name))
+			queries = append(queries, name[start:start+1+rng.Intn(len(name)-start)])
+		}
+	}
+
+	for _, q := range queries {
+		threshold := fuzzyThreshold(len(q))
+		var want, got matchBuckets
+		for _, rel := range releases {
+			scanMatch(x, rel, q, threshold, &want)
+			x.match(rel, "", q, threshold, &got)
+		}
+		wantResp := s.assembleResults(want, 200, 0)
+		gotResp := s.assembleResults(got, 200, 0)
+		if !reflect.DeepEqual(gotResp, wantResp) {
+			t.Errorf("match(%q) = %d results, scan = %d results", q, gotResp.Total, wantResp.Total)
+		}
+	}
+}
+
+// BenchmarkIndexSearch compares the indexed search with classifying every
+// entry, over 5 releases of 100k manpages each.
+func BenchmarkIndexSearch(b *testing.B) {
+	releases := []string{"focal", "jammy", "noble", "oracular", "plucky"}
+	x := syntheticIndex(releases, 100_000, 1)
+	s := &FSSearcher{releases: releases, index: x}
+
+	for _, q := range []string{"ls", "grep", "grpe", "sysctl", "libxmlssl"} {
+		threshold := fuzzyThreshold(len(q))
+		b.Run("scan/"+q, func(b *testing.B) {
+			for i := 0; i < b.N; i++ {
+				var buckets matchBuckets
+				for _, rel := range releases {
+					scanMatch(x, rel, q, threshold, &buckets)
+				}
+				s.assembleResults(buckets, 50, 0)
+			}
+		})
+		b.Run("index/"+q, func(b *testing.B) {
+			for i := 0; i < b.N; i++ {
+				if _, err := s.Search(context.Background(), q, "", "", 50, 0); err != nil {
+					b.Fatal(err)
+				}
+			}
+		})
+	}
+}
@@ -10,6 +10,13 @@ import (
 type Searcher interface {
 	Search(ctx context.Context, query, distro, language string, limit, offset int) (SearchResponse, error)
 	Rebuild()
+	// Apply updates the index with the pages listed in an ingest journal
+	// and returns the number of index entries that changed.
+	Apply(journal *Journal) (int, error)
+	// SuffixedVariant returns the suffixed manpage, such as
+	// SSL_connect.3ssl.html, that a cross-reference to a missing filename
+	// such as SSL_connect.3.html means, or "".
+	SuffixedVariant(release, language string, section int, filename string) string
 	Close() error
 }
 
@@ -30,6 +37,10 @@ type Result struct {
 	Distro    string    `json:"distro"`
 	Section   int       `json:"section"`
 	MatchType MatchType `json:"match_type"`
+
+	// description is carried from the index entry until the result is
+	// paginated and its Title formatted.
+	description string
 }
 
 // SearchResponse is the paginated response returned by a Searcher.
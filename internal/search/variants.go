@@ -0,0 +1,88 @@
+package search
+
+import (
+	"strings"
+	"sync"
+)
+
+// variantKey identifies the manpages a cross-reference to a section may
+// mean: the filename stem up to and including the section digit, such as
+// "SSL_connect.3", within one section directory.
+type variantKey struct {
+	section int
+	stem    string
+}
+
+// variantTables holds, per release and language, the suffixed manpages of
+// an index by the stem a cross-reference to them produces. Mandoc links
+// .Xr SSL_connect 3 to SSL_connect.3.html, while the page is installed as
+// SSL_connect.3ssl.html. Tables are built from the index entries on first
+// use, so mapping an index stays a single mmap.
+type variantTables struct {
+	mu     sync.Mutex
+	tables map[indexKey]map[variantKey]string
+}
+
+// suffixedStem returns the stem of a manpage filename with a section
+// suffix, "SSL_connect.3" for "SSL_connect.3ssl.html", and false for one
+// without, such as "ls.1.html".
+func suffixedStem(filename string) (string, bool) {
+	name := strings.TrimSuffix(filename, ".html")
+	dot := strings.LastIndex(name, ".")
+	if dot <= 0 || len(name)-dot <= 2 || name[dot+1] < '1' || name[dot+1] > '9' {
+		return "", false
+	}
+	return name[:dot+2], true
+}
+
+// variants returns the variant table of a release and language, building
+// it from the group's entries if needed. Its strings point into the index
+// data.
+func (x *Index) variants(key indexKey) map[variantKey]string {
+	x.variantTables.mu.Lock()
+	defer x.variantTables.mu.Unlock()
+	if table, ok := x.variantTables.tables[key]; ok {
+		return table
+	}
+	if x.variantTables.tables == nil {
+		x.variantTables.tables = make(map[indexKey]map[variantKey]string)
+	}
+	table := make(map[variantKey]string)
+	if g, ok := x.groups[key]; ok {
+		for i := g.start; i < g.start+g.count; i++ {
+			e := x.entry(i)
+			stem, ok := suffixedStem(e.filename)
+			if !ok {
+				continue
+			}
+			// Entries are sorted by name, section and filename, so the
+			// first variant by filename wins, as a directory scan would.
+			k := variantKey{section: e.section, stem: stem}
+			if _, ok := table[k]; !ok {
+				table[k] = e.filename
+			}
+		}
+	}
+	x.variantTables.tables[key] = table
+	return table
+}
+
+// SuffixedVariant returns the filename of the manpage in a section
+// directory of release and language that a cross-reference to filename
+// means when filename itself does not exist: SSL_connect.3ssl.html for
+// SSL_connect.3.html. It returns "" when the index has no such page. The
+// lookup is a map access once the release and language have been looked
+// up before.
+func (s *FSSearcher) SuffixedVariant(release, language string, section int, filename string) string {
+	name, ok := strings.CutSuffix(filename, ".html")
+	if !ok {
+		return ""
+	}
+	s.mu.RLock()
+	defer s.mu.RUnlock()
+	variant := s.index.variants(indexKey{release: release, language: language})[variantKey{section: section, stem: name}]
+	if variant == filename {
+		return ""
+	}
+	return strings.Clone(variant)
+}
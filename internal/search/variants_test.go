@@ -0,0 +1,60 @@
+package search
+
+import (
+	"path/filepath"
+	"testing"
+)
+
+func TestSuffixedStem(t *testing.T) {
+	for filename, want := range map[string]string{
+		"SSL_connect.3ssl.html": "SSL_connect.3",
+		"Carp.3perl.html":       "Carp.3",
+		"ls.1.html":             "",
+		"README.html":           "",
+		"v1.2.x.html":           "",
+	} {
+		if got, _ := suffixedStem(filename); got != want {
+			t.Errorf("suffixedStem(%q) = %q, want %q", filename, got, want)
+		}
+	}
+}
+
+func TestSuffixedVariant(t *testing.T) {
+	root := t.TempDir()
+	writeManpage(t, root, "noble", "", 3, "SSL_connect.3ssl.html", "SSL_connect", "")
+	writeManpage(t, root, "noble", "", 3, "printf.3.html", "printf", "")
+	writeManpage(t, root, "noble", "", 3, "printf.3posix.html", "printf", "")
+	writeManpage(t, root, "noble", "de", 3, "Carp.3perl.html", "Carp", "")
+
+	s := NewFSSearcherWithIndex(root, []string{"noble"}, filepath.Join(root, "search.db"))
+	defer func() { _ = s.Close() }()
+	for _, tt := range []struct {
+		language string
+		section  int
+		filename string
+		want     string
+	}{
+		{"", 3, "SSL_connect.3.html", "SSL_connect.3ssl.html"},
+		{"", 1, "SSL_connect.3.html", ""},
+		{"", 3, "printf.3.html", "printf.3posix.html"},
+		{"", 3, "printf.3posix.html", ""},
+		{"", 3, "missing.3.html", ""},
+		{"de", 3, "Carp.3.html", "Carp.3perl.html"},
+		{"", 3, "Carp.3.html", ""},
+	} {
+		if got := s.SuffixedVariant("noble", tt.language, tt.section, tt.filename); got != tt.want {
+			t.Errorf("SuffixedVariant(%q, %d, %q) = %q, want %q", tt.language, tt.section, tt.filename, got, tt.want)
+		}
+	}
+
+	// The table follows the index when it is replaced.
+	writeManpage(t, root, "noble", "", 3, "BIO_new.3ssl.html", "BIO_new", "")
+	journal := NewJournal()
+	journal.Record("noble", "manpages/noble/man3/BIO_new.3ssl.html", false)
+	if _, err := s.Apply(journal); err != nil {
+		t.Fatal(err)
+	}
+	if got := s.SuffixedVariant("noble", "", 3, "BIO_new.3.html"); got != "BIO_new.3ssl.html" {
+		t.Errorf("SuffixedVariant after Apply = %q, want BIO_new.3ssl.html", got)
+	}
+}
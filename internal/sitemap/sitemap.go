@@ -1,17 +1,35 @@
 package sitemap
 
 import (
+	"bufio"
+	"bytes"
+	"compress/gzip"
 	"context"
+	"encoding/json"
 	"encoding/xml"
+	"errors"
 	"fmt"
+	"io"
+	"io/fs"
 	"log/slog"
 	"os"
+	"path"
 	"path/filepath"
 	"strings"
-	"time"
+	"sync"
 )
 
-const maxSitemapURLs = 50000
+// StateFile is the name, under the public HTML root, of the record of the
+// sitemaps last written: the site URL they were written for and, per
+// section directory, its modification time and the sitemap files written
+// from it.
+const StateFile = "sitemap-state.json"
+
+// readDirBatch is the number of directory entries read at a time.
+const readDirBatch = 1024
+
+// lastModLayout is the W3C date format used for lastmod values.
+const lastModLayout = "2006-01-02"
 
 type sitemapURL struct {
 	XMLName xml.Name `xml:"url"`
@@ -37,216 +55,492 @@ type sitemapIndexRef struct {
 	LastMod string   `xml:"lastmod,omitempty"`
 }
 
-// SitemapGenerator creates sitemap XML files by walking the manpages directory tree.
+// generatorState is the content of StateFile.
+type generatorState struct {
+	SiteURL string `json:"site_url"`
+	// Sections are keyed by section directory relative to the root, for
+	// example "manpages/noble/man1" or "manpages/noble/de/man1".
+	Sections map[string]*sectionState `json:"sections"`
+}
+
+// sectionState records the sitemaps written for a section directory. The
+// directory's modification time changes whenever ingest adds, replaces or
+// removes a page in it, so a section whose directory has the recorded time
+// has the recorded sitemaps.
+type sectionState struct {
+	ModTime int64          `json:"mtime"` // Unix nanoseconds
+	Files   []sitemapShard `json:"files"`
+}
+
+// sitemapShard is a sitemap file and the newest lastmod of its URLs.
+type sitemapShard struct {
+	Name    string `json:"name"`
+	LastMod string `json:"lastmod,omitempty"`
+}
+
+// generateStats reports what a Generate call did.
+type generateStats struct {
+	// Sections is the number of section directories found.
+	Sections int
+	// Written is the number of sections whose sitemaps were regenerated
+	// from their pages, and Rehosted the number only rewritten for a new
+	// site URL.
+	Written  int
+	Rehosted int
+	// Removed is the number of sitemap files deleted because their section
+	// no longer exists or has fewer pages.
+	Removed int
+}
+
+// SitemapGenerator creates sitemap XML files by walking the manpages
+// directory tree. It keeps a record of what it wrote in StateFile, and
+// only regenerates the sitemaps of sections that changed since.
 type SitemapGenerator struct {
 	Root    string // PublicHTMLDir
 	SiteURL string // e.g. "https://manpages.ubuntu.com"
 	Logger  *slog.Logger
+	// Pages is the tree below Root to walk, such as a storage.Pages; nil
+	// walks the files under Root.
+	Pages fs.FS
+	// Gzip writes the sitemaps of man sections gzip-compressed, as
+	// .xml.gz files, which the server sends as they are.
+	Gzip bool
+
+	mu sync.Mutex // serializes Generate
 }
 
-// Generate creates sitemap files for all releases. It writes per-release-per-section
-// sitemaps plus a sitemap index to {Root}/sitemaps/.
+func (g *SitemapGenerator) pages() fs.FS {
+	if g.Pages != nil {
+		return g.Pages
+	}
+	return os.DirFS(g.Root)
+}
+
+// Generate brings the sitemaps of all releases up to date. It writes
+// per-release-per-section sitemaps plus a sitemap index to {Root}/sitemaps/.
+// Sections whose directory is unchanged since the last call keep their
+// sitemaps; when only the site URL changed, their URLs are rewritten from
+// the existing sitemaps without reading the tree. Each URL's lastmod is the
+// modification time ingest gave its page, and each sitemap's the newest of
+// its URLs', so unchanged sitemaps do not look new to crawlers. Files whose
+// content is unchanged are not rewritten.
 func (g *SitemapGenerator) Generate(ctx context.Context, releases []string) error {
+	g.mu.Lock()
+	defer g.mu.Unlock()
+
 	sitemapDir := filepath.Join(g.Root, "sitemaps")
 	if err := os.MkdirAll(sitemapDir, 0o755); err != nil {
 		return fmt.Errorf("create sitemaps dir: %w", err)
 	}
 
-	now := time.Now().UTC().Format("2006-01-02")
+	prev := g.loadState()
+	next := &generatorState{SiteURL: g.SiteURL, Sections: make(map[string]*sectionState)}
+	var stats generateStats
 	var indexRefs []sitemapIndexRef
-
-	// Static pages sitemap.
-	staticURLs := []sitemapURL{
-		{Loc: g.SiteURL + "/", LastMod: now},
-		{Loc: g.SiteURL + "/search", LastMod: now},
-		{Loc: g.SiteURL + "/manpages/", LastMod: now},
-	}
-	for _, rel := range releases {
-		staticURLs = append(staticURLs, sitemapURL{
-			Loc:     g.SiteURL + "/manpages/" + rel + "/",
-			LastMod: now,
-		})
-	}
-	staticFile := "sitemap-static.xml"
-	if err := g.writeSitemap(filepath.Join(sitemapDir, staticFile), staticURLs); err != nil {
-		return fmt.Errorf("write static sitemap: %w", err)
-	}
-	indexRefs = append(indexRefs, sitemapIndexRef{
-		Loc:     g.SiteURL + "/sitemaps/" + staticFile,
-		LastMod: now,
-	})
+	releaseLastMod := make(map[string]string, len(releases))
 
 	// Per-release, per-section sitemaps.
 	for _, release := range releases {
 		if ctx.Err() != nil {
 			return ctx.Err()
 		}
-		releaseDir := filepath.Join(g.Root, "manpages", release)
-		entries, err := os.ReadDir(releaseDir)
+		dirs, err := g.sectionDirs(release)
 		if err != nil {
-			if os.IsNotExist(err) {
+			return err
+		}
+		for _, dir := range dirs {
+			if ctx.Err() != nil {
+				return ctx.Err()
+			}
+			stats.Sections++
+			section, err := g.updateSection(ctx, sitemapDir, dir, prev, &stats)
+			if err != nil {
+				g.Logger.Warn("sitemap section error", "release", release, "dir", dir.path, "error", err)
+				// Keep serving what was written before.
+				section = prev.Sections[dir.path]
+			}
+			if section == nil {
 				continue
 			}
-			return fmt.Errorf("read release dir %s: %w", release, err)
+			next.Sections[dir.path] = section
+			for _, f := range section.Files {
+				indexRefs = append(indexRefs, sitemapIndexRef{
+					Loc:     g.SiteURL + "/sitemaps/" + f.Name,
+					LastMod: f.LastMod,
+				})
+				releaseLastMod[release] = max(releaseLastMod[release], f.LastMod)
+			}
 		}
+	}
 
-		for _, entry := range entries {
-			if !entry.IsDir() {
+	// Sitemaps of sections that are gone, or of shards a section no longer
+	// fills.
+	written := make(map[string]bool)
+	for _, section := range next.Sections {
+		for _, f := range section.Files {
+			written[f.Name] = true
+		}
+	}
+	for _, section := range prev.Sections {
+		for _, f := range section.Files {
+			if written[f.Name] {
 				continue
 			}
-			name := entry.Name()
-			// Match man sections (man1..man9) and language subdirectories.
-			sectionDir := filepath.Join(releaseDir, name)
-			refs, err := g.generateSection(ctx, sitemapDir, release, name, sectionDir)
-			if err != nil {
-				g.Logger.Warn("sitemap section error", "release", release, "dir", name, "error", err)
-				continue
+			if err := os.Remove(filepath.Join(sitemapDir, f.Name)); err == nil {
+				stats.Removed++
 			}
-			indexRefs = append(indexRefs, refs...)
 		}
 	}
 
+	// Static pages sitemap, dated by the newest page of the site or of each
+	// release.
+	var siteLastMod string
+	for _, lastMod := range releaseLastMod {
+		siteLastMod = max(siteLastMod, lastMod)
+	}
+	staticURLs := []sitemapURL{
+		{Loc: g.SiteURL + "/", LastMod: siteLastMod},
+		{Loc: g.SiteURL + "/search", LastMod: siteLastMod},
+		{Loc: g.SiteURL + "/manpages/", LastMod: siteLastMod},
+	}
+	for _, rel := range releases {
+		staticURLs = append(staticURLs, sitemapURL{
+			Loc:     g.SiteURL + "/manpages/" + rel + "/",
+			LastMod: releaseLastMod[rel],
+		})
+	}
+	staticFile := "sitemap-static.xml"
+	if err := writeSitemap(filepath.Join(sitemapDir, staticFile), staticURLs); err != nil {
+		return fmt.Errorf("write static sitemap: %w", err)
+	}
+	indexRefs = append([]sitemapIndexRef{{
+		Loc:     g.SiteURL + "/sitemaps/" + staticFile,
+		LastMod: siteLastMod,
+	}}, indexRefs...)
+
 	// Write the sitemap index.
 	idx := sitemapIndex{
-		XMLNS:    "http://www.sitemaps.org/schemas/sitemap/0.9",
+		XMLNS:    sitemapNS,
 		Sitemaps: indexRefs,
 	}
 	indexPath := filepath.Join(sitemapDir, "sitemap-index.xml")
-	return writeXML(indexPath, idx)
+	if err := writeXML(indexPath, idx); err != nil {
+		return err
+	}
+	if err := g.saveState(next); err != nil {
+		g.Logger.Warn("failed to save sitemap state", "error", err)
+	}
+	g.Logger.Info("sitemaps updated", "sections", stats.Sections, "written", stats.Written,
+		"rehosted", stats.Rehosted, "removed", stats.Removed)
+	return nil
 }
 
-// generateSection creates sitemaps for a single directory under a release.
-// For man section directories (man1-man9) it walks .html files directly.
-// For language directories, it recurses into their man sections.
-func (g *SitemapGenerator) generateSection(ctx context.Context, sitemapDir, release, dirName, dirPath string) ([]sitemapIndexRef, error) {
-	if strings.HasPrefix(dirName, "man") {
-		return g.generateManSection(ctx, sitemapDir, release, dirName, dirPath, "")
-	}
+// sectionDir is a man section directory of a release, for example
+// "manpages/noble/man1" (lang "") or "manpages/noble/de/man1" (lang "de").
+type sectionDir struct {
+	path, release, lang, section string
+}
 
-	// Language subdirectory — look for man sections within it.
-	var refs []sitemapIndexRef
-	entries, err := os.ReadDir(dirPath)
+// sectionDirs returns the man section directories of release: its man*
+// directories and those of its language subdirectories.
+func (g *SitemapGenerator) sectionDirs(release string) ([]sectionDir, error) {
+	releaseDir := path.Join("manpages", release)
+	entries, err := fs.ReadDir(g.pages(), releaseDir)
 	if err != nil {
-		return nil, err
+		if errors.Is(err, fs.ErrNotExist) {
+			return nil, nil
+		}
+		return nil, fmt.Errorf("read release dir %s: %w", release, err)
 	}
+
+	var dirs []sectionDir
 	for _, entry := range entries {
-		if !entry.IsDir() || !strings.HasPrefix(entry.Name(), "man") {
+		name := entry.Name()
+		if !entry.IsDir() || strings.HasPrefix(name, ".") {
 			continue
 		}
-		sectionDir := filepath.Join(dirPath, entry.Name())
-		r, err := g.generateManSection(ctx, sitemapDir, release, entry.Name(), sectionDir, dirName)
+		dirPath := path.Join(releaseDir, name)
+		if strings.HasPrefix(name, "man") {
+			dirs = append(dirs, sectionDir{path: dirPath, release: release, section: name})
+			continue
+		}
+
+		// Language subdirectory — look for man sections within it.
+		langEntries, err := fs.ReadDir(g.pages(), dirPath)
 		if err != nil {
-			g.Logger.Warn("sitemap lang section error", "release", release, "lang", dirName, "section", entry.Name(), "error", err)
+			g.Logger.Warn("sitemap section error", "release", release, "dir", name, "error", err)
 			continue
 		}
-		refs = append(refs, r...)
+		for _, e := range langEntries {
+			if e.IsDir() && strings.HasPrefix(e.Name(), "man") {
+				dirs = append(dirs, sectionDir{path: path.Join(dirPath, e.Name()), release: release, lang: name, section: e.Name()})
+			}
+		}
 	}
-	return refs, nil
+	return dirs, nil
 }
 
-func (g *SitemapGenerator) generateManSection(ctx context.Context, sitemapDir, release, section, sectionDir, lang string) ([]sitemapIndexRef, error) {
-	entries, err := os.ReadDir(sectionDir)
+// updateSection returns the sitemaps of dir, writing them if dir changed
+// since prev was recorded, or rewriting their URLs if only the site URL
+// did. It returns nil for a section without pages.
+func (g *SitemapGenerator) updateSection(ctx context.Context, sitemapDir string, dir sectionDir, prev *generatorState, stats *generateStats) (*sectionState, error) {
+	// Stat before reading, so that a page written meanwhile changes the
+	// directory after the time that is recorded.
+	info, err := fs.Stat(g.pages(), dir.path)
 	if err != nil {
 		return nil, err
 	}
+	modTime := info.ModTime().UnixNano()
 
-	var urls []sitemapURL
-	for _, entry := range entries {
-		if ctx.Err() != nil {
-			return nil, ctx.Err()
+	if old := prev.Sections[dir.path]; old != nil && old.ModTime == modTime && !info.ModTime().IsZero() && g.compressedAsConfigured(old.Files) {
+		if prev.SiteURL == g.SiteURL && sitemapsExist(sitemapDir, old.Files) {
+			return old, nil
 		}
-		name := entry.Name()
-		if !strings.HasSuffix(name, ".html") {
-			continue
-		}
-		var urlPath string
-		if lang != "" {
-			urlPath = fmt.Sprintf("/manpages/%s/%s/%s/%s", release, lang, section, name)
-		} else {
-			urlPath = fmt.Sprintf("/manpages/%s/%s/%s", release, section, name)
+		if err := g.rehost(sitemapDir, old.Files, prev.SiteURL); err == nil {
+			stats.Rehosted++
+			return old, nil
 		}
+	}
+
+	files, err := g.generateManSection(ctx, sitemapDir, dir)
+	if err != nil {
+		return nil, err
+	}
+	stats.Written++
+	if len(files) == 0 {
+		return nil, nil
+	}
+	return &sectionState{ModTime: modTime, Files: files}, nil
+}
 
-		var lastmod string
-		if info, err := entry.Info(); err == nil {
-			lastmod = info.ModTime().UTC().Format("2006-01-02")
+// compressedAsConfigured reports whether the sitemaps in files are
+// compressed if and only if the generator compresses them.
+func (g *SitemapGenerator) compressedAsConfigured(files []sitemapShard) bool {
+	for _, f := range files {
+		if strings.HasSuffix(f.Name, ".gz") != g.Gzip {
+			return false
 		}
+	}
+	return true
+}
 
-		urls = append(urls, sitemapURL{
-			Loc:     g.SiteURL + urlPath,
-			LastMod: lastmod,
-		})
+// sitemapsExist reports whether every sitemap in files is on disk.
+func sitemapsExist(sitemapDir string, files []sitemapShard) bool {
+	for _, f := range files {
+		if _, err := os.Stat(filepath.Join(sitemapDir, f.Name)); err != nil {
+			return false
+		}
 	}
+	return true
+}
 
-	if len(urls) == 0 {
-		return nil, nil
+// rehost rewrites the URLs of the sitemaps in files from the site URL
+// oldSite to the current one.
+func (g *SitemapGenerator) rehost(sitemapDir string, files []sitemapShard, oldSite string) error {
+	for _, f := range files {
+		if err := g.rehostFile(filepath.Join(sitemapDir, f.Name), oldSite); err != nil {
+			return fmt.Errorf("%s: %w", f.Name, err)
+		}
 	}
+	return nil
+}
 
-	// Split into chunks if exceeding the limit.
-	var refs []sitemapIndexRef
-	now := time.Now().UTC().Format("2006-01-02")
+// rehostFile rewrites the sitemap at path one URL at a time.
+func (g *SitemapGenerator) rehostFile(path, oldSite string) error {
+	in, err := os.Open(path)
+	if err != nil {
+		return err
+	}
+	defer in.Close()
+	var r io.Reader = bufio.NewReader(in)
+	compressed := strings.HasSuffix(path, ".gz")
+	if compressed {
+		zr, err := gzip.NewReader(r)
+		if err != nil {
+			return err
+		}
+		defer zr.Close()
+		r = zr
+	}
 
-	chunks := splitURLs(urls, maxSitemapURLs)
-	for i, chunk := range chunks {
-		var filename string
-		if lang != "" {
-			filename = fmt.Sprintf("sitemap-%s-%s-%s", release, lang, section)
-		} else {
-			filename = fmt.Sprintf("sitemap-%s-%s", release, section)
+	w, err := newURLSetWriter(filepath.Dir(path), compressed, maxSitemapURLs, maxSitemapBytes)
+	if err != nil {
+		return err
+	}
+	dec := xml.NewDecoder(r)
+	for {
+		tok, err := dec.Token()
+		if errors.Is(err, io.EOF) {
+			break
+		}
+		if err != nil {
+			w.abort()
+			return err
+		}
+		start, ok := tok.(xml.StartElement)
+		if !ok || start.Name.Local != "url" {
+			continue
+		}
+		var u sitemapURL
+		if err := dec.DecodeElement(&u, &start); err != nil {
+			w.abort()
+			return err
 		}
-		if len(chunks) > 1 {
-			filename = fmt.Sprintf("%s-%d", filename, i+1)
+		rest, ok := strings.CutPrefix(u.Loc, oldSite)
+		if !ok {
+			w.abort()
+			return fmt.Errorf("URL %s is not below %s", u.Loc, oldSite)
 		}
-		filename += ".xml"
+		u.Loc = g.SiteURL + rest
+		if ok, err := w.add(u); !ok || err != nil {
+			w.abort()
+			if err == nil {
+				err = fmt.Errorf("URL %s does not fit in the sitemap", u.Loc)
+			}
+			return err
+		}
+	}
+	return w.commit(path)
+}
+
+// generateManSection writes the sitemaps of the pages in a man section
+// directory and returns them. The directory is read a batch of entries at a
+// time and each URL streamed to its sitemap, so memory use does not grow
+// with the size of the section.
+func (g *SitemapGenerator) generateManSection(ctx context.Context, sitemapDir string, dir sectionDir) ([]sitemapShard, error) {
+	f, err := g.pages().Open(dir.path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	d, ok := f.(fs.ReadDirFile)
+	if !ok {
+		return nil, &fs.PathError{Op: "readdir", Path: dir.path, Err: errors.New("not a directory")}
+	}
 
-		if err := g.writeSitemap(filepath.Join(sitemapDir, filename), chunk); err != nil {
+	urlPrefix := g.SiteURL + "/manpages/" + dir.release + "/"
+	base := "sitemap-" + dir.release + "-"
+	if dir.lang != "" {
+		urlPrefix += dir.lang + "/"
+		base += dir.lang + "-"
+	}
+	urlPrefix += dir.section + "/"
+	base += dir.section
+
+	w := newShardWriter(sitemapDir, base, g.Gzip)
+	for {
+		if ctx.Err() != nil {
+			w.abort()
+			return nil, ctx.Err()
+		}
+		entries, err := d.ReadDir(readDirBatch)
+		for _, entry := range entries {
+			name := entry.Name()
+			if !strings.HasSuffix(name, ".html") {
+				continue
+			}
+			var lastmod string
+			if info, err := entry.Info(); err == nil {
+				lastmod = info.ModTime().UTC().Format(lastModLayout)
+			}
+			if err := w.add(sitemapURL{Loc: urlPrefix + name, LastMod: lastmod}); err != nil {
+				w.abort()
+				return nil, err
+			}
+		}
+		if errors.Is(err, io.EOF) || (err == nil && len(entries) == 0) {
+			break
+		}
+		if err != nil {
+			w.abort()
 			return nil, err
 		}
-		refs = append(refs, sitemapIndexRef{
-			Loc:     g.SiteURL + "/sitemaps/" + filename,
-			LastMod: now,
-		})
 	}
-
-	return refs, nil
+	return w.commit()
 }
 
-func (g *SitemapGenerator) writeSitemap(path string, urls []sitemapURL) error {
-	urlset := sitemapURLSet{
-		XMLNS: "http://www.sitemaps.org/schemas/sitemap/0.9",
-		URLs:  urls,
+// loadState returns the recorded state, or an empty one when there is none
+// or it cannot be read, which regenerates every section.
+func (g *SitemapGenerator) loadState() *generatorState {
+	state := &generatorState{}
+	data, err := os.ReadFile(filepath.Join(g.Root, StateFile))
+	if err == nil {
+		err = json.Unmarshal(data, state)
+	}
+	if err != nil && !errors.Is(err, fs.ErrNotExist) {
+		g.Logger.Warn("ignoring unreadable sitemap state", "error", err)
+		state = &generatorState{}
 	}
-	return writeXML(path, urlset)
+	if state.Sections == nil {
+		state.Sections = make(map[string]*sectionState)
+	}
+	return state
 }
 
-func writeXML(path string, v any) error {
-	f, err := os.Create(path)
+func (g *SitemapGenerator) saveState(state *generatorState) error {
+	data, err := json.Marshal(state)
 	if err != nil {
 		return err
 	}
-	defer func() { _ = f.Close() }()
+	return writeFileAtomic(filepath.Join(g.Root, StateFile), data)
+}
 
-	if _, err := f.WriteString(xml.Header); err != nil {
+// writeSitemap writes urls to path as one sitemap.
+func writeSitemap(path string, urls []sitemapURL) error {
+	w, err := newURLSetWriter(filepath.Dir(path), false, maxSitemapURLs, maxSitemapBytes)
+	if err != nil {
 		return err
 	}
-	enc := xml.NewEncoder(f)
+	for _, u := range urls {
+		if ok, err := w.add(u); !ok || err != nil {
+			w.abort()
+			if err == nil {
+				err = fmt.Errorf("URL %s does not fit in the sitemap", u.Loc)
+			}
+			return err
+		}
+	}
+	return w.commit(path)
+}
+
+// writeXML writes v to path as an XML document, leaving the file alone when
+// it already holds the same document so that its validators do not change.
+func writeXML(path string, v any) error {
+	var buf bytes.Buffer
+	buf.WriteString(xml.Header)
+	enc := xml.NewEncoder(&buf)
 	enc.Indent("", "  ")
 	if err := enc.Encode(v); err != nil {
 		return err
 	}
-	return enc.Close()
+	if err := enc.Close(); err != nil {
+		return err
+	}
+	if old, err := os.ReadFile(path); err == nil && bytes.Equal(old, buf.Bytes()) {
+		return nil
+	}
+	return writeFileAtomic(path, buf.Bytes())
 }
 
-func splitURLs(urls []sitemapURL, maxPerFile int) [][]sitemapURL {
-	if len(urls) <= maxPerFile {
-		return [][]sitemapURL{urls}
+// writeFileAtomic writes data to a temporary file next to path and renames
+// it into place, so the server never serves a partial sitemap.
+func writeFileAtomic(path string, data []byte) error {
+	f, err := os.CreateTemp(filepath.Dir(path), "."+filepath.Base(path)+".tmp-*")
+	if err != nil {
+		return err
 	}
-	var chunks [][]sitemapURL
-	for i := 0; i < len(urls); i += maxPerFile {
-		end := i + maxPerFile
-		if end > len(urls) {
-			end = len(urls)
-		}
-		chunks = append(chunks, urls[i:end])
+	_, err = f.Write(data)
+	if err == nil {
+		err = f.Chmod(0o644)
+	}
+	if closeErr := f.Close(); err == nil {
+		err = closeErr
+	}
+	if err == nil {
+		err = os.Rename(f.Name(), path)
+	}
+	if err != nil {
+		_ = os.Remove(f.Name())
 	}
-	return chunks
+	return err
 }
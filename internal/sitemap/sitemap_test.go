@@ -1,13 +1,21 @@
 package sitemap
 
 import (
+	"compress/gzip"
 	"context"
 	"encoding/xml"
+	"fmt"
+	"io"
+	"io/fs"
 	"log/slog"
 	"os"
 	"path/filepath"
+	"runtime"
+	"runtime/metrics"
 	"strings"
 	"testing"
+	"testing/fstest"
+	"time"
 )
 
 func TestSitemapGenerator_Generate(t *testing.T) {
@@ -149,26 +157,336 @@ func TestSitemapGenerator_EmptyRelease(t *testing.T) {
 	}
 }
 
-func TestSplitURLs(t *testing.T) {
+func TestShardWriterRollsOver(t *testing.T) {
+	dir := t.TempDir()
 	urls := make([]sitemapURL, 5)
 	for i := range urls {
-		urls[i] = sitemapURL{Loc: "http://example.com/" + string(rune('a'+i))}
+		urls[i] = sitemapURL{Loc: "http://example.com/" + string(rune('a'+i)), LastMod: fmt.Sprintf("2025-03-0%d", i+1)}
+	}
+	write := func(base string, maxURLs, maxBytes int) []sitemapShard {
+		t.Helper()
+		w := newShardWriter(dir, base, false)
+		w.maxURLs, w.maxBytes = maxURLs, maxBytes
+		for _, u := range urls {
+			if err := w.add(u); err != nil {
+				t.Fatal(err)
+			}
+		}
+		files, err := w.commit()
+		if err != nil {
+			t.Fatal(err)
+		}
+		return files
+	}
+
+	// Under the limits, one sitemap laid out as xml.Encoder would.
+	files := write("single", 10, maxSitemapBytes)
+	if len(files) != 1 || files[0].Name != "single.xml" || files[0].LastMod != "2025-03-05" {
+		t.Fatalf("files = %+v, want single.xml dated 2025-03-05", files)
+	}
+	want := filepath.Join(dir, "encoded.xml")
+	if err := writeXML(want, sitemapURLSet{XMLNS: sitemapNS, URLs: urls}); err != nil {
+		t.Fatal(err)
+	}
+	if !sameContent(filepath.Join(dir, "single.xml"), want) {
+		t.Error("streamed sitemap differs from the encoded one")
+	}
+
+	// By URL count.
+	files = write("count", 2, maxSitemapBytes)
+	if got := fmt.Sprint(files); got != "[{count-1.xml 2025-03-02} {count-2.xml 2025-03-04} {count-3.xml 2025-03-05}]" {
+		t.Errorf("files = %s", got)
+	}
+
+	// By size: each URL entry takes 88 bytes.
+	files = write("size", 10, len(urlsetStart)+3*88+len(urlsetEnd))
+	if len(files) != 2 {
+		t.Fatalf("files = %+v, want 2", files)
+	}
+	for i, n := range []int{3, 2} {
+		data, err := os.ReadFile(filepath.Join(dir, files[i].Name))
+		if err != nil {
+			t.Fatal(err)
+		}
+		var urlset sitemapURLSet
+		if err := xml.Unmarshal(data, &urlset); err != nil {
+			t.Fatal(err)
+		}
+		if len(urlset.URLs) != n {
+			t.Errorf("%s has %d URLs, want %d", files[i].Name, len(urlset.URLs), n)
+		}
+	}
+
+	// No temporary file is left behind.
+	entries, _ := os.ReadDir(dir)
+	for _, e := range entries {
+		if strings.HasPrefix(e.Name(), ".") {
+			t.Errorf("temporary file %s left behind", e.Name())
+		}
+	}
+}
+
+func TestSitemapGenerator_Gzip(t *testing.T) {
+	dir := t.TempDir()
+	logger := slog.New(slog.NewTextHandler(io.Discard, nil))
+	man1Dir := filepath.Join(dir, "manpages", "noble", "man1")
+	if err := os.MkdirAll(man1Dir, 0o755); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(man1Dir, "ls.1.html"), []byte("<p>test</p>"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	gen := &SitemapGenerator{Root: dir, SiteURL: "https://manpages.ubuntu.com", Logger: logger, Gzip: true}
+	ctx := context.Background()
+	if err := gen.Generate(ctx, []string{"noble"}); err != nil {
+		t.Fatal(err)
+	}
+
+	readGzip := func() sitemapURLSet {
+		t.Helper()
+		f, err := os.Open(filepath.Join(dir, "sitemaps", "sitemap-noble-man1.xml.gz"))
+		if err != nil {
+			t.Fatal(err)
+		}
+		defer f.Close()
+		zr, err := gzip.NewReader(f)
+		if err != nil {
+			t.Fatal(err)
+		}
+		var urlset sitemapURLSet
+		if err := xml.NewDecoder(zr).Decode(&urlset); err != nil {
+			t.Fatal(err)
+		}
+		return urlset
+	}
+	if urlset := readGzip(); len(urlset.URLs) != 1 || urlset.URLs[0].Loc != "https://manpages.ubuntu.com/manpages/noble/man1/ls.1.html" {
+		t.Errorf("gzipped sitemap URLs = %+v", urlset.URLs)
+	}
+	index, err := os.ReadFile(filepath.Join(dir, "sitemaps", "sitemap-index.xml"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	if !strings.Contains(string(index), "/sitemaps/sitemap-noble-man1.xml.gz<") {
+		t.Errorf("index does not list the gzipped sitemap:\n%s", index)
+	}
+
+	// Rehosting keeps the sitemap compressed.
+	gen.SiteURL = "https://manpages.example.com"
+	if err := gen.Generate(ctx, []string{"noble"}); err != nil {
+		t.Fatal(err)
+	}
+	if urlset := readGzip(); urlset.URLs[0].Loc != "https://manpages.example.com/manpages/noble/man1/ls.1.html" {
+		t.Errorf("rehosted URL = %s", urlset.URLs[0].Loc)
+	}
+
+	// Turning compression off replaces the gzipped sitemap.
+	gen.Gzip = false
+	if err := gen.Generate(ctx, []string{"noble"}); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := os.Stat(filepath.Join(dir, "sitemaps", "sitemap-noble-man1.xml")); err != nil {
+		t.Errorf("uncompressed sitemap: %v", err)
+	}
+	if _, err := os.Stat(filepath.Join(dir, "sitemaps", "sitemap-noble-man1.xml.gz")); !os.IsNotExist(err) {
+		t.Errorf("gzipped sitemap still there: %v", err)
+	}
+}
+
+// countingFS counts the directories read from an fs.FS.
+type countingFS struct {
+	fstest.MapFS
+	reads map[string]int
+}
+
+func (c *countingFS) Open(name string) (fs.File, error) {
+	f, err := c.MapFS.Open(name)
+	if err == nil {
+		if info, err := f.Stat(); err == nil && info.IsDir() {
+			c.reads[name]++
+		}
 	}
+	return f, err
+}
+
+func (c *countingFS) ReadDir(name string) ([]fs.DirEntry, error) {
+	c.reads[name]++
+	return c.MapFS.ReadDir(name)
+}
 
-	chunks := splitURLs(urls, 2)
-	if len(chunks) != 3 {
-		t.Errorf("expected 3 chunks, got %d", len(chunks))
+func TestSitemapGenerator_Incremental(t *testing.T) {
+	dir := t.TempDir()
+	logger := slog.New(slog.NewTextHandler(io.Discard, nil))
+	day := func(d int) time.Time { return time.Date(2025, 3, d, 12, 0, 0, 0, time.UTC) }
+	pages := &countingFS{reads: make(map[string]int), MapFS: fstest.MapFS{
+		"manpages/noble":                 {Mode: fs.ModeDir, ModTime: day(1)},
+		"manpages/noble/man1":            {Mode: fs.ModeDir, ModTime: day(2)},
+		"manpages/noble/man1/ls.1.html":  {Data: []byte("ls"), ModTime: day(1)},
+		"manpages/noble/man1/cat.1.html": {Data: []byte("cat"), ModTime: day(2)},
+		"manpages/noble/man3":            {Mode: fs.ModeDir, ModTime: day(3)},
+		"manpages/noble/man3/printf.3.html": {
+			Data: []byte("printf"), ModTime: day(3),
+		},
+	}}
+	gen := &SitemapGenerator{Root: dir, SiteURL: "https://manpages.ubuntu.com", Logger: logger, Pages: pages}
+	ctx := context.Background()
+	if err := gen.Generate(ctx, []string{"noble"}); err != nil {
+		t.Fatal(err)
 	}
-	if len(chunks[0]) != 2 {
-		t.Errorf("first chunk: expected 2 URLs, got %d", len(chunks[0]))
+
+	readURLs := func(name string) []sitemapURL {
+		t.Helper()
+		data, err := os.ReadFile(filepath.Join(dir, "sitemaps", name))
+		if err != nil {
+			t.Fatal(err)
+		}
+		var urlset sitemapURLSet
+		if err := xml.Unmarshal(data, &urlset); err != nil {
+			t.Fatal(err)
+		}
+		return urlset.URLs
 	}
-	if len(chunks[2]) != 1 {
-		t.Errorf("last chunk: expected 1 URL, got %d", len(chunks[2]))
+	readIndex := func() map[string]string {
+		t.Helper()
+		data, err := os.ReadFile(filepath.Join(dir, "sitemaps", "sitemap-index.xml"))
+		if err != nil {
+			t.Fatal(err)
+		}
+		var idx sitemapIndex
+		if err := xml.Unmarshal(data, &idx); err != nil {
+			t.Fatal(err)
+		}
+		lastMods := make(map[string]string)
+		for _, ref := range idx.Sitemaps {
+			lastMods[ref.Loc] = ref.LastMod
+		}
+		return lastMods
+	}
+
+	// URLs carry their page's date and sitemaps the newest of their URLs'.
+	for _, u := range readURLs("sitemap-noble-man1.xml") {
+		want := map[string]string{"ls.1.html": "2025-03-01", "cat.1.html": "2025-03-02"}[filepath.Base(u.Loc)]
+		if u.LastMod != want {
+			t.Errorf("%s: lastmod %q, want %q", u.Loc, u.LastMod, want)
+		}
+	}
+	index := readIndex()
+	if got := index["https://manpages.ubuntu.com/sitemaps/sitemap-noble-man1.xml"]; got != "2025-03-02" {
+		t.Errorf("man1 sitemap lastmod = %q, want 2025-03-02", got)
+	}
+	if got := index["https://manpages.ubuntu.com/sitemaps/sitemap-static.xml"]; got != "2025-03-03" {
+		t.Errorf("static sitemap lastmod = %q, want 2025-03-03", got)
 	}
 
-	// Under limit returns single chunk.
-	single := splitURLs(urls, 10)
-	if len(single) != 1 {
-		t.Errorf("expected 1 chunk for under-limit, got %d", len(single))
+	// Only the changed section is read again.
+	clear(pages.reads)
+	pages.MapFS["manpages/noble/man1/grep.1.html"] = &fstest.MapFile{Data: []byte("grep"), ModTime: day(4)}
+	pages.MapFS["manpages/noble/man1"] = &fstest.MapFile{Mode: fs.ModeDir, ModTime: day(4)}
+	if err := gen.Generate(ctx, []string{"noble"}); err != nil {
+		t.Fatal(err)
+	}
+	if pages.reads["manpages/noble/man1"] != 1 || pages.reads["manpages/noble/man3"] != 0 {
+		t.Errorf("section reads = %v, want man1 only", pages.reads)
+	}
+	if n := len(readURLs("sitemap-noble-man1.xml")); n != 3 {
+		t.Errorf("man1 sitemap has %d URLs, want 3", n)
+	}
+	if got := readIndex()["https://manpages.ubuntu.com/sitemaps/sitemap-noble-man3.xml"]; got != "2025-03-03" {
+		t.Errorf("unchanged man3 sitemap lastmod = %q, want 2025-03-03", got)
+	}
+
+	// A new site URL rewrites the sitemaps without reading the tree.
+	clear(pages.reads)
+	gen.SiteURL = "https://manpages.example.com"
+	if err := gen.Generate(ctx, []string{"noble"}); err != nil {
+		t.Fatal(err)
+	}
+	if pages.reads["manpages/noble/man1"] != 0 || pages.reads["manpages/noble/man3"] != 0 {
+		t.Errorf("section reads after site URL change = %v, want none", pages.reads)
+	}
+	for _, u := range readURLs("sitemap-noble-man3.xml") {
+		if !strings.HasPrefix(u.Loc, "https://manpages.example.com/manpages/noble/man3/") || u.LastMod != "2025-03-03" {
+			t.Errorf("rehosted URL = %+v", u)
+		}
+	}
+	if _, ok := readIndex()["https://manpages.example.com/sitemaps/sitemap-noble-man1.xml"]; !ok {
+		t.Error("index does not list the rehosted man1 sitemap")
+	}
+
+	// A section that is gone loses its sitemap.
+	for name := range pages.MapFS {
+		if strings.HasPrefix(name, "manpages/noble/man3") {
+			delete(pages.MapFS, name)
+		}
+	}
+	if err := gen.Generate(ctx, []string{"noble"}); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := os.Stat(filepath.Join(dir, "sitemaps", "sitemap-noble-man3.xml")); !os.IsNotExist(err) {
+		t.Errorf("sitemap of removed section still there: %v", err)
+	}
+}
+
+// BenchmarkGenerateLargeSection regenerates the sitemaps of a section with
+// more pages than fit in one sitemap, reporting the peak growth of the live
+// heap while it runs.
+func BenchmarkGenerateLargeSection(b *testing.B) {
+	dir := b.TempDir()
+	man3Dir := filepath.Join(dir, "manpages", "noble", "man3")
+	if err := os.MkdirAll(man3Dir, 0o755); err != nil {
+		b.Fatal(err)
+	}
+	for i := 0; i < maxSitemapURLs+maxSitemapURLs/5; i++ {
+		if err := os.WriteFile(filepath.Join(man3Dir, fmt.Sprintf("function_%06d.3.html", i)), nil, 0o644); err != nil {
+			b.Fatal(err)
+		}
+	}
+	gen := &SitemapGenerator{Root: dir, SiteURL: "https://manpages.ubuntu.com", Logger: slog.New(slog.NewTextHandler(io.Discard, nil))}
+	ctx := context.Background()
+
+	sample := []metrics.Sample{{Name: "/memory/classes/heap/objects:bytes"}}
+	heap := func() uint64 {
+		metrics.Read(sample)
+		return sample[0].Value.Uint64()
+	}
+	var peak uint64
+	b.ReportAllocs()
+	b.ResetTimer()
+	for i := 0; i < b.N; i++ {
+		b.StopTimer()
+		if err := os.RemoveAll(filepath.Join(dir, "sitemaps")); err != nil {
+			b.Fatal(err)
+		}
+		_ = os.Remove(filepath.Join(dir, StateFile))
+		runtime.GC()
+		base := heap()
+		done := make(chan struct{})
+		sampled := make(chan uint64)
+		go func() {
+			var high uint64
+			ticker := time.NewTicker(time.Millisecond)
+			defer ticker.Stop()
+			for {
+				high = max(high, heap())
+				select {
+				case <-done:
+					sampled <- high
+					return
+				case <-ticker.C:
+				}
+			}
+		}()
+		b.StartTimer()
+
+		if err := gen.Generate(ctx, []string{"noble"}); err != nil {
+			b.Fatal(err)
+		}
+
+		b.StopTimer()
+		close(done)
+		if high := <-sampled; high > base {
+			peak = max(peak, high-base)
+		}
+		b.StartTimer()
 	}
+	b.ReportMetric(float64(peak), "peak-heap-B")
 }
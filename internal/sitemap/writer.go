@@ -0,0 +1,268 @@
+package sitemap
+
+import (
+	"bufio"
+	"bytes"
+	"compress/gzip"
+	"encoding/xml"
+	"errors"
+	"fmt"
+	"io"
+	"os"
+	"path/filepath"
+)
+
+// Limits of a single sitemap set by the sitemaps protocol. The size limit
+// applies to the uncompressed document.
+const (
+	maxSitemapURLs  = 50000
+	maxSitemapBytes = 50 << 20
+)
+
+const sitemapNS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+// The start and end of a urlset document, laid out as xml.Encoder with a
+// two-space indent lays out a sitemapURLSet.
+const (
+	urlsetStart = xml.Header + `<urlset xmlns="` + sitemapNS + `">`
+	urlsetEnd   = "\n</urlset>"
+)
+
+// urlsetWriter streams a urlset document to a temporary file, optionally
+// gzip-compressed, so that a sitemap never has to be held in memory.
+type urlsetWriter struct {
+	f     *os.File
+	gz    *gzip.Writer
+	w     *bufio.Writer
+	entry bytes.Buffer
+
+	maxURLs  int
+	maxBytes int
+	urls     int
+	size     int // uncompressed bytes written so far
+	lastMod  string
+}
+
+func newURLSetWriter(dir string, compress bool, maxURLs, maxBytes int) (*urlsetWriter, error) {
+	f, err := os.CreateTemp(dir, ".sitemap.tmp-*")
+	if err != nil {
+		return nil, err
+	}
+	w := &urlsetWriter{f: f, maxURLs: maxURLs, maxBytes: maxBytes}
+	var out io.Writer = f
+	if compress {
+		w.gz = gzip.NewWriter(f)
+		out = w.gz
+	}
+	w.w = bufio.NewWriterSize(out, 64<<10)
+	w.size, _ = w.w.WriteString(urlsetStart)
+	return w, nil
+}
+
+// add appends u to the document. It returns false, writing nothing, when
+// the document already holds as many URLs or bytes as a sitemap may.
+func (w *urlsetWriter) add(u sitemapURL) (bool, error) {
+	w.entry.Reset()
+	w.entry.WriteString("\n  <url>\n    <loc>")
+	if err := xml.EscapeText(&w.entry, []byte(u.Loc)); err != nil {
+		return false, err
+	}
+	w.entry.WriteString("</loc>")
+	if u.LastMod != "" {
+		w.entry.WriteString("\n    <lastmod>")
+		if err := xml.EscapeText(&w.entry, []byte(u.LastMod)); err != nil {
+			return false, err
+		}
+		w.entry.WriteString("</lastmod>")
+	}
+	w.entry.WriteString("\n  </url>")
+
+	if w.urls >= w.maxURLs || w.size+w.entry.Len()+len(urlsetEnd) > w.maxBytes {
+		return false, nil
+	}
+	n, err := w.w.Write(w.entry.Bytes())
+	w.size += n
+	if err != nil {
+		return false, err
+	}
+	w.urls++
+	w.lastMod = max(w.lastMod, u.LastMod)
+	return true, nil
+}
+
+// close ends the document and closes the temporary file.
+func (w *urlsetWriter) close() error {
+	if w.urls == 0 {
+		// An empty urlset is written on one line, as xml.Encoder does.
+		_, _ = w.w.WriteString("</urlset>")
+	} else {
+		_, _ = w.w.WriteString(urlsetEnd)
+	}
+	err := w.w.Flush()
+	if w.gz != nil {
+		if closeErr := w.gz.Close(); err == nil {
+			err = closeErr
+		}
+	}
+	if err == nil {
+		err = w.f.Chmod(0o644)
+	}
+	if closeErr := w.f.Close(); err == nil {
+		err = closeErr
+	}
+	w.w, w.gz = nil, nil
+	return err
+}
+
+// commit closes the document and moves it to path, leaving path alone when
+// it already holds the same bytes so that its validators do not change.
+func (w *urlsetWriter) commit(path string) error {
+	if err := w.close(); err != nil {
+		_ = os.Remove(w.f.Name())
+		return err
+	}
+	return w.place(path)
+}
+
+// place moves the closed document to path, or discards it when path already
+// holds the same bytes.
+func (w *urlsetWriter) place(path string) error {
+	if sameContent(w.f.Name(), path) {
+		return os.Remove(w.f.Name())
+	}
+	if err := os.Rename(w.f.Name(), path); err != nil {
+		_ = os.Remove(w.f.Name())
+		return err
+	}
+	return nil
+}
+
+// abort discards the document.
+func (w *urlsetWriter) abort() {
+	if w.w != nil {
+		_ = w.f.Close()
+	}
+	_ = os.Remove(w.f.Name())
+}
+
+// shardWriter streams the URLs of a section into as many sitemaps as the
+// protocol limits require: base.xml when one is enough, base-1.xml,
+// base-2.xml, ... otherwise, with ".gz" appended when compressed. Nothing
+// is moved into place before commit.
+type shardWriter struct {
+	dir, base string
+	compress  bool
+	maxURLs   int
+	maxBytes  int
+
+	cur  *urlsetWriter
+	done []*urlsetWriter
+}
+
+func newShardWriter(dir, base string, compress bool) *shardWriter {
+	return &shardWriter{dir: dir, base: base, compress: compress, maxURLs: maxSitemapURLs, maxBytes: maxSitemapBytes}
+}
+
+// add appends u to the current sitemap, starting a new one when it is full.
+func (s *shardWriter) add(u sitemapURL) error {
+	if s.cur != nil {
+		ok, err := s.cur.add(u)
+		if ok || err != nil {
+			return err
+		}
+		if err := s.cur.close(); err != nil {
+			return err
+		}
+		s.done = append(s.done, s.cur)
+		s.cur = nil
+	}
+	cur, err := newURLSetWriter(s.dir, s.compress, s.maxURLs, s.maxBytes)
+	if err != nil {
+		return err
+	}
+	s.cur = cur
+	ok, err := cur.add(u)
+	if err == nil && !ok {
+		err = fmt.Errorf("URL %s does not fit in a sitemap", u.Loc)
+	}
+	return err
+}
+
+// commit moves the sitemaps written into place and returns them, nil when
+// no URL was added.
+func (s *shardWriter) commit() ([]sitemapShard, error) {
+	if s.cur == nil {
+		return nil, nil
+	}
+	if err := s.cur.close(); err != nil {
+		s.abort()
+		return nil, err
+	}
+	shards := append(s.done, s.cur)
+	s.done, s.cur = nil, nil
+
+	ext := ".xml"
+	if s.compress {
+		ext += ".gz"
+	}
+	files := make([]sitemapShard, 0, len(shards))
+	var errs []error
+	for i, w := range shards {
+		name := s.base + ext
+		if len(shards) > 1 {
+			name = fmt.Sprintf("%s-%d%s", s.base, i+1, ext)
+		}
+		if err := w.place(filepath.Join(s.dir, name)); err != nil {
+			errs = append(errs, err)
+			continue
+		}
+		files = append(files, sitemapShard{Name: name, LastMod: w.lastMod})
+	}
+	if err := errors.Join(errs...); err != nil {
+		return nil, err
+	}
+	return files, nil
+}
+
+// abort discards the sitemaps written.
+func (s *shardWriter) abort() {
+	for _, w := range s.done {
+		w.abort()
+	}
+	if s.cur != nil {
+		s.cur.abort()
+	}
+	s.done, s.cur = nil, nil
+}
+
+// sameContent reports whether the files a and b hold the same bytes,
+// comparing them a block at a time.
+func sameContent(a, b string) bool {
+	infoA, errA := os.Stat(a)
+	infoB, errB := os.Stat(b)
+	if errA != nil || errB != nil || infoA.Size() != infoB.Size() {
+		return false
+	}
+	fa, err := os.Open(a)
+	if err != nil {
+		return false
+	}
+	defer fa.Close()
+	fb, err := os.Open(b)
+	if err != nil {
+		return false
+	}
+	defer fb.Close()
+
+	bufA, bufB := make([]byte, 32<<10), make([]byte, 32<<10)
+	for {
+		n, errA := io.ReadFull(fa, bufA)
+		m, errB := io.ReadFull(fb, bufB)
+		if n != m || !bytes.Equal(bufA[:n], bufB[:m]) {
+			return false
+		}
+		if errA != nil || errB != nil {
+			return errors.Is(errA, io.ErrUnexpectedEOF) || errors.Is(errA, io.EOF)
+		}
+	}
+}
@@ -0,0 +1,206 @@
+package storage
+
+import (
+	"context"
+	"errors"
+	"fmt"
+	"io/fs"
+	"os"
+	"path"
+	"path/filepath"
+	"strings"
+	"time"
+)
+
+// PackRelease copies the files and symlinks of a release's manpages tree
+// below the public HTML root into a new segment of the release's pack,
+// leaving the files in place. Files shadowed by an entry the pack already
+// holds are skipped, as readers never see them. It returns the number of
+// entries packed.
+func PackRelease(ctx context.Context, root, release string) (int, error) {
+	dir := filepath.Join(root, "manpages", release)
+	packDir := filepath.Join(dir, PackDir)
+	if err := os.MkdirAll(packDir, 0o755); err != nil {
+		return 0, fmt.Errorf("mkdir: %w", err)
+	}
+	current, err := OpenPack(packDir)
+	if err != nil && !errors.Is(err, os.ErrNotExist) {
+		return 0, err
+	}
+	if current != nil {
+		defer func() { _ = current.Close() }()
+	}
+
+	next, err := nextSegmentPath(packDir)
+	if err != nil {
+		return 0, err
+	}
+	w, err := createSegment(next)
+	if err != nil {
+		return 0, err
+	}
+	err = walkRelease(ctx, dir, func(name, fullPath string, info fs.FileInfo) error {
+		if info.IsDir() {
+			return nil
+		}
+		if current != nil {
+			if _, ok := current.lookup(name); ok {
+				return nil
+			}
+		}
+		kind := kindFile
+		var data []byte
+		var err error
+		if info.Mode()&fs.ModeSymlink != 0 {
+			kind = kindSymlink
+			var target string
+			target, err = os.Readlink(fullPath)
+			data = []byte(target)
+		} else {
+			data, err = os.ReadFile(fullPath)
+		}
+		if err != nil {
+			return err
+		}
+		return w.add(name, kind, data, info.ModTime())
+	})
+	if err != nil {
+		w.abort()
+		return 0, err
+	}
+	if w.empty() {
+		w.abort()
+		return 0, nil
+	}
+	n := len(w.entries)
+	if err := w.close(); err != nil {
+		return 0, err
+	}
+	if err := compactIfNeeded(packDir); err != nil {
+		return 0, err
+	}
+	return n, nil
+}
+
+// RemovePackedFiles removes the files and symlinks of a release's manpages
+// tree that its pack holds, and the directories left empty. Call it once
+// readers have mapped the pack. It returns the number of entries removed.
+func RemovePackedFiles(ctx context.Context, root, release string) (int, error) {
+	dir := filepath.Join(root, "manpages", release)
+	pack, err := OpenPack(filepath.Join(dir, PackDir))
+	if err != nil {
+		if errors.Is(err, os.ErrNotExist) {
+			return 0, nil
+		}
+		return 0, err
+	}
+	defer func() { _ = pack.Close() }()
+
+	var removed int
+	var dirs []string
+	err = walkRelease(ctx, dir, func(name, fullPath string, info fs.FileInfo) error {
+		if info.IsDir() {
+			dirs = append(dirs, fullPath)
+			return nil
+		}
+		if _, ok := pack.lookup(name); !ok {
+			return nil
+		}
+		if err := os.Remove(fullPath); err != nil {
+			return err
+		}
+		removed++
+		return nil
+	})
+	if err != nil {
+		return removed, err
+	}
+	// Deepest first; directories still holding files stay.
+	for i := len(dirs) - 1; i >= 0; i-- {
+		_ = os.Remove(dirs[i])
+	}
+	return removed, nil
+}
+
+// UnpackRelease writes every entry of a release's pack back as a file or
+// symlink, syncs them, and removes the pack. Readers that mapped the pack
+// keep reading it until they reload. It returns the number of entries
+// unpacked, 0 when the release has no pack.
+func UnpackRelease(ctx context.Context, root, release string) (int, error) {
+	packDir := filepath.Join(root, "manpages", release, PackDir)
+	pack, err := OpenPack(packDir)
+	if err != nil {
+		if errors.Is(err, os.ErrNotExist) {
+			_ = os.RemoveAll(packDir)
+			return 0, nil
+		}
+		return 0, err
+	}
+	defer func() { _ = pack.Close() }()
+
+	s := NewFSStorage(root)
+	s.Sync = true
+	s = s.Batch()
+	for i, e := range pack.entries {
+		if i%purgeBatchSize == 0 {
+			if err := ctx.Err(); err != nil {
+				return 0, err
+			}
+		}
+		destPath := path.Join("manpages", release, e.name)
+		if e.kind == kindSymlink {
+			err = s.writeSymlink(destPath, string(e.data))
+		} else {
+			err = s.writeFile(destPath, e.data)
+			if err == nil {
+				modTime := time.Unix(0, e.modTime)
+				err = os.Chtimes(filepath.Join(root, filepath.FromSlash(destPath)), modTime, modTime)
+			}
+		}
+		if err != nil {
+			return 0, fmt.Errorf("unpack %s: %w", e.name, err)
+		}
+	}
+	if err := s.Flush(); err != nil {
+		return 0, err
+	}
+	if err := os.RemoveAll(packDir); err != nil {
+		return 0, fmt.Errorf("remove pack: %w", err)
+	}
+	return pack.Len(), nil
+}
+
+// walkRelease calls fn for every directory, file and symlink below the
+// release tree dir, except its pack and temporary files, with the entry's
+// slash-separated path relative to dir.
+func walkRelease(ctx context.Context, dir string, fn func(name, fullPath string, info fs.FileInfo) error) error {
+	var seen int
+	return filepath.WalkDir(dir, func(fullPath string, d fs.DirEntry, err error) error {
+		if err != nil {
+			return err
+		}
+		if fullPath == dir {
+			return nil
+		}
+		if seen++; seen%purgeBatchSize == 0 {
+			if err := ctx.Err(); err != nil {
+				return err
+			}
+		}
+		if d.IsDir() && d.Name() == PackDir && filepath.Dir(fullPath) == dir {
+			return filepath.SkipDir
+		}
+		if strings.HasPrefix(d.Name(), ".") && strings.Contains(d.Name(), ".tmp-") {
+			return nil
+		}
+		info, err := d.Info()
+		if err != nil {
+			return err
+		}
+		rel, err := filepath.Rel(dir, fullPath)
+		if err != nil {
+			return err
+		}
+		return fn(filepath.ToSlash(rel), fullPath, info)
+	})
+}
@@ -0,0 +1,416 @@
+package storage
+
+import (
+	"errors"
+	"fmt"
+	"os"
+	"path"
+	"path/filepath"
+	"sort"
+	"strconv"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// PackDir is the directory, inside a release's manpages tree, that holds
+// the release's segment files when it is stored packed. A release's pack
+// moves with its tree, so purging a release removes its pack too.
+const PackDir = ".pack"
+
+// maxPackSegments is the number of segments a pack may reach, one per
+// ingest run that changed the release, before PackWriter compacts it.
+const maxPackSegments = 8
+
+// Pack is the packed tree of one release: its segments, with entries of
+// newer segments replacing those of older ones under the same name.
+type Pack struct {
+	dir      string
+	segments []*segment
+	entries  []segmentEntry // sorted by name
+	modTime  time.Time      // of the newest segment
+
+	// refs counts the reference OpenPack returns and those of readers still
+	// holding data read from the pack. The segments are unmapped when the
+	// last one is released.
+	refs atomic.Int64
+}
+
+// OpenPack maps the segments in dir, a release's PackDir. It returns
+// os.ErrNotExist when dir holds no segments.
+func OpenPack(dir string) (*Pack, error) {
+	paths, err := listSegments(dir)
+	if err != nil {
+		return nil, err
+	}
+	if len(paths) == 0 {
+		return nil, fmt.Errorf("pack %s: %w", dir, os.ErrNotExist)
+	}
+	p := &Pack{dir: dir}
+	p.refs.Store(1)
+	for _, path := range paths {
+		seg, err := openSegment(path)
+		if err != nil {
+			_ = p.Close()
+			return nil, err
+		}
+		p.segments = append(p.segments, seg)
+		if seg.modTime.After(p.modTime) {
+			p.modTime = seg.modTime
+		}
+	}
+	p.entries = mergeSegments(p.segments)
+	return p, nil
+}
+
+// listSegments returns the segment files in dir, oldest first.
+func listSegments(dir string) ([]string, error) {
+	entries, err := os.ReadDir(dir)
+	if err != nil {
+		if os.IsNotExist(err) {
+			return nil, nil
+		}
+		return nil, err
+	}
+	var paths []string
+	for _, e := range entries {
+		if e.Type().IsRegular() && segmentNumber(e.Name()) > 0 {
+			paths = append(paths, filepath.Join(dir, e.Name()))
+		}
+	}
+	sort.Slice(paths, func(i, j int) bool {
+		return segmentNumber(filepath.Base(paths[i])) < segmentNumber(filepath.Base(paths[j]))
+	})
+	return paths, nil
+}
+
+// segmentNumber returns the sequence number in a segment file name such as
+// 00000003.seg, or 0 for other names.
+func segmentNumber(name string) int {
+	n, err := strconv.Atoi(strings.TrimSuffix(name, segmentExt))
+	if err != nil || !strings.HasSuffix(name, segmentExt) || n <= 0 {
+		return 0
+	}
+	return n
+}
+
+// nextSegmentPath returns the path of the segment to write after those in
+// dir.
+func nextSegmentPath(dir string) (string, error) {
+	paths, err := listSegments(dir)
+	if err != nil {
+		return "", err
+	}
+	next := 1
+	if len(paths) > 0 {
+		next = segmentNumber(filepath.Base(paths[len(paths)-1])) + 1
+	}
+	return filepath.Join(dir, fmt.Sprintf("%08d%s", next, segmentExt)), nil
+}
+
+// mergeSegments returns the entries of segments, given oldest first, sorted
+// by name, keeping the newest entry of each name.
+func mergeSegments(segments []*segment) []segmentEntry {
+	if len(segments) == 1 {
+		return segments[0].entries
+	}
+	var n int
+	for _, seg := range segments {
+		n += len(seg.entries)
+	}
+	merged := make([]segmentEntry, 0, n)
+	for i := len(segments) - 1; i >= 0; i-- {
+		merged = append(merged, segments[i].entries...)
+	}
+	// Newest first, so the stable sort keeps the newest entry of a name first.
+	sort.SliceStable(merged, func(i, j int) bool { return merged[i].name < merged[j].name })
+	out := merged[:0]
+	for _, e := range merged {
+		if len(out) > 0 && out[len(out)-1].name == e.name {
+			continue
+		}
+		out = append(out, e)
+	}
+	return out
+}
+
+// Len returns the number of files and symlinks in the pack.
+func (p *Pack) Len() int { return len(p.entries) }
+
+// Close releases the reference OpenPack returned. The segments are unmapped
+// once no reader holds data read from the pack either; data read without a
+// reference must not be used afterwards.
+func (p *Pack) Close() error {
+	return p.release()
+}
+
+// acquire takes a reference to the pack for a reader of its data. The
+// caller must already hold one, or know that one is held, such as Pages
+// does for the packs it serves.
+func (p *Pack) acquire() {
+	p.refs.Add(1)
+}
+
+// release drops a reference to the pack, unmapping its segments with the
+// last one.
+func (p *Pack) release() error {
+	if p.refs.Add(-1) > 0 {
+		return nil
+	}
+	var errs []error
+	for _, seg := range p.segments {
+		errs = append(errs, seg.close())
+	}
+	p.segments = nil
+	return errors.Join(errs...)
+}
+
+// lookup returns the entry named name, a slash-separated path relative to
+// the release tree.
+func (p *Pack) lookup(name string) (segmentEntry, bool) {
+	i := sort.Search(len(p.entries), func(i int) bool { return p.entries[i].name >= name })
+	if i < len(p.entries) && p.entries[i].name == name {
+		return p.entries[i], true
+	}
+	return segmentEntry{}, false
+}
+
+// packChild is an immediate child of a directory in a pack: an entry, or a
+// directory implied by the entries below it.
+type packChild struct {
+	name  string
+	entry *segmentEntry // nil for directories
+}
+
+// children returns the children of dir ("" for the release tree itself),
+// sorted by name, and whether dir exists in the pack.
+func (p *Pack) children(dir string) ([]packChild, bool) {
+	prefix := ""
+	if dir != "" {
+		prefix = dir + "/"
+	}
+	start := sort.Search(len(p.entries), func(i int) bool { return p.entries[i].name >= prefix })
+	var children []packChild
+	for i := start; i < len(p.entries) && strings.HasPrefix(p.entries[i].name, prefix); i++ {
+		rest := p.entries[i].name[len(prefix):]
+		if slash := strings.IndexByte(rest, '/'); slash >= 0 {
+			sub := rest[:slash]
+			if n := len(children); n == 0 || children[n-1].name != sub {
+				children = append(children, packChild{name: sub})
+			}
+			continue
+		}
+		children = append(children, packChild{name: rest, entry: &p.entries[i]})
+	}
+	return children, len(children) > 0 || dir == ""
+}
+
+// isDir reports whether dir is a directory in the pack.
+func (p *Pack) isDir(dir string) bool {
+	prefix := dir + "/"
+	i := sort.Search(len(p.entries), func(i int) bool { return p.entries[i].name >= prefix })
+	return i < len(p.entries) && strings.HasPrefix(p.entries[i].name, prefix)
+}
+
+// CompactPack rewrites the segments in dir as one and removes the old ones.
+// It returns the number of entries in the compacted pack.
+func CompactPack(dir string) (int, error) {
+	p, err := OpenPack(dir)
+	if err != nil {
+		return 0, err
+	}
+	defer func() { _ = p.Close() }()
+	if len(p.segments) == 1 {
+		return p.Len(), nil
+	}
+	next, err := nextSegmentPath(dir)
+	if err != nil {
+		return 0, err
+	}
+	w, err := createSegment(next)
+	if err != nil {
+		return 0, err
+	}
+	for _, e := range p.entries {
+		if err := w.add(e.name, e.kind, e.data, time.Unix(0, e.modTime)); err != nil {
+			w.abort()
+			return 0, err
+		}
+	}
+	if err := w.close(); err != nil {
+		return 0, err
+	}
+	// Readers that mapped the old segments keep their mappings.
+	for _, seg := range p.segments {
+		if err := os.Remove(seg.path); err != nil {
+			return 0, fmt.Errorf("remove compacted segment: %w", err)
+		}
+	}
+	return p.Len(), nil
+}
+
+// PackWriter stores the manpages trees written by an ingest run in the
+// packs of their releases, as one new segment per release, published by
+// Commit. Until then readers see the release as it was, and a run that
+// dies leaves no trace but a temporary file.
+type PackWriter struct {
+	root string // the manpages directory
+
+	mu       sync.Mutex
+	releases map[string]*packRelease
+}
+
+// packRelease is the state of one release in a PackWriter: the pack as it
+// was when the run started, and the segment being written.
+type packRelease struct {
+	once sync.Once
+	err  error
+	pack *Pack
+	w    *segmentWriter
+}
+
+// NewPackWriter returns a writer for the releases under the manpages
+// directory root.
+func NewPackWriter(root string) *PackWriter {
+	return &PackWriter{root: root, releases: make(map[string]*packRelease)}
+}
+
+// release returns the state of release, opening its pack and starting its
+// segment on first use.
+func (w *PackWriter) release(release string) (*packRelease, error) {
+	w.mu.Lock()
+	r, ok := w.releases[release]
+	if !ok {
+		r = &packRelease{}
+		w.releases[release] = r
+	}
+	w.mu.Unlock()
+	r.once.Do(func() {
+		dir := filepath.Join(w.root, release, PackDir)
+		if err := os.MkdirAll(dir, 0o755); err != nil {
+			r.err = fmt.Errorf("mkdir: %w", err)
+			return
+		}
+		if pack, err := OpenPack(dir); err == nil {
+			r.pack = pack
+		} else if !errors.Is(err, os.ErrNotExist) {
+			r.err = err
+			return
+		}
+		next, err := nextSegmentPath(dir)
+		if err == nil {
+			r.w, err = createSegment(next)
+		}
+		r.err = err
+	})
+	return r, r.err
+}
+
+// put adds a file or symlink at name, a slash-separated path relative to
+// the release tree.
+func (w *PackWriter) put(release, name string, kind entryKind, data []byte) error {
+	r, err := w.release(release)
+	if err != nil {
+		return err
+	}
+	return r.w.add(name, kind, data, time.Now())
+}
+
+// read returns the contents of the file at name as packed before the run.
+func (w *PackWriter) read(release, name string) ([]byte, bool) {
+	r, err := w.release(release)
+	if err != nil || r.pack == nil {
+		return nil, false
+	}
+	e, ok := r.pack.lookup(name)
+	if !ok || e.kind != kindFile {
+		return nil, false
+	}
+	return e.data, true
+}
+
+// exists reports whether there is a file or symlink at name, written in
+// this run or packed before it.
+func (w *PackWriter) exists(release, name string) bool {
+	r, err := w.release(release)
+	if err != nil {
+		return false
+	}
+	if r.w.has(name) {
+		return true
+	}
+	if r.pack != nil {
+		_, ok := r.pack.lookup(name)
+		return ok
+	}
+	return false
+}
+
+// Commit publishes the segment written for release, compacting the
+// release's pack when it has grown too many segments. Releases the run
+// did not write to are left alone.
+func (w *PackWriter) Commit(release string) error {
+	w.mu.Lock()
+	r, ok := w.releases[release]
+	delete(w.releases, release)
+	w.mu.Unlock()
+	if !ok || r.err != nil {
+		return nil
+	}
+	if r.pack != nil {
+		_ = r.pack.Close()
+	}
+	if r.w.empty() {
+		r.w.abort()
+		return nil
+	}
+	if err := r.w.close(); err != nil {
+		return err
+	}
+	return compactIfNeeded(filepath.Dir(r.w.path))
+}
+
+// compactIfNeeded compacts the pack in dir once it has more than
+// maxPackSegments segments.
+func compactIfNeeded(dir string) error {
+	paths, err := listSegments(dir)
+	if err != nil {
+		return err
+	}
+	if len(paths) > maxPackSegments {
+		if _, err := CompactPack(dir); err != nil {
+			return fmt.Errorf("compact %s: %w", dir, err)
+		}
+	}
+	return nil
+}
+
+// Close commits every release written to.
+func (w *PackWriter) Close() error {
+	w.mu.Lock()
+	releases := make([]string, 0, len(w.releases))
+	for release := range w.releases {
+		releases = append(releases, release)
+	}
+	w.mu.Unlock()
+	var errs []error
+	for _, release := range releases {
+		errs = append(errs, w.Commit(release))
+	}
+	return errors.Join(errs...)
+}
+
+// splitPackPath splits a slash-separated path below the public HTML root of
+// the form manpages/{release}/{name} into release and name.
+func splitPackPath(p string) (release, name string, ok bool) {
+	rest, ok := strings.CutPrefix(p, "manpages/")
+	if !ok {
+		return "", "", false
+	}
+	release, name, ok = strings.Cut(rest, "/")
+	if !ok || release == "" || strings.HasPrefix(release, ".") || name == "" {
+		return "", "", false
+	}
+	return release, path.Clean(name), true
+}
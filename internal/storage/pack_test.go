@@ -0,0 +1,261 @@
+package storage
+
+import (
+	"bytes"
+	"context"
+	"errors"
+	"fmt"
+	"io/fs"
+	"os"
+	"path/filepath"
+	"testing"
+	"time"
+)
+
+// packedStorage returns a storage below a temporary public HTML root that
+// packs the manpages trees it writes.
+func packedStorage(t *testing.T) *FSStorage {
+	t.Helper()
+	root := t.TempDir()
+	s := NewFSStorage(root)
+	s.Packs = NewPackWriter(filepath.Join(root, "manpages"))
+	t.Cleanup(func() { _ = s.Packs.Close() })
+	return s
+}
+
+func TestSegmentRoundTrip(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "00000001.seg")
+	w, err := createSegment(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	mtime := time.Unix(1700000000, 42)
+	for _, e := range []struct {
+		name string
+		kind entryKind
+		data string
+	}{
+		{"man1/ls.1.html", kindFile, "ls page"},
+		{"man1/dir.1.html", kindSymlink, "ls.1.html"},
+		{"man1/empty.1.html", kindFile, ""},
+		{"man1/ls.1.html", kindFile, "ls page, rewritten"},
+	} {
+		if err := w.add(e.name, e.kind, []byte(e.data), mtime); err != nil {
+			t.Fatal(err)
+		}
+	}
+	if err := w.close(); err != nil {
+		t.Fatal(err)
+	}
+
+	seg, err := openSegment(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer func() { _ = seg.close() }()
+	var got []string
+	for _, e := range seg.entries {
+		got = append(got, fmt.Sprintf("%s %d %q", e.name, e.kind, e.data))
+		if e.modTime != mtime.UnixNano() {
+			t.Errorf("%s: modTime = %d, want %d", e.name, e.modTime, mtime.UnixNano())
+		}
+	}
+	want := []string{
+		`man1/dir.1.html 1 "ls.1.html"`,
+		`man1/empty.1.html 0 ""`,
+		`man1/ls.1.html 0 "ls page, rewritten"`,
+	}
+	if fmt.Sprint(got) != fmt.Sprint(want) {
+		t.Errorf("entries = %q, want %q", got, want)
+	}
+}
+
+func TestSegmentRejectsCorruption(t *testing.T) {
+	dir := t.TempDir()
+	path := filepath.Join(dir, "00000001.seg")
+	w, err := createSegment(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := w.add("man1/ls.1.html", kindFile, []byte("ls page"), time.Now()); err != nil {
+		t.Fatal(err)
+	}
+	if err := w.close(); err != nil {
+		t.Fatal(err)
+	}
+	good, err := os.ReadFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+
+	for name, corrupt := range map[string]func([]byte) []byte{
+		"truncated": func(b []byte) []byte { return b[:len(b)-3] },
+		"index":     func(b []byte) []byte { b[len(b)-segmentFooterLen-2] ^= 0xff; return b },
+		"magic":     func(b []byte) []byte { b[0] = 'X'; return b },
+	} {
+		bad := filepath.Join(dir, name+".seg")
+		if err := os.WriteFile(bad, corrupt(bytes.Clone(good)), 0o644); err != nil {
+			t.Fatal(err)
+		}
+		if seg, err := openSegment(bad); err == nil {
+			_ = seg.close()
+			t.Errorf("%s: openSegment succeeded, want error", name)
+		}
+	}
+}
+
+func TestPackWriterCommit(t *testing.T) {
+	s := packedStorage(t)
+	ctx := context.Background()
+	if err := s.WriteHTML(ctx, "manpages/noble/man1/ls.1.html", []byte("ls page")); err != nil {
+		t.Fatal(err)
+	}
+	if err := s.WriteSymlink(ctx, "manpages/noble/man1/dir.1.html", "ls.1.html"); err != nil {
+		t.Fatal(err)
+	}
+	if err := s.WriteCache(ctx, "noble", "coreutils", "abc"); err != nil {
+		t.Fatal(err)
+	}
+	if !s.Exists("manpages/noble/man1/ls.1.html") {
+		t.Error("Exists before commit = false, want true")
+	}
+
+	// Nothing is visible before the commit, and no file was written.
+	packDir := filepath.Join(s.Root, "manpages", "noble", PackDir)
+	if _, err := OpenPack(packDir); !errors.Is(err, os.ErrNotExist) {
+		t.Fatalf("OpenPack before commit: %v, want ErrNotExist", err)
+	}
+	if _, err := os.Lstat(filepath.Join(s.Root, "manpages", "noble", "man1")); !os.IsNotExist(err) {
+		t.Errorf("man1 written as files: %v", err)
+	}
+
+	if err := s.Commit("noble"); err != nil {
+		t.Fatal(err)
+	}
+	pack, err := OpenPack(packDir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer func() { _ = pack.Close() }()
+	if pack.Len() != 3 {
+		t.Errorf("Len = %d, want 3", pack.Len())
+	}
+	if e, ok := pack.lookup("man1/dir.1.html"); !ok || e.kind != kindSymlink || string(e.data) != "ls.1.html" {
+		t.Errorf("lookup symlink = %+v, %v", e, ok)
+	}
+
+	// A later run sees the cache entry, and one that writes nothing
+	// leaves no segment behind.
+	s2 := NewFSStorage(s.Root)
+	s2.Packs = NewPackWriter(filepath.Join(s.Root, "manpages"))
+	if !s2.CheckCache("noble", "coreutils", "abc") || s2.CheckCache("noble", "coreutils", "def") {
+		t.Error("CheckCache does not match the packed cache entry")
+	}
+	if err := s2.Commit("noble"); err != nil {
+		t.Fatal(err)
+	}
+	if paths, _ := listSegments(packDir); len(paths) != 1 {
+		t.Errorf("segments = %v, want one", paths)
+	}
+}
+
+func TestPackNewestWinsAndCompaction(t *testing.T) {
+	root := t.TempDir()
+	ctx := context.Background()
+	for run := 1; run <= maxPackSegments+1; run++ {
+		s := NewFSStorage(root)
+		s.Packs = NewPackWriter(filepath.Join(root, "manpages"))
+		page := fmt.Sprintf("run %d", run)
+		if err := s.WriteHTML(ctx, "manpages/noble/man1/ls.1.html", []byte(page)); err != nil {
+			t.Fatal(err)
+		}
+		if err := s.WriteHTML(ctx, fmt.Sprintf("manpages/noble/man1/p%d.1.html", run), []byte(page)); err != nil {
+			t.Fatal(err)
+		}
+		if err := s.Commit("noble"); err != nil {
+			t.Fatal(err)
+		}
+	}
+
+	packDir := filepath.Join(root, "manpages", "noble", PackDir)
+	paths, err := listSegments(packDir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(paths) != 1 {
+		t.Fatalf("segments after %d runs = %v, want one compacted segment", maxPackSegments+1, paths)
+	}
+	pack, err := OpenPack(packDir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer func() { _ = pack.Close() }()
+	if pack.Len() != maxPackSegments+2 {
+		t.Errorf("Len = %d, want %d", pack.Len(), maxPackSegments+2)
+	}
+	want := fmt.Sprintf("run %d", maxPackSegments+1)
+	if e, _ := pack.lookup("man1/ls.1.html"); string(e.data) != want {
+		t.Errorf("ls.1.html = %q, want %q", e.data, want)
+	}
+}
+
+func TestPackAndUnpackRelease(t *testing.T) {
+	root := t.TempDir()
+	dir := filepath.Join(root, "manpages", "noble")
+	for name, content := range map[string]string{
+		"man1/ls.1.html":    "ls page",
+		"man1/ls.1.html.gz": "ls gzip",
+		"de/man1/ls.1.html": "ls Seite",
+		".cache/coreutils":  "abc",
+	} {
+		path := filepath.Join(dir, filepath.FromSlash(name))
+		if err := os.MkdirAll(filepath.Dir(path), 0o755); err != nil {
+			t.Fatal(err)
+		}
+		if err := os.WriteFile(path, []byte(content), 0o644); err != nil {
+			t.Fatal(err)
+		}
+	}
+	if err := os.Symlink("ls.1.html", filepath.Join(dir, "man1", "dir.1.html")); err != nil {
+		t.Fatal(err)
+	}
+
+	ctx := context.Background()
+	n, err := PackRelease(ctx, root, "noble")
+	if err != nil || n != 5 {
+		t.Fatalf("PackRelease = %d, %v, want 5", n, err)
+	}
+	// Already packed entries are not packed again.
+	if n, err := PackRelease(ctx, root, "noble"); err != nil || n != 0 {
+		t.Fatalf("PackRelease again = %d, %v, want 0", n, err)
+	}
+	if n, err := RemovePackedFiles(ctx, root, "noble"); err != nil || n != 5 {
+		t.Fatalf("RemovePackedFiles = %d, %v, want 5", n, err)
+	}
+	entries, err := os.ReadDir(dir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(entries) != 1 || entries[0].Name() != PackDir {
+		t.Errorf("release dir after packing holds %v, want only %s", entries, PackDir)
+	}
+
+	pages := OpenPages(root)
+	defer func() { _ = pages.Close() }()
+	if got, err := fs.ReadFile(pages, "manpages/noble/man1/dir.1.html"); err != nil || string(got) != "ls page" {
+		t.Errorf("read packed symlink = %q, %v", got, err)
+	}
+
+	if n, err := UnpackRelease(ctx, root, "noble"); err != nil || n != 5 {
+		t.Fatalf("UnpackRelease = %d, %v, want 5", n, err)
+	}
+	if _, err := os.Stat(filepath.Join(dir, PackDir)); !os.IsNotExist(err) {
+		t.Errorf("pack not removed: %v", err)
+	}
+	if got, err := os.ReadFile(filepath.Join(dir, "de", "man1", "ls.1.html")); err != nil || string(got) != "ls Seite" {
+		t.Errorf("unpacked file = %q, %v", got, err)
+	}
+	if target, err := os.Readlink(filepath.Join(dir, "man1", "dir.1.html")); err != nil || target != "ls.1.html" {
+		t.Errorf("unpacked symlink = %q, %v", target, err)
+	}
+}
@@ -0,0 +1,399 @@
+package storage
+
+import (
+	"bytes"
+	"errors"
+	"io"
+	"io/fs"
+	"log/slog"
+	"os"
+	"path"
+	"path/filepath"
+	"sort"
+	"sync"
+	"time"
+)
+
+// maxSymlinkHops bounds how many packed symlinks Pages follows to resolve a
+// path, as the kernel bounds symlink loops.
+const maxSymlinkHops = 40
+
+// Pages is the tree below a public HTML root as an fs.FS. Release trees
+// under manpages/ are read from their packs where they have one, falling
+// back to files for paths a pack does not hold, and from files otherwise.
+// Paths are slash-separated and relative to the root, for example
+// "manpages/noble/man1/ls.1.html". Packed symlinks are followed like file
+// system ones.
+type Pages struct {
+	root  string
+	files fs.FS
+
+	mu    sync.RWMutex
+	packs map[string]*Pack // by release, each holding the reference it was opened with
+
+	// reloadMu serializes Reload from its snapshot of packs through the
+	// swap, so a concurrent Reload cannot install a pack another released.
+	reloadMu sync.Mutex
+}
+
+// OpenPages returns the tree below root with the packs found under
+// root/manpages mapped. Packs that cannot be opened are logged and their
+// releases read from files.
+func OpenPages(root string) *Pages {
+	p := &Pages{root: root, files: os.DirFS(root)}
+	p.packs = p.openPacks(nil)
+	return p
+}
+
+// openPacks maps the pack of every release under root/manpages, reusing
+// the packs in current whose segments have not changed.
+func (p *Pages) openPacks(current map[string]*Pack) map[string]*Pack {
+	packs := make(map[string]*Pack)
+	manpages := filepath.Join(p.root, "manpages")
+	releases, err := os.ReadDir(manpages)
+	if err != nil {
+		return packs
+	}
+	for _, rel := range releases {
+		if !rel.IsDir() || IsTombstone(rel.Name()) {
+			continue
+		}
+		dir := filepath.Join(manpages, rel.Name(), PackDir)
+		paths, err := listSegments(dir)
+		if err != nil || len(paths) == 0 {
+			continue
+		}
+		if old := current[rel.Name()]; old != nil && old.hasSegments(paths) {
+			packs[rel.Name()] = old
+			continue
+		}
+		pack, err := OpenPack(dir)
+		if err != nil {
+			slog.Warn("open pack", "release", rel.Name(), "error", err)
+			continue
+		}
+		packs[rel.Name()] = pack
+	}
+	return packs
+}
+
+// hasSegments reports whether the pack was opened from exactly paths.
+func (p *Pack) hasSegments(paths []string) bool {
+	if len(paths) != len(p.segments) {
+		return false
+	}
+	for i, seg := range p.segments {
+		if seg.path != paths[i] {
+			return false
+		}
+	}
+	return true
+}
+
+// Reload maps the packs written or compacted since the last load, for
+// example after an ingest run. A replaced pack is unmapped once the pages
+// read from it before are released, however many reloads follow.
+func (p *Pages) Reload() {
+	p.reloadMu.Lock()
+	defer p.reloadMu.Unlock()
+	p.mu.RLock()
+	current := p.packs
+	p.mu.RUnlock()
+	packs := p.openPacks(current)
+
+	p.mu.Lock()
+	var replaced []*Pack
+	for release, pack := range p.packs {
+		if packs[release] != pack {
+			replaced = append(replaced, pack)
+		}
+	}
+	p.packs = packs
+	p.mu.Unlock()
+	for _, pack := range replaced {
+		_ = pack.Close()
+	}
+}
+
+// Close releases every pack, which is unmapped once the pages read from it
+// are released.
+func (p *Pages) Close() error {
+	p.reloadMu.Lock()
+	defer p.reloadMu.Unlock()
+	p.mu.Lock()
+	defer p.mu.Unlock()
+	var errs []error
+	for _, pack := range p.packs {
+		errs = append(errs, pack.Close())
+	}
+	p.packs = nil
+	return errors.Join(errs...)
+}
+
+// Packed reports whether release is stored in a pack.
+func (p *Pages) Packed(release string) bool {
+	p.mu.RLock()
+	defer p.mu.RUnlock()
+	return p.packs[release] != nil
+}
+
+// resolve returns the pack and packed entry that name refers to after
+// following packed symlinks, or the path to read from files when name is
+// not packed. dir reports a directory implied by packed entries. A pack
+// returned is referenced for the caller, which must release it.
+func (p *Pages) resolve(name string) (pack *Pack, rel, release string, entry segmentEntry, dir bool, err error) {
+	p.mu.RLock()
+	defer p.mu.RUnlock()
+	for hops := 0; hops <= maxSymlinkHops; hops++ {
+		release, rel, ok := splitPackPath(name)
+		pack := p.packs[release]
+		if !ok || pack == nil {
+			return nil, name, "", segmentEntry{}, false, nil
+		}
+		e, found := pack.lookup(rel)
+		switch {
+		case found && e.kind == kindSymlink:
+			name = path.Join(path.Dir(name), string(e.data))
+			continue
+		case found:
+			pack.acquire()
+			return pack, rel, release, e, false, nil
+		case pack.isDir(rel):
+			pack.acquire()
+			return pack, rel, release, segmentEntry{}, true, nil
+		}
+		return nil, name, "", segmentEntry{}, false, nil
+	}
+	return nil, name, "", segmentEntry{}, false, &fs.PathError{Op: "open", Path: name, Err: errors.New("too many levels of symbolic links")}
+}
+
+// Open opens the file or directory at name.
+func (p *Pages) Open(name string) (fs.File, error) {
+	if !fs.ValidPath(name) {
+		return nil, &fs.PathError{Op: "open", Path: name, Err: fs.ErrInvalid}
+	}
+	pack, rel, _, e, dir, err := p.resolve(name)
+	if err != nil {
+		return nil, err
+	}
+	if pack == nil {
+		if !p.isPackedDir(rel) {
+			return p.files.Open(rel)
+		}
+		info, err := p.Stat(rel)
+		if err != nil {
+			return nil, err
+		}
+		entries, err := p.ReadDir(rel)
+		if err != nil {
+			return nil, err
+		}
+		return &packDir{info: info, entries: entries}, nil
+	}
+	if dir {
+		modTime := pack.modTime
+		_ = pack.release()
+		entries, err := p.ReadDir(name)
+		if err != nil {
+			return nil, err
+		}
+		return &packDir{info: packDirInfo{name: path.Base(rel), modTime: modTime}, entries: entries}, nil
+	}
+	return &packFile{Reader: bytes.NewReader(e.data), info: packFileInfo{e}, pack: pack}, nil
+}
+
+// Stat returns the file info of name, following symlinks.
+func (p *Pages) Stat(name string) (fs.FileInfo, error) {
+	if !fs.ValidPath(name) {
+		return nil, &fs.PathError{Op: "stat", Path: name, Err: fs.ErrInvalid}
+	}
+	pack, rel, _, e, dir, err := p.resolve(name)
+	if err != nil {
+		return nil, err
+	}
+	if pack != nil {
+		// Only the entry's name and size are used, which outlive the mapping.
+		_ = pack.release()
+	}
+	switch {
+	case pack == nil:
+		if info, err := fs.Stat(p.files, rel); err == nil || !p.isPackedDir(rel) {
+			return info, err
+		}
+		return packDirInfo{name: path.Base(rel)}, nil
+	case dir:
+		return packDirInfo{name: path.Base(rel), modTime: pack.modTime}, nil
+	}
+	return packFileInfo{e}, nil
+}
+
+// isPackedDir reports whether name is a directory holding a release's
+// packed tree, which is the release directory itself.
+func (p *Pages) isPackedDir(name string) bool {
+	release, rel, ok := splitPackPath(name + "/.")
+	return ok && rel == "." && p.Packed(release)
+}
+
+// ReadDir returns the entries of the directory name, sorted by name, with
+// packed entries taking the place of files of the same name.
+func (p *Pages) ReadDir(name string) ([]fs.DirEntry, error) {
+	if !fs.ValidPath(name) {
+		return nil, &fs.PathError{Op: "readdir", Path: name, Err: fs.ErrInvalid}
+	}
+	files, filesErr := fs.ReadDir(p.files, name)
+
+	release, rel, ok := splitPackPath(name + "/.")
+	p.mu.RLock()
+	pack := p.packs[release]
+	p.mu.RUnlock()
+	if !ok || pack == nil {
+		return files, filesErr
+	}
+	if rel == "." {
+		rel = ""
+	}
+	children, found := pack.children(rel)
+	if !found {
+		return files, filesErr
+	}
+
+	entries := make([]fs.DirEntry, 0, len(children)+len(files))
+	seen := make(map[string]bool, len(children))
+	for _, c := range children {
+		seen[c.name] = true
+		if c.entry == nil {
+			entries = append(entries, fs.FileInfoToDirEntry(packDirInfo{name: c.name, modTime: pack.modTime}))
+		} else {
+			entries = append(entries, fs.FileInfoToDirEntry(packFileInfo{*c.entry}))
+		}
+	}
+	for _, f := range files {
+		if !seen[f.Name()] {
+			entries = append(entries, f)
+		}
+	}
+	if len(files) > 0 {
+		sort.Slice(entries, func(i, j int) bool { return entries[i].Name() < entries[j].Name() })
+	}
+	return entries, nil
+}
+
+// ReadFile returns a copy of the contents of the file at name.
+func (p *Pages) ReadFile(name string) ([]byte, error) {
+	data, pack, err := p.read(name)
+	if pack != nil {
+		data = bytes.Clone(data)
+		_ = pack.release()
+	}
+	return data, err
+}
+
+// Bytes returns the contents of the file at name, and a function to call
+// once they are no longer used. Packed files are returned without copying,
+// as a slice of the pack's mapping, which the caller must not modify and
+// which stays mapped until done is called, across reloads. done is never
+// nil.
+func (p *Pages) Bytes(name string) (data []byte, done func(), err error) {
+	data, pack, err := p.read(name)
+	if pack == nil {
+		return data, func() {}, err
+	}
+	var once sync.Once
+	return data, func() { once.Do(func() { _ = pack.release() }) }, nil
+}
+
+// read returns the contents of the file at name and, when they are a slice
+// of a pack's mapping, the pack, referenced for the caller.
+func (p *Pages) read(name string) ([]byte, *Pack, error) {
+	if !fs.ValidPath(name) {
+		return nil, nil, &fs.PathError{Op: "read", Path: name, Err: fs.ErrInvalid}
+	}
+	pack, rel, _, e, dir, err := p.resolve(name)
+	switch {
+	case err != nil:
+		return nil, nil, err
+	case pack == nil:
+		data, err := fs.ReadFile(p.files, rel)
+		return data, nil, err
+	case dir:
+		_ = pack.release()
+		return nil, nil, &fs.PathError{Op: "read", Path: name, Err: errors.New("is a directory")}
+	}
+	return e.data, pack, nil
+}
+
+// packFileInfo describes a packed file or symlink.
+type packFileInfo struct{ e segmentEntry }
+
+func (i packFileInfo) Name() string       { return path.Base(i.e.name) }
+func (i packFileInfo) Size() int64        { return int64(len(i.e.data)) }
+func (i packFileInfo) ModTime() time.Time { return time.Unix(0, i.e.modTime) }
+func (i packFileInfo) IsDir() bool        { return false }
+func (i packFileInfo) Sys() any           { return nil }
+func (i packFileInfo) Mode() fs.FileMode {
+	if i.e.kind == kindSymlink {
+		return fs.ModeSymlink | 0o777
+	}
+	return 0o644
+}
+
+// packDirInfo describes a directory implied by packed entries. Its
+// modification time is that of the pack's newest segment, so it changes
+// whenever an ingest run changes the release, like a directory's does.
+type packDirInfo struct {
+	name    string
+	modTime time.Time
+}
+
+func (i packDirInfo) Name() string       { return i.name }
+func (i packDirInfo) Size() int64        { return 0 }
+func (i packDirInfo) ModTime() time.Time { return i.modTime }
+func (i packDirInfo) IsDir() bool        { return true }
+func (i packDirInfo) Sys() any           { return nil }
+func (i packDirInfo) Mode() fs.FileMode  { return fs.ModeDir | 0o755 }
+
+// packFile is an open packed file. It holds a reference to its pack, so
+// the data stays mapped until it is closed.
+type packFile struct {
+	*bytes.Reader
+	info fs.FileInfo
+	pack *Pack
+}
+
+func (f *packFile) Stat() (fs.FileInfo, error) { return f.info, nil }
+
+func (f *packFile) Close() error {
+	if f.pack == nil {
+		return nil
+	}
+	pack := f.pack
+	f.pack = nil
+	return pack.release()
+}
+
+// packDir is an open directory with packed entries.
+type packDir struct {
+	info    fs.FileInfo
+	entries []fs.DirEntry
+	offset  int
+}
+
+func (d *packDir) Stat() (fs.FileInfo, error) { return d.info, nil }
+func (d *packDir) Close() error               { return nil }
+func (d *packDir) Read([]byte) (int, error) {
+	return 0, &fs.PathError{Op: "read", Path: d.info.Name(), Err: errors.New("is a directory")}
+}
+
+func (d *packDir) ReadDir(n int) ([]fs.DirEntry, error) {
+	rest := d.entries[d.offset:]
+	if n <= 0 {
+		d.offset = len(d.entries)
+		return rest, nil
+	}
+	if len(rest) == 0 {
+		return nil, io.EOF
+	}
+	rest = rest[:min(n, len(rest))]
+	d.offset += len(rest)
+	return rest, nil
+}
@@ -0,0 +1,270 @@
+package storage
+
+import (
+	"context"
+	"fmt"
+	"io"
+	"io/fs"
+	"os"
+	"path/filepath"
+	"strings"
+	"sync"
+	"testing"
+	"testing/fstest"
+)
+
+// writePages writes content below root as files.
+func writePages(t testing.TB, root string, files map[string]string) {
+	t.Helper()
+	for name, content := range files {
+		path := filepath.Join(root, filepath.FromSlash(name))
+		if err := os.MkdirAll(filepath.Dir(path), 0o755); err != nil {
+			t.Fatal(err)
+		}
+		if err := os.WriteFile(path, []byte(content), 0o644); err != nil {
+			t.Fatal(err)
+		}
+	}
+}
+
+// packPages writes content to the packs below root in one ingest run.
+func packPages(t testing.TB, root string, files map[string]string) {
+	t.Helper()
+	s := NewFSStorage(root)
+	s.Packs = NewPackWriter(filepath.Join(root, "manpages"))
+	for name, content := range files {
+		if err := s.WriteHTML(context.Background(), name, []byte(content)); err != nil {
+			t.Fatal(err)
+		}
+	}
+	if err := s.Packs.Close(); err != nil {
+		t.Fatal(err)
+	}
+}
+
+func TestPagesMergesPacksWithFiles(t *testing.T) {
+	root := t.TempDir()
+	writePages(t, root, map[string]string{
+		"manpages/noble/man1/ls.1.html":   "stale ls",
+		"manpages/noble/man1/cat.1.html":  "cat",
+		"manpages/jammy/man1/ls.1.html":   "jammy ls",
+		"manpages.gz/noble/man1/ls.1.gz":  "gzip",
+		"manpages/noble/man8/apt.8.html":  "apt",
+		"sitemaps/sitemap-noble-man1.xml": "<urlset/>",
+	})
+	packPages(t, root, map[string]string{
+		"manpages/noble/man1/ls.1.html":    "ls",
+		"manpages/noble/man1/grep.1.html":  "grep",
+		"manpages/noble/man5/fstab.5.html": "fstab",
+	})
+	s := NewFSStorage(root)
+	s.Packs = NewPackWriter(filepath.Join(root, "manpages"))
+	if err := s.WriteSymlink(context.Background(), "manpages/noble/man1/dir.1.html", "ls.1.html"); err != nil {
+		t.Fatal(err)
+	}
+	if err := s.Commit("noble"); err != nil {
+		t.Fatal(err)
+	}
+
+	pages := OpenPages(root)
+	defer func() { _ = pages.Close() }()
+	if !pages.Packed("noble") || pages.Packed("jammy") {
+		t.Errorf("Packed(noble), Packed(jammy) = %v, %v, want true, false", pages.Packed("noble"), pages.Packed("jammy"))
+	}
+
+	for name, want := range map[string]string{
+		"manpages/noble/man1/ls.1.html":  "ls",
+		"manpages/noble/man1/dir.1.html": "ls",
+		"manpages/noble/man1/cat.1.html": "cat",
+		"manpages/jammy/man1/ls.1.html":  "jammy ls",
+		"manpages.gz/noble/man1/ls.1.gz": "gzip",
+	} {
+		got, done, err := pages.Bytes(name)
+		if err != nil || string(got) != want {
+			t.Errorf("Bytes(%s) = %q, %v, want %q", name, got, err, want)
+		}
+		done()
+	}
+	if _, _, err := pages.Bytes("manpages/noble/man1/missing.1.html"); !os.IsNotExist(err) {
+		t.Errorf("Bytes(missing) error = %v, want not exist", err)
+	}
+
+	entries, err := fs.ReadDir(pages, "manpages/noble/man1")
+	if err != nil {
+		t.Fatal(err)
+	}
+	var names []string
+	for _, e := range entries {
+		names = append(names, e.Name())
+	}
+	if got, want := fmt.Sprint(names), "[cat.1.html dir.1.html grep.1.html ls.1.html]"; got != want {
+		t.Errorf("ReadDir(man1) = %s, want %s", got, want)
+	}
+	entries, err = fs.ReadDir(pages, "manpages/noble")
+	if err != nil {
+		t.Fatal(err)
+	}
+	names = names[:0]
+	for _, e := range entries {
+		if !e.IsDir() {
+			t.Errorf("%s is not a directory", e.Name())
+		}
+		names = append(names, e.Name())
+	}
+	if got, want := fmt.Sprint(names), "["+PackDir+" man1 man5 man8]"; got != want {
+		t.Errorf("ReadDir(noble) = %s, want %s", got, want)
+	}
+	if info, err := fs.Stat(pages, "manpages/noble/man5"); err != nil || !info.IsDir() {
+		t.Errorf("Stat(man5) = %v, %v, want a directory", info, err)
+	}
+
+	if err := fstest.TestFS(pages, "manpages/noble/man1/ls.1.html", "manpages/noble/man5/fstab.5.html", "manpages/jammy/man1/ls.1.html"); err != nil {
+		t.Error(err)
+	}
+}
+
+// readPage returns the contents of name in pages as a string, releasing them.
+func readPage(pages *Pages, name string) string {
+	data, done, _ := pages.Bytes(name)
+	defer done()
+	return string(data)
+}
+
+func TestPagesReload(t *testing.T) {
+	root := t.TempDir()
+	const name = "manpages/noble/man1/ls.1.html"
+	writePages(t, root, map[string]string{name: "ls from files"})
+	pages := OpenPages(root)
+	defer func() { _ = pages.Close() }()
+
+	packPages(t, root, map[string]string{name: "ls v1"})
+	if got := readPage(pages, name); got != "ls from files" {
+		t.Errorf("before Reload = %q, want files", got)
+	}
+	pages.Reload()
+	v1, doneV1, _ := pages.Bytes(name)
+	if string(v1) != "ls v1" {
+		t.Errorf("after Reload = %q, want ls v1", v1)
+	}
+	f, err := pages.Open(name)
+	if err != nil {
+		t.Fatal(err)
+	}
+	pages.mu.RLock()
+	packV1 := pages.packs["noble"]
+	pages.mu.RUnlock()
+
+	// Pages read before reloads stay mapped until they are released, however
+	// many reloads follow.
+	packPages(t, root, map[string]string{name: "ls v2"})
+	pages.Reload()
+	if got := readPage(pages, name); got != "ls v2" {
+		t.Errorf("after second Reload = %q, want ls v2", got)
+	}
+	packPages(t, root, map[string]string{name: "ls v3"})
+	pages.Reload()
+	if got := readPage(pages, name); got != "ls v3" {
+		t.Errorf("after third Reload = %q, want ls v3", got)
+	}
+	if string(v1) != "ls v1" {
+		t.Errorf("page read before the reloads = %q, want ls v1", v1)
+	}
+	doneV1()
+	doneV1()
+	if got, err := io.ReadAll(f); err != nil || string(got) != "ls v1" {
+		t.Errorf("file opened before the reloads = %q, %v, want ls v1", got, err)
+	}
+	if packV1.segments == nil {
+		t.Error("pack unmapped while a file opened from it is open")
+	}
+	_ = f.Close()
+	if packV1.segments != nil {
+		t.Error("pack still mapped after its last reader was released")
+	}
+
+	// Removing the pack falls back to files.
+	if err := os.RemoveAll(filepath.Join(root, "manpages", "noble", PackDir)); err != nil {
+		t.Fatal(err)
+	}
+	pages.Reload()
+	if got := readPage(pages, name); got != "ls from files" {
+		t.Errorf("after removing the pack = %q, want files", got)
+	}
+}
+
+func TestPagesReloadConcurrent(t *testing.T) {
+	root := t.TempDir()
+	const name = "manpages/noble/man1/ls.1.html"
+	pages := OpenPages(root)
+	defer func() { _ = pages.Close() }()
+
+	// Two goroutines reload while ingest runs keep changing the pack. A
+	// reload that listed the segments before a run must not install the
+	// pack it found after the other reload released it.
+	stop := make(chan struct{})
+	var wg sync.WaitGroup
+	for i := 0; i < 2; i++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for {
+				select {
+				case <-stop:
+					return
+				default:
+					pages.Reload()
+				}
+			}
+		}()
+	}
+	const runs = 30
+	for i := 0; i < runs; i++ {
+		packPages(t, root, map[string]string{name: fmt.Sprintf("ls v%d", i)})
+	}
+	close(stop)
+	wg.Wait()
+
+	pages.mu.RLock()
+	pack := pages.packs["noble"]
+	pages.mu.RUnlock()
+	if pack == nil || pack.refs.Load() < 1 || pack.segments == nil {
+		t.Fatal("concurrent reloads left a released pack in place")
+	}
+	pages.Reload()
+	if got, want := readPage(pages, name), fmt.Sprintf("ls v%d", runs-1); got != want {
+		t.Errorf("after the runs = %q, want %q", got, want)
+	}
+}
+
+// BenchmarkPagesRead compares reading pages from files with reading them
+// from a pack.
+func BenchmarkPagesRead(b *testing.B) {
+	const n = 2000
+	files := make(map[string]string, n)
+	names := make([]string, 0, n)
+	for i := range n {
+		name := fmt.Sprintf("manpages/noble/man1/p%d.1.html", i)
+		files[name] = strings.Repeat("x", 8<<10)
+		names = append(names, name)
+	}
+	for _, backend := range []string{"files", "packed"} {
+		b.Run(backend, func(b *testing.B) {
+			root := b.TempDir()
+			if backend == "files" {
+				writePages(b, root, files)
+			} else {
+				packPages(b, root, files)
+			}
+			pages := OpenPages(root)
+			defer func() { _ = pages.Close() }()
+			b.ResetTimer()
+			for i := 0; i < b.N; i++ {
+				_, done, err := pages.Bytes(names[i%n])
+				if err != nil {
+					b.Fatal(err)
+				}
+				done()
+			}
+		})
+	}
+}
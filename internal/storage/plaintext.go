@@ -0,0 +1,60 @@
+package storage
+
+import (
+	"bytes"
+	"compress/gzip"
+	"strings"
+
+	"github.com/canonical/ubuntu-manpages-operator/internal/transform"
+)
+
+// PlainTextSuffix replaces ".html" in the path of a manpage to name its
+// plain-text rendering.
+const PlainTextSuffix = ".txt"
+
+// PlainTextPath returns the path of the plain-text rendering of the HTML
+// page at htmlPath.
+func PlainTextPath(htmlPath string) string {
+	return strings.TrimSuffix(htmlPath, ".html") + PlainTextSuffix
+}
+
+// writePlainText writes the plain-text rendering of the HTML page content
+// at destPath and, with Precompress, a gzip copy of it. The copy is a plain
+// gzip file, served as is.
+func (s *FSStorage) writePlainText(destPath string, content []byte) error {
+	text := []byte(transform.ManpageText(string(content)))
+	txtPath := PlainTextPath(destPath)
+	if err := s.writeFile(txtPath, text); err != nil {
+		return err
+	}
+	if s.Precompress {
+		return s.writeFile(txtPath+PrecompressedSuffix, gzipText(text))
+	}
+	return nil
+}
+
+// writePlainTextSymlink links the plain-text rendering of the HTML page at
+// destPath, and its gzip copy, to those of the page target links to.
+func (s *FSStorage) writePlainTextSymlink(destPath, target string) error {
+	if !strings.HasSuffix(destPath, ".html") || !strings.HasSuffix(target, ".html") {
+		return nil
+	}
+	txtPath, txtTarget := PlainTextPath(destPath), PlainTextPath(target)
+	if err := s.writeSymlink(txtPath, txtTarget); err != nil {
+		return err
+	}
+	if s.Precompress {
+		return s.writeSymlink(txtPath+PrecompressedSuffix, txtTarget+PrecompressedSuffix)
+	}
+	return nil
+}
+
+// gzipText compresses text as a standard gzip file.
+func gzipText(text []byte) []byte {
+	var buf bytes.Buffer
+	buf.Grow(len(text)/3 + 64)
+	gw, _ := gzip.NewWriterLevel(&buf, gzip.BestCompression)
+	_, _ = gw.Write(text)
+	_ = gw.Close()
+	return buf.Bytes()
+}
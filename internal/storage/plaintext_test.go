@@ -0,0 +1,53 @@
+package storage
+
+import (
+	"bytes"
+	"compress/gzip"
+	"context"
+	"io"
+	"os"
+	"path/filepath"
+	"testing"
+)
+
+func TestWriteHTMLPlainText(t *testing.T) {
+	root := t.TempDir()
+	dir := filepath.Join(root, "manpages", "noble", "man1")
+	s := NewFSStorage(root)
+	if err := s.WriteHTML(context.Background(), "manpages/noble/man1/ls.1.html", []byte(testPage)); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := os.Stat(filepath.Join(dir, "ls.1.txt")); !os.IsNotExist(err) {
+		t.Fatalf("plain text written without PlainText: %v", err)
+	}
+
+	s.PlainText = true
+	s.Precompress = true
+	if err := s.WriteHTML(context.Background(), "manpages/noble/man1/ls.1.html", []byte(testPage)); err != nil {
+		t.Fatal(err)
+	}
+	if err := s.WriteSymlink(context.Background(), "manpages/noble/man1/dir.1.html", "ls.1.html"); err != nil {
+		t.Fatal(err)
+	}
+	const want = "NAME  ls - list directory contents"
+	for _, name := range []string{"ls.1.txt", "dir.1.txt"} {
+		text, err := os.ReadFile(filepath.Join(dir, name))
+		if err != nil || string(text) != want {
+			t.Errorf("%s = %q, %v, want %q", name, text, err, want)
+		}
+		gz, err := os.ReadFile(filepath.Join(dir, name+PrecompressedSuffix))
+		if err != nil {
+			t.Fatal(err)
+		}
+		gr, err := gzip.NewReader(bytes.NewReader(gz))
+		if err != nil {
+			t.Fatal(err)
+		}
+		if got, err := io.ReadAll(gr); err != nil || string(got) != want {
+			t.Errorf("%s%s decompressed %q, %v, want %q", name, PrecompressedSuffix, got, err, want)
+		}
+	}
+	if target, err := os.Readlink(filepath.Join(dir, "dir.1.txt")); err != nil || target != "ls.1.txt" {
+		t.Errorf("dir.1.txt links to %q, %v, want ls.1.txt", target, err)
+	}
+}
@@ -0,0 +1,122 @@
+package storage
+
+import (
+	"bytes"
+	"compress/flate"
+	"encoding/binary"
+	"hash/crc32"
+)
+
+// PrecompressedSuffix is appended to the path of an HTML page to name its
+// precompressed copy.
+const PrecompressedSuffix = ".gz"
+
+// A precompressed page is a standard gzip file of the page, so any tool can
+// read it, laid out so that the server can reuse the compressed body when it
+// wraps the page in the site template:
+//
+//   - the META header comment and the body are deflated by separate
+//     compressors, so the body's deflate blocks refer to nothing before
+//     them, and each part ends with a sync flush, so it is byte aligned and
+//     not final;
+//   - an empty final stored block follows;
+//   - the gzip header carries an "MP" extra subfield with the offset of the
+//     body's blocks in the deflate stream and of the body in the page.
+const (
+	gzipHeaderLen  = 10
+	segmentXLen    = 12
+	segmentDataLen = 8
+	gzipTrailerLen = 8
+)
+
+// finalEmptyBlock is a final stored block of length zero, as written after
+// a sync flush.
+var finalEmptyBlock = []byte{0x01, 0x00, 0x00, 0xff, 0xff}
+
+// htmlBodyStart returns the offset of the page body in content: after a
+// leading <!--META:...--> header and the newline following it.
+func htmlBodyStart(content []byte) int {
+	const metaPrefix, metaSuffix = "<!--META:", "-->"
+	if !bytes.HasPrefix(content, []byte(metaPrefix)) {
+		return 0
+	}
+	end := bytes.Index(content, []byte(metaSuffix))
+	if end == -1 {
+		return 0
+	}
+	start := end + len(metaSuffix)
+	if start < len(content) && content[start] == '\n' {
+		start++
+	}
+	return start
+}
+
+// precompress returns the precompressed form of an HTML page.
+func precompress(content []byte) []byte {
+	split := htmlBodyStart(content)
+	var buf bytes.Buffer
+	buf.Grow(len(content)/4 + 64)
+	buf.Write([]byte{0x1f, 0x8b, 8, 0x04, 0, 0, 0, 0, 0, 255})
+	var extra [2 + 4 + segmentDataLen]byte
+	binary.LittleEndian.PutUint16(extra[0:], segmentXLen)
+	extra[2], extra[3] = 'M', 'P'
+	binary.LittleEndian.PutUint16(extra[4:], segmentDataLen)
+	buf.Write(extra[:])
+
+	deflateStart := buf.Len()
+	deflatePart(&buf, content[:split])
+	bodyOffset := buf.Len() - deflateStart
+	deflatePart(&buf, content[split:])
+	buf.Write(finalEmptyBlock)
+
+	var trailer [gzipTrailerLen]byte
+	binary.LittleEndian.PutUint32(trailer[0:], crc32.ChecksumIEEE(content))
+	binary.LittleEndian.PutUint32(trailer[4:], uint32(len(content)))
+	buf.Write(trailer[:])
+
+	data := buf.Bytes()
+	binary.LittleEndian.PutUint32(data[gzipHeaderLen+6:], uint32(bodyOffset))
+	binary.LittleEndian.PutUint32(data[gzipHeaderLen+10:], uint32(split))
+	return data
+}
+
+// deflatePart compresses p with a fresh compressor and ends it with a sync
+// flush, leaving the stream byte aligned and open.
+func deflatePart(buf *bytes.Buffer, p []byte) {
+	fw, _ := flate.NewWriter(buf, flate.BestCompression)
+	_, _ = fw.Write(p)
+	_ = fw.Flush()
+}
+
+// PrecompressedBody returns the deflate blocks of the body of content from
+// its precompressed copy gz, and the offset of the body in content. The
+// blocks are byte aligned, not final, and refer to nothing before them, so
+// they can be spliced into another deflate stream. ok is false when gz is
+// not a precompressed copy of content, for example because the page was
+// rewritten without one.
+func PrecompressedBody(gz, content []byte) (blocks []byte, offset int, ok bool) {
+	const headerLen = gzipHeaderLen + 2 + segmentXLen
+	if len(gz) < headerLen+len(finalEmptyBlock)+gzipTrailerLen ||
+		!bytes.Equal(gz[:4], []byte{0x1f, 0x8b, 8, 0x04}) ||
+		binary.LittleEndian.Uint16(gz[gzipHeaderLen:]) != segmentXLen ||
+		gz[gzipHeaderLen+2] != 'M' || gz[gzipHeaderLen+3] != 'P' ||
+		binary.LittleEndian.Uint16(gz[gzipHeaderLen+4:]) != segmentDataLen {
+		return nil, 0, false
+	}
+	trailer := gz[len(gz)-gzipTrailerLen:]
+	if binary.LittleEndian.Uint32(trailer[4:]) != uint32(len(content)) ||
+		binary.LittleEndian.Uint32(trailer) != crc32.ChecksumIEEE(content) {
+		return nil, 0, false
+	}
+	deflate := gz[headerLen : len(gz)-gzipTrailerLen]
+	if !bytes.HasSuffix(deflate, finalEmptyBlock) {
+		return nil, 0, false
+	}
+	deflate = deflate[:len(deflate)-len(finalEmptyBlock)]
+	bodyOffset := int(binary.LittleEndian.Uint32(gz[gzipHeaderLen+6:]))
+	offset = int(binary.LittleEndian.Uint32(gz[gzipHeaderLen+10:]))
+	if bodyOffset > len(deflate) || offset > len(content) {
+		return nil, 0, false
+	}
+	return deflate[bodyOffset:], offset, true
+}
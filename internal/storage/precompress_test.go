@@ -0,0 +1,76 @@
+package storage
+
+import (
+	"bytes"
+	"compress/flate"
+	"compress/gzip"
+	"context"
+	"io"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+)
+
+const testPage = `<!--META:{"title":"ls","description":"list directory contents"}-->` + "\n" + `<h2>NAME</h2><p>ls - list directory contents</p>`
+
+func TestPrecompressIsGzip(t *testing.T) {
+	for _, content := range []string{testPage, "<p>no header</p>", ""} {
+		gr, err := gzip.NewReader(bytes.NewReader(precompress([]byte(content))))
+		if err != nil {
+			t.Fatalf("gzip.NewReader(%q): %v", content, err)
+		}
+		got, err := io.ReadAll(gr)
+		if err != nil || string(got) != content {
+			t.Errorf("decompressed %q, %v, want %q", got, err, content)
+		}
+	}
+}
+
+func TestPrecompressedBody(t *testing.T) {
+	content := []byte(testPage)
+	blocks, offset, ok := PrecompressedBody(precompress(content), content)
+	if !ok {
+		t.Fatal("PrecompressedBody() not ok")
+	}
+	if want := strings.Index(testPage, "<h2>"); offset != want {
+		t.Errorf("offset = %d, want %d", offset, want)
+	}
+	// The blocks stand alone: ended by a final block, they inflate to the body.
+	stream := append(append([]byte(nil), blocks...), finalEmptyBlock...)
+	got, err := io.ReadAll(flate.NewReader(bytes.NewReader(stream)))
+	if err != nil || string(got) != testPage[offset:] {
+		t.Errorf("inflated %q, %v, want %q", got, err, testPage[offset:])
+	}
+
+	if _, _, ok := PrecompressedBody(precompress(content), []byte(strings.Replace(testPage, "ls", "lz", 1))); ok {
+		t.Error("PrecompressedBody() ok for other content")
+	}
+	if _, _, ok := PrecompressedBody([]byte("not gzip"), content); ok {
+		t.Error("PrecompressedBody() ok for garbage")
+	}
+}
+
+func TestWriteHTMLPrecompress(t *testing.T) {
+	root := t.TempDir()
+	s := NewFSStorage(root)
+	if err := s.WriteHTML(context.Background(), "manpages/noble/man1/ls.1.html", []byte(testPage)); err != nil {
+		t.Fatal(err)
+	}
+	gzPath := filepath.Join(root, "manpages", "noble", "man1", "ls.1.html"+PrecompressedSuffix)
+	if _, err := os.Stat(gzPath); !os.IsNotExist(err) {
+		t.Fatalf("precompressed copy written without Precompress: %v", err)
+	}
+
+	s.Precompress = true
+	if err := s.WriteHTML(context.Background(), "manpages/noble/man1/ls.1.html", []byte(testPage)); err != nil {
+		t.Fatal(err)
+	}
+	gz, err := os.ReadFile(gzPath)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if _, _, ok := PrecompressedBody(gz, []byte(testPage)); !ok {
+		t.Error("written copy does not match the page")
+	}
+}
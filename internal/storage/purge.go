@@ -0,0 +1,116 @@
+package storage
+
+import (
+	"context"
+	"errors"
+	"fmt"
+	"io"
+	"log/slog"
+	"os"
+	"path/filepath"
+	"strings"
+)
+
+// TombstonePrefix marks a release tree that has been renamed away by the
+// charm and is waiting to be deleted by PurgeTombstones.
+const TombstonePrefix = ".purge-"
+
+// purgeBatchSize is the number of directory entries read and removed at a
+// time, which bounds memory use on directories with hundreds of thousands
+// of entries.
+const purgeBatchSize = 1024
+
+// purgeProgressEvery controls how often (in removed entries) progress is logged.
+const purgeProgressEvery = 50000
+
+// IsTombstone reports whether a directory name is a purge tombstone.
+func IsTombstone(name string) bool {
+	return strings.HasPrefix(name, TombstonePrefix)
+}
+
+// PurgeTombstones deletes every tombstoned tree directly under the given
+// directories (e.g. {root}/manpages and {root}/manpages.gz). Directories
+// that do not exist are skipped. Progress is logged periodically so that
+// long-running purges can be followed in the service logs.
+func PurgeTombstones(ctx context.Context, logger *slog.Logger, dirs ...string) error {
+	var removed int
+	progress := func() {
+		removed++
+		if removed%purgeProgressEvery == 0 {
+			logger.Info("purge progress", "removed", removed)
+		}
+	}
+
+	for _, dir := range dirs {
+		entries, err := os.ReadDir(dir)
+		if err != nil {
+			if os.IsNotExist(err) {
+				continue
+			}
+			return fmt.Errorf("read %s: %w", dir, err)
+		}
+		for _, e := range entries {
+			if !IsTombstone(e.Name()) {
+				continue
+			}
+			path := filepath.Join(dir, e.Name())
+			logger.Info("purging", "path", path)
+			if err := removeTree(ctx, path, progress); err != nil {
+				return fmt.Errorf("purge %s: %w", path, err)
+			}
+		}
+	}
+
+	logger.Info("purge done", "removed", removed)
+	return nil
+}
+
+// removeTree removes path and everything below it. Unlike os.RemoveAll it
+// reads directories in batches and reports each removed entry, and it
+// checks ctx between batches so a purge can be interrupted.
+func removeTree(ctx context.Context, path string, removed func()) error {
+	info, err := os.Lstat(path)
+	if err != nil {
+		if os.IsNotExist(err) {
+			return nil
+		}
+		return err
+	}
+	if info.IsDir() {
+		if err := removeDirContents(ctx, path, removed); err != nil {
+			return err
+		}
+	}
+	if err := os.Remove(path); err != nil && !os.IsNotExist(err) {
+		return err
+	}
+	removed()
+	return nil
+}
+
+func removeDirContents(ctx context.Context, dir string, removed func()) error {
+	for {
+		if err := ctx.Err(); err != nil {
+			return err
+		}
+		// Re-open the directory for every batch: entries are removed as we
+		// go, so reading from the start always yields the next batch.
+		f, err := os.Open(dir)
+		if err != nil {
+			return err
+		}
+		entries, err := f.ReadDir(purgeBatchSize)
+		_ = f.Close()
+		if err != nil && !errors.Is(err, io.EOF) {
+			return err
+		}
+		if len(entries) == 0 {
+			return nil
+		}
+		for _, e := range entries {
+			if err := removeTree(ctx, filepath.Join(dir, e.Name()), removed); err != nil {
+				return err
+			}
+		}
+	}
+}
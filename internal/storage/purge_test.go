@@ -0,0 +1,66 @@
+package storage
+
+import (
+	"context"
+	"fmt"
+	"io"
+	"log/slog"
+	"os"
+	"path/filepath"
+	"testing"
+)
+
+func TestPurgeTombstones(t *testing.T) {
+	root := t.TempDir()
+	htmlDir := filepath.Join(root, "manpages")
+	gzDir := filepath.Join(root, "manpages.gz")
+
+	// A tombstoned release with more entries than a single purge batch,
+	// plus symlinks, in both trees.
+	for _, dir := range []string{htmlDir, gzDir} {
+		section := filepath.Join(dir, TombstonePrefix+"oracular-1", "man1")
+		if err := os.MkdirAll(section, 0o755); err != nil {
+			t.Fatal(err)
+		}
+		for i := range purgeBatchSize + 10 {
+			if err := os.WriteFile(filepath.Join(section, fmt.Sprintf("p%d.1.html", i)), []byte("x"), 0o644); err != nil {
+				t.Fatal(err)
+			}
+		}
+		if err := os.Symlink("p0.1.html", filepath.Join(section, "link.1.html")); err != nil {
+			t.Fatal(err)
+		}
+		// A live release that must survive.
+		if err := os.MkdirAll(filepath.Join(dir, "noble", "man1"), 0o755); err != nil {
+			t.Fatal(err)
+		}
+	}
+
+	logger := slog.New(slog.NewTextHandler(io.Discard, nil))
+	if err := PurgeTombstones(context.Background(), logger, htmlDir, gzDir, filepath.Join(root, "missing")); err != nil {
+		t.Fatalf("PurgeTombstones: %v", err)
+	}
+
+	for _, dir := range []string{htmlDir, gzDir} {
+		if _, err := os.Stat(filepath.Join(dir, TombstonePrefix+"oracular-1")); !os.IsNotExist(err) {
+			t.Errorf("tombstone in %s not removed: %v", dir, err)
+		}
+		if _, err := os.Stat(filepath.Join(dir, "noble", "man1")); err != nil {
+			t.Errorf("live release in %s removed: %v", dir, err)
+		}
+	}
+}
+
+func TestPurgeTombstones_Cancelled(t *testing.T) {
+	root := t.TempDir()
+	if err := os.MkdirAll(filepath.Join(root, TombstonePrefix+"jammy-1", "man1"), 0o755); err != nil {
+		t.Fatal(err)
+	}
+
+	ctx, cancel := context.WithCancel(context.Background())
+	cancel()
+	logger := slog.New(slog.NewTextHandler(io.Discard, nil))
+	if err := PurgeTombstones(ctx, logger, root); err == nil {
+		t.Fatal("expected error for cancelled context")
+	}
+}
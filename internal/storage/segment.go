@@ -0,0 +1,272 @@
+package storage
+
+import (
+	"bufio"
+	"bytes"
+	"encoding/binary"
+	"errors"
+	"fmt"
+	"hash/crc32"
+	"os"
+	"path/filepath"
+	"sort"
+	"sync"
+	"time"
+)
+
+// A segment file packs many files and symlinks of one release tree into a
+// single immutable file, indexed by their path in the tree:
+//
+//	header  "MPSEG001"
+//	data    file contents and symlink targets, back to back
+//	index   per entry, sorted by name: uvarint name length, name, kind
+//	        byte, uvarint data offset, uvarint data length, varint
+//	        modification time in Unix nanoseconds
+//	footer  uint64 index offset, uint32 index length, uint32 CRC-32 of the
+//	        index, "MPSEGEND"
+//
+// Footer integers are little endian. A segment is written under a temporary
+// name and renamed into place once complete and synced, so readers never
+// see a partial one.
+const (
+	segmentMagic     = "MPSEG001"
+	segmentEndMagic  = "MPSEGEND"
+	segmentFooterLen = 8 + 4 + 4 + len(segmentEndMagic)
+	segmentExt       = ".seg"
+)
+
+// entryKind tells files from symlinks in a segment.
+type entryKind uint8
+
+const (
+	kindFile entryKind = iota
+	kindSymlink
+)
+
+// segmentEntry is one file or symlink of a segment. data is the file's
+// contents or the link's target, sliced from the segment's mapping.
+type segmentEntry struct {
+	name    string
+	kind    entryKind
+	data    []byte
+	modTime int64
+}
+
+// segment is a mapped segment file.
+type segment struct {
+	path    string
+	modTime time.Time
+	unmap   func() error
+	entries []segmentEntry // sorted by name
+}
+
+// openSegment maps the segment file at path and reads its index.
+func openSegment(path string) (*segment, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer func() { _ = f.Close() }()
+	info, err := f.Stat()
+	if err != nil {
+		return nil, err
+	}
+	if info.Size() < int64(len(segmentMagic)+segmentFooterLen) {
+		return nil, fmt.Errorf("segment %s: bad size %d", path, info.Size())
+	}
+	data, unmap, err := mapFile(f, int(info.Size()))
+	if err != nil {
+		return nil, fmt.Errorf("map segment %s: %w", path, err)
+	}
+	entries, err := parseSegment(data)
+	if err != nil {
+		_ = unmap()
+		return nil, fmt.Errorf("segment %s: %w", path, err)
+	}
+	return &segment{path: path, modTime: info.ModTime(), unmap: unmap, entries: entries}, nil
+}
+
+func (s *segment) close() error {
+	return s.unmap()
+}
+
+// parseSegment returns the entries of the segment in data.
+func parseSegment(data []byte) ([]segmentEntry, error) {
+	if !bytes.HasPrefix(data, []byte(segmentMagic)) {
+		return nil, errors.New("bad magic")
+	}
+	footer := data[len(data)-segmentFooterLen:]
+	if string(footer[16:]) != segmentEndMagic {
+		return nil, errors.New("truncated")
+	}
+	indexOff := binary.LittleEndian.Uint64(footer)
+	indexLen := uint64(binary.LittleEndian.Uint32(footer[8:]))
+	dataEnd := uint64(len(data) - segmentFooterLen)
+	if indexOff < uint64(len(segmentMagic)) || indexOff > dataEnd || indexLen != dataEnd-indexOff {
+		return nil, errors.New("bad index bounds")
+	}
+	index := data[indexOff:dataEnd]
+	if crc32.ChecksumIEEE(index) != binary.LittleEndian.Uint32(footer[12:]) {
+		return nil, errors.New("index checksum mismatch")
+	}
+
+	var entries []segmentEntry
+	for len(index) > 0 {
+		nameLen, n := binary.Uvarint(index)
+		if n <= 0 || nameLen+1 > uint64(len(index)-n) {
+			return nil, errors.New("bad index entry")
+		}
+		index = index[n:]
+		e := segmentEntry{name: string(index[:nameLen]), kind: entryKind(index[nameLen])}
+		index = index[nameLen+1:]
+		off, n1 := binary.Uvarint(index)
+		if n1 <= 0 {
+			return nil, errors.New("bad index entry")
+		}
+		size, n2 := binary.Uvarint(index[n1:])
+		if n2 <= 0 {
+			return nil, errors.New("bad index entry")
+		}
+		mtime, n3 := binary.Varint(index[n1+n2:])
+		if n3 <= 0 {
+			return nil, errors.New("bad index entry")
+		}
+		index = index[n1+n2+n3:]
+		if off < uint64(len(segmentMagic)) || off > indexOff || size > indexOff-off {
+			return nil, fmt.Errorf("entry %s out of bounds", e.name)
+		}
+		if e.kind != kindFile && e.kind != kindSymlink {
+			return nil, fmt.Errorf("entry %s has unknown kind %d", e.name, e.kind)
+		}
+		if len(entries) > 0 && entries[len(entries)-1].name >= e.name {
+			return nil, errors.New("index not sorted")
+		}
+		e.data = data[off : off+size : off+size]
+		e.modTime = mtime
+		entries = append(entries, e)
+	}
+	return entries, nil
+}
+
+// segmentWriter writes a segment file. It is safe for concurrent use.
+type segmentWriter struct {
+	path string
+	tmp  string
+
+	mu      sync.Mutex
+	f       *os.File
+	w       *bufio.Writer
+	off     uint64
+	entries map[string]segmentRecord
+}
+
+// segmentRecord locates an entry's data in a segment being written.
+type segmentRecord struct {
+	kind      entryKind
+	off, size uint64
+	modTime   int64
+}
+
+// createSegment starts a segment that close will publish at path.
+func createSegment(path string) (*segmentWriter, error) {
+	tmp := tempPath(path)
+	f, err := os.OpenFile(tmp, os.O_WRONLY|os.O_CREATE|os.O_EXCL, 0o644)
+	if err != nil {
+		return nil, err
+	}
+	w := &segmentWriter{
+		path:    path,
+		tmp:     tmp,
+		f:       f,
+		w:       bufio.NewWriterSize(f, 1<<20),
+		entries: make(map[string]segmentRecord),
+	}
+	if _, err := w.w.WriteString(segmentMagic); err != nil {
+		w.abort()
+		return nil, err
+	}
+	w.off = uint64(len(segmentMagic))
+	return w, nil
+}
+
+// add appends an entry. A later entry with the same name replaces it.
+func (w *segmentWriter) add(name string, kind entryKind, data []byte, modTime time.Time) error {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	if _, err := w.w.Write(data); err != nil {
+		return fmt.Errorf("write segment: %w", err)
+	}
+	w.entries[name] = segmentRecord{kind: kind, off: w.off, size: uint64(len(data)), modTime: modTime.UnixNano()}
+	w.off += uint64(len(data))
+	return nil
+}
+
+// has reports whether an entry named name was added.
+func (w *segmentWriter) has(name string) bool {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	_, ok := w.entries[name]
+	return ok
+}
+
+// empty reports whether no entry was added.
+func (w *segmentWriter) empty() bool {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	return len(w.entries) == 0
+}
+
+// close writes the index, syncs the segment and renames it into place.
+func (w *segmentWriter) close() error {
+	w.mu.Lock()
+	defer w.mu.Unlock()
+	names := make([]string, 0, len(w.entries))
+	for name := range w.entries {
+		names = append(names, name)
+	}
+	sort.Strings(names)
+
+	var index []byte
+	for _, name := range names {
+		rec := w.entries[name]
+		index = binary.AppendUvarint(index, uint64(len(name)))
+		index = append(index, name...)
+		index = append(index, byte(rec.kind))
+		index = binary.AppendUvarint(index, rec.off)
+		index = binary.AppendUvarint(index, rec.size)
+		index = binary.AppendVarint(index, rec.modTime)
+	}
+	var footer [segmentFooterLen]byte
+	binary.LittleEndian.PutUint64(footer[0:], w.off)
+	binary.LittleEndian.PutUint32(footer[8:], uint32(len(index)))
+	binary.LittleEndian.PutUint32(footer[12:], crc32.ChecksumIEEE(index))
+	copy(footer[16:], segmentEndMagic)
+
+	_, err := w.w.Write(index)
+	if err == nil {
+		_, err = w.w.Write(footer[:])
+	}
+	if err == nil {
+		err = w.w.Flush()
+	}
+	if err == nil {
+		err = w.f.Sync()
+	}
+	if closeErr := w.f.Close(); err == nil {
+		err = closeErr
+	}
+	if err == nil {
+		err = os.Rename(w.tmp, w.path)
+	}
+	if err != nil {
+		_ = os.Remove(w.tmp)
+		return fmt.Errorf("write segment %s: %w", w.path, err)
+	}
+	return syncPath(filepath.Dir(w.path))
+}
+
+// abort discards the segment.
+func (w *segmentWriter) abort() {
+	_ = w.f.Close()
+	_ = os.Remove(w.tmp)
+}
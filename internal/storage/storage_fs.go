@@ -2,25 +2,89 @@ package storage
 
 import (
 	"context"
+	"errors"
 	"fmt"
+	"io/fs"
 	"os"
 	"path/filepath"
+	"slices"
+	"strings"
+	"sync"
+	"sync/atomic"
 )
 
+// tmpSeq makes temporary file and symlink names unique within the process.
+var tmpSeq atomic.Uint64
+
+// FSStorage writes manpages below Root. Files are written under a temporary
+// name and renamed into place, so readers never see a partial page, and
+// directories are created once per storage rather than checked per file.
 type FSStorage struct {
 	Root string
+	// Precompress writes a gzip copy of each HTML page next to it, which
+	// the server splices into its compressed responses.
+	Precompress bool
+	// PlainText writes the plain-text rendering of each HTML page next to
+	// it as <page>.txt, which the server streams for .txt requests, and a
+	// gzip copy of it as well with Precompress.
+	PlainText bool
+	// Sync makes written files durable before they are reported written.
+	// A storage returned by Batch defers this to WriteCache, so that a
+	// package's files and directories are synced together before the
+	// package is marked done.
+	Sync bool
+	// Packs, when set, stores the manpages trees of releases in packs
+	// rather than as files. Gzip downloads are always written as files.
+	Packs *PackWriter
+
+	dirs    *sync.Map // directories known to exist
+	pending *pendingSyncs
+}
+
+// pendingSyncs lists the files a batch wrote but has not synced yet.
+type pendingSyncs struct {
+	mu    sync.Mutex
+	files []string
 }
 
 func NewFSStorage(root string) *FSStorage {
-	return &FSStorage{Root: root}
+	return &FSStorage{Root: root, dirs: &sync.Map{}}
+}
+
+// Batch returns a storage for the files of one package. It writes to the
+// same tree, and when Sync is set it syncs the files it wrote, and their
+// directories once each, in WriteCache.
+func (s *FSStorage) Batch() *FSStorage {
+	b := *s
+	if s.Sync {
+		b.pending = &pendingSyncs{}
+	}
+	return &b
 }
 
 func (s *FSStorage) WriteHTML(ctx context.Context, destPath string, content []byte) error {
-	return s.writeFile(destPath, content)
+	if err := s.writeFile(destPath, content); err != nil {
+		return err
+	}
+	if s.Precompress {
+		if err := s.writeFile(destPath+PrecompressedSuffix, precompress(content)); err != nil {
+			return err
+		}
+	}
+	if s.PlainText {
+		return s.writePlainText(destPath, content)
+	}
+	return nil
 }
 
 func (s *FSStorage) WriteSymlink(ctx context.Context, destPath string, target string) error {
-	return s.writeSymlink(destPath, target)
+	if err := s.writeSymlink(destPath, target); err != nil {
+		return err
+	}
+	if s.PlainText {
+		return s.writePlainTextSymlink(destPath, target)
+	}
+	return nil
 }
 
 func (s *FSStorage) WriteGzip(ctx context.Context, destPath string, content []byte) error {
@@ -32,49 +96,244 @@ func (s *FSStorage) WriteGzipSymlink(ctx context.Context, destPath string, targe
 }
 
 func (s *FSStorage) CheckCache(release string, pkgName string, sha1 string) bool {
+	if s.Packs != nil {
+		// Packages ingested before the release was packed are still marked
+		// in files, and served from them.
+		if data, ok := s.Packs.read(release, ".cache/"+pkgName); ok {
+			return s.cached(data, sha1)
+		}
+	}
 	cachePath := filepath.Join(s.Root, "manpages", release, ".cache", pkgName)
 	data, err := os.ReadFile(cachePath)
-	return err == nil && string(data) == sha1
+	return err == nil && s.cached(data, sha1)
+}
+
+// outputs names the optional files this storage writes next to each page.
+func (s *FSStorage) outputs() []string {
+	var outputs []string
+	if s.Precompress {
+		outputs = append(outputs, "precompress")
+	}
+	if s.PlainText {
+		outputs = append(outputs, "plain-text")
+	}
+	return outputs
+}
+
+// cacheMarker returns the cache marker of a package with hash sha1: the
+// hash followed by the optional outputs written for it, so that enabling
+// one processes again the packages ingested without it.
+func (s *FSStorage) cacheMarker(sha1 string) []byte {
+	return []byte(strings.Join(append([]string{sha1}, s.outputs()...), " "))
+}
+
+// cached reports whether marker records a package with hash sha1 written
+// with at least the optional outputs this storage writes. Disabling an
+// output does not require processing packages again.
+func (s *FSStorage) cached(marker []byte, sha1 string) bool {
+	fields := strings.Fields(string(marker))
+	if len(fields) == 0 || fields[0] != sha1 {
+		return false
+	}
+	for _, output := range s.outputs() {
+		if !slices.Contains(fields[1:], output) {
+			return false
+		}
+	}
+	return true
 }
 
 func (s *FSStorage) WriteCache(ctx context.Context, release string, pkgName string, sha1 string) error {
 	if release == "" {
 		return fmt.Errorf("cache release required")
 	}
+	if err := s.syncPending(); err != nil {
+		return err
+	}
+	if s.Packs != nil {
+		return s.Packs.put(release, ".cache/"+pkgName, kindFile, s.cacheMarker(sha1))
+	}
 	cachePath := filepath.Join(s.Root, "manpages", release, ".cache", pkgName)
-	return s.writeFileAbsolute(cachePath, []byte(sha1))
+	if err := s.writeFileAbsolute(cachePath, s.cacheMarker(sha1)); err != nil {
+		return err
+	}
+	return s.syncPending()
+}
+
+// Exists reports whether there is a file or symlink at destPath.
+func (s *FSStorage) Exists(destPath string) bool {
+	if release, name, ok := splitPackPath(destPath); ok && s.Packs != nil {
+		return s.Packs.exists(release, name)
+	}
+	_, err := os.Lstat(filepath.Join(s.Root, filepath.FromSlash(destPath)))
+	return err == nil
+}
+
+// Commit makes what was written for release visible to readers. Files are
+// visible as soon as they are written; packs when their release is
+// committed.
+func (s *FSStorage) Commit(release string) error {
+	if s.Packs == nil {
+		return nil
+	}
+	return s.Packs.Commit(release)
 }
 
 func (s *FSStorage) writeFile(destPath string, content []byte) error {
+	if release, name, ok := splitPackPath(destPath); ok && s.Packs != nil {
+		return s.Packs.put(release, name, kindFile, content)
+	}
 	fullPath := filepath.Join(s.Root, filepath.FromSlash(destPath))
 	return s.writeFileAbsolute(fullPath, content)
 }
 
 func (s *FSStorage) writeFileAbsolute(fullPath string, content []byte) error {
-	if err := os.MkdirAll(filepath.Dir(fullPath), 0o755); err != nil {
+	dir := filepath.Dir(fullPath)
+	if err := s.mkdir(dir); err != nil {
 		return fmt.Errorf("mkdir: %w", err)
 	}
-	// Remove any existing file or symlink so os.WriteFile does not
-	// follow a stale symlink left by a different package.
-	if err := os.Remove(fullPath); err != nil && !os.IsNotExist(err) {
-		return fmt.Errorf("remove existing: %w", err)
+	// Write under a unique temporary name and rename it into place: readers
+	// see the old file or the new one, never a truncated one, and a stale
+	// symlink left by a different package is replaced rather than followed.
+	tmpPath := tempPath(fullPath)
+	f, err := os.OpenFile(tmpPath, os.O_WRONLY|os.O_CREATE|os.O_EXCL, 0o644)
+	if errors.Is(err, fs.ErrNotExist) && s.dirs != nil {
+		// The directory was removed since it was created.
+		s.dirs.Delete(dir)
+		if err := s.mkdir(dir); err != nil {
+			return fmt.Errorf("mkdir: %w", err)
+		}
+		f, err = os.OpenFile(tmpPath, os.O_WRONLY|os.O_CREATE|os.O_EXCL, 0o644)
 	}
-	if err := os.WriteFile(fullPath, content, 0o644); err != nil {
+	if err != nil {
 		return fmt.Errorf("write file: %w", err)
 	}
-	return nil
+	_, err = f.Write(content)
+	if err == nil && s.Sync && s.pending == nil {
+		err = f.Sync()
+	}
+	if closeErr := f.Close(); err == nil {
+		err = closeErr
+	}
+	if err != nil {
+		_ = os.Remove(tmpPath)
+		return fmt.Errorf("write file: %w", err)
+	}
+	if err := os.Rename(tmpPath, fullPath); err != nil {
+		_ = os.Remove(tmpPath)
+		return fmt.Errorf("rename file: %w", err)
+	}
+	return s.synced(fullPath)
 }
 
 func (s *FSStorage) writeSymlink(destPath string, target string) error {
+	if release, name, ok := splitPackPath(destPath); ok && s.Packs != nil {
+		return s.Packs.put(release, name, kindSymlink, []byte(target))
+	}
 	fullPath := filepath.Join(s.Root, filepath.FromSlash(destPath))
-	if err := os.MkdirAll(filepath.Dir(fullPath), 0o755); err != nil {
+	if err := s.mkdir(filepath.Dir(fullPath)); err != nil {
 		return fmt.Errorf("mkdir: %w", err)
 	}
-	if err := os.Remove(fullPath); err != nil && !os.IsNotExist(err) {
-		return fmt.Errorf("remove existing: %w", err)
-	}
-	if err := os.Symlink(target, fullPath); err != nil {
+	// Create the link under a unique temporary name and rename it into
+	// place, so concurrent writers of the same path (packages shipping the
+	// same manpage) cannot fail with EEXIST between remove and symlink.
+	tmpPath := tempPath(fullPath)
+	if err := os.Symlink(target, tmpPath); err != nil {
 		return fmt.Errorf("symlink: %w", err)
 	}
+	if err := os.Rename(tmpPath, fullPath); err != nil {
+		_ = os.Remove(tmpPath)
+		return fmt.Errorf("rename symlink: %w", err)
+	}
+	return s.synced(fullPath)
+}
+
+// tempPath returns a hidden, unique name next to fullPath to write it under.
+func tempPath(fullPath string) string {
+	return filepath.Join(filepath.Dir(fullPath), fmt.Sprintf(".%s.tmp-%d", filepath.Base(fullPath), tmpSeq.Add(1)))
+}
+
+// mkdir creates dir and its parents unless this storage already did.
+func (s *FSStorage) mkdir(dir string) error {
+	if s.dirs != nil {
+		if _, ok := s.dirs.Load(dir); ok {
+			return nil
+		}
+	}
+	if err := os.MkdirAll(dir, 0o755); err != nil {
+		return err
+	}
+	if s.dirs != nil {
+		s.dirs.Store(dir, struct{}{})
+	}
+	return nil
+}
+
+// synced makes the rename of fullPath durable when Sync is set, or leaves
+// it, and the file's contents, to the batch's WriteCache.
+func (s *FSStorage) synced(fullPath string) error {
+	if !s.Sync {
+		return nil
+	}
+	if s.pending != nil {
+		s.pending.mu.Lock()
+		s.pending.files = append(s.pending.files, fullPath)
+		s.pending.mu.Unlock()
+		return nil
+	}
+	return syncPath(filepath.Dir(fullPath))
+}
+
+// Flush syncs the files a batch wrote so far, for packages that are not
+// marked done with WriteCache.
+func (s *FSStorage) Flush() error {
+	return s.syncPending()
+}
+
+// syncPending syncs the files written by a batch, then each of their
+// directories once.
+func (s *FSStorage) syncPending() error {
+	if s.pending == nil {
+		return nil
+	}
+	s.pending.mu.Lock()
+	files := s.pending.files
+	s.pending.files = nil
+	s.pending.mu.Unlock()
+
+	dirs := make(map[string]bool)
+	for _, path := range files {
+		info, err := os.Lstat(path)
+		if err != nil {
+			return fmt.Errorf("sync: %w", err)
+		}
+		if info.Mode().IsRegular() {
+			if err := syncPath(path); err != nil {
+				return err
+			}
+		}
+		dirs[filepath.Dir(path)] = true
+	}
+	for dir := range dirs {
+		if err := syncPath(dir); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+// syncPath flushes the file or directory at path to stable storage.
+func syncPath(path string) error {
+	f, err := os.Open(path)
+	if err != nil {
+		return fmt.Errorf("sync: %w", err)
+	}
+	err = f.Sync()
+	if closeErr := f.Close(); err == nil {
+		err = closeErr
+	}
+	if err != nil {
+		return fmt.Errorf("sync %s: %w", path, err)
+	}
 	return nil
 }
@@ -1,8 +1,12 @@
 package storage
 
 import (
+	"bytes"
+	"context"
+	"fmt"
 	"os"
 	"path/filepath"
+	"sync"
 	"testing"
 )
 
@@ -65,3 +69,178 @@ func TestWriteFileAbsolute_OverwritesCircularSymlink(t *testing.T) {
 		t.Fatalf("got %q, want %q", got, "content")
 	}
 }
+
+func TestWriteSymlink_ConcurrentSamePath(t *testing.T) {
+	dir := t.TempDir()
+	s := NewFSStorage(dir)
+
+	var wg sync.WaitGroup
+	errs := make(chan error, 16)
+	for i := range 16 {
+		wg.Add(1)
+		go func(n int) {
+			defer wg.Done()
+			if err := s.writeSymlink("manpages/noble/man1/sh.1.html", fmt.Sprintf("dash%d.1.html", n)); err != nil {
+				errs <- err
+			}
+		}(i)
+	}
+	wg.Wait()
+	close(errs)
+	for err := range errs {
+		t.Errorf("writeSymlink: %v", err)
+	}
+
+	entries, err := os.ReadDir(filepath.Join(dir, "manpages", "noble", "man1"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(entries) != 1 || entries[0].Name() != "sh.1.html" {
+		t.Errorf("entries = %v, want only sh.1.html", entries)
+	}
+}
+
+func TestWriteHTMLIsAtomic(t *testing.T) {
+	root := t.TempDir()
+	s := NewFSStorage(root)
+	ctx := context.Background()
+	for _, content := range []string{"first", "second"} {
+		if err := s.WriteHTML(ctx, "manpages/noble/man1/ls.1.html", []byte(content)); err != nil {
+			t.Fatal(err)
+		}
+	}
+	dir := filepath.Join(root, "manpages", "noble", "man1")
+	entries, err := os.ReadDir(dir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(entries) != 1 || entries[0].Name() != "ls.1.html" {
+		t.Errorf("directory holds %v, want only ls.1.html", entries)
+	}
+	if got, _ := os.ReadFile(filepath.Join(dir, "ls.1.html")); string(got) != "second" {
+		t.Errorf("got %q, want %q", got, "second")
+	}
+
+	// A directory removed behind the storage's back is created again.
+	if err := os.RemoveAll(dir); err != nil {
+		t.Fatal(err)
+	}
+	if err := s.WriteHTML(ctx, "manpages/noble/man1/ls.1.html", []byte("third")); err != nil {
+		t.Fatalf("WriteHTML after removing the directory: %v", err)
+	}
+}
+
+func TestCacheMarkerRecordsOutputs(t *testing.T) {
+	root := t.TempDir()
+	ctx := context.Background()
+	s := NewFSStorage(root)
+	if err := s.WriteCache(ctx, "noble", "coreutils", "abc"); err != nil {
+		t.Fatal(err)
+	}
+	marker := filepath.Join(root, "manpages", "noble", ".cache", "coreutils")
+	if data, _ := os.ReadFile(marker); string(data) != "abc" {
+		t.Errorf("marker = %q, want the bare hash", data)
+	}
+
+	// Enabling an output processes packages ingested without it again.
+	s.PlainText = true
+	if s.CheckCache("noble", "coreutils", "abc") {
+		t.Error("package ingested without plain text is cached for PlainText")
+	}
+	s.Precompress = true
+	if err := s.WriteCache(ctx, "noble", "coreutils", "abc"); err != nil {
+		t.Fatal(err)
+	}
+	if !s.CheckCache("noble", "coreutils", "abc") || s.CheckCache("noble", "coreutils", "def") {
+		t.Error("CheckCache does not match the marker written with the same outputs")
+	}
+
+	// Disabling one does not.
+	s.PlainText = false
+	if !s.CheckCache("noble", "coreutils", "abc") {
+		t.Error("package ingested with more outputs is not cached")
+	}
+}
+
+func TestBatchSyncsOnWriteCache(t *testing.T) {
+	root := t.TempDir()
+	s := NewFSStorage(root)
+	s.Sync = true
+	ctx := context.Background()
+
+	b := s.Batch()
+	if err := b.WriteHTML(ctx, "manpages/noble/man1/ls.1.html", []byte("ls")); err != nil {
+		t.Fatal(err)
+	}
+	if err := b.WriteSymlink(ctx, "manpages/noble/man1/dir.1.html", "ls.1.html"); err != nil {
+		t.Fatal(err)
+	}
+	if got := len(b.pending.files); got != 2 {
+		t.Fatalf("%d pending files, want 2", got)
+	}
+	if err := b.WriteCache(ctx, "noble", "coreutils", "abc"); err != nil {
+		t.Fatal(err)
+	}
+	if got := len(b.pending.files); got != 0 {
+		t.Errorf("%d pending files after WriteCache, want 0", got)
+	}
+	if !s.CheckCache("noble", "coreutils", "abc") {
+		t.Error("cache marker not written")
+	}
+	if s.pending != nil {
+		t.Error("Batch() changed the parent storage")
+	}
+}
+
+// BenchmarkWriteHTML measures the files written per second. The directories
+// written to default to a temporary one; set MANPAGES_BENCH_DIRS to a
+// colon-separated list, for example a tmpfs and an ext4 path, to compare
+// file systems.
+func BenchmarkWriteHTML(b *testing.B) {
+	dirs := filepath.SplitList(os.Getenv("MANPAGES_BENCH_DIRS"))
+	if len(dirs) == 0 {
+		dirs = []string{b.TempDir()}
+	}
+	page := bytes.Repeat([]byte("<p>manpage body</p>\n"), 400)
+	modes := []struct {
+		name  string
+		sync  bool
+		batch bool
+	}{
+		{"nosync", false, false},
+		{"sync-per-file", true, false},
+		{"sync-per-package", true, true},
+	}
+	for _, dir := range dirs {
+		for _, mode := range modes {
+			b.Run(filepath.Base(dir)+"/"+mode.name, func(b *testing.B) {
+				root, err := os.MkdirTemp(dir, "bench-")
+				if err != nil {
+					b.Fatal(err)
+				}
+				b.Cleanup(func() { _ = os.RemoveAll(root) })
+				s := NewFSStorage(root)
+				s.Sync = mode.sync
+				ctx := context.Background()
+				const perPackage = 20
+				b.ResetTimer()
+				for i := 0; i < b.N; i += perPackage {
+					store := s
+					if mode.batch {
+						store = s.Batch()
+					}
+					for j := i; j < min(i+perPackage, b.N); j++ {
+						path := fmt.Sprintf("manpages/noble/man%d/page%d.%d.html", j%8+1, j, j%8+1)
+						if err := store.WriteHTML(ctx, path, page); err != nil {
+							b.Fatal(err)
+						}
+					}
+					if err := store.WriteCache(ctx, "noble", fmt.Sprint("pkg", i), "sha"); err != nil {
+						b.Fatal(err)
+					}
+				}
+				b.ReportMetric(float64(b.N)/b.Elapsed().Seconds(), "files/s")
+			})
+		}
+	}
+}
@@ -168,3 +168,14 @@ func titleFromFilename(filename string) string {
 func StripHTMLTags(html string) string {
 	return strings.TrimSpace(manpageStripTags.ReplaceAllString(html, " "))
 }
+
+// ManpageText returns the plain-text rendering of a manpage fragment: its
+// body, after the META header, without HTML tags.
+func ManpageText(fragment string) string {
+	if strings.HasPrefix(fragment, "<!--META:") {
+		if end := strings.Index(fragment, "-->"); end != -1 {
+			fragment = strings.TrimPrefix(fragment[end+len("-->"):], "\n")
+		}
+	}
+	return StripHTMLTags(fragment)
+}
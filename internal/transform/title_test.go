@@ -77,3 +77,13 @@ func TestPrepareFragmentDescriptionCapped(t *testing.T) {
 		t.Fatalf("expected truncated description to end with ellipsis, got: ...%s", meta.Description[len(meta.Description)-10:])
 	}
 }
+
+func TestManpageText(t *testing.T) {
+	fragment := `<!--META:{"title":"ls"}-->` + "\n" + `<h2>NAME</h2><p>ls - list directory contents</p>`
+	if got, want := ManpageText(fragment), "NAME  ls - list directory contents"; got != want {
+		t.Errorf("ManpageText() = %q, want %q", got, want)
+	}
+	if got, want := ManpageText("<p>no header</p>"), "no header"; got != want {
+		t.Errorf("ManpageText() = %q, want %q", got, want)
+	}
+}
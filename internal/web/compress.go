@@ -0,0 +1,74 @@
+package web
+
+import (
+	"bytes"
+	"compress/flate"
+	"compress/gzip"
+	"encoding/binary"
+	"hash/crc32"
+	"io"
+	"sync"
+)
+
+// Compressors keep about a megabyte of state, so they are pooled rather
+// than allocated per response.
+var (
+	gzipWriters = sync.Pool{New: func() any {
+		gw, _ := gzip.NewWriterLevel(io.Discard, gzip.DefaultCompression)
+		return gw
+	}}
+	flateWriters = sync.Pool{New: func() any {
+		fw, _ := flate.NewWriter(io.Discard, flate.DefaultCompression)
+		return fw
+	}}
+)
+
+func getGzipWriter(w io.Writer) *gzip.Writer {
+	gw := gzipWriters.Get().(*gzip.Writer)
+	gw.Reset(w)
+	return gw
+}
+
+func putGzipWriter(gw *gzip.Writer) {
+	gw.Reset(io.Discard)
+	gzipWriters.Put(gw)
+}
+
+// gzipBytes returns data compressed with gzip.
+func gzipBytes(data []byte) []byte {
+	var buf bytes.Buffer
+	gw := getGzipWriter(&buf)
+	_, _ = gw.Write(data)
+	_ = gw.Close()
+	putGzipWriter(gw)
+	return buf.Bytes()
+}
+
+// spliceGzip returns the gzip encoding of head, body and tail, reusing
+// bodyBlocks, the precompressed deflate blocks of body, so that only head
+// and tail are compressed. bodyBlocks must be byte aligned, not final, and
+// free of references before their start, as storage.PrecompressedBody
+// returns them.
+func spliceGzip(head, body, bodyBlocks, tail []byte) []byte {
+	var buf bytes.Buffer
+	buf.Grow(len(head)/4 + len(bodyBlocks) + len(tail)/4 + 64)
+	buf.Write([]byte{0x1f, 0x8b, 8, 0, 0, 0, 0, 0, 0, 255})
+
+	fw := flateWriters.Get().(*flate.Writer)
+	fw.Reset(&buf)
+	_, _ = fw.Write(head)
+	_ = fw.Flush()
+	buf.Write(bodyBlocks)
+	fw.Reset(&buf)
+	_, _ = fw.Write(tail)
+	_ = fw.Close()
+	fw.Reset(io.Discard)
+	flateWriters.Put(fw)
+
+	crc := crc32.Update(crc32.Update(crc32.ChecksumIEEE(head), crc32.IEEETable, body), crc32.IEEETable, tail)
+	var trailer [8]byte
+	binary.LittleEndian.PutUint32(trailer[0:], crc)
+	binary.LittleEndian.PutUint32(trailer[4:], uint32(len(head)+len(body)+len(tail)))
+	buf.Write(trailer[:])
+	return buf.Bytes()
+}
@@ -0,0 +1,141 @@
+package web
+
+import (
+	"bytes"
+	"compress/gzip"
+	"context"
+	"fmt"
+	"io"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+
+	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
+)
+
+// precompressServer returns a test server without a page cache whose ls(1)
+// page has the given body and, if precompress is set, a precompressed copy.
+func precompressServer(t testing.TB, body string, precompress bool) *Server {
+	t.Helper()
+	srv, cfg := testServer(t)
+	srv.pages = nil
+	fs := storage.NewFSStorage(cfg.PublicHTMLDir)
+	fs.Precompress = precompress
+	fragment := `<!--META:{"title":"ls","description":"list directory contents"}-->` + "\n" + body
+	if err := fs.WriteHTML(context.Background(), "manpages/noble/man1/ls.1.html", []byte(fragment)); err != nil {
+		t.Fatal(err)
+	}
+	return srv
+}
+
+func getManpage(t testing.TB, srv *Server, path, encoding string) *httptest.ResponseRecorder {
+	t.Helper()
+	req := httptest.NewRequest(http.MethodGet, path, nil)
+	if encoding != "" {
+		req.Header.Set("Accept-Encoding", encoding)
+	}
+	w := httptest.NewRecorder()
+	gzipHandler(http.HandlerFunc(srv.handleManpages)).ServeHTTP(w, req)
+	return w
+}
+
+func TestServeManpagePrecompressed(t *testing.T) {
+	srv := precompressServer(t, "<h2>NAME</h2><p>ls - list directory contents</p>", true)
+	gz, err := os.ReadFile(filepath.Join(srv.cfg.PublicHTMLDir, "manpages", "noble", "man1", "ls.1.html"+storage.PrecompressedSuffix))
+	if err != nil {
+		t.Fatal(err)
+	}
+	raw, _ := os.ReadFile(filepath.Join(srv.cfg.PublicHTMLDir, "manpages", "noble", "man1", "ls.1.html"))
+	blocks, _, _ := storage.PrecompressedBody(gz, raw)
+
+	plain := getManpage(t, srv, "/manpages/noble/man1/ls.1.html", "")
+	w := getManpage(t, srv, "/manpages/noble/man1/ls.1.html", "gzip")
+	if w.Code != http.StatusOK || w.Header().Get("Content-Encoding") != "gzip" {
+		t.Fatalf("GET = %d, encoding %q, want a gzipped 200", w.Code, w.Header().Get("Content-Encoding"))
+	}
+	if !bytes.Contains(w.Body.Bytes(), blocks) {
+		t.Error("response does not reuse the precompressed body")
+	}
+	gr, err := gzip.NewReader(w.Body)
+	if err != nil {
+		t.Fatal(err)
+	}
+	got, err := io.ReadAll(gr)
+	if err != nil {
+		t.Fatalf("decompressing: %v", err)
+	}
+	if !bytes.Equal(got, plain.Body.Bytes()) {
+		t.Error("spliced page differs from the identity page")
+	}
+	if etag := w.Header().Get("ETag"); etag != strings.TrimSuffix(plain.Header().Get("ETag"), `"`)+gzipETagSuffix+`"` {
+		t.Errorf("ETag = %s, want the gzip variant of %s", etag, plain.Header().Get("ETag"))
+	}
+
+	// A stale copy is ignored.
+	path := filepath.Join(srv.cfg.PublicHTMLDir, "manpages", "noble", "man1", "ls.1.html")
+	if err := os.WriteFile(path, append(raw, "<p>more</p>"...), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	w = getManpage(t, srv, "/manpages/noble/man1/ls.1.html", "gzip")
+	gr, err = gzip.NewReader(w.Body)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if got, _ := io.ReadAll(gr); !bytes.Contains(got, []byte("<p>more</p>")) {
+		t.Error("stale precompressed body served")
+	}
+}
+
+func TestPrecompressedCopiesHidden(t *testing.T) {
+	srv := precompressServer(t, "<p>ls</p>", true)
+	if w := getManpage(t, srv, "/manpages/noble/man1/ls.1.html.gz", ""); w.Code != http.StatusNotFound {
+		t.Errorf("GET precompressed copy = %d, want 404", w.Code)
+	}
+	w := getManpage(t, srv, "/manpages/noble/man1/", "")
+	if body := w.Body.String(); !strings.Contains(body, "ls.1") || strings.Contains(body, "ls.1.html.gz") {
+		t.Error("browse listing shows the precompressed copy")
+	}
+}
+
+// BenchmarkServeManpageGzip measures a gzip page cache miss with and without
+// a precompressed copy of the page.
+func BenchmarkServeManpageGzip(b *testing.B) {
+	var body strings.Builder
+	for i := 0; body.Len() < 64<<10; i++ {
+		fmt.Fprintf(&body, "<p>Option <b>--flag-%d</b> sets parameter %d of the listing, see <a href=\"../man5/ls.5.html\">ls(5)</a>.</p>\n", i, i*7)
+	}
+	for _, precompress := range []bool{false, true} {
+		name := "compress"
+		if precompress {
+			name = "precompressed"
+		}
+		b.Run(name, func(b *testing.B) {
+			srv := precompressServer(b, body.String(), precompress)
+			b.ReportAllocs()
+			b.ResetTimer()
+			for i := 0; i < b.N; i++ {
+				if w := getManpage(b, srv, "/manpages/noble/man1/ls.1.html", "gzip"); w.Code != http.StatusOK {
+					b.Fatalf("GET = %d", w.Code)
+				}
+			}
+		})
+	}
+}
+
+// BenchmarkGzipHandler measures the compression of a dynamic response.
+func BenchmarkGzipHandler(b *testing.B) {
+	payload := bytes.Repeat([]byte(`{"name":"ls","section":"1","release":"noble"},`), 200)
+	handler := gzipHandler(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		w.Header().Set("Content-Type", "application/json")
+		_, _ = w.Write(payload)
+	}))
+	req := httptest.NewRequest(http.MethodGet, "/api/search", nil)
+	req.Header.Set("Accept-Encoding", "gzip")
+	b.ReportAllocs()
+	for i := 0; i < b.N; i++ {
+		handler.ServeHTTP(httptest.NewRecorder(), req)
+	}
+}
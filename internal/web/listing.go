@@ -0,0 +1,203 @@
+package web
+
+import (
+	"container/list"
+	"html/template"
+	"io/fs"
+	"path"
+	"sort"
+	"strings"
+	"sync"
+	"sync/atomic"
+	"time"
+
+	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
+)
+
+// dirListing is a sorted snapshot of a directory as the browse page shows
+// it, so that a page of a large section is a slice of it rather than a
+// read and sort of the whole directory.
+type dirListing struct {
+	name     string
+	modTime  time.Time
+	sections []browseEntry
+	dirs     []browseEntry
+	files    []browseEntry
+	bytes    int64
+}
+
+// listingEntryOverhead approximates the memory a browse entry uses besides
+// its strings.
+const listingEntryOverhead = 32
+
+// listingCacheOverhead approximates the memory a listing uses besides its
+// entries.
+const listingCacheOverhead = 128
+
+// readListing reads the directory name of tree into a listing whose entries
+// link below urlDir, the directory's URL path without a trailing slash.
+// Copies and renderings ingest writes next to pages are left out.
+func readListing(tree fs.FS, name, urlDir string, modTime time.Time) (*dirListing, error) {
+	entries, err := fs.ReadDir(tree, name)
+	if err != nil {
+		return nil, err
+	}
+	l := &dirListing{name: name, modTime: modTime, bytes: listingCacheOverhead + int64(len(name))}
+	for _, e := range entries {
+		entryName := e.Name()
+		if strings.HasPrefix(entryName, ".") {
+			continue
+		}
+		href := urlDir + "/" + entryName
+		var entry browseEntry
+		switch {
+		case e.IsDir():
+			entry = browseEntry{Name: entryName, Href: template.URL(href + "/")}
+			if isManSection(entryName) {
+				l.sections = append(l.sections, entry)
+			} else {
+				l.dirs = append(l.dirs, entry)
+			}
+		case !strings.HasSuffix(entryName, storage.PrecompressedSuffix) && !strings.HasSuffix(entryName, storage.PlainTextSuffix):
+			entry = browseEntry{Name: strings.TrimSuffix(entryName, ".html"), Href: template.URL(href)}
+			l.files = append(l.files, entry)
+		default:
+			continue
+		}
+		l.bytes += int64(len(entry.Name)+len(entry.Href)) + listingEntryOverhead
+	}
+	sort.Slice(l.sections, func(i, j int) bool { return l.sections[i].Name < l.sections[j].Name })
+	sort.Slice(l.dirs, func(i, j int) bool { return l.dirs[i].Name < l.dirs[j].Name })
+	sort.Slice(l.files, func(i, j int) bool { return l.files[i].Name < l.files[j].Name })
+	return l, nil
+}
+
+// listingURLDir returns the URL path below which the entries of the
+// directory name are linked.
+func listingURLDir(basePath, name string) string {
+	return basePath + path.Join("/", name)
+}
+
+// listingCache is a size-bounded LRU of directory listings. A listing is
+// checked against its directory's modification time on lookup, which
+// changes whenever an entry is added, renamed or removed, and the whole
+// cache is dropped on reindex together with the page cache, since ingest
+// may have mapped new packs whose directories keep their times. A nil
+// *listingCache caches nothing.
+type listingCache struct {
+	maxBytes int64
+
+	mu    sync.Mutex
+	bytes int64
+	lru   *list.List // of *dirListing, most recently used first
+	items map[string]*list.Element
+
+	hits   atomic.Int64
+	misses atomic.Int64
+}
+
+// newListingCache returns a cache holding up to maxBytes of listings, or nil
+// when maxBytes is not positive.
+func newListingCache(maxBytes int64) *listingCache {
+	if maxBytes <= 0 {
+		return nil
+	}
+	return &listingCache{
+		maxBytes: maxBytes,
+		lru:      list.New(),
+		items:    make(map[string]*list.Element),
+	}
+}
+
+// get returns the cached listing of the directory name if it was read when
+// the directory had the given modification time.
+func (c *listingCache) get(name string, modTime time.Time) (*dirListing, bool) {
+	if c == nil {
+		return nil, false
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	el, ok := c.items[name]
+	if !ok {
+		c.misses.Add(1)
+		return nil, false
+	}
+	l := el.Value.(*dirListing)
+	if !l.modTime.Equal(modTime) {
+		c.remove(el)
+		c.misses.Add(1)
+		return nil, false
+	}
+	c.lru.MoveToFront(el)
+	c.hits.Add(1)
+	return l, true
+}
+
+// put stores l, evicting the least recently used listings to stay within
+// the size bound. Listings larger than the whole cache are not stored.
+func (c *listingCache) put(l *dirListing) {
+	if c == nil || l.bytes > c.maxBytes {
+		return
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if el, ok := c.items[l.name]; ok {
+		c.remove(el)
+	}
+	c.items[l.name] = c.lru.PushFront(l)
+	c.bytes += l.bytes
+	for c.bytes > c.maxBytes {
+		c.remove(c.lru.Back())
+	}
+}
+
+// purge drops every listing.
+func (c *listingCache) purge() {
+	if c == nil {
+		return
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	c.lru.Init()
+	clear(c.items)
+	c.bytes = 0
+}
+
+func (c *listingCache) stats() cacheStats {
+	if c == nil {
+		return cacheStats{}
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	stats := cacheStats{
+		Hits:     c.hits.Load(),
+		Misses:   c.misses.Load(),
+		Entries:  len(c.items),
+		Bytes:    c.bytes,
+		MaxBytes: c.maxBytes,
+	}
+	if total := stats.Hits + stats.Misses; total > 0 {
+		stats.HitRate = float64(stats.Hits) / float64(total)
+	}
+	return stats
+}
+
+func (c *listingCache) remove(el *list.Element) {
+	l := c.lru.Remove(el).(*dirListing)
+	delete(c.items, l.name)
+	c.bytes -= l.bytes
+}
+
+// listing returns the sorted listing of the directory name, whose file info
+// is info, from the cache or by reading it.
+func (s *Server) listing(name string, info fs.FileInfo) (*dirListing, error) {
+	if l, ok := s.listings.get(name, info.ModTime()); ok {
+		return l, nil
+	}
+	l, err := readListing(s.tree, name, listingURLDir(s.basePath, name), info.ModTime())
+	if err != nil {
+		return nil, err
+	}
+	s.listings.put(l)
+	return l, nil
+}
@@ -0,0 +1,117 @@
+package web
+
+import (
+	"fmt"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+)
+
+func TestListingCacheEvictsAndChecksModTime(t *testing.T) {
+	listing := func(name string) *dirListing {
+		return &dirListing{name: name, modTime: time.Unix(1700000000, 0), bytes: 100}
+	}
+	c := newListingCache(300)
+	for _, name := range []string{"a", "b", "c"} {
+		c.put(listing(name))
+	}
+	// Touch a so that b is the least recently used.
+	if _, ok := c.get("a", time.Unix(1700000000, 0)); !ok {
+		t.Fatal("get(a) missed")
+	}
+	c.put(listing("d"))
+	for name, want := range map[string]bool{"a": true, "b": false, "c": true, "d": true} {
+		if _, ok := c.get(name, time.Unix(1700000000, 0)); ok != want {
+			t.Errorf("get(%s) hit = %v, want %v", name, ok, want)
+		}
+	}
+
+	if _, ok := c.get("a", time.Unix(1700000001, 0)); ok {
+		t.Error("get() hit after the directory's mtime changed")
+	}
+	if stats := c.stats(); stats.Entries != 2 || stats.Bytes != 200 {
+		t.Errorf("stats() = %+v, want the stale listing dropped", stats)
+	}
+
+	var nilCache *listingCache
+	nilCache.put(listing("a"))
+	if _, ok := nilCache.get("a", time.Unix(1700000000, 0)); ok {
+		t.Error("nil cache hit")
+	}
+}
+
+func TestBrowseFromListingCache(t *testing.T) {
+	srv, cfg := testServer(t)
+	srv.listings = newListingCache(1 << 20)
+	man1 := filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", "man1")
+
+	browse := func() string {
+		t.Helper()
+		w := httptest.NewRecorder()
+		srv.handleManpages(w, httptest.NewRequest(http.MethodGet, "/manpages/noble/man1/", nil))
+		if w.Code != http.StatusOK {
+			t.Fatalf("GET man1/ = %d", w.Code)
+		}
+		return w.Body.String()
+	}
+
+	browse()
+	if body := browse(); !strings.Contains(body, `href="/manpages/noble/man1/ls.1.html"`) {
+		t.Errorf("listing does not link ls.1.html:\n%s", body)
+	}
+	if stats := srv.listings.stats(); stats.Hits != 1 || stats.Misses != 1 {
+		t.Errorf("stats() = %+v, want 1 hit, 1 miss", stats)
+	}
+
+	// A page added to the directory is listed.
+	if err := os.WriteFile(filepath.Join(man1, "cat.1.html"), []byte("cat"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.Chtimes(man1, time.Now(), time.Now().Add(time.Minute)); err != nil {
+		t.Fatal(err)
+	}
+	if body := browse(); !strings.Contains(body, "cat.1.html") {
+		t.Error("cached listing served after the directory changed")
+	}
+
+	// Reindex drops every listing.
+	srv.handleReindex(httptest.NewRecorder(), httptest.NewRequest(http.MethodPost, "/_/reindex", nil))
+	if stats := srv.listings.stats(); stats.Entries != 0 {
+		t.Errorf("%d listings after reindex, want 0", stats.Entries)
+	}
+}
+
+// BenchmarkBrowseLargeSection renders a page of the listing of a section
+// with 50,000 pages.
+func BenchmarkBrowseLargeSection(b *testing.B) {
+	srv, cfg := testServer(b)
+	man3 := filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", "man3")
+	if err := os.MkdirAll(man3, 0o755); err != nil {
+		b.Fatal(err)
+	}
+	for i := 0; i < 50000; i++ {
+		if err := os.WriteFile(filepath.Join(man3, fmt.Sprintf("function_%05d.3.html", i)), nil, 0o644); err != nil {
+			b.Fatal(err)
+		}
+	}
+	for _, cached := range []bool{false, true} {
+		b.Run(fmt.Sprintf("cached=%v", cached), func(b *testing.B) {
+			srv.listings = nil
+			if cached {
+				srv.listings = newListingCache(32 << 20)
+			}
+			b.ReportAllocs()
+			for i := 0; i < b.N; i++ {
+				w := httptest.NewRecorder()
+				srv.handleManpages(w, httptest.NewRequest(http.MethodGet, "/manpages/noble/man3/?page=1000", nil))
+				if w.Code != http.StatusOK {
+					b.Fatalf("GET man3/ = %d", w.Code)
+				}
+			}
+		})
+	}
+}
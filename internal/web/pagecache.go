@@ -0,0 +1,159 @@
+package web
+
+import (
+	"container/list"
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// pageCacheKey identifies a rendered response: the cleaned URL path and the
+// content encoding of the body ("gzip" or "" for identity).
+type pageCacheKey struct {
+	path     string
+	encoding string
+}
+
+// renderedPage is a rendered response body and its validator.
+type renderedPage struct {
+	body []byte
+	etag string
+}
+
+// cachedPage is a rendered response and the state of the source file it was
+// rendered from.
+type cachedPage struct {
+	key pageCacheKey
+	renderedPage
+	modTime time.Time
+	size    int64
+}
+
+// pageCacheOverhead approximates the memory an entry uses besides its body.
+const pageCacheOverhead = 128
+
+// pageCache is a size-bounded LRU of rendered manpage responses, so that a
+// popular page is read, parsed, rendered and compressed once rather than on
+// every request. Entries are checked against the source file's modification
+// time and size on lookup, and the whole cache is dropped on reindex because
+// a render also depends on which other releases have the page. A nil
+// *pageCache caches nothing.
+type pageCache struct {
+	maxBytes int64
+
+	mu    sync.Mutex
+	bytes int64
+	lru   *list.List // of *cachedPage, most recently used first
+	items map[pageCacheKey]*list.Element
+
+	hits   atomic.Int64
+	misses atomic.Int64
+}
+
+// cacheStats reports the usage of a server cache, as served by GET
+// /_/stats.
+type cacheStats struct {
+	Hits     int64   `json:"hits"`
+	Misses   int64   `json:"misses"`
+	HitRate  float64 `json:"hit_rate"`
+	Entries  int     `json:"entries"`
+	Bytes    int64   `json:"bytes"`
+	MaxBytes int64   `json:"max_bytes"`
+}
+
+// newPageCache returns a cache holding up to maxBytes of rendered pages, or
+// nil when maxBytes is not positive.
+func newPageCache(maxBytes int64) *pageCache {
+	if maxBytes <= 0 {
+		return nil
+	}
+	return &pageCache{
+		maxBytes: maxBytes,
+		lru:      list.New(),
+		items:    make(map[pageCacheKey]*list.Element),
+	}
+}
+
+// get returns the cached page for key if it was rendered from a file with
+// the given modification time and size.
+func (c *pageCache) get(key pageCacheKey, modTime time.Time, size int64) (renderedPage, bool) {
+	if c == nil {
+		return renderedPage{}, false
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	el, ok := c.items[key]
+	if !ok {
+		c.misses.Add(1)
+		return renderedPage{}, false
+	}
+	page := el.Value.(*cachedPage)
+	if !page.modTime.Equal(modTime) || page.size != size {
+		c.remove(el)
+		c.misses.Add(1)
+		return renderedPage{}, false
+	}
+	c.lru.MoveToFront(el)
+	c.hits.Add(1)
+	return page.renderedPage, true
+}
+
+// put stores page for key, evicting the least recently used entries to stay
+// within the size bound. Pages larger than the whole cache are not stored.
+func (c *pageCache) put(key pageCacheKey, page renderedPage, modTime time.Time, size int64) {
+	if c == nil || int64(len(page.body))+pageCacheOverhead > c.maxBytes {
+		return
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	if el, ok := c.items[key]; ok {
+		c.remove(el)
+	}
+	entry := &cachedPage{key: key, renderedPage: page, modTime: modTime, size: size}
+	c.items[key] = c.lru.PushFront(entry)
+	c.bytes += entry.cost()
+	for c.bytes > c.maxBytes {
+		c.remove(c.lru.Back())
+	}
+}
+
+// purge drops every entry.
+func (c *pageCache) purge() {
+	if c == nil {
+		return
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	c.lru.Init()
+	clear(c.items)
+	c.bytes = 0
+}
+
+func (c *pageCache) stats() cacheStats {
+	if c == nil {
+		return cacheStats{}
+	}
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	stats := cacheStats{
+		Hits:     c.hits.Load(),
+		Misses:   c.misses.Load(),
+		Entries:  len(c.items),
+		Bytes:    c.bytes,
+		MaxBytes: c.maxBytes,
+	}
+	if total := stats.Hits + stats.Misses; total > 0 {
+		stats.HitRate = float64(stats.Hits) / float64(total)
+	}
+	return stats
+}
+
+func (c *pageCache) remove(el *list.Element) {
+	page := c.lru.Remove(el).(*cachedPage)
+	delete(c.items, page.key)
+	c.bytes -= page.cost()
+}
+
+func (p *cachedPage) cost() int64 {
+	return int64(len(p.body)+len(p.etag)+len(p.key.path)) + pageCacheOverhead
+}
@@ -0,0 +1,118 @@
+package web
+
+import (
+	"compress/gzip"
+	"io"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+)
+
+func TestPageCacheEvictsLeastRecentlyUsed(t *testing.T) {
+	page := renderedPage{body: make([]byte, 100)}
+	c := newPageCache(3 * (100 + pageCacheOverhead + 2))
+	mtime := time.Unix(1700000000, 0)
+	for _, path := range []string{"/a", "/b", "/c"} {
+		c.put(pageCacheKey{path: path}, page, mtime, 1)
+	}
+	// Touch /a so that /b is the least recently used.
+	if _, ok := c.get(pageCacheKey{path: "/a"}, mtime, 1); !ok {
+		t.Fatal("get(/a) missed")
+	}
+	c.put(pageCacheKey{path: "/d"}, page, mtime, 1)
+
+	for path, want := range map[string]bool{"/a": true, "/b": false, "/c": true, "/d": true} {
+		if _, ok := c.get(pageCacheKey{path: path}, mtime, 1); ok != want {
+			t.Errorf("get(%s) hit = %v, want %v", path, ok, want)
+		}
+	}
+	if stats := c.stats(); stats.Entries != 3 || stats.Bytes > stats.MaxBytes {
+		t.Errorf("stats() = %+v, want 3 entries within the bound", stats)
+	}
+}
+
+func TestPageCacheChecksSourceFile(t *testing.T) {
+	c := newPageCache(1 << 20)
+	key := pageCacheKey{path: "/manpages/noble/man1/ls.1.html", encoding: "gzip"}
+	mtime := time.Unix(1700000000, 0)
+	c.put(key, renderedPage{body: []byte("page")}, mtime, 10)
+
+	if _, ok := c.get(pageCacheKey{path: key.path}, mtime, 10); ok {
+		t.Error("identity lookup hit the gzip entry")
+	}
+	if _, ok := c.get(key, mtime.Add(time.Second), 10); ok {
+		t.Error("get() hit after the file's mtime changed")
+	}
+	if _, ok := c.get(key, mtime, 10); ok {
+		t.Error("stale entry was not dropped")
+	}
+
+	var nilCache *pageCache
+	nilCache.put(key, renderedPage{body: []byte("page")}, mtime, 10)
+	if _, ok := nilCache.get(key, mtime, 10); ok {
+		t.Error("nil cache hit")
+	}
+}
+
+func TestServeManpageFromCache(t *testing.T) {
+	srv, cfg := testServer(t)
+	srv.pages = newPageCache(1 << 20)
+	path := filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", "man1", "ls.1.html")
+
+	get := func(encoding string) (*http.Response, string) {
+		t.Helper()
+		req := httptest.NewRequest(http.MethodGet, "/manpages/noble/man1/ls.1.html", nil)
+		req.Header.Set("Accept-Encoding", encoding)
+		w := httptest.NewRecorder()
+		gzipHandler(http.HandlerFunc(srv.handleManpages)).ServeHTTP(w, req)
+		resp := w.Result()
+		var body io.Reader = resp.Body
+		if resp.Header.Get("Content-Encoding") == "gzip" {
+			gr, err := gzip.NewReader(resp.Body)
+			if err != nil {
+				t.Fatalf("gzip body: %v", err)
+			}
+			body = gr
+		}
+		data, _ := io.ReadAll(body)
+		return resp, string(data)
+	}
+
+	for i := 0; i < 2; i++ {
+		for _, encoding := range []string{"gzip", ""} {
+			resp, body := get(encoding)
+			if resp.StatusCode != http.StatusOK || !strings.Contains(body, "list directory contents") {
+				t.Fatalf("GET (%q) = %d, body missing the manpage", encoding, resp.StatusCode)
+			}
+			if got := resp.Header.Get("Content-Encoding"); got != encoding {
+				t.Errorf("Content-Encoding = %q, want %q", got, encoding)
+			}
+		}
+	}
+	if stats := srv.pages.stats(); stats.Hits != 2 || stats.Misses != 2 || stats.Entries != 2 {
+		t.Errorf("stats() = %+v, want 2 hits, 2 misses, 2 entries", stats)
+	}
+
+	// A rewritten file is rendered again.
+	fragment := `<!--META:{"title":"ls","description":"list files"}-->` + "\n" + `<p>updated</p>`
+	if err := os.WriteFile(path, []byte(fragment), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.Chtimes(path, time.Now(), time.Now().Add(time.Minute)); err != nil {
+		t.Fatal(err)
+	}
+	if _, body := get("gzip"); !strings.Contains(body, "updated") {
+		t.Error("cached page served after the file changed")
+	}
+
+	// Reindex drops every entry.
+	w := httptest.NewRecorder()
+	srv.handleReindex(w, httptest.NewRequest(http.MethodPost, "/_/reindex", nil))
+	if stats := srv.pages.stats(); stats.Entries != 0 {
+		t.Errorf("%d entries after reindex, want 0", stats.Entries)
+	}
+}
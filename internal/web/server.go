@@ -1,24 +1,29 @@
 package web
 
 import (
+	"bytes"
 	"compress/gzip"
 	"crypto/sha256"
 	"embed"
 	"encoding/hex"
 	"encoding/json"
+	"errors"
 	"fmt"
 	"html/template"
+	"io"
 	"io/fs"
 	"log/slog"
 	"mime"
 	"net"
 	"net/http"
-	"os"
+	"path"
 	"path/filepath"
 	"runtime/debug"
 	"sort"
 	"strconv"
 	"strings"
+	"sync"
+	"sync/atomic"
 	"time"
 
 	"context"
@@ -27,6 +32,7 @@ import (
 	"github.com/canonical/ubuntu-manpages-operator/internal/pipeline"
 	"github.com/canonical/ubuntu-manpages-operator/internal/search"
 	"github.com/canonical/ubuntu-manpages-operator/internal/sitemap"
+	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
 	"github.com/canonical/ubuntu-manpages-operator/internal/transform"
 )
 
@@ -49,8 +55,34 @@ type Server struct {
 	notFound    *template.Template
 	search      search.Searcher
 	sitemapGen  *sitemap.SitemapGenerator
+	// tree is the public HTML tree, with packed releases read from their
+	// packs.
+	tree     *storage.Pages
+	pages    *pageCache
+	listings *listingCache
+	// missing remembers pages found missing since the last reindex.
+	missing missingPages
+	// pagesChanged is the Unix time after which any rendered page may
+	// differ from one rendered earlier: startup or the last reindex.
+	pagesChanged atomic.Int64
+
+	reindexMu   sync.Mutex
+	lastReindex *reindexStatus
 }
 
+// reindexStatus describes the most recent search index update, as reported
+// by GET /_/reindex.
+type reindexStatus struct {
+	Time time.Time `json:"time"`
+	// Full is set for a rescan of the whole tree, which does not count
+	// changed entries.
+	Full    bool `json:"full"`
+	Changed int  `json:"changed"`
+}
+
+// maxJournalBytes bounds the ingest journal accepted by POST /_/reindex.
+const maxJournalBytes = 64 << 20
+
 type manpageView struct {
 	ActiveNav    string
 	Title        string
@@ -184,13 +216,16 @@ func NewServer(cfg *config.Config, logger *slog.Logger) *Server {
 	browsePage := parse(append(partials, "templates/base.html", "templates/browse.html")...)
 	manpagePage := parse(append(partials, "templates/base.html", "templates/manpage.html")...)
 	notFound := parse(append(partials, "templates/base.html", "templates/404.html")...)
-	searcher := search.NewFSSearcher(cfg.PublicHTMLDir, cfg.ReleaseKeys())
+	tree := storage.OpenPages(cfg.PublicHTMLDir)
+	searcher := search.NewFSSearcherFS(tree, cfg.ReleaseKeys(), cfg.IndexPath())
 	sitemapGen := &sitemap.SitemapGenerator{
 		Root:    cfg.PublicHTMLDir,
+		Pages:   tree,
 		SiteURL: cfg.SiteURL(),
 		Logger:  logger,
+		Gzip:    cfg.SitemapGzip,
 	}
-	return &Server{
+	srv := &Server{
 		cfg:         cfg,
 		basePath:    basePath,
 		logger:      logger,
@@ -201,7 +236,12 @@ func NewServer(cfg *config.Config, logger *slog.Logger) *Server {
 		notFound:    notFound,
 		search:      searcher,
 		sitemapGen:  sitemapGen,
+		tree:        tree,
+		pages:       newPageCache(int64(cfg.PageCacheSizeMB) << 20),
+		listings:    newListingCache(int64(cfg.ListingCacheSizeMB) << 20),
 	}
+	srv.pagesChanged.Store(time.Now().Unix())
+	return srv
 }
 
 func (s *Server) ListenAndServe(addr, adminAddr string) error {
@@ -220,11 +260,13 @@ func (s *Server) ListenAndServe(addr, adminAddr string) error {
 	))
 	fileServer := http.FileServer(http.Dir(s.cfg.PublicHTMLDir))
 	mux.HandleFunc("/manpages/", s.handleManpages)
-	mux.Handle("/manpages.gz/", fileServer)
+	mux.Handle("/manpages.gz/", hideDotfiles(validateFiles(s.cfg.PublicHTMLDir, s.cfg.CacheControlDownloads, fileServer)))
 	mux.Handle("/assets/", fileServer)
 	mux.Handle("/functions.js", fileServer)
 	sitemapDir := filepath.Join(s.cfg.PublicHTMLDir, "sitemaps")
-	mux.Handle("/sitemaps/", http.StripPrefix("/sitemaps/", http.FileServer(http.Dir(sitemapDir))))
+	mux.Handle("/sitemaps/", http.StripPrefix("/sitemaps/",
+		validateFiles(sitemapDir, s.cfg.CacheControlSitemaps, http.FileServer(http.Dir(sitemapDir))),
+	))
 
 	pubSrv := &http.Server{
 		Handler:           s.logRequests(securityHeaders(gzipHandler(mux))),
@@ -238,6 +280,8 @@ func (s *Server) ListenAndServe(addr, adminAddr string) error {
 	adminMux := http.NewServeMux()
 	adminMux.HandleFunc("GET /_/healthz", s.handleAdminHealth)
 	adminMux.HandleFunc("POST /_/reindex", s.handleReindex)
+	adminMux.HandleFunc("GET /_/reindex", s.handleReindexStatus)
+	adminMux.HandleFunc("GET /_/stats", s.handleStats)
 	adminMux.HandleFunc("POST /_/regenerate-sitemaps", s.handleRegenerateSitemaps)
 	adminSrv := &http.Server{
 		Handler:           adminMux,
@@ -263,9 +307,77 @@ func (s *Server) ListenAndServe(addr, adminAddr string) error {
 	return <-errc
 }
 
+// handleReindex updates the search index. With an ingest journal as the
+// body, only the listed pages are re-read and the number of changed entries
+// is returned once the update is in place; a journal that cannot be applied
+// is rejected so that ingest can fall back to a full rebuild. Without a body
+// the whole tree is rescanned in the background.
 func (s *Server) handleReindex(w http.ResponseWriter, r *http.Request) {
-	go s.search.Rebuild()
-	w.WriteHeader(http.StatusAccepted)
+	// Ingest may have written new packs, and rendered pages list the
+	// releases that have them, which it may have changed.
+	s.tree.Reload()
+	s.pages.purge()
+	s.listings.purge()
+	s.missing.purge()
+	s.pagesChanged.Store(time.Now().Unix())
+
+	var journal search.Journal
+	err := json.NewDecoder(http.MaxBytesReader(w, r.Body, maxJournalBytes)).Decode(&journal)
+	if errors.Is(err, io.EOF) {
+		go func() {
+			s.search.Rebuild()
+			s.setReindexStatus(reindexStatus{Time: time.Now(), Full: true})
+		}()
+		w.WriteHeader(http.StatusAccepted)
+		return
+	}
+
+	w.Header().Set("Content-Type", "application/json")
+	if err != nil {
+		w.WriteHeader(http.StatusBadRequest)
+		_ = json.NewEncoder(w).Encode(map[string]string{"error": "invalid journal: " + err.Error()})
+		return
+	}
+	changed, err := s.search.Apply(&journal)
+	if err != nil {
+		s.logger.Warn("search journal rejected", "error", err)
+		w.WriteHeader(http.StatusUnprocessableEntity)
+		_ = json.NewEncoder(w).Encode(map[string]string{"error": err.Error()})
+		return
+	}
+	status := reindexStatus{Time: time.Now(), Changed: changed}
+	s.setReindexStatus(status)
+	_ = json.NewEncoder(w).Encode(status)
+}
+
+func (s *Server) setReindexStatus(status reindexStatus) {
+	s.reindexMu.Lock()
+	s.lastReindex = &status
+	s.reindexMu.Unlock()
+}
+
+// handleStats reports server cache usage for monitoring.
+func (s *Server) handleStats(w http.ResponseWriter, r *http.Request) {
+	w.Header().Set("Content-Type", "application/json")
+	_ = json.NewEncoder(w).Encode(map[string]any{
+		"page_cache":    s.pages.stats(),
+		"listing_cache": s.listings.stats(),
+	})
+}
+
+// handleReindexStatus reports the most recent search index update, or an
+// empty object when the index has not been updated since startup.
+func (s *Server) handleReindexStatus(w http.ResponseWriter, r *http.Request) {
+	s.reindexMu.Lock()
+	status := s.lastReindex
+	s.reindexMu.Unlock()
+
+	w.Header().Set("Content-Type", "application/json")
+	if status == nil {
+		_, _ = w.Write([]byte("{}\n"))
+		return
+	}
+	_ = json.NewEncoder(w).Encode(status)
 }
 
 func (s *Server) handleRegenerateSitemaps(w http.ResponseWriter, r *http.Request) {
@@ -500,6 +612,19 @@ func (rw *responseWriter) Write(b []byte) (int, error) {
 	return rw.ResponseWriter.Write(b)
 }
 
+// ReadFrom implements io.ReaderFrom, delegating to the underlying writer,
+// so that files served through it can still be sent with sendfile.
+func (rw *responseWriter) ReadFrom(src io.Reader) (int64, error) {
+	if !rw.written {
+		rw.statusCode = http.StatusOK
+		rw.written = true
+	}
+	if rf, ok := rw.ResponseWriter.(io.ReaderFrom); ok {
+		return rf.ReadFrom(src)
+	}
+	return io.Copy(writerOnly{rw.ResponseWriter}, src)
+}
+
 // Flush implements http.Flusher, delegating to the underlying writer.
 func (rw *responseWriter) Flush() {
 	if f, ok := rw.ResponseWriter.(http.Flusher); ok {
@@ -548,6 +673,29 @@ func computeStaticETag() string {
 	return `"` + hex.EncodeToString(h.Sum(nil))[:16] + `"`
 }
 
+// isHiddenPath reports whether any segment of a URL path is a dot-file.
+// Ingest keeps its bookkeeping (package and conversion caches, purge
+// tombstones, ingest state) under such names next to the served trees.
+func isHiddenPath(p string) bool {
+	for _, seg := range strings.Split(p, "/") {
+		if strings.HasPrefix(seg, ".") && seg != "." && seg != ".." {
+			return true
+		}
+	}
+	return false
+}
+
+// hideDotfiles responds 404 for hidden paths.
+func hideDotfiles(next http.Handler) http.Handler {
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		if isHiddenPath(r.URL.Path) {
+			http.NotFound(w, r)
+			return
+		}
+		next.ServeHTTP(w, r)
+	})
+}
+
 func staticCacheHandler(etag string, next http.Handler) http.Handler {
 	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
 		w.Header().Set("Cache-Control", "public, max-age=86400")
@@ -577,7 +725,12 @@ type gzipResponseWriter struct {
 }
 
 func (grw *gzipResponseWriter) WriteHeader(code int) {
-	if code != http.StatusNotModified {
+	if code == http.StatusNotModified {
+		// A 304 has no body, so closing the writer must not add a gzip
+		// header and trailer to it.
+		grw.sniffed = true
+		grw.gw = nil
+	} else {
 		grw.sniff()
 	}
 	grw.ResponseWriter.WriteHeader(code)
@@ -591,18 +744,47 @@ func (grw *gzipResponseWriter) Write(b []byte) (int, error) {
 	return grw.ResponseWriter.Write(b)
 }
 
+// ReadFrom implements io.ReaderFrom. Responses it does not compress are
+// delegated to the underlying writer, so that precompressed files can still
+// be sent with sendfile.
+func (grw *gzipResponseWriter) ReadFrom(src io.Reader) (int64, error) {
+	grw.sniff()
+	if grw.gw != nil {
+		return io.Copy(grw.gw, src)
+	}
+	if rf, ok := grw.ResponseWriter.(io.ReaderFrom); ok {
+		return rf.ReadFrom(src)
+	}
+	return io.Copy(writerOnly{grw.ResponseWriter}, src)
+}
+
+// writerOnly hides every method of a writer but Write, so that io.Copy to
+// it does not call back into a ReadFrom.
+type writerOnly struct{ io.Writer }
+
 func (grw *gzipResponseWriter) sniff() {
 	if grw.sniffed {
 		return
 	}
 	grw.sniffed = true
 
+	// Handlers that serve precompressed bodies set the encoding themselves.
+	if grw.ResponseWriter.Header().Get("Content-Encoding") != "" {
+		grw.gw = nil
+		return
+	}
 	ct := grw.ResponseWriter.Header().Get("Content-Type")
 	if strings.HasPrefix(ct, "text/") ||
 		strings.HasPrefix(ct, "application/json") ||
 		strings.HasPrefix(ct, "application/javascript") {
-		grw.ResponseWriter.Header().Set("Content-Encoding", "gzip")
-		grw.ResponseWriter.Header().Del("Content-Length")
+		h := grw.ResponseWriter.Header()
+		h.Set("Content-Encoding", "gzip")
+		h.Del("Content-Length")
+		h.Add("Vary", "Accept-Encoding")
+		// The compressed representation needs its own strong validator.
+		if etag := h.Get("ETag"); strings.HasPrefix(etag, `"`) && !strings.HasSuffix(etag, gzipETagSuffix+`"`) {
+			h.Set("ETag", strings.TrimSuffix(etag, `"`)+gzipETagSuffix+`"`)
+		}
 	} else {
 		grw.gw = nil
 	}
@@ -619,11 +801,12 @@ func (grw *gzipResponseWriter) Flush() {
 
 func gzipHandler(next http.Handler) http.Handler {
 	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
-		if !strings.Contains(r.Header.Get("Accept-Encoding"), "gzip") {
+		if !acceptsGzip(r) {
 			next.ServeHTTP(w, r)
 			return
 		}
-		gw := gzip.NewWriter(w)
+		gw := getGzipWriter(w)
+		defer putGzipWriter(gw)
 		grw := &gzipResponseWriter{ResponseWriter: w, gw: gw}
 		next.ServeHTTP(grw, r)
 		if grw.gw != nil {
@@ -632,6 +815,10 @@ func gzipHandler(next http.Handler) http.Handler {
 	})
 }
 
+func acceptsGzip(r *http.Request) bool {
+	return strings.Contains(r.Header.Get("Accept-Encoding"), "gzip")
+}
+
 func parseIntQuery(r *http.Request, key string, fallback int) int {
 	value := r.URL.Query().Get(key)
 	if value == "" {
@@ -687,6 +874,10 @@ type browseView struct {
 
 func (s *Server) handleManpages(w http.ResponseWriter, r *http.Request) {
 	clean := filepath.Clean(r.URL.Path)
+	if isHiddenPath(clean) {
+		s.renderNotFound(w, r)
+		return
+	}
 
 	// Redirect "latest" and "lts" aliases to the actual release codename.
 	parts := strings.SplitN(clean, "/", 4) // ["", "manpages", alias, ...]
@@ -721,30 +912,42 @@ func (s *Server) handleManpages(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	fsPath := filepath.Join(s.cfg.PublicHTMLDir, clean)
+	name := strings.TrimPrefix(clean, "/")
+
+	// Precompressed copies are only read to build gzip responses.
+	if strings.HasSuffix(clean, ".html"+storage.PrecompressedSuffix) ||
+		strings.HasSuffix(clean, storage.PlainTextSuffix+storage.PrecompressedSuffix) {
+		s.renderNotFound(w, r)
+		return
+	}
 
 	// Serve plain text version of manpages for LLM consumption.
 	if strings.HasSuffix(clean, ".txt") {
-		htmlPath := strings.TrimSuffix(fsPath, ".txt") + ".html"
+		htmlPath := strings.TrimSuffix(name, ".txt") + ".html"
 		s.serveManpageText(w, r, htmlPath)
 		return
 	}
 
-	info, err := os.Stat(fsPath)
+	if s.missing.has(name) {
+		s.renderNotFound(w, r)
+		return
+	}
+	info, err := fs.Stat(s.tree, name)
 	if err != nil {
 		// Cross-reference links like SSL_connect(3) produce .3.html but
 		// the actual file may be .3ssl.html. Try finding a suffixed variant.
-		if redirect := findSuffixedVariant(clean, fsPath); redirect != "" {
+		if redirect := s.suffixedVariant(clean, name); redirect != "" {
 			http.Redirect(w, r, s.basePath+redirect, http.StatusMovedPermanently)
 			return
 		}
+		s.missing.add(name)
 		s.renderNotFound(w, r)
 		return
 	}
 
 	// Render manpage fragments through the template.
 	if !info.IsDir() {
-		s.serveManpage(w, r, fsPath)
+		s.serveManpage(w, r, name, info)
 		return
 	}
 
@@ -754,34 +957,12 @@ func (s *Server) handleManpages(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	entries, err := os.ReadDir(fsPath)
+	listing, err := s.listing(name, info)
 	if err != nil {
 		s.renderNotFound(w, r)
 		return
 	}
-
-	var sections, dirs, files []browseEntry
-	for _, e := range entries {
-		name := e.Name()
-		if strings.HasPrefix(name, ".") {
-			continue
-		}
-		href := s.basePath + filepath.Join(r.URL.Path, name)
-		if e.IsDir() {
-			entry := browseEntry{Name: name, Href: template.URL(href + "/")}
-			if isManSection(name) {
-				sections = append(sections, entry)
-			} else {
-				dirs = append(dirs, entry)
-			}
-		} else {
-			display := strings.TrimSuffix(name, ".html")
-			files = append(files, browseEntry{Name: display, Href: template.URL(href)})
-		}
-	}
-	sort.Slice(sections, func(i, j int) bool { return sections[i].Name < sections[j].Name })
-	sort.Slice(dirs, func(i, j int) bool { return dirs[i].Name < dirs[j].Name })
-	sort.Slice(files, func(i, j int) bool { return files[i].Name < files[j].Name })
+	files := listing.files
 
 	// Build breadcrumbs from path segments.
 	segments := strings.Split(strings.Trim(clean, "/"), "/")
@@ -838,8 +1019,8 @@ func (s *Server) handleManpages(w http.ResponseWriter, r *http.Request) {
 		Title:          title,
 		Releases:       buildIndexView(s.cfg).Releases,
 		Breadcrumbs:    crumbs,
-		Sections:       sections,
-		Dirs:           dirs,
+		Sections:       listing.sections,
+		Dirs:           listing.dirs,
 		Files:          files,
 		FileCount:      totalFiles,
 		Page:           page,
@@ -879,45 +1060,107 @@ func parseBrowsePerPage(r *http.Request) int {
 	return defaultBrowsePageSize
 }
 
-// findSuffixedVariant handles cross-reference section suffix mismatches.
-// For example, .Xr SSL_connect(3) generates a link to SSL_connect.3.html
-// but the actual file is SSL_connect.3ssl.html. This scans the directory
-// for a file that matches the prefix and returns a redirect URL, or "".
-func findSuffixedVariant(urlPath, fsPath string) string {
-	if !strings.HasSuffix(fsPath, ".html") {
-		return ""
-	}
-	dir := filepath.Dir(fsPath)
-	base := filepath.Base(fsPath)
-	prefix := strings.TrimSuffix(base, ".html") // e.g. "SSL_connect.3"
-
-	entries, err := os.ReadDir(dir)
-	if err != nil {
-		return ""
+// serveManpage renders the manpage fragment at name, described by info,
+// through the manpage template. Rendered responses are kept in the page
+// cache in the encoding the client accepts, with a validator hashed from
+// the rendered page.
+func (s *Server) serveManpage(w http.ResponseWriter, r *http.Request, name string, info fs.FileInfo) {
+	key := pageCacheKey{path: filepath.Clean(r.URL.Path)}
+	if acceptsGzip(r) {
+		key.encoding = "gzip"
 	}
-	for _, e := range entries {
-		if e.IsDir() {
-			continue
+	page, ok := s.pages.get(key, info.ModTime(), info.Size())
+	if !ok {
+		raw, done, err := s.tree.Bytes(name)
+		if err != nil {
+			s.renderNotFound(w, r)
+			return
 		}
-		name := e.Name()
-		if name == base || !strings.HasSuffix(name, ".html") {
-			continue
+		if key.encoding == "gzip" {
+			page, err = s.renderManpageGzip(r, name, raw)
+		} else {
+			var buf bytes.Buffer
+			err = s.renderManpage(&buf, r, name, raw)
+			page = renderedPage{body: buf.Bytes(), etag: contentETag("", buf.Bytes())}
 		}
-		// Match files like SSL_connect.3ssl.html for prefix SSL_connect.3
-		if strings.HasPrefix(name, prefix) {
-			return filepath.Join(filepath.Dir(urlPath), name)
+		// The rendered page holds no part of raw.
+		done()
+		if err != nil {
+			s.logger.Error("render error", "template", "manpage", "error", err)
+			http.Error(w, "internal server error", http.StatusInternalServerError)
+			return
 		}
+		s.pages.put(key, page, info.ModTime(), info.Size())
 	}
-	return ""
-}
 
-func (s *Server) serveManpage(w http.ResponseWriter, r *http.Request, fsPath string) {
-	raw, err := os.ReadFile(fsPath)
-	if err != nil {
-		s.renderNotFound(w, r)
+	// A page also lists the other releases that have it, which may change
+	// whenever the index is updated.
+	modTime := info.ModTime()
+	if changed := time.Unix(s.pagesChanged.Load(), 0); changed.After(modTime) {
+		modTime = changed
+	}
+	w.Header().Set("Content-Type", "text/html; charset=utf-8")
+	w.Header().Add("Vary", "Accept-Encoding")
+	setValidators(w, s.cfg.CacheControlPages, page.etag, modTime)
+	if notModified(r, page.etag, modTime) {
+		w.WriteHeader(http.StatusNotModified)
 		return
 	}
+	if key.encoding != "" {
+		w.Header().Set("Content-Encoding", key.encoding)
+	}
+	w.Header().Set("Content-Length", strconv.Itoa(len(page.body)))
+	_, _ = w.Write(page.body)
+}
 
+// renderManpage writes the manpage page for the fragment raw, read from
+// name, to w.
+func (s *Server) renderManpage(w io.Writer, r *http.Request, name string, raw []byte) error {
+	view, _ := s.buildManpageView(r, name, raw)
+	return s.manpagePage.ExecuteTemplate(w, "base", view)
+}
+
+// manpageBodyMarker stands in for the manpage body when rendering the page
+// around a precompressed body.
+const manpageBodyMarker = "\x00manpage-body\x00"
+
+// renderManpageGzip renders the manpage page for the fragment raw, read
+// from name, compressed with gzip. When ingest left a precompressed copy
+// of the fragment, only the page around the body is compressed and the
+// body's compressed blocks are spliced in, which is most of the work saved.
+// The response is the same page either way, and so is its validator.
+func (s *Server) renderManpageGzip(r *http.Request, name string, raw []byte) (renderedPage, error) {
+	view, bodyStart := s.buildManpageView(r, name, raw)
+	if gz, done, err := s.tree.Bytes(name + storage.PrecompressedSuffix); err == nil {
+		defer done()
+		if blocks, offset, ok := storage.PrecompressedBody(gz, raw); ok && offset == bodyStart {
+			body := view.Body
+			view.Body = manpageBodyMarker
+			var buf bytes.Buffer
+			if err := s.manpagePage.ExecuteTemplate(&buf, "base", view); err != nil {
+				return renderedPage{}, err
+			}
+			head, tail, found := bytes.Cut(buf.Bytes(), []byte(manpageBodyMarker))
+			if found && !bytes.Contains(tail, []byte(manpageBodyMarker)) {
+				return renderedPage{
+					body: spliceGzip(head, raw[bodyStart:], blocks, tail),
+					etag: contentETag("gzip", head, raw[bodyStart:], tail),
+				}, nil
+			}
+			view.Body = body
+		}
+	}
+
+	var buf bytes.Buffer
+	if err := s.manpagePage.ExecuteTemplate(&buf, "base", view); err != nil {
+		return renderedPage{}, err
+	}
+	return renderedPage{body: gzipBytes(buf.Bytes()), etag: contentETag("gzip", buf.Bytes())}, nil
+}
+
+// buildManpageView returns the view of the manpage page for the fragment
+// raw, read from name, and the offset of the manpage body in raw.
+func (s *Server) buildManpageView(r *http.Request, name string, raw []byte) (manpageView, int) {
 	siteURL := s.cfg.SiteURL()
 	content := string(raw)
 	view := manpageView{
@@ -955,7 +1198,7 @@ func (s *Server) serveManpage(w http.ResponseWriter, r *http.Request, fsPath str
 	}
 
 	if view.Title == "" {
-		view.Title = filepath.Base(fsPath)
+		view.Title = path.Base(name)
 	}
 	view.Body = template.HTML(content)
 
@@ -971,8 +1214,8 @@ func (s *Server) serveManpage(w http.ResponseWriter, r *http.Request, fsPath str
 	allReleases := buildIndexView(s.cfg).Releases
 	if view.PathSuffix != "" {
 		for _, rel := range allReleases {
-			otherPath := filepath.Join(s.cfg.PublicHTMLDir, "manpages", rel.Name, view.PathSuffix)
-			if _, err := os.Stat(otherPath); err == nil {
+			otherPath := path.Join("manpages", rel.Name, view.PathSuffix)
+			if _, err := fs.Stat(s.tree, otherPath); err == nil {
 				view.Releases = append(view.Releases, rel)
 			}
 		}
@@ -989,10 +1232,7 @@ func (s *Server) serveManpage(w http.ResponseWriter, r *http.Request, fsPath str
 	}
 	view.JSONLD = buildManpageJSONLD(view.SiteURL, view.CanonicalURL, view.Title, view.Description, view.Breadcrumbs)
 
-	w.Header().Set("Content-Type", "text/html; charset=utf-8")
-	if err := s.manpagePage.ExecuteTemplate(w, "base", view); err != nil {
-		s.logger.Error("render error", "template", "manpage", "error", err)
-	}
+	return view, len(raw) - len(content)
 }
 
 func (s *Server) buildManpageBreadcrumbs(segments []string) []breadcrumb {
@@ -1239,22 +1479,80 @@ For example:
 }
 
 func (s *Server) serveManpageText(w http.ResponseWriter, r *http.Request, htmlPath string) {
-	raw, err := os.ReadFile(htmlPath)
+	if s.servePlainText(w, r, htmlPath) {
+		return
+	}
+	raw, done, err := s.tree.Bytes(htmlPath)
 	if err != nil {
 		s.renderNotFound(w, r)
 		return
 	}
 
-	content := string(raw)
-	if strings.HasPrefix(content, metaPrefix) {
-		if end := strings.Index(content, metaSuffix); end != -1 {
-			content = strings.TrimPrefix(content[end+len(metaSuffix):], "\n")
+	text := transform.ManpageText(string(raw))
+	done()
+	w.Header().Set("Content-Type", "text/plain; charset=utf-8")
+	_, _ = w.Write([]byte(text))
+}
+
+// servePlainText serves the plain-text rendering ingest wrote next to the
+// page at htmlPath, or its gzip copy when the client accepts gzip, as the
+// file it is: with file validators, and through sendfile when it is a file
+// on disk. It reports false, having written nothing, when there is no
+// rendering at least as new as the page, so that a rendering left by an
+// earlier ingest run is never served for a rewritten page.
+func (s *Server) servePlainText(w http.ResponseWriter, r *http.Request, htmlPath string) bool {
+	page, err := fs.Stat(s.tree, htmlPath)
+	if err != nil {
+		return false
+	}
+	name := storage.PlainTextPath(htmlPath)
+	f, info, ok := s.openRendering(name, page.ModTime())
+	if !ok {
+		return false
+	}
+	var encoding string
+	if acceptsGzip(r) {
+		if gz, gzInfo, ok := s.openRendering(name+storage.PrecompressedSuffix, info.ModTime()); ok {
+			_ = f.Close()
+			f, info, encoding = gz, gzInfo, "gzip"
 		}
 	}
+	defer f.Close()
+	content, ok := f.(io.ReadSeeker)
+	if !ok {
+		return false
+	}
 
-	text := transform.StripHTMLTags(content)
-	w.Header().Set("Content-Type", "text/plain; charset=utf-8")
-	_, _ = w.Write([]byte(text))
+	h := w.Header()
+	h.Set("Content-Type", "text/plain; charset=utf-8")
+	etag := fileETag(info)
+	if encoding != "" {
+		h.Set("Content-Encoding", encoding)
+		h.Add("Vary", "Accept-Encoding")
+		etag = strings.TrimSuffix(etag, `"`) + gzipETagSuffix + `"`
+	}
+	setValidators(w, s.cfg.CacheControlPages, etag, info.ModTime())
+	if notModified(r, etag, info.ModTime()) {
+		w.WriteHeader(http.StatusNotModified)
+		return true
+	}
+	http.ServeContent(w, r, "", info.ModTime(), content)
+	return true
+}
+
+// openRendering opens name, a file ingest derives from a page, if it is a
+// regular file not older than the page, whose modification time is modTime.
+func (s *Server) openRendering(name string, modTime time.Time) (fs.File, fs.FileInfo, bool) {
+	f, err := s.tree.Open(name)
+	if err != nil {
+		return nil, nil, false
+	}
+	info, err := f.Stat()
+	if err != nil || !info.Mode().IsRegular() || info.ModTime().Before(modTime) {
+		_ = f.Close()
+		return nil, nil, false
+	}
+	return f, info, true
 }
 
 func buildJSONLD(data any) template.HTML {
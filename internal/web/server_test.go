@@ -3,6 +3,8 @@ package web
 import (
 	"bytes"
 	"compress/gzip"
+	"context"
+	"encoding/json"
 	"fmt"
 	"io"
 	"io/fs"
@@ -17,10 +19,11 @@ import (
 
 	"github.com/canonical/ubuntu-manpages-operator/internal/config"
 	"github.com/canonical/ubuntu-manpages-operator/internal/search"
+	"github.com/canonical/ubuntu-manpages-operator/internal/storage"
 	"github.com/canonical/ubuntu-manpages-operator/internal/transform"
 )
 
-func testServer(t *testing.T) (*Server, *config.Config) {
+func testServer(t testing.TB) (*Server, *config.Config) {
 	t.Helper()
 	dir := t.TempDir()
 
@@ -195,6 +198,124 @@ func TestServeManpageText_NotFound(t *testing.T) {
 	}
 }
 
+// plainTextServer returns a test server whose ls(1) page was written by a
+// storage writing plain-text renderings and their gzip copies.
+func plainTextServer(t testing.TB) (*Server, string) {
+	t.Helper()
+	srv, cfg := testServer(t)
+	st := storage.NewFSStorage(cfg.PublicHTMLDir)
+	st.PlainText = true
+	st.Precompress = true
+	fragment := `<!--META:{"title":"ls"}-->` + "\n" + `<h2>NAME</h2><p>ls - precomputed</p>`
+	if err := st.WriteHTML(context.Background(), "manpages/noble/man1/ls.1.html", []byte(fragment)); err != nil {
+		t.Fatal(err)
+	}
+	return srv, filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", "man1")
+}
+
+func TestServeManpageTextPrecomputed(t *testing.T) {
+	srv, dir := plainTextServer(t)
+	info, err := os.Stat(filepath.Join(dir, "ls.1.txt"))
+	if err != nil {
+		t.Fatal(err)
+	}
+
+	w := getManpage(t, srv, "/manpages/noble/man1/ls.1.txt", "")
+	if w.Code != http.StatusOK || w.Body.String() != "NAME  ls - precomputed" {
+		t.Fatalf("GET = %d %q, want the precomputed text", w.Code, w.Body.String())
+	}
+	etag := w.Header().Get("ETag")
+	if etag != fileETag(info) || w.Header().Get("Last-Modified") == "" || w.Header().Get("Content-Type") != "text/plain; charset=utf-8" {
+		t.Errorf("headers = %v, want file validators and text/plain", w.Header())
+	}
+
+	req := httptest.NewRequest(http.MethodGet, "/manpages/noble/man1/ls.1.txt", nil)
+	req.Header.Set("If-None-Match", etag)
+	rec := httptest.NewRecorder()
+	srv.handleManpages(rec, req)
+	if rec.Code != http.StatusNotModified {
+		t.Errorf("conditional GET = %d, want 304", rec.Code)
+	}
+
+	gz, err := os.ReadFile(filepath.Join(dir, "ls.1.txt"+storage.PrecompressedSuffix))
+	if err != nil {
+		t.Fatal(err)
+	}
+	w = getManpage(t, srv, "/manpages/noble/man1/ls.1.txt", "gzip")
+	if w.Header().Get("Content-Encoding") != "gzip" || !bytes.Equal(w.Body.Bytes(), gz) {
+		t.Errorf("gzip GET = encoding %q, %d bytes, want the gzip copy as is", w.Header().Get("Content-Encoding"), w.Body.Len())
+	}
+	if got := w.Header().Get("ETag"); !strings.HasSuffix(got, gzipETagSuffix+`"`) {
+		t.Errorf("gzip ETag = %s, want a gzip validator", got)
+	}
+
+	if w := getManpage(t, srv, "/manpages/noble/man1/ls.1.txt.gz", "gzip"); w.Code != http.StatusNotFound {
+		t.Errorf("GET .txt.gz = %d, want 404", w.Code)
+	}
+	if body := getManpage(t, srv, "/manpages/noble/man1/", "").Body.String(); strings.Contains(body, "ls.1.txt") {
+		t.Error("browse page lists the plain-text rendering")
+	}
+}
+
+func TestServeManpageTextStaleRendering(t *testing.T) {
+	srv, dir := plainTextServer(t)
+	// A page rewritten by an ingest run without plain text keeps the old
+	// rendering next to it, which must not be served.
+	old := time.Now().Add(-time.Hour)
+	for _, name := range []string{"ls.1.txt", "ls.1.txt" + storage.PrecompressedSuffix} {
+		if err := os.Chtimes(filepath.Join(dir, name), old, old); err != nil {
+			t.Fatal(err)
+		}
+	}
+	fragment := `<!--META:{"title":"ls"}-->` + "\n" + `<p>ls - rewritten</p>`
+	if err := os.WriteFile(filepath.Join(dir, "ls.1.html"), []byte(fragment), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	for _, encoding := range []string{"", "gzip"} {
+		w := getManpage(t, srv, "/manpages/noble/man1/ls.1.txt", encoding)
+		body := w.Body.String()
+		if encoding != "" {
+			gr, err := gzip.NewReader(w.Body)
+			if err != nil {
+				t.Fatal(err)
+			}
+			b, _ := io.ReadAll(gr)
+			body = string(b)
+		}
+		if body != "ls - rewritten" {
+			t.Errorf("GET (%q) = %q, want the rewritten page", encoding, body)
+		}
+	}
+}
+
+// readFromRecorder is a ResponseRecorder that records whether a body was
+// sent through ReadFrom, as net/http does to use sendfile.
+type readFromRecorder struct {
+	*httptest.ResponseRecorder
+	readFrom bool
+}
+
+func (r *readFromRecorder) ReadFrom(src io.Reader) (int64, error) {
+	r.readFrom = true
+	return io.Copy(r.ResponseRecorder, src)
+}
+
+func TestServeManpageTextReadFrom(t *testing.T) {
+	srv, _ := plainTextServer(t)
+	handler := srv.logRequests(gzipHandler(http.HandlerFunc(srv.handleManpages)))
+	for _, encoding := range []string{"", "gzip"} {
+		req := httptest.NewRequest(http.MethodGet, "/manpages/noble/man1/ls.1.txt", nil)
+		if encoding != "" {
+			req.Header.Set("Accept-Encoding", encoding)
+		}
+		w := &readFromRecorder{ResponseRecorder: httptest.NewRecorder()}
+		handler.ServeHTTP(w, req)
+		if w.Code != http.StatusOK || !w.readFrom {
+			t.Errorf("GET (%q) = %d, ReadFrom used %v, want 200 through ReadFrom", encoding, w.Code, w.readFrom)
+		}
+	}
+}
+
 func TestStripHTMLTags(t *testing.T) {
 	tests := []struct {
 		input string
@@ -765,6 +886,38 @@ func TestSuffixedVariantNoMatch(t *testing.T) {
 	}
 }
 
+func TestHiddenPathsNotServed(t *testing.T) {
+	srv, cfg := testServer(t)
+
+	tomb := filepath.Join(cfg.PublicHTMLDir, "manpages", ".purge-jammy-1", "man1")
+	if err := os.MkdirAll(tomb, 0o755); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(tomb, "ls.1.html"), []byte("<p>ls</p>"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	cache := filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", ".cache")
+	if err := os.MkdirAll(cache, 0o755); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(cache, "coreutils"), []byte("abc"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+
+	for _, path := range []string{
+		"/manpages/.purge-jammy-1/man1/ls.1.html",
+		"/manpages/noble/.cache/coreutils",
+	} {
+		req := httptest.NewRequest(http.MethodGet, path, nil)
+		w := httptest.NewRecorder()
+		srv.handleManpages(w, req)
+
+		if w.Code != http.StatusNotFound {
+			t.Errorf("GET %s: expected 404, got %d", path, w.Code)
+		}
+	}
+}
+
 func TestGroupSearchResults(t *testing.T) {
 	// Releases are sorted ascending by version (oldest first).
 	releases := []indexRelease{
@@ -1063,9 +1216,8 @@ func TestHandleSearchPageFuzzySection(t *testing.T) {
 		t.Fatal(err)
 	}
 
-	// Recreate the server so the searcher picks up the new file.
-	logger := slog.New(slog.NewTextHandler(io.Discard, nil))
-	srv = NewServer(cfg, logger)
+	// Reindex so the searcher picks up the new file.
+	srv.search.Rebuild()
 
 	req := httptest.NewRequest(http.MethodGet, "/search?q=grpe", nil)
 	w := httptest.NewRecorder()
@@ -1227,6 +1379,118 @@ func TestHandleReindex(t *testing.T) {
 	}
 }
 
+func TestServePackedRelease(t *testing.T) {
+	srv, cfg := testServer(t)
+
+	// An ingest run with the packed backend stores htop in noble's pack.
+	store := storage.NewFSStorage(cfg.PublicHTMLDir)
+	store.Packs = storage.NewPackWriter(filepath.Join(cfg.PublicHTMLDir, "manpages"))
+	fragment := `<!--META:{"title":"htop","description":"interactive process viewer"}-->` + "\n" + `<p>htop content</p>`
+	if err := store.WriteHTML(t.Context(), "manpages/noble/man1/htop.1.html", []byte(fragment)); err != nil {
+		t.Fatal(err)
+	}
+	if err := store.Commit("noble"); err != nil {
+		t.Fatal(err)
+	}
+
+	get := func(path string) *httptest.ResponseRecorder {
+		req := httptest.NewRequest(http.MethodGet, path, nil)
+		w := httptest.NewRecorder()
+		srv.handleManpages(w, req)
+		return w
+	}
+	if w := get("/manpages/noble/man1/htop.1.html"); w.Code != http.StatusNotFound {
+		t.Fatalf("before reindex: expected 404, got %d", w.Code)
+	}
+
+	req := httptest.NewRequest(http.MethodPost, "/_/reindex", nil)
+	srv.handleReindex(httptest.NewRecorder(), req)
+
+	w := get("/manpages/noble/man1/htop.1.html")
+	if w.Code != http.StatusOK || !strings.Contains(w.Body.String(), "htop content") {
+		t.Errorf("packed page: got %d, body contains content: %v", w.Code, strings.Contains(w.Body.String(), "htop content"))
+	}
+	if w := get("/manpages/noble/man1/htop.1.txt"); !strings.Contains(w.Body.String(), "htop content") {
+		t.Errorf("packed page as text: got %q", w.Body.String())
+	}
+	// The browse listing merges the packed page with the files.
+	w = get("/manpages/noble/man1/")
+	for _, name := range []string{"htop.1", "ls.1"} {
+		if !strings.Contains(w.Body.String(), name) {
+			t.Errorf("browse listing misses %s", name)
+		}
+	}
+	if w := get("/manpages/noble/.pack/"); w.Code != http.StatusNotFound {
+		t.Errorf("pack directory: expected 404, got %d", w.Code)
+	}
+}
+
+func TestHandleReindex_Journal(t *testing.T) {
+	srv, cfg := testServer(t)
+
+	manDir := filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", "man1")
+	fragment := `<!--META:{"title":"htop","description":"interactive process viewer"}-->` + "\n" + `<p>content</p>`
+	if err := os.WriteFile(filepath.Join(manDir, "htop.1.html"), []byte(fragment), 0o644); err != nil {
+		t.Fatal(err)
+	}
+
+	body := `{"releases":{"noble":{"added":["manpages/noble/man1/htop.1.html"]}}}`
+	req := httptest.NewRequest(http.MethodPost, "/_/reindex", strings.NewReader(body))
+	w := httptest.NewRecorder()
+	srv.handleReindex(w, req)
+	if w.Code != http.StatusOK {
+		t.Fatalf("expected 200, got %d: %s", w.Code, w.Body.String())
+	}
+	var status reindexStatus
+	if err := json.NewDecoder(w.Body).Decode(&status); err != nil {
+		t.Fatal(err)
+	}
+	if status.Full || status.Changed != 1 {
+		t.Errorf("reindex = %+v, want 1 changed entry", status)
+	}
+
+	// The journal is applied before the response, so htop is searchable.
+	results, err := srv.search.Search(t.Context(), "htop", "noble", "", 10, 0)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(results.Results) != 1 {
+		t.Errorf("expected htop after journal reindex, got %d results", len(results.Results))
+	}
+
+	w = httptest.NewRecorder()
+	srv.handleReindexStatus(w, httptest.NewRequest(http.MethodGet, "/_/reindex", nil))
+	var last reindexStatus
+	if err := json.NewDecoder(w.Body).Decode(&last); err != nil {
+		t.Fatal(err)
+	}
+	if last.Changed != 1 || last.Time.IsZero() {
+		t.Errorf("GET /_/reindex = %+v, want the journal reindex", last)
+	}
+}
+
+func TestHandleReindex_InvalidJournal(t *testing.T) {
+	srv, _ := testServer(t)
+
+	for body, want := range map[string]int{
+		`{"releases":`: http.StatusBadRequest,
+		`{"releases":{"focal":{"added":["manpages/focal/man1/ls.1.html"]}}}`: http.StatusUnprocessableEntity,
+	} {
+		req := httptest.NewRequest(http.MethodPost, "/_/reindex", strings.NewReader(body))
+		w := httptest.NewRecorder()
+		srv.handleReindex(w, req)
+		if w.Code != want {
+			t.Errorf("POST %s: expected %d, got %d", body, want, w.Code)
+		}
+	}
+
+	w := httptest.NewRecorder()
+	srv.handleReindexStatus(w, httptest.NewRequest(http.MethodGet, "/_/reindex", nil))
+	if got := strings.TrimSpace(w.Body.String()); got != "{}" {
+		t.Errorf("GET /_/reindex = %s, want {} before any reindex", got)
+	}
+}
+
 func TestHandleRegenerateSitemaps(t *testing.T) {
 	srv, cfg := testServer(t)
 
@@ -0,0 +1,106 @@
+package web
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"net/http"
+	"os"
+	"path/filepath"
+	"strconv"
+	"strings"
+	"time"
+)
+
+// gzipETagSuffix marks the validator of a gzip-encoded representation, so
+// that it differs from the identity one as strong validators must.
+const gzipETagSuffix = "-gzip"
+
+// fileETag returns a strong validator for a file served as is, derived from
+// its modification time and size. Ingest replaces files rather than editing
+// them in place, so a changed file always has a new mtime.
+func fileETag(info os.FileInfo) string {
+	return `"` + strconv.FormatInt(info.ModTime().UnixNano(), 36) + "-" + strconv.FormatInt(info.Size(), 36) + `"`
+}
+
+// contentETag returns a strong validator for a rendered body, given in one
+// or more consecutive parts, tagged with the content encoding it is served
+// in.
+func contentETag(encoding string, body ...[]byte) string {
+	h := sha256.New()
+	for _, part := range body {
+		h.Write(part)
+	}
+	etag := hex.EncodeToString(h.Sum(nil))[:16]
+	if encoding == "gzip" {
+		etag += gzipETagSuffix
+	}
+	return `"` + etag + `"`
+}
+
+// setValidators sets the caching headers of a response about to be served.
+func setValidators(w http.ResponseWriter, cacheControl, etag string, modTime time.Time) {
+	h := w.Header()
+	if cacheControl != "" {
+		h.Set("Cache-Control", cacheControl)
+	}
+	h.Set("ETag", etag)
+	if !modTime.IsZero() {
+		h.Set("Last-Modified", modTime.UTC().Format(http.TimeFormat))
+	}
+}
+
+// notModified reports whether a GET or HEAD request's preconditions show
+// that the client already has the representation with etag and modTime.
+// If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+func notModified(r *http.Request, etag string, modTime time.Time) bool {
+	if r.Method != http.MethodGet && r.Method != http.MethodHead {
+		return false
+	}
+	if inm := r.Header.Get("If-None-Match"); inm != "" {
+		return etagListMatches(inm, etag)
+	}
+	ims, err := http.ParseTime(r.Header.Get("If-Modified-Since"))
+	if err != nil || modTime.IsZero() {
+		return false
+	}
+	return !modTime.Truncate(time.Second).After(ims)
+}
+
+// etagListMatches applies the weak comparison of If-None-Match. The
+// identity and gzip representations of a resource share their content, so
+// either validator matches the other.
+func etagListMatches(list, etag string) bool {
+	want := strings.TrimSuffix(strings.TrimSuffix(etag, `"`), gzipETagSuffix)
+	for _, candidate := range strings.Split(list, ",") {
+		candidate = strings.TrimSpace(candidate)
+		if candidate == "*" {
+			return true
+		}
+		candidate = strings.TrimPrefix(candidate, "W/")
+		if strings.TrimSuffix(strings.TrimSuffix(candidate, `"`), gzipETagSuffix) == want {
+			return true
+		}
+	}
+	return false
+}
+
+// validateFiles sets validators and cacheControl on files that next serves
+// from root, and answers conditional requests for unchanged files with 304
+// before next opens them. Responses for missing files and directories are
+// left to next unchanged.
+func validateFiles(root, cacheControl string, next http.Handler) http.Handler {
+	return http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		info, err := os.Stat(filepath.Join(root, filepath.FromSlash(filepath.Clean("/"+r.URL.Path))))
+		if err != nil || !info.Mode().IsRegular() {
+			next.ServeHTTP(w, r)
+			return
+		}
+		etag := fileETag(info)
+		setValidators(w, cacheControl, etag, info.ModTime())
+		if notModified(r, etag, info.ModTime()) {
+			w.WriteHeader(http.StatusNotModified)
+			return
+		}
+		next.ServeHTTP(w, r)
+	})
+}
@@ -0,0 +1,149 @@
+package web
+
+import (
+	"bytes"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"testing"
+	"time"
+)
+
+func TestNotModified(t *testing.T) {
+	modTime := time.Date(2026, 10, 1, 12, 0, 0, 500, time.UTC)
+	etag := `"abc"`
+	tests := []struct {
+		name    string
+		method  string
+		headers map[string]string
+		want    bool
+	}{
+		{"no preconditions", http.MethodGet, nil, false},
+		{"matching etag", http.MethodGet, map[string]string{"If-None-Match": `"abc"`}, true},
+		{"etag in list", http.MethodHead, map[string]string{"If-None-Match": `"x", W/"abc"`}, true},
+		{"gzip variant", http.MethodGet, map[string]string{"If-None-Match": `"abc-gzip"`}, true},
+		{"wildcard", http.MethodGet, map[string]string{"If-None-Match": "*"}, true},
+		{"other etag", http.MethodGet, map[string]string{"If-None-Match": `"abd"`}, false},
+		{"etag wins over date", http.MethodGet, map[string]string{
+			"If-None-Match":     `"abd"`,
+			"If-Modified-Since": modTime.Add(time.Hour).Format(http.TimeFormat),
+		}, false},
+		{"same second", http.MethodGet, map[string]string{"If-Modified-Since": modTime.Format(http.TimeFormat)}, true},
+		{"modified since", http.MethodGet, map[string]string{"If-Modified-Since": modTime.Add(-time.Second).Format(http.TimeFormat)}, false},
+		{"post", http.MethodPost, map[string]string{"If-None-Match": `"abc"`}, false},
+	}
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			req := httptest.NewRequest(tt.method, "/", nil)
+			for k, v := range tt.headers {
+				req.Header.Set(k, v)
+			}
+			if got := notModified(req, etag, modTime); got != tt.want {
+				t.Errorf("notModified() = %v, want %v", got, tt.want)
+			}
+		})
+	}
+}
+
+func TestManpageValidators(t *testing.T) {
+	srv, cfg := testServer(t)
+	cfg.CacheControlPages = "public, max-age=600"
+	handler := gzipHandler(http.HandlerFunc(srv.handleManpages))
+
+	get := func(headers map[string]string) *httptest.ResponseRecorder {
+		t.Helper()
+		req := httptest.NewRequest(http.MethodGet, "/manpages/noble/man1/ls.1.html", nil)
+		for k, v := range headers {
+			req.Header.Set(k, v)
+		}
+		w := httptest.NewRecorder()
+		handler.ServeHTTP(w, req)
+		return w
+	}
+
+	first := get(map[string]string{"Accept-Encoding": "gzip"})
+	etag := first.Header().Get("ETag")
+	if first.Code != http.StatusOK || etag == "" || etag[0] != '"' {
+		t.Fatalf("GET = %d with ETag %q, want 200 and a strong ETag", first.Code, etag)
+	}
+	if got := first.Header().Get("Cache-Control"); got != "public, max-age=600" {
+		t.Errorf("Cache-Control = %q", got)
+	}
+	if plain := get(nil).Header().Get("ETag"); plain == etag {
+		t.Errorf("identity and gzip responses share ETag %s", etag)
+	}
+
+	if w := get(map[string]string{"Accept-Encoding": "gzip", "If-None-Match": etag}); w.Code != http.StatusNotModified || w.Body.Len() != 0 {
+		t.Errorf("If-None-Match: got %d with %d bytes, want an empty 304", w.Code, w.Body.Len())
+	}
+	lastModified := first.Header().Get("Last-Modified")
+	if w := get(map[string]string{"If-Modified-Since": lastModified}); w.Code != http.StatusNotModified {
+		t.Errorf("If-Modified-Since: got %d, want 304", w.Code)
+	}
+
+	// Updating the page changes the validator.
+	path := filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", "man1", "ls.1.html")
+	fragment := `<!--META:{"title":"ls","description":"list files"}-->` + "\n" + `<p>updated</p>`
+	if err := os.WriteFile(path, []byte(fragment), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.Chtimes(path, time.Now(), time.Now().Add(time.Minute)); err != nil {
+		t.Fatal(err)
+	}
+	if w := get(map[string]string{"Accept-Encoding": "gzip", "If-None-Match": etag}); w.Code != http.StatusOK {
+		t.Errorf("If-None-Match after update: got %d, want 200", w.Code)
+	}
+}
+
+func TestValidateFiles(t *testing.T) {
+	root := t.TempDir()
+	if err := os.WriteFile(filepath.Join(root, "sitemap-noble.xml"), []byte("<urlset/>"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	handler := gzipHandler(validateFiles(root, "public, max-age=60", http.FileServer(http.Dir(root))))
+
+	req := httptest.NewRequest(http.MethodGet, "/sitemap-noble.xml", nil)
+	req.Header.Set("Accept-Encoding", "gzip")
+	w := httptest.NewRecorder()
+	handler.ServeHTTP(w, req)
+	etag := w.Header().Get("ETag")
+	if w.Code != http.StatusOK || w.Header().Get("Content-Encoding") != "gzip" {
+		t.Fatalf("GET = %d, encoding %q, want a gzipped 200", w.Code, w.Header().Get("Content-Encoding"))
+	}
+	if etag == "" || etag[len(etag)-len(gzipETagSuffix)-1:] != gzipETagSuffix+`"` {
+		t.Errorf("ETag = %q, want the gzip variant", etag)
+	}
+	if got := w.Header().Get("Cache-Control"); got != "public, max-age=60" {
+		t.Errorf("Cache-Control = %q", got)
+	}
+
+	req = httptest.NewRequest(http.MethodGet, "/sitemap-noble.xml", nil)
+	req.Header.Set("Accept-Encoding", "gzip")
+	req.Header.Set("If-None-Match", etag)
+	w = httptest.NewRecorder()
+	handler.ServeHTTP(w, req)
+	if w.Code != http.StatusNotModified {
+		t.Errorf("If-None-Match: got %d, want 304", w.Code)
+	}
+
+	req = httptest.NewRequest(http.MethodGet, "/missing.xml", nil)
+	w = httptest.NewRecorder()
+	handler.ServeHTTP(w, req)
+	if w.Code != http.StatusNotFound || w.Header().Get("Cache-Control") != "" {
+		t.Errorf("missing file: got %d with Cache-Control %q, want a plain 404", w.Code, w.Header().Get("Cache-Control"))
+	}
+
+	// Gzipped sitemaps are sent as they are.
+	compressed := gzipBytes([]byte("<urlset/>"))
+	if err := os.WriteFile(filepath.Join(root, "sitemap-noble.xml.gz"), compressed, 0o644); err != nil {
+		t.Fatal(err)
+	}
+	req = httptest.NewRequest(http.MethodGet, "/sitemap-noble.xml.gz", nil)
+	req.Header.Set("Accept-Encoding", "gzip")
+	w = httptest.NewRecorder()
+	handler.ServeHTTP(w, req)
+	if w.Code != http.StatusOK || w.Header().Get("Content-Encoding") != "" || !bytes.Equal(w.Body.Bytes(), compressed) {
+		t.Errorf("GET .xml.gz = %d, encoding %q, want the file as it is", w.Code, w.Header().Get("Content-Encoding"))
+	}
+}
@@ -0,0 +1,104 @@
+package web
+
+import (
+	"io/fs"
+	"path"
+	"sort"
+	"strconv"
+	"strings"
+	"sync"
+)
+
+// maxMissingPages bounds the paths a missingPages remembers.
+const maxMissingPages = 1 << 16
+
+// missingPages remembers manpage paths found to be missing with no suffixed
+// variant, so that crawlers repeating a dead cross-reference get their 404
+// without a stat, an index lookup or a directory read. It is cleared on
+// reindex, when ingest may have written the pages, and when it is full.
+type missingPages struct {
+	mu    sync.Mutex
+	names map[string]struct{}
+}
+
+func (m *missingPages) has(name string) bool {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	_, ok := m.names[name]
+	return ok
+}
+
+func (m *missingPages) add(name string) {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	if m.names == nil || len(m.names) >= maxMissingPages {
+		m.names = make(map[string]struct{})
+	}
+	m.names[name] = struct{}{}
+}
+
+func (m *missingPages) purge() {
+	m.mu.Lock()
+	defer m.mu.Unlock()
+	m.names = nil
+}
+
+// suffixedVariant handles cross-reference section suffix mismatches. For
+// example, .Xr SSL_connect(3) generates a link to SSL_connect.3.html but the
+// actual file is SSL_connect.3ssl.html. It returns the URL path to redirect
+// the missing page name, at URL path urlPath, to, or "". Indexed pages are
+// found in the search index's variant table; pages written since the last
+// reindex are found in the directory's sorted listing.
+func (s *Server) suffixedVariant(urlPath, name string) string {
+	if !strings.HasSuffix(name, ".html") {
+		return ""
+	}
+	dir, file := path.Split(name)
+	dir = strings.TrimSuffix(dir, "/")
+	if release, language, section, ok := parseSectionDir(dir); ok {
+		if variant := s.search.SuffixedVariant(release, language, section, file); variant != "" {
+			return path.Join(path.Dir(urlPath), variant)
+		}
+	}
+
+	info, err := fs.Stat(s.tree, dir)
+	if err != nil || !info.IsDir() {
+		return ""
+	}
+	listing, err := s.listing(dir, info)
+	if err != nil {
+		return ""
+	}
+	if variant := listing.suffixedVariant(file); variant != "" {
+		return path.Join(path.Dir(urlPath), variant)
+	}
+	return ""
+}
+
+// suffixedVariant returns the name of the first file in the listing, other
+// than file, whose name extends file's without its .html extension.
+func (l *dirListing) suffixedVariant(file string) string {
+	prefix := strings.TrimSuffix(file, ".html")
+	i := sort.Search(len(l.files), func(i int) bool { return l.files[i].Name >= prefix })
+	for ; i < len(l.files) && strings.HasPrefix(l.files[i].Name, prefix); i++ {
+		name := path.Base(string(l.files[i].Href))
+		if name != file && strings.HasSuffix(name, ".html") {
+			return name
+		}
+	}
+	return ""
+}
+
+// parseSectionDir splits a man section directory of the form
+// manpages/{release}/[{language}/]man{N}.
+func parseSectionDir(dir string) (release, language string, section int, ok bool) {
+	parts := strings.Split(dir, "/")
+	if len(parts) < 3 || len(parts) > 4 || parts[0] != "manpages" || !isManSection(parts[len(parts)-1]) {
+		return "", "", 0, false
+	}
+	if len(parts) == 4 {
+		language = parts[2]
+	}
+	section, _ = strconv.Atoi(parts[len(parts)-1][3:])
+	return parts[1], language, section, true
+}
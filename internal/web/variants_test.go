@@ -0,0 +1,60 @@
+package web
+
+import (
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"testing"
+)
+
+func TestSuffixedVariantFromIndex(t *testing.T) {
+	srv, cfg := testServer(t)
+	manDir := filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", "man3")
+	if err := os.MkdirAll(manDir, 0o755); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(manDir, "SSL_connect.3ssl.html"), []byte("<p>connect</p>"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	srv.search.Rebuild()
+	srv.listings = newListingCache(1 << 20)
+
+	w := httptest.NewRecorder()
+	srv.handleManpages(w, httptest.NewRequest(http.MethodGet, "/manpages/noble/man3/SSL_connect.3.html", nil))
+	if w.Code != http.StatusMovedPermanently || w.Header().Get("Location") != "/manpages/noble/man3/SSL_connect.3ssl.html" {
+		t.Fatalf("GET = %d to %q, want a 301 to SSL_connect.3ssl.html", w.Code, w.Header().Get("Location"))
+	}
+	if stats := srv.listings.stats(); stats.Misses != 0 {
+		t.Errorf("listing stats = %+v, want the index to answer without reading the directory", stats)
+	}
+}
+
+func TestMissingPagesRememberedUntilReindex(t *testing.T) {
+	srv, cfg := testServer(t)
+	get := func() int {
+		t.Helper()
+		w := httptest.NewRecorder()
+		srv.handleManpages(w, httptest.NewRequest(http.MethodGet, "/manpages/noble/man1/cat.1.html", nil))
+		return w.Code
+	}
+
+	if code := get(); code != http.StatusNotFound {
+		t.Fatalf("GET missing page = %d, want 404", code)
+	}
+	if !srv.missing.has("manpages/noble/man1/cat.1.html") {
+		t.Fatal("missing page not remembered")
+	}
+
+	// Ingest writes the page, then requests a reindex.
+	if err := os.WriteFile(filepath.Join(cfg.PublicHTMLDir, "manpages", "noble", "man1", "cat.1.html"), []byte("<p>cat</p>"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if code := get(); code != http.StatusNotFound {
+		t.Errorf("GET before reindex = %d, want the remembered 404", code)
+	}
+	srv.handleReindex(httptest.NewRecorder(), httptest.NewRequest(http.MethodPost, "/_/reindex", nil))
+	if code := get(); code != http.StatusOK {
+		t.Errorf("GET after reindex = %d, want 200", code)
+	}
+}
@@ -0,0 +1,370 @@
+package xz
+
+import (
+	"bufio"
+	"encoding/binary"
+	"fmt"
+	"io"
+)
+
+const (
+	numStates        = 12
+	posStatesMax     = 1 << 4
+	lenToPosStates   = 4
+	alignBits        = 4
+	endPosModel      = 14
+	numFullDistances = 1 << (endPosModel >> 1)
+	matchMinLen      = 2
+	minDictSize      = 1 << 12
+)
+
+// window is the LZ dictionary, a circular buffer over the last size bytes
+// of output. It grows on demand, so a large dictionary only costs memory
+// once that much has been decoded. Bytes in buf[read:pos] have been
+// decoded but not yet returned.
+type window struct {
+	buf   []byte
+	size  int
+	pos   int
+	read  int
+	total int64 // bytes decoded since the last dictionary reset
+}
+
+func (w *window) reset(size int) {
+	w.buf = w.buf[:0]
+	w.size = size
+	w.pos, w.read, w.total = 0, 0, 0
+}
+
+// space returns how many bytes can be decoded before the unread ones must
+// be returned, wrapping around first when the buffer is full.
+func (w *window) space() int {
+	if w.pos == w.size && w.read == w.pos {
+		w.pos, w.read = 0, 0
+	}
+	return w.size - w.pos
+}
+
+func (w *window) unread() []byte {
+	return w.buf[w.read:w.pos]
+}
+
+func (w *window) put(b byte) {
+	if w.pos < len(w.buf) {
+		w.buf[w.pos] = b
+	} else {
+		w.buf = append(w.buf, b)
+	}
+	w.pos++
+	w.total++
+}
+
+// get returns the byte dist bytes back, with dist 1 the last one written.
+func (w *window) get(dist int) byte {
+	i := w.pos - dist
+	if i < 0 {
+		i += len(w.buf)
+	}
+	return w.buf[i]
+}
+
+func (w *window) copyMatch(dist, n int) {
+	for ; n > 0; n-- {
+		w.put(w.get(dist))
+	}
+}
+
+type lenDecoder struct {
+	choice  prob
+	choice2 prob
+	low     [posStatesMax][1 << 3]prob
+	mid     [posStatesMax][1 << 3]prob
+	high    [1 << 8]prob
+}
+
+func (l *lenDecoder) reset() {
+	l.choice, l.choice2 = probInit, probInit
+	for i := range l.low {
+		initProbs(l.low[i][:])
+		initProbs(l.mid[i][:])
+	}
+	initProbs(l.high[:])
+}
+
+func (l *lenDecoder) decode(rc *rangeDecoder, posState int) int {
+	if rc.bit(&l.choice) == 0 {
+		return int(rc.tree(l.low[posState][:], 3))
+	}
+	if rc.bit(&l.choice2) == 0 {
+		return 8 + int(rc.tree(l.mid[posState][:], 3))
+	}
+	return 16 + int(rc.tree(l.high[:], 8))
+}
+
+// lzmaDecoder holds the LZMA model: the literal coding properties, the
+// adaptive probabilities and the recent match distances.
+type lzmaDecoder struct {
+	lc, lp, pb int
+
+	literal    []prob
+	isMatch    [numStates << 4]prob
+	isRep      [numStates]prob
+	isRepG0    [numStates]prob
+	isRepG1    [numStates]prob
+	isRepG2    [numStates]prob
+	isRep0Long [numStates << 4]prob
+	posSlot    [lenToPosStates][1 << 6]prob
+	posSpecial [1 + numFullDistances - endPosModel]prob
+	align      [1 << alignBits]prob
+	matchLen   lenDecoder
+	repLen     lenDecoder
+
+	state   int
+	reps    [4]uint32
+	pending int  // bytes of an interrupted match still to copy
+	eos     bool // end of payload marker decoded
+}
+
+// setProps sets the literal coding properties from their packed byte.
+func (d *lzmaDecoder) setProps(b byte) error {
+	if b >= 9*5*5 {
+		return fmt.Errorf("%w: bad LZMA properties", errCorrupt)
+	}
+	d.lc = int(b % 9)
+	d.lp = int(b / 9 % 5)
+	d.pb = int(b / 45)
+	if n := 0x300 << (d.lc + d.lp); cap(d.literal) < n {
+		d.literal = make([]prob, n)
+	} else {
+		d.literal = d.literal[:n]
+	}
+	return nil
+}
+
+// reset returns the model to its initial state.
+func (d *lzmaDecoder) reset() {
+	initProbs(d.literal)
+	initProbs(d.isMatch[:])
+	initProbs(d.isRep[:])
+	initProbs(d.isRepG0[:])
+	initProbs(d.isRepG1[:])
+	initProbs(d.isRepG2[:])
+	initProbs(d.isRep0Long[:])
+	for i := range d.posSlot {
+		initProbs(d.posSlot[i][:])
+	}
+	initProbs(d.posSpecial[:])
+	initProbs(d.align[:])
+	d.matchLen.reset()
+	d.repLen.reset()
+	d.state = 0
+	d.reps = [4]uint32{}
+	d.pending = 0
+	d.eos = false
+}
+
+// decode decodes up to n bytes into w, stopping early at the end of
+// payload marker, and returns how many it decoded.
+func (d *lzmaDecoder) decode(w *window, rc *rangeDecoder, n int) (int, error) {
+	start := w.pos
+	for w.pos-start < n {
+		if d.pending > 0 {
+			k := min(d.pending, n-(w.pos-start))
+			w.copyMatch(int(d.reps[0])+1, k)
+			d.pending -= k
+			continue
+		}
+		if rc.err != nil {
+			return w.pos - start, rc.err
+		}
+
+		posState := int(w.total) & (1<<d.pb - 1)
+		s := d.state
+		if rc.bit(&d.isMatch[s<<4|posState]) == 0 {
+			w.put(d.decodeLiteral(w, rc))
+			switch {
+			case s < 4:
+				d.state = 0
+			case s < 10:
+				d.state = s - 3
+			default:
+				d.state = s - 6
+			}
+			continue
+		}
+
+		var length int
+		if rc.bit(&d.isRep[s]) == 0 {
+			length = d.matchLen.decode(rc, posState)
+			d.state = 10
+			if s < 7 {
+				d.state = 7
+			}
+			dist := d.decodeDistance(rc, length)
+			if dist == 0xFFFFFFFF {
+				d.eos = true
+				break
+			}
+			d.reps = [4]uint32{dist, d.reps[0], d.reps[1], d.reps[2]}
+		} else {
+			if w.total == 0 {
+				return w.pos - start, fmt.Errorf("%w: repeated match before any output", errCorrupt)
+			}
+			if rc.bit(&d.isRepG0[s]) == 0 {
+				if rc.bit(&d.isRep0Long[s<<4|posState]) == 0 {
+					d.state = 11
+					if s < 7 {
+						d.state = 9
+					}
+					w.put(w.get(int(d.reps[0]) + 1))
+					continue
+				}
+			} else {
+				var dist uint32
+				if rc.bit(&d.isRepG1[s]) == 0 {
+					dist = d.reps[1]
+				} else {
+					if rc.bit(&d.isRepG2[s]) == 0 {
+						dist = d.reps[2]
+					} else {
+						dist = d.reps[3]
+						d.reps[3] = d.reps[2]
+					}
+					d.reps[2] = d.reps[1]
+				}
+				d.reps[1] = d.reps[0]
+				d.reps[0] = dist
+			}
+			length = d.repLen.decode(rc, posState)
+			d.state = 11
+			if s < 7 {
+				d.state = 8
+			}
+		}
+		if int64(d.reps[0]) >= w.total || int(d.reps[0]) >= w.size {
+			return w.pos - start, fmt.Errorf("%w: match distance out of range", errCorrupt)
+		}
+		d.pending = length + matchMinLen
+	}
+	return w.pos - start, rc.err
+}
+
+func (d *lzmaDecoder) decodeLiteral(w *window, rc *rangeDecoder) byte {
+	var prev int
+	if w.total > 0 {
+		prev = int(w.get(1))
+	}
+	litState := (int(w.total)&(1<<d.lp-1))<<d.lc | prev>>(8-d.lc)
+	probs := d.literal[0x300*litState:][:0x300]
+	sym := uint32(1)
+	if d.state >= 7 {
+		// After a match the literal is coded against the byte that
+		// would have continued it.
+		match := uint32(w.get(int(d.reps[0]) + 1))
+		for sym < 0x100 {
+			mb := match >> 7 & 1
+			match <<= 1
+			b := rc.bit(&probs[(1+mb)<<8+sym])
+			sym = sym<<1 | b
+			if mb != b {
+				break
+			}
+		}
+	}
+	for sym < 0x100 {
+		sym = sym<<1 | rc.bit(&probs[sym])
+	}
+	return byte(sym)
+}
+
+func (d *lzmaDecoder) decodeDistance(rc *rangeDecoder, length int) uint32 {
+	slot := rc.tree(d.posSlot[min(length, lenToPosStates-1)][:], 6)
+	if slot < 4 {
+		return slot
+	}
+	direct := int(slot>>1) - 1
+	dist := (2 | slot&1) << direct
+	if slot < endPosModel {
+		return dist + rc.reverseTree(d.posSpecial[dist-slot:], direct)
+	}
+	dist += rc.direct(direct-alignBits) << alignBits
+	return dist + rc.reverseTree(d.align[:], alignBits)
+}
+
+// LZMAReader decompresses a legacy .lzma stream, as written by lzma(1) and
+// xz --format=lzma.
+type LZMAReader struct {
+	r         *bufio.Reader
+	rc        rangeDecoder
+	dec       lzmaDecoder
+	win       window
+	remaining int64 // -1 when the header leaves the size unknown
+	err       error
+}
+
+// NewLZMAReader reads the .lzma header from r and returns a reader for the
+// data that follows.
+func NewLZMAReader(r io.Reader) (*LZMAReader, error) {
+	z := &LZMAReader{r: bufio.NewReader(r)}
+	var hdr [13]byte
+	if _, err := io.ReadFull(z.r, hdr[:]); err != nil {
+		return nil, unexpected(err)
+	}
+	if err := z.dec.setProps(hdr[0]); err != nil {
+		return nil, err
+	}
+	if z.dec.lc > 8 || z.dec.lp > 4 || z.dec.pb > 4 {
+		return nil, fmt.Errorf("%w: bad LZMA properties", errCorrupt)
+	}
+	dictSize := int64(binary.LittleEndian.Uint32(hdr[1:5]))
+	z.remaining = int64(binary.LittleEndian.Uint64(hdr[5:]))
+	if z.remaining >= 0 {
+		dictSize = min(dictSize, z.remaining)
+	}
+	z.win.reset(int(max(dictSize, minDictSize)))
+	z.dec.reset()
+	if err := z.rc.init(z.r); err != nil {
+		return nil, err
+	}
+	return z, nil
+}
+
+// Read implements io.Reader.
+func (z *LZMAReader) Read(p []byte) (int, error) {
+	for len(z.win.unread()) == 0 {
+		if z.err != nil {
+			return 0, z.err
+		}
+		z.err = z.fill()
+	}
+	n := copy(p, z.win.unread())
+	z.win.read += n
+	return n, nil
+}
+
+func (z *LZMAReader) fill() error {
+	if z.remaining == 0 {
+		if z.dec.pending > 0 {
+			return fmt.Errorf("%w: match runs past the end of the data", errCorrupt)
+		}
+		return io.EOF
+	}
+	if z.dec.eos {
+		if z.remaining > 0 {
+			return io.ErrUnexpectedEOF
+		}
+		if !z.rc.finished() {
+			return fmt.Errorf("%w: data after end marker", errCorrupt)
+		}
+		return io.EOF
+	}
+	n := z.win.space()
+	if z.remaining > 0 {
+		n = int(min(int64(n), z.remaining))
+	}
+	k, err := z.dec.decode(&z.win, &z.rc, n)
+	if z.remaining > 0 {
+		z.remaining -= int64(k)
+	}
+	return err
+}
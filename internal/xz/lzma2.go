@@ -0,0 +1,177 @@
+package xz
+
+import (
+	"fmt"
+	"io"
+)
+
+// lzma2Decoder decodes an LZMA2 stream: a sequence of chunks that are
+// either stored or LZMA coded, each possibly resetting the dictionary,
+// the model or its properties.
+type lzma2Decoder struct {
+	r        io.ByteReader
+	chunk    chunkReader
+	rc       rangeDecoder
+	dec      lzmaDecoder
+	win      window
+	dictSize int
+
+	started    bool  // a chunk has reset the dictionary
+	hasProps   bool  // properties have been set
+	stored     bool  // the current chunk is stored rather than LZMA coded
+	remaining  int   // bytes of the current chunk still to decode
+	chunkCount int64 // chunks decoded, for error messages
+	done       bool
+}
+
+// chunkReader limits reads to the compressed size of an LZMA chunk.
+type chunkReader struct {
+	r io.ByteReader
+	n int
+}
+
+func (c *chunkReader) ReadByte() (byte, error) {
+	if c.n <= 0 {
+		return 0, io.ErrUnexpectedEOF
+	}
+	c.n--
+	return c.r.ReadByte()
+}
+
+// dictSizeFromProps decodes the dictionary size byte of an LZMA2 filter.
+func dictSizeFromProps(b byte) (int, error) {
+	if b > 40 {
+		return 0, fmt.Errorf("%w: bad LZMA2 dictionary size", errCorrupt)
+	}
+	if b == 40 {
+		return 0xFFFFFFFF, nil
+	}
+	return (2 | int(b)&1) << (b/2 + 11), nil
+}
+
+func (z *lzma2Decoder) reset(r io.ByteReader, dictSize int) {
+	z.r = r
+	z.dictSize = max(dictSize, minDictSize)
+	z.started, z.hasProps, z.done = false, false, false
+	z.remaining = 0
+	z.chunkCount = 0
+}
+
+// fill decodes more of the stream into z.win and returns how many bytes
+// it added. It returns io.EOF after the end of stream marker.
+func (z *lzma2Decoder) fill() (int, error) {
+	if z.done {
+		return 0, io.EOF
+	}
+	if z.remaining == 0 {
+		if err := z.endChunk(); err != nil {
+			return 0, err
+		}
+		if err := z.startChunk(); err != nil {
+			return 0, err
+		}
+		if z.done {
+			return 0, io.EOF
+		}
+	}
+
+	n := min(z.win.space(), z.remaining)
+	if z.stored {
+		// Stored bytes still feed the dictionary of later chunks.
+		for i := 0; i < n; i++ {
+			b, err := z.r.ReadByte()
+			if err != nil {
+				return i, unexpected(err)
+			}
+			z.win.put(b)
+		}
+		z.remaining -= n
+		return n, nil
+	}
+	k, err := z.dec.decode(&z.win, &z.rc, n)
+	z.remaining -= k
+	if err == nil && z.dec.eos {
+		err = fmt.Errorf("%w: end marker inside LZMA2 chunk", errCorrupt)
+	}
+	return k, err
+}
+
+// endChunk checks that the LZMA chunk just decoded used all of its input.
+func (z *lzma2Decoder) endChunk() error {
+	if z.chunkCount == 0 || z.stored {
+		return nil
+	}
+	if z.dec.pending > 0 || z.chunk.n != 0 || !z.rc.finished() {
+		return fmt.Errorf("%w: LZMA2 chunk %d size mismatch", errCorrupt, z.chunkCount)
+	}
+	return nil
+}
+
+func (z *lzma2Decoder) startChunk() error {
+	control, err := z.r.ReadByte()
+	if err != nil {
+		return unexpected(err)
+	}
+	if control == 0 {
+		z.done = true
+		return nil
+	}
+	z.chunkCount++
+
+	var hdr [5]byte
+	hdrSize := 2
+	if control >= 0x80 {
+		hdrSize = 4
+		if control >= 0xC0 {
+			hdrSize = 5
+		}
+	} else if control > 2 {
+		return fmt.Errorf("%w: bad LZMA2 control byte %#x", errCorrupt, control)
+	}
+	for i := 0; i < hdrSize; i++ {
+		if hdr[i], err = z.r.ReadByte(); err != nil {
+			return unexpected(err)
+		}
+	}
+
+	// Control 1 and 0xE0 and up reset the dictionary, which the first
+	// chunk must do.
+	if control == 1 || control >= 0xE0 {
+		z.win.reset(z.dictSize)
+		z.started = true
+	} else if !z.started {
+		return fmt.Errorf("%w: LZMA2 stream does not start with a dictionary reset", errCorrupt)
+	}
+
+	size := int(hdr[0])<<8 | int(hdr[1]) + 1
+	if control < 0x80 {
+		z.stored = true
+		z.remaining = size
+		return nil
+	}
+
+	z.stored = false
+	z.remaining = int(control&0x1F)<<16 + size
+	z.chunk = chunkReader{r: z.r, n: int(hdr[2])<<8 | int(hdr[3]) + 1}
+	switch reset := control >> 5 & 3; {
+	case reset >= 2:
+		if err := z.dec.setProps(hdr[4]); err != nil {
+			return err
+		}
+		if z.dec.lc+z.dec.lp > 4 {
+			return fmt.Errorf("%w: bad LZMA2 properties", errCorrupt)
+		}
+		z.hasProps = true
+		z.dec.reset()
+	case reset == 1:
+		if !z.hasProps {
+			return fmt.Errorf("%w: LZMA2 chunk without properties", errCorrupt)
+		}
+		z.dec.reset()
+	default:
+		if !z.hasProps {
+			return fmt.Errorf("%w: LZMA2 chunk without properties", errCorrupt)
+		}
+	}
+	return z.rc.init(&z.chunk)
+}
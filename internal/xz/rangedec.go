@@ -0,0 +1,125 @@
+package xz
+
+import (
+	"fmt"
+	"io"
+)
+
+const (
+	probBits = 11
+	probInit = 1 << (probBits - 1)
+	moveBits = 5
+	rangeTop = 1 << 24
+)
+
+type prob uint16
+
+// rangeDecoder decodes the binary arithmetic coding underneath LZMA.
+type rangeDecoder struct {
+	r    io.ByteReader
+	rng  uint32
+	code uint32
+	err  error
+}
+
+func (rc *rangeDecoder) init(r io.ByteReader) error {
+	rc.r = r
+	rc.rng = 0xFFFFFFFF
+	rc.code = 0
+	rc.err = nil
+	if rc.byte() != 0 {
+		return fmt.Errorf("%w: bad range coder start", errCorrupt)
+	}
+	for i := 0; i < 4; i++ {
+		rc.code = rc.code<<8 | rc.byte()
+	}
+	if rc.err != nil {
+		return rc.err
+	}
+	if rc.code == rc.rng {
+		return fmt.Errorf("%w: bad range coder start", errCorrupt)
+	}
+	return nil
+}
+
+// byte reads the next input byte. A read error is kept in rc.err and
+// reads as zero, so callers check it once per symbol.
+func (rc *rangeDecoder) byte() uint32 {
+	b, err := rc.r.ReadByte()
+	if err != nil {
+		if rc.err == nil {
+			rc.err = unexpected(err)
+		}
+		return 0
+	}
+	return uint32(b)
+}
+
+func (rc *rangeDecoder) normalize() {
+	if rc.rng < rangeTop {
+		rc.rng <<= 8
+		rc.code = rc.code<<8 | rc.byte()
+	}
+}
+
+// finished reports whether the encoder's final flush has been consumed.
+func (rc *rangeDecoder) finished() bool {
+	return rc.code == 0
+}
+
+func (rc *rangeDecoder) bit(p *prob) uint32 {
+	bound := (rc.rng >> probBits) * uint32(*p)
+	var b uint32
+	if rc.code < bound {
+		rc.rng = bound
+		*p += (1<<probBits - *p) >> moveBits
+	} else {
+		rc.rng -= bound
+		rc.code -= bound
+		*p -= *p >> moveBits
+		b = 1
+	}
+	rc.normalize()
+	return b
+}
+
+// direct decodes n bits with fixed, even probabilities.
+func (rc *rangeDecoder) direct(n int) uint32 {
+	var v uint32
+	for ; n > 0; n-- {
+		rc.rng >>= 1
+		rc.code -= rc.rng
+		t := 0 - rc.code>>31
+		rc.code += rc.rng & t
+		v = v<<1 + t + 1
+		rc.normalize()
+	}
+	return v
+}
+
+// tree decodes an n-bit symbol, most significant bit first.
+func (rc *rangeDecoder) tree(probs []prob, n int) uint32 {
+	m := uint32(1)
+	for i := 0; i < n; i++ {
+		m = m<<1 | rc.bit(&probs[m])
+	}
+	return m - 1<<n
+}
+
+// reverseTree decodes an n-bit symbol, least significant bit first.
+func (rc *rangeDecoder) reverseTree(probs []prob, n int) uint32 {
+	m := uint32(1)
+	var v uint32
+	for i := 0; i < n; i++ {
+		b := rc.bit(&probs[m])
+		m = m<<1 | b
+		v |= b << i
+	}
+	return v
+}
+
+func initProbs(probs []prob) {
+	for i := range probs {
+		probs[i] = probInit
+	}
+}
@@ -0,0 +1,396 @@
+// Package xz decodes .xz and legacy .lzma streams.
+//
+// It handles what xz(1) and dpkg-deb produce: concatenated streams, stream
+// padding and all integrity checks, with LZMA2 as the only filter. Blocks
+// using other filters, such as the BCJ filters of xz --x86, are rejected
+// with ErrUnsupported so callers can fall back to the system decompressor.
+package xz
+
+import (
+	"bufio"
+	"bytes"
+	"crypto/sha256"
+	"encoding/binary"
+	"errors"
+	"fmt"
+	"hash"
+	"hash/crc32"
+	"hash/crc64"
+	"io"
+)
+
+const (
+	headerSize  = 12
+	filterLZMA2 = 0x21
+)
+
+var (
+	headerMagic = []byte{0xFD, '7', 'z', 'X', 'Z', 0x00}
+	footerMagic = []byte{'Y', 'Z'}
+	crc64Table  = crc64.MakeTable(crc64.ECMA)
+)
+
+// ErrUnsupported is returned, wrapped, for valid streams this package does
+// not decode.
+var ErrUnsupported = errors.New("xz: unsupported stream")
+
+var errCorrupt = errors.New("xz: corrupt stream")
+
+// record is the index entry of a decoded block.
+type record struct {
+	unpadded     int64
+	uncompressed int64
+}
+
+// Reader decompresses an xz stream.
+type Reader struct {
+	r   *countingReader
+	err error
+
+	flags   [2]byte
+	check   byte
+	hash    hash.Hash
+	records []record
+
+	inBlock    bool
+	blockStart int64
+	blockSize  int64 // uncompressed size from the block header, or -1
+	packedSize int64 // compressed size from the block header, or -1
+	headerLen  int64
+	decoded    int64
+	lz         lzma2Decoder
+}
+
+// countingReader tracks the stream offset, which the index is checked
+// against.
+type countingReader struct {
+	*bufio.Reader
+	n int64
+}
+
+func (c *countingReader) ReadByte() (byte, error) {
+	b, err := c.Reader.ReadByte()
+	if err == nil {
+		c.n++
+	}
+	return b, err
+}
+
+func (c *countingReader) Read(p []byte) (int, error) {
+	n, err := c.Reader.Read(p)
+	c.n += int64(n)
+	return n, err
+}
+
+// NewReader reads the first stream header from r and returns a reader
+// for the data that follows.
+func NewReader(r io.Reader) (*Reader, error) {
+	z := &Reader{r: &countingReader{Reader: bufio.NewReader(r)}}
+	if err := z.readStreamHeader(); err != nil {
+		return nil, err
+	}
+	return z, nil
+}
+
+// Read implements io.Reader.
+func (z *Reader) Read(p []byte) (int, error) {
+	for len(z.lz.win.unread()) == 0 {
+		if z.err != nil {
+			return 0, z.err
+		}
+		z.err = z.next()
+	}
+	n := copy(p, z.lz.win.unread())
+	if z.hash != nil {
+		z.hash.Write(p[:n])
+	}
+	z.lz.win.read += n
+	return n, nil
+}
+
+// next decodes more of the current block, or moves on to the next block
+// or stream. It is only called once all decoded bytes have been returned.
+func (z *Reader) next() error {
+	if !z.inBlock {
+		return z.readBlockHeader()
+	}
+	n, err := z.lz.fill()
+	z.decoded += int64(n)
+	if z.blockSize >= 0 && z.decoded > z.blockSize {
+		return fmt.Errorf("%w: block larger than its header says", errCorrupt)
+	}
+	if err != io.EOF {
+		return err
+	}
+	return z.endBlock()
+}
+
+func (z *Reader) readStreamHeader() error {
+	var hdr [headerSize]byte
+	if _, err := io.ReadFull(z.r, hdr[:]); err != nil {
+		return unexpected(err)
+	}
+	if !bytes.Equal(hdr[:6], headerMagic) {
+		return fmt.Errorf("%w: bad magic number", errCorrupt)
+	}
+	if crc32.ChecksumIEEE(hdr[6:8]) != binary.LittleEndian.Uint32(hdr[8:]) {
+		return fmt.Errorf("%w: stream header checksum mismatch", errCorrupt)
+	}
+	if hdr[6] != 0 || hdr[7]&0xF0 != 0 {
+		return fmt.Errorf("%w: unknown stream flags", ErrUnsupported)
+	}
+	z.flags = [2]byte{hdr[6], hdr[7]}
+	z.check = hdr[7]
+	switch z.check {
+	case 0x01:
+		z.hash = crc32.NewIEEE()
+	case 0x04:
+		z.hash = crc64.New(crc64Table)
+	case 0x0A:
+		z.hash = sha256.New()
+	default:
+		// Reserved check types are skipped unverified, as xz(1) does.
+		z.hash = nil
+	}
+	z.records = z.records[:0]
+	return nil
+}
+
+func (z *Reader) readBlockHeader() error {
+	z.blockStart = z.r.n
+	b, err := z.r.ReadByte()
+	if err != nil {
+		return unexpected(err)
+	}
+	if b == 0 {
+		return z.readIndex()
+	}
+
+	hdr := make([]byte, (int(b)+1)*4)
+	hdr[0] = b
+	if _, err := io.ReadFull(z.r, hdr[1:]); err != nil {
+		return unexpected(err)
+	}
+	end := len(hdr) - 4
+	if crc32.ChecksumIEEE(hdr[:end]) != binary.LittleEndian.Uint32(hdr[end:]) {
+		return fmt.Errorf("%w: block header checksum mismatch", errCorrupt)
+	}
+	flags := hdr[1]
+	if flags&0x3C != 0 {
+		return fmt.Errorf("%w: unknown block flags", ErrUnsupported)
+	}
+	p := hdr[2:end]
+	z.packedSize, z.blockSize = -1, -1
+	if flags&0x40 != 0 {
+		if z.packedSize, p, err = readVLI(p); err != nil {
+			return err
+		}
+	}
+	if flags&0x80 != 0 {
+		if z.blockSize, p, err = readVLI(p); err != nil {
+			return err
+		}
+	}
+	if n := flags&3 + 1; n != 1 {
+		return fmt.Errorf("%w: filter chain of %d filters", ErrUnsupported, n)
+	}
+	id, p, err := readVLI(p)
+	if err != nil {
+		return err
+	}
+	if id != filterLZMA2 {
+		return fmt.Errorf("%w: filter %#x", ErrUnsupported, id)
+	}
+	size, p, err := readVLI(p)
+	if err != nil {
+		return err
+	}
+	if size != 1 || len(p) < 1 {
+		return fmt.Errorf("%w: bad LZMA2 filter properties", errCorrupt)
+	}
+	dictSize, err := dictSizeFromProps(p[0])
+	if err != nil {
+		return err
+	}
+	for _, c := range p[1:] {
+		if c != 0 {
+			return fmt.Errorf("%w: non-zero block header padding", errCorrupt)
+		}
+	}
+
+	z.headerLen = int64(len(hdr))
+	z.decoded = 0
+	if z.hash != nil {
+		z.hash.Reset()
+	}
+	z.lz.reset(z.r, dictSize)
+	z.inBlock = true
+	return nil
+}
+
+// endBlock reads the padding and check that follow the compressed data of
+// a block and records the block for the index.
+func (z *Reader) endBlock() error {
+	z.inBlock = false
+	packed := z.r.n - z.blockStart - z.headerLen
+	if z.packedSize >= 0 && packed != z.packedSize || z.blockSize >= 0 && z.decoded != z.blockSize {
+		return fmt.Errorf("%w: block size does not match its header", errCorrupt)
+	}
+	for i := packed; i%4 != 0; i++ {
+		if b, err := z.r.ReadByte(); err != nil {
+			return unexpected(err)
+		} else if b != 0 {
+			return fmt.Errorf("%w: non-zero block padding", errCorrupt)
+		}
+	}
+
+	sum := make([]byte, checkSize(z.check))
+	if _, err := io.ReadFull(z.r, sum); err != nil {
+		return unexpected(err)
+	}
+	if z.hash != nil {
+		var ok bool
+		switch h := z.hash.(type) {
+		case hash.Hash32:
+			ok = binary.LittleEndian.Uint32(sum) == h.Sum32()
+		case hash.Hash64:
+			ok = binary.LittleEndian.Uint64(sum) == h.Sum64()
+		default:
+			ok = bytes.Equal(sum, h.Sum(nil))
+		}
+		if !ok {
+			return fmt.Errorf("%w: check mismatch", errCorrupt)
+		}
+	}
+	z.records = append(z.records, record{
+		unpadded:     z.headerLen + packed + int64(len(sum)),
+		uncompressed: z.decoded,
+	})
+	return nil
+}
+
+// readIndex checks the index and stream footer against the blocks just
+// decoded, then skips stream padding and starts the next stream. It
+// returns io.EOF at the end of the input.
+func (z *Reader) readIndex() error {
+	crc := crc32.NewIEEE()
+	crc.Write([]byte{0})
+	r := io.TeeReader(z.r, crc)
+	vli := func() (int64, error) {
+		var buf [maxVLISize]byte
+		for i := range buf {
+			if _, err := io.ReadFull(r, buf[i:i+1]); err != nil {
+				return 0, unexpected(err)
+			}
+			if buf[i]&0x80 == 0 {
+				v, _, err := readVLI(buf[:i+1])
+				return v, err
+			}
+		}
+		return 0, fmt.Errorf("%w: bad variable-length integer", errCorrupt)
+	}
+
+	count, err := vli()
+	if err != nil {
+		return err
+	}
+	if count != int64(len(z.records)) {
+		return fmt.Errorf("%w: index lists %d blocks, stream has %d", errCorrupt, count, len(z.records))
+	}
+	for _, rec := range z.records {
+		unpadded, err := vli()
+		if err != nil {
+			return err
+		}
+		uncompressed, err := vli()
+		if err != nil {
+			return err
+		}
+		if unpadded != rec.unpadded || uncompressed != rec.uncompressed {
+			return fmt.Errorf("%w: index does not match blocks", errCorrupt)
+		}
+	}
+	var pad [4]byte
+	padding := pad[:(4-(z.r.n-z.blockStart)%4)%4]
+	if _, err := io.ReadFull(r, padding); err != nil {
+		return unexpected(err)
+	}
+	if !bytes.Equal(padding, make([]byte, len(padding))) {
+		return fmt.Errorf("%w: non-zero index padding", errCorrupt)
+	}
+	var sum [4]byte
+	if _, err := io.ReadFull(z.r, sum[:]); err != nil {
+		return unexpected(err)
+	}
+	if binary.LittleEndian.Uint32(sum[:]) != crc.Sum32() {
+		return fmt.Errorf("%w: index checksum mismatch", errCorrupt)
+	}
+	indexSize := z.r.n - z.blockStart
+
+	var footer [headerSize]byte
+	if _, err := io.ReadFull(z.r, footer[:]); err != nil {
+		return unexpected(err)
+	}
+	switch {
+	case crc32.ChecksumIEEE(footer[4:10]) != binary.LittleEndian.Uint32(footer[:4]):
+		return fmt.Errorf("%w: stream footer checksum mismatch", errCorrupt)
+	case (int64(binary.LittleEndian.Uint32(footer[4:8]))+1)*4 != indexSize:
+		return fmt.Errorf("%w: stream footer does not match index", errCorrupt)
+	case footer[8] != z.flags[0] || footer[9] != z.flags[1] || !bytes.Equal(footer[10:], footerMagic):
+		return fmt.Errorf("%w: bad stream footer", errCorrupt)
+	}
+
+	// Streams may be concatenated, separated by null bytes in multiples
+	// of four.
+	for {
+		b, err := z.r.Peek(1)
+		if err == io.EOF {
+			return io.EOF
+		}
+		if err != nil {
+			return err
+		}
+		if b[0] != 0 {
+			return z.readStreamHeader()
+		}
+		if _, err := io.ReadFull(z.r, pad[:]); err != nil {
+			return unexpected(err)
+		}
+		if pad != [4]byte{} {
+			return fmt.Errorf("%w: non-zero stream padding", errCorrupt)
+		}
+	}
+}
+
+const maxVLISize = 9
+
+// readVLI decodes a variable-length integer from the start of p.
+func readVLI(p []byte) (int64, []byte, error) {
+	var v uint64
+	for i := 0; i < len(p) && i < maxVLISize; i++ {
+		b := p[i]
+		v |= uint64(b&0x7F) << (7 * i)
+		if b&0x80 == 0 {
+			if b == 0 && i > 0 {
+				break
+			}
+			return int64(v), p[i+1:], nil
+		}
+	}
+	return 0, nil, fmt.Errorf("%w: bad variable-length integer", errCorrupt)
+}
+
+// checkSize returns the size in bytes of the given check type.
+func checkSize(check byte) int {
+	if check == 0 {
+		return 0
+	}
+	return 4 << ((check - 1) / 3)
+}
+
+func unexpected(err error) error {
+	if err == io.EOF {
+		return io.ErrUnexpectedEOF
+	}
+	return err
+}
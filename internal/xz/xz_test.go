@@ -0,0 +1,157 @@
+package xz
+
+import (
+	"bytes"
+	"errors"
+	"fmt"
+	"io"
+	"math/rand"
+	"os/exec"
+	"strings"
+	"testing"
+)
+
+// testInputs returns data that exercises stored and LZMA chunks, short and
+// long matches and all the repeated-match paths.
+func testInputs() map[string][]byte {
+	rng := rand.New(rand.NewSource(1))
+	random := make([]byte, 300<<10)
+	rng.Read(random)
+
+	var text strings.Builder
+	words := []string{".TH", "LS", "1", ".SH", "NAME", "ls", "\\-", "list", "directory", "contents", ".B", "\\fB\\-a\\fR", "\n"}
+	for text.Len() < 1<<20 {
+		text.WriteString(words[rng.Intn(len(words))])
+		text.WriteByte(' ')
+	}
+
+	mixed := append([]byte(text.String()[:200<<10]), random[:100<<10]...)
+	mixed = append(mixed, bytes.Repeat([]byte{'x'}, 300<<10)...)
+
+	return map[string][]byte{
+		"empty":  {},
+		"byte":   {'a'},
+		"short":  []byte(".TH LS 1\n.SH NAME\nls \\- list directory contents\n"),
+		"zeros":  make([]byte, 1<<20),
+		"random": random,
+		"text":   []byte(text.String()),
+		"mixed":  mixed,
+	}
+}
+
+func compressCLI(t *testing.T, data []byte, args ...string) []byte {
+	t.Helper()
+	if _, err := exec.LookPath("xz"); err != nil {
+		t.Skip("xz not available")
+	}
+	cmd := exec.Command("xz", append([]string{"-c", "-q"}, args...)...)
+	cmd.Stdin = bytes.NewReader(data)
+	out, err := cmd.Output()
+	if err != nil {
+		t.Fatalf("xz %v: %v", args, err)
+	}
+	return out
+}
+
+func decompress(data []byte) ([]byte, error) {
+	zr, err := NewReader(bytes.NewReader(data))
+	if err != nil {
+		return nil, err
+	}
+	return io.ReadAll(zr)
+}
+
+func decompressLZMA(data []byte) ([]byte, error) {
+	zr, err := NewLZMAReader(bytes.NewReader(data))
+	if err != nil {
+		return nil, err
+	}
+	return io.ReadAll(zr)
+}
+
+func TestReaderMatchesCLI(t *testing.T) {
+	inputs := testInputs()
+	for _, args := range [][]string{
+		{"-0"},
+		{"-6"},
+		{"-9e"},
+		{"-6", "--check=none"},
+		{"-6", "--check=crc32"},
+		{"-6", "--check=sha256"},
+		{"-6", "--block-size=100000"},
+		{"--lzma2=preset=6,lc=0,lp=2,pb=0"},
+		{"--lzma2=preset=1,dict=4KiB"},
+	} {
+		for name, data := range inputs {
+			t.Run(fmt.Sprintf("%s/%s", strings.Join(args, ""), name), func(t *testing.T) {
+				got, err := decompress(compressCLI(t, data, args...))
+				if err != nil {
+					t.Fatal(err)
+				}
+				if !bytes.Equal(got, data) {
+					t.Fatalf("decoded %d bytes, want %d matching input", len(got), len(data))
+				}
+			})
+		}
+	}
+}
+
+func TestLZMAReaderMatchesCLI(t *testing.T) {
+	for name, data := range testInputs() {
+		t.Run(name, func(t *testing.T) {
+			got, err := decompressLZMA(compressCLI(t, data, "--format=lzma"))
+			if err != nil {
+				t.Fatal(err)
+			}
+			if !bytes.Equal(got, data) {
+				t.Fatalf("decoded %d bytes, want %d matching input", len(got), len(data))
+			}
+		})
+	}
+}
+
+func TestReaderConcatenatedStreams(t *testing.T) {
+	a := []byte("first stream\n")
+	b := bytes.Repeat([]byte("second stream\n"), 1000)
+
+	var stream []byte
+	stream = append(stream, compressCLI(t, a)...)
+	stream = append(stream, make([]byte, 8)...)
+	stream = append(stream, compressCLI(t, b, "--check=sha256")...)
+
+	got, err := decompress(stream)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if want := append(append([]byte{}, a...), b...); !bytes.Equal(got, want) {
+		t.Fatalf("got %q", got)
+	}
+
+	if _, err := decompress(append(stream, 0, 0)); err == nil {
+		t.Error("stream padding not a multiple of four decoded without error")
+	}
+}
+
+func TestReaderRejectsCorruptInput(t *testing.T) {
+	data := testInputs()["text"]
+	stream := compressCLI(t, data)
+
+	flipped := append([]byte{}, stream...)
+	flipped[len(flipped)/2] ^= 0x55
+	if _, err := decompress(flipped); err == nil {
+		t.Error("corrupted stream decoded without error")
+	}
+	if _, err := decompress(stream[:len(stream)-10]); err == nil {
+		t.Error("truncated stream decoded without error")
+	}
+	if _, err := decompress(nil); err == nil {
+		t.Error("empty input decoded without error")
+	}
+}
+
+func TestReaderRejectsOtherFilters(t *testing.T) {
+	stream := compressCLI(t, []byte("\x7fELF"), "--x86", "--lzma2")
+	if _, err := decompress(stream); !errors.Is(err, ErrUnsupported) {
+		t.Errorf("got %v, want ErrUnsupported", err)
+	}
+}
@@ -0,0 +1,88 @@
+package zstd
+
+import (
+	"encoding/binary"
+	"fmt"
+	"math/bits"
+)
+
+// bitsAt returns n bits (n <= 56) of data starting at bit offset off,
+// counting from the least significant bit of the first byte. Bits past
+// the end of data read as zero.
+func bitsAt(data []byte, off, n int) uint64 {
+	if n == 0 {
+		return 0
+	}
+	i := off >> 3
+	var w uint64
+	if i+8 <= len(data) {
+		w = binary.LittleEndian.Uint64(data[i:])
+	} else {
+		for j := len(data) - 1; j >= i; j-- {
+			w = w<<8 | uint64(data[j])
+		}
+	}
+	return w >> uint(off&7) & (1<<uint(n) - 1)
+}
+
+// forwardBits reads a little-endian bit stream from its first bit on, as
+// used by FSE table descriptions.
+type forwardBits struct {
+	data []byte
+	off  int
+}
+
+func (b *forwardBits) read(n int) uint64 {
+	v := bitsAt(b.data, b.off, n)
+	b.off += n
+	return v
+}
+
+// bytesRead returns the number of bytes touched so far.
+func (b *forwardBits) bytesRead() int {
+	return (b.off + 7) >> 3
+}
+
+// backwardBits reads a bit stream from its last bit down, as used by
+// Huffman and FSE coded data. The highest set bit of the final byte marks
+// where the stream starts.
+type backwardBits struct {
+	data []byte
+	pos  int // bits [0, pos) are still unread
+}
+
+func newBackwardBits(data []byte) (backwardBits, error) {
+	if len(data) == 0 || data[len(data)-1] == 0 {
+		return backwardBits{}, fmt.Errorf("%w: bad bit stream padding", errCorrupt)
+	}
+	return backwardBits{data: data, pos: (len(data)-1)*8 + bits.Len8(data[len(data)-1]) - 1}, nil
+}
+
+// peek returns the next n bits without consuming them, zero-filled once
+// the stream runs out.
+func (b *backwardBits) peek(n int) uint64 {
+	lo := b.pos - n
+	if lo >= 0 {
+		return bitsAt(b.data, lo, n)
+	}
+	if b.pos <= 0 {
+		return 0
+	}
+	return bitsAt(b.data, 0, b.pos) << uint(-lo)
+}
+
+func (b *backwardBits) read(n int) uint64 {
+	v := b.peek(n)
+	b.pos -= n
+	return v
+}
+
+// done reports whether the stream was consumed exactly.
+func (b *backwardBits) done() bool {
+	return b.pos == 0
+}
+
+// overflowed reports whether more bits were read than the stream holds.
+func (b *backwardBits) overflowed() bool {
+	return b.pos < 0
+}
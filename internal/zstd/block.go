@@ -0,0 +1,348 @@
+package zstd
+
+import (
+	"encoding/binary"
+	"fmt"
+	"sync"
+)
+
+// Literal length and match length codes above the directly coded ones map
+// to a baseline plus a number of extra bits.
+var (
+	literalBase = [...]uint32{
+		16, 18, 20, 22, 24, 28, 32, 40, 48, 64, 128, 256, 512,
+		1024, 2048, 4096, 8192, 16384, 32768, 65536,
+	}
+	literalBits = [...]uint8{
+		1, 1, 1, 1, 2, 2, 3, 3, 4, 6, 7, 8, 9,
+		10, 11, 12, 13, 14, 15, 16,
+	}
+	matchBase = [...]uint32{
+		35, 37, 39, 41, 43, 47, 51, 59, 67, 83, 99, 131, 259, 515,
+		1027, 2051, 4099, 8195, 16387, 32771, 65539,
+	}
+	matchBits = [...]uint8{
+		1, 1, 1, 1, 2, 2, 3, 3, 4, 4, 5, 7, 8, 9,
+		10, 11, 12, 13, 14, 15, 16,
+	}
+)
+
+// Sequence tables, in the order the block header lists their modes.
+const (
+	literalTable = iota
+	offsetTable
+	matchTable
+)
+
+var (
+	tableMaxSym = [3]int{35, 31, 52}
+	tableMaxLog = [3]int{9, 8, 9}
+
+	predefinedOnce   sync.Once
+	predefinedTables [3]fseTable
+)
+
+func predefined(kind int) *fseTable {
+	predefinedOnce.Do(func() {
+		dists := [3][]int16{
+			{
+				4, 3, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 2, 1, 1, 1,
+				2, 2, 2, 2, 2, 2, 2, 2, 2, 3, 2, 1, 1, 1, 1, 1,
+				-1, -1, -1, -1,
+			},
+			{
+				1, 1, 1, 1, 1, 1, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1,
+				1, 1, 1, 1, 1, 1, 1, 1, -1, -1, -1, -1, -1,
+			},
+			{
+				1, 4, 3, 2, 2, 2, 2, 2, 2, 1, 1, 1, 1, 1, 1, 1,
+				1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1,
+				1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, -1, -1,
+				-1, -1, -1, -1, -1,
+			},
+		}
+		logs := [3]int{6, 5, 6}
+		for i, d := range dists {
+			if err := predefinedTables[i].build(d, logs[i]); err != nil {
+				panic(err)
+			}
+		}
+	})
+	return &predefinedTables[kind]
+}
+
+// decodeBlock decodes a compressed block, appending its output to z.hist.
+func (z *Reader) decodeBlock(data []byte) error {
+	n, err := z.decodeLiterals(data)
+	if err != nil {
+		return err
+	}
+	return z.decodeSequences(data[n:])
+}
+
+// decodeLiterals decodes the literals section of a block into z.literals
+// and returns its size.
+func (z *Reader) decodeLiterals(data []byte) (int, error) {
+	if len(data) == 0 {
+		return 0, fmt.Errorf("%w: empty block", errCorrupt)
+	}
+	kind := data[0] & 3
+	format := (data[0] >> 2) & 3
+
+	if kind < 2 {
+		var hdrSize, size int
+		switch format {
+		case 0, 2:
+			hdrSize, size = 1, int(data[0]>>3)
+		case 1:
+			if len(data) < 2 {
+				return 0, fmt.Errorf("%w: short literals header", errCorrupt)
+			}
+			hdrSize, size = 2, int(data[0]>>4)|int(data[1])<<4
+		case 3:
+			if len(data) < 3 {
+				return 0, fmt.Errorf("%w: short literals header", errCorrupt)
+			}
+			hdrSize, size = 3, int(data[0]>>4)|int(data[1])<<4|int(data[2])<<12
+		}
+		if size > maxBlockSize {
+			return 0, fmt.Errorf("%w: %d literals", errCorrupt, size)
+		}
+		if kind == 0 {
+			if hdrSize+size > len(data) {
+				return 0, fmt.Errorf("%w: short literals", errCorrupt)
+			}
+			z.literals = append(z.literals[:0], data[hdrSize:hdrSize+size]...)
+			return hdrSize + size, nil
+		}
+		if hdrSize >= len(data) {
+			return 0, fmt.Errorf("%w: short literals", errCorrupt)
+		}
+		z.literals = z.literals[:0]
+		for i := 0; i < size; i++ {
+			z.literals = append(z.literals, data[hdrSize])
+		}
+		return hdrSize + 1, nil
+	}
+
+	hdrSize := [4]int{3, 3, 4, 5}[format]
+	if len(data) < hdrSize {
+		return 0, fmt.Errorf("%w: short literals header", errCorrupt)
+	}
+	var buf [8]byte
+	copy(buf[:], data[:hdrSize])
+	h := binary.LittleEndian.Uint64(buf[:]) >> 4
+	sizeBits := [4]uint{10, 10, 14, 18}[format]
+	size := int(h & (1<<sizeBits - 1))
+	compSize := int(h >> sizeBits & (1<<sizeBits - 1))
+	streams := 4
+	if format == 0 {
+		streams = 1
+	}
+	if size > maxBlockSize || hdrSize+compSize > len(data) {
+		return 0, fmt.Errorf("%w: bad literals sizes", errCorrupt)
+	}
+	comp := data[hdrSize : hdrSize+compSize]
+
+	if kind == 2 {
+		if z.huf == nil {
+			z.huf = new(huffTable)
+		}
+		n, err := readHuffTable(z.huf, comp)
+		if err != nil {
+			z.huf = nil
+			return 0, err
+		}
+		comp = comp[n:]
+	} else if z.huf == nil {
+		return 0, fmt.Errorf("%w: repeated Huffman tree missing", errCorrupt)
+	}
+
+	if cap(z.literals) < size {
+		z.literals = make([]byte, size)
+	}
+	z.literals = z.literals[:size]
+	if streams == 1 {
+		if err := z.huf.decode(z.literals, comp); err != nil {
+			return 0, err
+		}
+		return hdrSize + compSize, nil
+	}
+
+	if len(comp) < 6 {
+		return 0, fmt.Errorf("%w: short jump table", errCorrupt)
+	}
+	var sizes [4]int
+	rest := len(comp) - 6
+	for i := 0; i < 3; i++ {
+		sizes[i] = int(binary.LittleEndian.Uint16(comp[2*i:]))
+		rest -= sizes[i]
+	}
+	if rest < 0 {
+		return 0, fmt.Errorf("%w: bad jump table", errCorrupt)
+	}
+	sizes[3] = rest
+	comp = comp[6:]
+	per := (size + 3) / 4
+	if 3*per > size {
+		return 0, fmt.Errorf("%w: too few literals for four streams", errCorrupt)
+	}
+	out := z.literals
+	for i := 0; i < 4; i++ {
+		n := per
+		if i == 3 {
+			n = len(out)
+		}
+		if err := z.huf.decode(out[:n], comp[:sizes[i]]); err != nil {
+			return 0, err
+		}
+		out = out[n:]
+		comp = comp[sizes[i]:]
+	}
+	return hdrSize + compSize, nil
+}
+
+// decodeSequences decodes the sequences section of a block and executes
+// the sequences against z.literals and the history.
+func (z *Reader) decodeSequences(data []byte) error {
+	if len(data) == 0 {
+		return fmt.Errorf("%w: missing sequences section", errCorrupt)
+	}
+	count := int(data[0])
+	switch {
+	case count == 0:
+		z.hist = append(z.hist, z.literals...)
+		return nil
+	case count == 255:
+		if len(data) < 3 {
+			return fmt.Errorf("%w: short sequences header", errCorrupt)
+		}
+		count = int(data[1]) + int(data[2])<<8 + 0x7F00
+		data = data[3:]
+	case count >= 128:
+		if len(data) < 2 {
+			return fmt.Errorf("%w: short sequences header", errCorrupt)
+		}
+		count = (count-128)<<8 + int(data[1])
+		data = data[2:]
+	default:
+		data = data[1:]
+	}
+
+	if len(data) == 0 {
+		return fmt.Errorf("%w: missing compression modes", errCorrupt)
+	}
+	modes := data[0]
+	if modes&3 != 0 {
+		return fmt.Errorf("%w: reserved compression mode bits", errCorrupt)
+	}
+	data = data[1:]
+	for kind := 0; kind < 3; kind++ {
+		switch mode := modes >> (6 - 2*kind) & 3; mode {
+		case 0:
+			z.tables[kind] = predefined(kind)
+		case 1:
+			if len(data) == 0 || int(data[0]) > tableMaxSym[kind] {
+				return fmt.Errorf("%w: bad RLE sequence code", errCorrupt)
+			}
+			z.tableBuf[kind].initRLE(data[0])
+			z.tables[kind] = &z.tableBuf[kind]
+			data = data[1:]
+		case 2:
+			n, err := readFSETable(&z.tableBuf[kind], data, tableMaxSym[kind], tableMaxLog[kind])
+			if err != nil {
+				return err
+			}
+			z.tables[kind] = &z.tableBuf[kind]
+			data = data[n:]
+		case 3:
+			if z.tables[kind] == nil {
+				return fmt.Errorf("%w: repeated sequence table missing", errCorrupt)
+			}
+		}
+	}
+
+	b, err := newBackwardBits(data)
+	if err != nil {
+		return err
+	}
+	var ll, of, ml fseState
+	ll.init(z.tables[literalTable], &b)
+	of.init(z.tables[offsetTable], &b)
+	ml.init(z.tables[matchTable], &b)
+
+	lits := z.literals
+	for i := 0; i < count; i++ {
+		ofCode := int(of.sym())
+		mlCode := int(ml.sym())
+		llCode := int(ll.sym())
+		if ofCode > 31 || mlCode > 52 || llCode > 35 {
+			return fmt.Errorf("%w: bad sequence code", errCorrupt)
+		}
+
+		offset := 1<<ofCode + int(b.read(ofCode))
+		matchLen := mlCode + 3
+		if mlCode >= 32 {
+			matchLen = int(matchBase[mlCode-32]) + int(b.read(int(matchBits[mlCode-32])))
+		}
+		litLen := llCode
+		if llCode >= 16 {
+			litLen = int(literalBase[llCode-16]) + int(b.read(int(literalBits[llCode-16])))
+		}
+		if b.overflowed() {
+			return fmt.Errorf("%w: sequences overrun their bit stream", errCorrupt)
+		}
+
+		// Offsets 1 to 3 pick from the recent offsets, shifted by one
+		// when the sequence has no literals.
+		if offset > 3 {
+			offset -= 3
+			z.reps = [3]int{offset, z.reps[0], z.reps[1]}
+		} else {
+			idx := offset - 1
+			if litLen == 0 {
+				idx++
+			}
+			switch idx {
+			case 0:
+				offset = z.reps[0]
+			case 3:
+				offset = z.reps[0] - 1
+				z.reps = [3]int{offset, z.reps[0], z.reps[1]}
+			default:
+				offset = z.reps[idx]
+				if idx == 1 {
+					z.reps = [3]int{offset, z.reps[0], z.reps[2]}
+				} else {
+					z.reps = [3]int{offset, z.reps[0], z.reps[1]}
+				}
+			}
+		}
+
+		if litLen > len(lits) {
+			return fmt.Errorf("%w: sequence uses more literals than decoded", errCorrupt)
+		}
+		z.hist = append(z.hist, lits[:litLen]...)
+		lits = lits[litLen:]
+		if offset <= 0 || offset > len(z.hist) {
+			return fmt.Errorf("%w: match offset %d out of range", errCorrupt, offset)
+		}
+		for matchLen > 0 {
+			from := len(z.hist) - offset
+			n := min(matchLen, offset)
+			z.hist = append(z.hist, z.hist[from:from+n]...)
+			matchLen -= n
+		}
+
+		if i < count-1 {
+			ll.update(&b)
+			ml.update(&b)
+			of.update(&b)
+		}
+	}
+	if !b.done() {
+		return fmt.Errorf("%w: sequence bit stream size mismatch", errCorrupt)
+	}
+	z.hist = append(z.hist, lits...)
+	return nil
+}
@@ -0,0 +1,155 @@
+package zstd
+
+import (
+	"fmt"
+	"math/bits"
+)
+
+// fseEntry is one state of an FSE decoding table.
+type fseEntry struct {
+	sym    uint8
+	nbBits uint8
+	base   uint16 // next state, before adding nbBits read bits
+}
+
+type fseTable struct {
+	log     int
+	entries []fseEntry
+}
+
+// initRLE sets t to the single-symbol table used by RLE mode.
+func (t *fseTable) initRLE(sym uint8) {
+	t.log = 0
+	t.entries = append(t.entries[:0], fseEntry{sym: sym})
+}
+
+// readFSETable reads an FSE table description from the start of data into
+// t and returns the number of bytes it took.
+func readFSETable(t *fseTable, data []byte, maxSym, maxLog int) (int, error) {
+	b := forwardBits{data: data}
+	log := int(b.read(4)) + 5
+	if log > maxLog {
+		return 0, fmt.Errorf("%w: FSE accuracy log %d", errCorrupt, log)
+	}
+
+	var norm [256]int16
+	remaining := 1<<log + 1
+	threshold := 1 << log
+	nbBits := log + 1
+	sym := 0
+	prevZero := false
+	for remaining > 1 && sym <= maxSym {
+		if prevZero {
+			for {
+				r := int(b.read(2))
+				sym += r
+				if r != 3 {
+					break
+				}
+			}
+			if sym > maxSym {
+				break
+			}
+		}
+		limit := 2*threshold - 1 - remaining
+		var count int
+		if v := int(bitsAt(data, b.off, nbBits-1)); v < limit {
+			count = v
+			b.off += nbBits - 1
+		} else {
+			count = int(b.read(nbBits))
+			if count >= threshold {
+				count -= limit
+			}
+		}
+		count--
+		if count < 0 {
+			remaining += count
+		} else {
+			remaining -= count
+		}
+		norm[sym] = int16(count)
+		sym++
+		prevZero = count == 0
+		for remaining < threshold {
+			nbBits--
+			threshold >>= 1
+		}
+	}
+	if remaining != 1 || sym > maxSym+1 || b.bytesRead() > len(data) {
+		return 0, fmt.Errorf("%w: bad FSE table description", errCorrupt)
+	}
+	if err := t.build(norm[:sym], log); err != nil {
+		return 0, err
+	}
+	return b.bytesRead(), nil
+}
+
+// build fills t from the normalized symbol counts norm, where -1 stands
+// for a low probability symbol.
+func (t *fseTable) build(norm []int16, log int) error {
+	size := 1 << log
+	if cap(t.entries) < size {
+		t.entries = make([]fseEntry, size)
+	}
+	t.entries = t.entries[:size]
+	t.log = log
+
+	var next [256]int
+	high := size - 1
+	for s, n := range norm {
+		if n == -1 {
+			t.entries[high].sym = uint8(s)
+			high--
+			next[s] = 1
+		} else {
+			next[s] = int(n)
+		}
+	}
+
+	mask := size - 1
+	step := size>>1 + size>>3 + 3
+	pos := 0
+	for s, n := range norm {
+		for i := 0; i < int(n); i++ {
+			t.entries[pos].sym = uint8(s)
+			pos = (pos + step) & mask
+			for pos > high {
+				pos = (pos + step) & mask
+			}
+		}
+	}
+	if pos != 0 {
+		return fmt.Errorf("%w: bad FSE distribution", errCorrupt)
+	}
+
+	for i := range t.entries {
+		e := &t.entries[i]
+		state := next[e.sym]
+		next[e.sym]++
+		nb := log - (bits.Len(uint(state)) - 1)
+		e.nbBits = uint8(nb)
+		e.base = uint16(state<<nb - size)
+	}
+	return nil
+}
+
+// fseState walks an FSE table over a backward bit stream.
+type fseState struct {
+	t     *fseTable
+	state int
+}
+
+func (s *fseState) init(t *fseTable, b *backwardBits) {
+	s.t = t
+	s.state = int(b.read(t.log))
+}
+
+func (s *fseState) sym() uint8 {
+	return s.t.entries[s.state].sym
+}
+
+func (s *fseState) update(b *backwardBits) {
+	e := s.t.entries[s.state]
+	s.state = int(e.base) + int(b.read(int(e.nbBits)))
+}
@@ -0,0 +1,170 @@
+package zstd
+
+import (
+	"fmt"
+	"math/bits"
+)
+
+const maxHuffLog = 11
+
+type huffEntry struct {
+	sym    uint8
+	nbBits uint8
+}
+
+// huffTable decodes literals by looking up the next log bits.
+type huffTable struct {
+	log     int
+	entries []huffEntry
+}
+
+// readHuffTable reads a Huffman tree description from the start of data
+// into t and returns the number of bytes it took.
+func readHuffTable(t *huffTable, data []byte) (int, error) {
+	if len(data) == 0 {
+		return 0, fmt.Errorf("%w: missing Huffman tree", errCorrupt)
+	}
+	var weights [256]uint8
+	var n int
+	hdr := int(data[0])
+	data = data[1:]
+	if hdr >= 128 {
+		// Weights stored directly, four bits each.
+		n = hdr - 127
+		if (n+1)/2 > len(data) {
+			return 0, fmt.Errorf("%w: short Huffman tree", errCorrupt)
+		}
+		for i := 0; i < n; i++ {
+			w := data[i/2]
+			if i%2 == 0 {
+				w >>= 4
+			}
+			weights[i] = w & 15
+		}
+		if err := t.build(weights[:n]); err != nil {
+			return 0, err
+		}
+		return 1 + (n+1)/2, nil
+	}
+
+	// Weights compressed with FSE, decoded with two interleaved states.
+	if hdr > len(data) {
+		return 0, fmt.Errorf("%w: short Huffman tree", errCorrupt)
+	}
+	var ft fseTable
+	used, err := readFSETable(&ft, data[:hdr], 255, 6)
+	if err != nil {
+		return 0, err
+	}
+	b, err := newBackwardBits(data[used:hdr])
+	if err != nil {
+		return 0, err
+	}
+	var s1, s2 fseState
+	s1.init(&ft, &b)
+	s2.init(&ft, &b)
+	for {
+		if n > len(weights)-2 {
+			return 0, fmt.Errorf("%w: too many Huffman weights", errCorrupt)
+		}
+		weights[n] = s1.sym()
+		n++
+		s1.update(&b)
+		if b.overflowed() {
+			weights[n] = s2.sym()
+			n++
+			break
+		}
+		weights[n] = s2.sym()
+		n++
+		s2.update(&b)
+		if b.overflowed() {
+			weights[n] = s1.sym()
+			n++
+			break
+		}
+	}
+	if err := t.build(weights[:n]); err != nil {
+		return 0, err
+	}
+	return 1 + hdr, nil
+}
+
+// build fills t from the weights of all symbols but the last, whose weight
+// is implied by the others.
+func (t *huffTable) build(weights []uint8) error {
+	if len(weights) > 255 {
+		return fmt.Errorf("%w: too many Huffman weights", errCorrupt)
+	}
+	var count [maxHuffLog + 2]int
+	total := 0
+	for _, w := range weights {
+		if w > maxHuffLog {
+			return fmt.Errorf("%w: Huffman weight %d", errCorrupt, w)
+		}
+		count[w]++
+		if w > 0 {
+			total += 1 << (w - 1)
+		}
+	}
+	if total == 0 {
+		return fmt.Errorf("%w: empty Huffman tree", errCorrupt)
+	}
+	log := bits.Len(uint(total))
+	if log > maxHuffLog {
+		return fmt.Errorf("%w: Huffman tree too deep", errCorrupt)
+	}
+	rest := 1<<log - total
+	if rest&(rest-1) != 0 {
+		return fmt.Errorf("%w: incomplete Huffman tree", errCorrupt)
+	}
+	last := uint8(bits.Len(uint(rest)))
+	count[last]++
+
+	// Codes of the same weight sit next to each other, lightest first.
+	var start [maxHuffLog + 2]int
+	next := 0
+	for w := 1; w <= log; w++ {
+		start[w] = next
+		next += count[w] << (w - 1)
+	}
+
+	size := 1 << log
+	if cap(t.entries) < size {
+		t.entries = make([]huffEntry, size)
+	}
+	t.entries = t.entries[:size]
+	t.log = log
+	fill := func(sym int, w uint8) {
+		n := 1 << (w - 1)
+		e := huffEntry{sym: uint8(sym), nbBits: uint8(log + 1 - int(w))}
+		for i := start[w]; i < start[w]+n; i++ {
+			t.entries[i] = e
+		}
+		start[w] += n
+	}
+	for s, w := range weights {
+		if w > 0 {
+			fill(s, w)
+		}
+	}
+	fill(len(weights), last)
+	return nil
+}
+
+// decode decodes len(out) literals from one Huffman coded stream.
+func (t *huffTable) decode(out, data []byte) error {
+	b, err := newBackwardBits(data)
+	if err != nil {
+		return err
+	}
+	for i := range out {
+		e := t.entries[b.peek(t.log)]
+		out[i] = e.sym
+		b.pos -= int(e.nbBits)
+	}
+	if !b.done() {
+		return fmt.Errorf("%w: Huffman stream size mismatch", errCorrupt)
+	}
+	return nil
+}
@@ -0,0 +1,100 @@
+package zstd
+
+import (
+	"encoding/binary"
+	"math/bits"
+)
+
+// xxhash64 computes XXH64 with a zero seed, the content checksum of a
+// frame.
+type xxhash64 struct {
+	v     [4]uint64
+	total uint64
+	buf   [32]byte
+	n     int
+}
+
+const (
+	prime1 uint64 = 11400714785074694791
+	prime2 uint64 = 14029467366897019727
+	prime3 uint64 = 1609587929392839161
+	prime4 uint64 = 9650029242287828579
+	prime5 uint64 = 2870177450012600261
+)
+
+func (h *xxhash64) reset() {
+	*h = xxhash64{v: [4]uint64{prime1, prime2, 0, 0}}
+	h.v[0] += prime2
+	h.v[3] -= prime1
+}
+
+func xxRound(acc, in uint64) uint64 {
+	acc += in * prime2
+	return bits.RotateLeft64(acc, 31) * prime1
+}
+
+func xxMerge(acc, v uint64) uint64 {
+	acc ^= xxRound(0, v)
+	return acc*prime1 + prime4
+}
+
+func (h *xxhash64) write(p []byte) {
+	h.total += uint64(len(p))
+	if h.n > 0 {
+		c := copy(h.buf[h.n:], p)
+		h.n += c
+		p = p[c:]
+		if h.n < 32 {
+			return
+		}
+		h.blocks(h.buf[:])
+		h.n = 0
+	}
+	full := len(p) &^ 31
+	h.blocks(p[:full])
+	h.n = copy(h.buf[:], p[full:])
+}
+
+func (h *xxhash64) blocks(p []byte) {
+	for ; len(p) >= 32; p = p[32:] {
+		for i := range h.v {
+			h.v[i] = xxRound(h.v[i], binary.LittleEndian.Uint64(p[8*i:]))
+		}
+	}
+}
+
+func (h *xxhash64) sum() uint64 {
+	var s uint64
+	if h.total >= 32 {
+		s = bits.RotateLeft64(h.v[0], 1) + bits.RotateLeft64(h.v[1], 7) +
+			bits.RotateLeft64(h.v[2], 12) + bits.RotateLeft64(h.v[3], 18)
+		for _, v := range h.v {
+			s = xxMerge(s, v)
+		}
+	} else {
+		s = h.v[2] + prime5
+	}
+	s += h.total
+
+	p := h.buf[:h.n]
+	for ; len(p) >= 8; p = p[8:] {
+		s ^= xxRound(0, binary.LittleEndian.Uint64(p))
+		s = bits.RotateLeft64(s, 27)*prime1 + prime4
+	}
+	if len(p) >= 4 {
+		s ^= uint64(binary.LittleEndian.Uint32(p)) * prime1
+		s = bits.RotateLeft64(s, 23)*prime2 + prime3
+		p = p[4:]
+	}
+	for _, c := range p {
+		s ^= uint64(c) * prime5
+		s = bits.RotateLeft64(s, 11) * prime1
+	}
+
+	s ^= s >> 33
+	s *= prime2
+	s ^= s >> 29
+	s *= prime3
+	s ^= s >> 32
+	return s
+}
@@ -0,0 +1,268 @@
+// Package zstd decodes Zstandard streams (RFC 8878).
+//
+// It supports what zstd(1) and dpkg-deb produce: any number of frames,
+// skippable frames and content checksums. Frames that need a dictionary
+// or a window larger than MaxWindow are rejected, as zstd(1) does by
+// default, so callers can fall back to the system decompressor.
+package zstd
+
+import (
+	"bufio"
+	"encoding/binary"
+	"errors"
+	"fmt"
+	"io"
+)
+
+const (
+	frameMagic         = 0xFD2FB528
+	skippableMagicMask = 0xFFFFFFF0
+	skippableMagic     = 0x184D2A50
+
+	// MaxWindow is the largest window accepted, matching zstd(1)'s default
+	// memory limit.
+	MaxWindow = 1 << 27
+	// maxBlockSize is the largest block a frame may contain.
+	maxBlockSize = 128 << 10
+)
+
+// ErrUnsupported is returned, wrapped, for valid streams this package does
+// not decode.
+var ErrUnsupported = errors.New("zstd: unsupported stream")
+
+var errCorrupt = errors.New("zstd: corrupt stream")
+
+// Reader decompresses a zstd stream.
+type Reader struct {
+	r      *bufio.Reader
+	err    error
+	frames int
+
+	// State of the frame being decoded.
+	inFrame     bool
+	window      int
+	checksum    bool
+	contentSize int64 // -1 when not recorded in the frame header
+	decoded     int64
+	hash        xxhash64
+
+	// hist holds the decoded output of the frame, of which at least the
+	// last window bytes are kept for matches; out is the part of it not
+	// yet returned by Read.
+	hist []byte
+	out  []byte
+
+	block    []byte
+	literals []byte
+	reps     [3]int
+	huf      *huffTable
+	tables   [3]*fseTable // literal length, offset and match length
+	tableBuf [3]fseTable
+}
+
+// NewReader returns a Reader decompressing r.
+func NewReader(r io.Reader) (*Reader, error) {
+	return &Reader{r: bufio.NewReader(r)}, nil
+}
+
+// Read implements io.Reader.
+func (z *Reader) Read(p []byte) (int, error) {
+	for len(z.out) == 0 {
+		if z.err != nil {
+			return 0, z.err
+		}
+		z.err = z.next()
+	}
+	n := copy(p, z.out)
+	z.out = z.out[n:]
+	return n, nil
+}
+
+// next decodes the next block, starting a new frame when needed.
+func (z *Reader) next() error {
+	if !z.inFrame {
+		return z.readFrameHeader()
+	}
+
+	var hdr [3]byte
+	if _, err := io.ReadFull(z.r, hdr[:]); err != nil {
+		return unexpected(err)
+	}
+	h := int(hdr[0]) | int(hdr[1])<<8 | int(hdr[2])<<16
+	last := h&1 != 0
+	size := h >> 3
+	if size > maxBlockSize || size > z.window && z.window > 0 {
+		return fmt.Errorf("%w: block of %d bytes", errCorrupt, size)
+	}
+
+	// Drop history that no match can reach any more.
+	if len(z.hist) > 2*z.window+maxBlockSize {
+		n := copy(z.hist, z.hist[len(z.hist)-z.window:])
+		z.hist = z.hist[:n]
+	}
+	start := len(z.hist)
+
+	switch blockType := (h >> 1) & 3; blockType {
+	case 0:
+		if cap(z.hist)-len(z.hist) < size {
+			z.hist = append(z.hist, make([]byte, size)...)[:start]
+		}
+		z.hist = z.hist[:start+size]
+		if _, err := io.ReadFull(z.r, z.hist[start:]); err != nil {
+			return unexpected(err)
+		}
+	case 1:
+		b, err := z.r.ReadByte()
+		if err != nil {
+			return unexpected(err)
+		}
+		for i := 0; i < size; i++ {
+			z.hist = append(z.hist, b)
+		}
+	case 2:
+		if cap(z.block) < size {
+			z.block = make([]byte, size)
+		}
+		z.block = z.block[:size]
+		if _, err := io.ReadFull(z.r, z.block); err != nil {
+			return unexpected(err)
+		}
+		if err := z.decodeBlock(z.block); err != nil {
+			return err
+		}
+	default:
+		return fmt.Errorf("%w: reserved block type", errCorrupt)
+	}
+
+	z.out = z.hist[start:]
+	z.decoded += int64(len(z.out))
+	if z.checksum {
+		z.hash.write(z.out)
+	}
+	if last {
+		return z.endFrame()
+	}
+	return nil
+}
+
+// readFrameHeader starts the next frame, skipping skippable frames. It
+// returns io.EOF at the end of the stream.
+func (z *Reader) readFrameHeader() error {
+	var buf [4]byte
+	for {
+		n, err := io.ReadFull(z.r, buf[:])
+		if n == 0 && err == io.EOF && z.frames > 0 {
+			return io.EOF
+		}
+		if err != nil {
+			return unexpected(err)
+		}
+		magic := binary.LittleEndian.Uint32(buf[:])
+		if magic&skippableMagicMask != skippableMagic {
+			if magic != frameMagic {
+				return fmt.Errorf("%w: bad magic number", errCorrupt)
+			}
+			break
+		}
+		if _, err := io.ReadFull(z.r, buf[:]); err != nil {
+			return unexpected(err)
+		}
+		if _, err := z.r.Discard(int(binary.LittleEndian.Uint32(buf[:]))); err != nil {
+			return unexpected(err)
+		}
+		z.frames++
+	}
+
+	desc, err := z.r.ReadByte()
+	if err != nil {
+		return unexpected(err)
+	}
+	singleSegment := desc&0x20 != 0
+	if desc&0x08 != 0 {
+		return fmt.Errorf("%w: reserved frame header bit set", errCorrupt)
+	}
+	window := 0
+	if !singleSegment {
+		wd, err := z.r.ReadByte()
+		if err != nil {
+			return unexpected(err)
+		}
+		exp := uint(wd >> 3)
+		if exp > 31-10 {
+			return fmt.Errorf("%w: window too large", ErrUnsupported)
+		}
+		base := 1 << (10 + exp)
+		window = base + base/8*int(wd&7)
+	}
+	dictSize := [4]int{0, 1, 2, 4}[desc&3]
+	var field [8]byte
+	if _, err := io.ReadFull(z.r, field[:dictSize]); err != nil {
+		return unexpected(err)
+	}
+	if binary.LittleEndian.Uint32(field[:4]) != 0 {
+		return fmt.Errorf("%w: frame needs a dictionary", ErrUnsupported)
+	}
+	fcsSize := [4]int{0, 2, 4, 8}[desc>>6]
+	if fcsSize == 0 && singleSegment {
+		fcsSize = 1
+	}
+	field = [8]byte{}
+	if _, err := io.ReadFull(z.r, field[:fcsSize]); err != nil {
+		return unexpected(err)
+	}
+	z.contentSize = -1
+	if fcsSize > 0 {
+		size := binary.LittleEndian.Uint64(field[:])
+		if fcsSize == 2 {
+			size += 256
+		}
+		if size > 1<<62 {
+			return fmt.Errorf("%w: content size too large", ErrUnsupported)
+		}
+		z.contentSize = int64(size)
+	}
+	if singleSegment {
+		window = int(min(z.contentSize, MaxWindow+1))
+	}
+	if window > MaxWindow {
+		return fmt.Errorf("%w: window of %d bytes", ErrUnsupported, window)
+	}
+
+	z.inFrame = true
+	z.frames++
+	z.window = window
+	z.checksum = desc&0x04 != 0
+	z.decoded = 0
+	z.hash.reset()
+	z.hist = z.hist[:0]
+	z.reps = [3]int{1, 4, 8}
+	z.huf = nil
+	z.tables = [3]*fseTable{}
+	return nil
+}
+
+// endFrame checks the content size and checksum of the frame just decoded.
+func (z *Reader) endFrame() error {
+	z.inFrame = false
+	if z.contentSize >= 0 && z.decoded != z.contentSize {
+		return fmt.Errorf("%w: frame decoded to %d bytes, want %d", errCorrupt, z.decoded, z.contentSize)
+	}
+	if !z.checksum {
+		return nil
+	}
+	var buf [4]byte
+	if _, err := io.ReadFull(z.r, buf[:]); err != nil {
+		return unexpected(err)
+	}
+	if binary.LittleEndian.Uint32(buf[:]) != uint32(z.hash.sum()) {
+		return fmt.Errorf("%w: checksum mismatch", errCorrupt)
+	}
+	return nil
+}
+
+func unexpected(err error) error {
+	if err == io.EOF {
+		return io.ErrUnexpectedEOF
+	}
+	return err
+}
@@ -0,0 +1,147 @@
+package zstd
+
+import (
+	"bytes"
+	"errors"
+	"fmt"
+	"io"
+	"math/rand"
+	"os/exec"
+	"strings"
+	"testing"
+)
+
+// testInputs returns data that exercises raw, RLE and compressed blocks,
+// short and long matches and both literal stream layouts.
+func testInputs() map[string][]byte {
+	rng := rand.New(rand.NewSource(1))
+	random := make([]byte, 300<<10)
+	rng.Read(random)
+
+	var text strings.Builder
+	words := []string{".TH", "LS", "1", ".SH", "NAME", "ls", "\\-", "list", "directory", "contents", ".B", "\\fB\\-a\\fR", "\n"}
+	for text.Len() < 1<<20 {
+		text.WriteString(words[rng.Intn(len(words))])
+		text.WriteByte(' ')
+	}
+
+	mixed := append([]byte(text.String()[:200<<10]), random[:100<<10]...)
+	mixed = append(mixed, bytes.Repeat([]byte{'x'}, 300<<10)...)
+
+	return map[string][]byte{
+		"empty":  {},
+		"byte":   {'a'},
+		"short":  []byte(".TH LS 1\n.SH NAME\nls \\- list directory contents\n"),
+		"zeros":  make([]byte, 1<<20),
+		"random": random,
+		"text":   []byte(text.String()),
+		"mixed":  mixed,
+	}
+}
+
+func compressCLI(t *testing.T, data []byte, args ...string) []byte {
+	t.Helper()
+	if _, err := exec.LookPath("zstd"); err != nil {
+		t.Skip("zstd not available")
+	}
+	cmd := exec.Command("zstd", append([]string{"-c", "-q"}, args...)...)
+	cmd.Stdin = bytes.NewReader(data)
+	out, err := cmd.Output()
+	if err != nil {
+		t.Fatalf("zstd %v: %v", args, err)
+	}
+	return out
+}
+
+func decompress(data []byte) ([]byte, error) {
+	zr, err := NewReader(bytes.NewReader(data))
+	if err != nil {
+		return nil, err
+	}
+	return io.ReadAll(zr)
+}
+
+func TestReaderMatchesCLI(t *testing.T) {
+	inputs := testInputs()
+	for _, args := range [][]string{{"-1"}, {"-3"}, {"-19"}, {"--ultra", "-22"}, {"-3", "--no-check"}, {"-6", "--long=24"}} {
+		for name, data := range inputs {
+			t.Run(fmt.Sprintf("%s/%s", strings.Join(args, ""), name), func(t *testing.T) {
+				got, err := decompress(compressCLI(t, data, args...))
+				if err != nil {
+					t.Fatal(err)
+				}
+				if !bytes.Equal(got, data) {
+					t.Fatalf("decoded %d bytes, want %d matching input", len(got), len(data))
+				}
+			})
+		}
+	}
+}
+
+func TestReaderConcatenatedAndSkippableFrames(t *testing.T) {
+	a := []byte("first frame\n")
+	b := bytes.Repeat([]byte("second frame\n"), 1000)
+	skippable := []byte{0x50, 0x2A, 0x4D, 0x18, 3, 0, 0, 0, 'x', 'y', 'z'}
+
+	var stream []byte
+	stream = append(stream, compressCLI(t, a, "-3")...)
+	stream = append(stream, skippable...)
+	stream = append(stream, compressCLI(t, b, "-3")...)
+
+	got, err := decompress(stream)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if want := append(append([]byte{}, a...), b...); !bytes.Equal(got, want) {
+		t.Fatalf("got %q", got)
+	}
+}
+
+func TestReaderRejectsCorruptInput(t *testing.T) {
+	data := testInputs()["text"]
+	frame := compressCLI(t, data, "-3")
+
+	flipped := append([]byte{}, frame...)
+	flipped[len(flipped)/2] ^= 0x55
+	if _, err := decompress(flipped); err == nil {
+		t.Error("corrupted frame decoded without error")
+	}
+	if _, err := decompress(frame[:len(frame)-10]); err == nil {
+		t.Error("truncated frame decoded without error")
+	}
+	if _, err := decompress(nil); err == nil {
+		t.Error("empty input decoded without error")
+	}
+}
+
+func TestReaderRejectsUnsupportedFrames(t *testing.T) {
+	// A frame header naming dictionary 1, followed by an empty last block.
+	withDict := []byte{0x28, 0xB5, 0x2F, 0xFD, 0x21, 1, 0, 1, 0, 0}
+	if _, err := decompress(withDict); !errors.Is(err, ErrUnsupported) {
+		t.Errorf("dictionary frame: got %v, want ErrUnsupported", err)
+	}
+
+	// A frame header asking for a 1 GiB window.
+	hugeWindow := []byte{0x28, 0xB5, 0x2F, 0xFD, 0x00, 20 << 3, 1, 0, 0}
+	if _, err := decompress(hugeWindow); !errors.Is(err, ErrUnsupported) {
+		t.Errorf("huge window: got %v, want ErrUnsupported", err)
+	}
+}
+
+func TestXXHash64(t *testing.T) {
+	for _, tt := range []struct {
+		in   string
+		want uint64
+	}{
+		{"", 0xef46db3751d8e999},
+		{"a", 0xd24ec4f1a98c6e5b},
+		{"abc", 0x44bc2cf5ad770999},
+	} {
+		var h xxhash64
+		h.reset()
+		h.write([]byte(tt.in))
+		if got := h.sum(); got != tt.want {
+			t.Errorf("xxhash64(%q) = %#x, want %#x", tt.in, got, tt.want)
+		}
+	}
+}
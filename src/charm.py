@@ -11,7 +11,7 @@ import ops
 from charms.traefik_k8s.v2.ingress import IngressPerAppRequirer
 from ops.pebble import APIError, ConnectionError, ProtocolError
 
-from manpages import PORT, Manpages
+from manpages import PORT, Manpages, ingest_environment, parse_releases, server_environment
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +28,7 @@ class ManpagesCharm(ops.CharmBase):
         framework.observe(self.on.manpages_pebble_check_failed, self._on_pebble_check_failed)
         framework.observe(self.on.manpages_pebble_check_recovered, self._on_pebble_check_recovered)
         framework.observe(self.on.update_status, self._on_update_status)
-        framework.observe(self.on.update_manpages_action, self._on_config_changed)
+        framework.observe(self.on.update_manpages_action, self._on_update_manpages_action)
         framework.observe(self.on.config_changed, self._on_config_changed)
 
         self.unit.open_port(protocol="tcp", port=PORT)
@@ -40,7 +40,9 @@ class ManpagesCharm(ops.CharmBase):
         )
 
         # Ingress URL changes require updating the configuration and also regenerating sitemaps,
-        # therefore we can bind events for this relation to the config_changed event.
+        # therefore we can bind events for this relation to the config_changed event. The
+        # restarted server rewrites the URLs of its existing sitemaps rather than rereading
+        # the manpage tree, so this stays cheap.
         framework.observe(self._ingress.on.ready, self._on_config_changed)
         framework.observe(self._ingress.on.revoked, self._on_config_changed)
 
@@ -52,12 +54,54 @@ class ManpagesCharm(ops.CharmBase):
         """Update configuration and fetch relevant manpages."""
         self._replan_workload()
 
-    def _replan_workload(self):
+    def _on_update_manpages_action(self, event: ops.ActionEvent):
+        """Refresh the manpages from the archive, even if the configuration is unchanged.
+
+        If the optional `releases` parameter is set, only those releases are refreshed.
+        """
+        scope = str(event.params.get("releases", ""))
+        if scope:
+            try:
+                requested = parse_releases(scope)
+            except ValueError:
+                event.fail(f"invalid releases specified: '{scope}'")
+                return
+            unknown = set(requested) - set(parse_releases(str(self.config["releases"])))
+            if unknown:
+                event.fail(f"releases not configured: {', '.join(sorted(unknown))}")
+                return
+
+        started = self._replan_workload(force=not scope, scope=scope or None)
+        if started is None:
+            event.fail("Failed to update manpages. Check `juju debug-log` for details.")
+            return
+        results = {"releases": ", ".join(started)}
+        # Ingest runs in the background, so report the index update of the previous run.
+        if last := self._manpages.last_reindex():
+            results["last-reindex-time"] = last.get("time", "")
+            changes = "full rebuild" if last.get("full") else str(last.get("changed", 0))
+            results["last-reindex-changes"] = changes
+        event.set_results(results)
+
+    def _replan_workload(self, force=False, scope=None):
+        """Apply the Pebble layer and start any ingest runs that are due.
+
+        Returns the releases being ingested, or None if the workload could not be updated.
+        """
         container = self._container
+        releases = str(self.config["releases"])
+        try:
+            parse_releases(releases)
+            ingest_env = ingest_environment(self.config)
+            server_env = server_environment(self.config)
+        except ValueError as e:
+            logger.error("invalid configuration: %s", e)
+            self.unit.status = ops.BlockedStatus(f"Invalid configuration: {e}")
+            return None
+
         try:
-            releases = str(self.config["releases"])
             url = self._get_external_url()
-            layer = self._manpages.pebble_layer(releases, url)
+            layer = self._manpages.pebble_layer(releases, url, ingest_env, server_env)
 
             container.add_layer("manpages", layer, combine=True)
             container.replan()
@@ -66,18 +110,21 @@ class ManpagesCharm(ops.CharmBase):
             self.unit.status = ops.BlockedStatus(
                 "Failed to connect to workload container. Check `juju debug-log` for details."
             )
-            return
+            return None
 
         try:
-            self._manpages.update_manpages(str(self.config["releases"]))
+            started = self._manpages.update_manpages(
+                releases, force=force, scope=scope, ingest_env=ingest_env
+            )
         except (ProtocolError, ConnectionError, APIError) as e:
             logger.error("failed to ingest manpages: %s", e)
             self.unit.status = ops.BlockedStatus(
                 "Failed to connect to workload container. Check `juju debug-log` for details."
             )
-            return
+            return None
 
         self.unit.status = self._compute_status()
+        return started
 
     def _on_pebble_check_failed(self, event: ops.PebbleCheckFailedEvent):
         """Handle a Pebble health check failure."""
@@ -100,6 +147,8 @@ class ManpagesCharm(ops.CharmBase):
             return ops.MaintenanceStatus(err)
         if self._manpages.updating:
             return ops.MaintenanceStatus("Updating manpages")
+        if self._manpages.purging:
+            return ops.MaintenanceStatus("Purging removed releases")
         return ops.ActiveStatus()
 
     def _get_external_url(self) -> str:
@@ -3,16 +3,19 @@
 
 """Representation of the manpages service."""
 
+import hashlib
 import json
 import logging
 import os
 import re
+import time
 import urllib.error
 import urllib.request
+import uuid
 from pathlib import Path
 
 import ops
-from ops.pebble import APIError, ConnectionError, PathError, ProtocolError
+from ops.pebble import APIError, ConnectionError, ExecError, PathError, ProtocolError
 
 logger = logging.getLogger(__name__)
 
@@ -20,36 +23,151 @@ WWW_DIR = Path("/app") / "www"
 PORT = 8080
 ADMIN_PORT = 9090
 
+ARCHIVE = "https://archive.ubuntu.com/ubuntu"
+REPOS = "main, restricted, universe, multiverse"
+ARCH = "amd64"
+
+INGEST_BINARY = Path("/usr/bin/ingest")
+# Records the inputs of the last ingest run so that unrelated configuration
+# changes (e.g. the ingress URL) do not trigger a full archive walk.
+INGEST_STATE_PATH = WWW_DIR / "manpages" / ".ingest-state"
+# Where ingest records the MANPAGES_INGEST_RUN of its last completed run.
+INGEST_DONE_PATH = WWW_DIR / "manpages" / ".ingest-done"
+# Ingest environment that changes what is written for each page, so that a
+# change to it starts an ingest run. Other tuning options apply from the next run.
+INGEST_OUTPUT_OPTIONS = ("MANPAGES_STORAGE_BACKEND", "MANPAGES_PRECOMPRESS", "MANPAGES_PLAIN_TEXT")
+# Overlay layer narrowing the ingest service to the releases that need a run.
+INGEST_SCOPE_LAYER = "ingest-scope"
+
+# Archive index files kept across ingest runs for conditional requests.
+FETCH_CACHE_DIR = WWW_DIR / "manpages" / ".fetch-cache"
+
+# Per-release trees written by ingest. Removed releases are renamed to a
+# tombstone (matching storage.TombstonePrefix) and deleted by the purge service.
+PURGE_TREES = (WWW_DIR / "manpages", WWW_DIR / "manpages.gz")
+TOMBSTONE_PREFIX = ".purge-"
+
 # Used to fetch release codenames from the config string passed to the charm.
 RELEASES_PATTERN = re.compile(r"([a-z]+)(?:[,][ ]*)*")
 
 
+def parse_releases(releases) -> list[str]:
+    """Return the sorted, de-duplicated release codenames in a config string."""
+    releases_list = sorted(set(RELEASES_PATTERN.findall(releases)))
+    if not releases_list:
+        raise ValueError("failed to build manpages config: invalid releases specified")
+    return releases_list
+
+
+def _int_option(config, name, minimum, maximum=None) -> int:
+    """Return an integer option, raising ValueError if it is out of range."""
+    value = int(config[name])
+    if maximum is not None and not minimum <= value <= maximum:
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return value
+
+
+def _choice_option(config, name, choices) -> str:
+    """Return a string option, raising ValueError if it is not one of choices."""
+    value = str(config[name])
+    if value not in choices:
+        quoted = " or ".join(f"'{c}'" for c in choices)
+        raise ValueError(f"{name} must be {quoted}")
+    return value
+
+
+def ingest_environment(config) -> dict:
+    """Validate the ingest tuning options in the charm config and return their environment.
+
+    Raises ValueError naming the first invalid option.
+    """
+    workers = _int_option(config, "ingest-workers", 0, 256)
+    concurrency = _int_option(config, "fetch-concurrency", 1, 256)
+    timeout = _int_option(config, "fetch-timeout", 1)
+    retries = _int_option(config, "fetch-retries", 0, 20)
+    backoff = _choice_option(config, "fetch-backoff", ("linear", "exponential"))
+    backoff_base = _int_option(config, "fetch-backoff-base", 0, 300)
+    cache_size = _int_option(config, "fetch-cache-size", 0)
+    converter = _choice_option(config, "converter", ("exec", "batch"))
+    convert_cache_size = _int_option(config, "convert-cache-size", 0)
+    backend = _choice_option(config, "storage-backend", ("files", "packed"))
+
+    env = {
+        "MANPAGES_FETCH_CONCURRENCY": str(concurrency),
+        "MANPAGES_FETCH_TIMEOUT": f"{timeout}s",
+        "MANPAGES_FETCH_RETRIES": str(retries),
+        "MANPAGES_FETCH_BACKOFF": backoff,
+        "MANPAGES_FETCH_BACKOFF_BASE": f"{backoff_base}s",
+        "MANPAGES_CONVERTER": converter,
+        "MANPAGES_CONVERT_CACHE_SIZE_MB": str(convert_cache_size),
+        "MANPAGES_STORAGE_BACKEND": backend,
+    }
+    # 0 disables the index cache; the ingest binary only caches when given a directory.
+    if cache_size:
+        env["MANPAGES_FETCH_CACHE_DIR"] = str(FETCH_CACHE_DIR)
+        env["MANPAGES_FETCH_CACHE_SIZE_MB"] = str(cache_size)
+    # 0 leaves the worker count to the ingest binary (one per CPU).
+    if workers:
+        env["MANPAGES_INGEST_WORKERS"] = str(workers)
+    if config["precompress"]:
+        env["MANPAGES_PRECOMPRESS"] = "true"
+    if config["plain-text"]:
+        env["MANPAGES_PLAIN_TEXT"] = "true"
+    if config["fsync"]:
+        env["MANPAGES_FSYNC"] = "true"
+    return env
+
+
+def ingest_output(ingest_env) -> dict:
+    """Return the part of an ingest environment that affects the ingest output."""
+    return {k: v for k, v in ingest_env.items() if k in INGEST_OUTPUT_OPTIONS}
+
+
+def server_environment(config) -> dict:
+    """Validate the server tuning options in the charm config and return their environment.
+
+    Raises ValueError naming the first invalid option.
+    """
+    page_cache_size = _int_option(config, "page-cache-size", 0)
+    listing_cache_size = _int_option(config, "listing-cache-size", 0)
+    env = {
+        "MANPAGES_PAGE_CACHE_SIZE_MB": str(page_cache_size),
+        "MANPAGES_LISTING_CACHE_SIZE_MB": str(listing_cache_size),
+    }
+    for route in ("pages", "downloads", "sitemaps"):
+        name = f"cache-control-{route}"
+        policy = str(config[name]).strip()
+        if not policy or any(c in policy for c in "\r\n"):
+            raise ValueError(f"{name} must be a single non-empty line")
+        env[f"MANPAGES_CACHE_CONTROL_{route.upper()}"] = policy
+    if config["sitemap-gzip"]:
+        env["MANPAGES_SITEMAP_GZIP"] = "true"
+    return env
+
+
 class Manpages:
     """Represent a manpages instance in the workload."""
 
     def __init__(self, container: ops.Container):
         self.container = container
 
-    def pebble_layer(self, releases, external_url) -> ops.pebble.Layer:
-        """Return a Pebble layer for managing manpages server and ingestion."""
+    def pebble_layer(
+        self, releases, external_url, ingest_env=None, server_env=None
+    ) -> ops.pebble.Layer:
+        """Return a Pebble layer for managing manpages server and ingestion.
+
+        ingest_env and server_env hold the tuning variables passed to the ingest
+        and server services.
+        """
         # Validate the releases string before building the layer
-        releases_list = RELEASES_PATTERN.findall(releases)
-        if not releases_list:
-            raise ValueError("failed to build manpages config: invalid releases specified")
+        parse_releases(releases)
 
-        proxy_env = {
-            "HTTP_PROXY": os.environ.get("JUJU_CHARM_HTTP_PROXY", ""),
-            "HTTPS_PROXY": os.environ.get("JUJU_CHARM_HTTPS_PROXY", ""),
-            "NO_PROXY": os.environ.get("JUJU_CHARM_NO_PROXY", ""),
-        }
-        app_config = {
-            "MANPAGES_RELEASES": releases,
+        server_config = {
+            **self._app_environment(releases),
+            **(server_env or {}),
             "MANPAGES_SITE": external_url,
-            "MANPAGES_ARCHIVE": "https://archive.ubuntu.com/ubuntu",
-            "MANPAGES_PUBLIC_HTML_DIR": str(WWW_DIR),
-            "MANPAGES_REPOS": "main, restricted, universe, multiverse",
-            "MANPAGES_ARCH": "amd64",
-            "MANPAGES_LOG_LEVEL": "info",
         }
 
         return ops.pebble.Layer(
@@ -60,15 +178,20 @@ class Manpages:
                         "summary": "manpages server",
                         "command": "/usr/bin/server",
                         "startup": "enabled",
-                        "environment": {**proxy_env, **app_config},
+                        "environment": server_config,
                     },
-                    "ingest": {
+                    "ingest": self._ingest_service(releases, ingest_env),
+                    "purge": {
                         "override": "replace",
-                        "summary": "manpages ingestion",
-                        "command": "/usr/bin/ingest",
-                        "startup": "enabled",
+                        "summary": "manpages purge",
+                        "command": "/usr/bin/purge",
+                        # Started by purge_unused_manpages when releases are removed.
+                        "startup": "disabled",
                         "on-success": "ignore",
-                        "environment": {**proxy_env, **app_config},
+                        "environment": {
+                            "MANPAGES_PUBLIC_HTML_DIR": str(WWW_DIR),
+                            "MANPAGES_LOG_LEVEL": "info",
+                        },
                     },
                 },
                 "checks": {
@@ -89,52 +212,215 @@ class Manpages:
             }
         )
 
-    def update_manpages(self, releases):
-        """Update the manpages."""
+    def _app_environment(self, releases) -> dict:
+        """Return the application environment shared by the server and ingest services."""
+        return {
+            "HTTP_PROXY": os.environ.get("JUJU_CHARM_HTTP_PROXY", ""),
+            "HTTPS_PROXY": os.environ.get("JUJU_CHARM_HTTPS_PROXY", ""),
+            "NO_PROXY": os.environ.get("JUJU_CHARM_NO_PROXY", ""),
+            "MANPAGES_RELEASES": releases,
+            "MANPAGES_ARCHIVE": ARCHIVE,
+            "MANPAGES_PUBLIC_HTML_DIR": str(WWW_DIR),
+            "MANPAGES_REPOS": REPOS,
+            "MANPAGES_ARCH": ARCH,
+            "MANPAGES_LOG_LEVEL": "info",
+        }
+
+    def _ingest_service(self, releases, ingest_env=None) -> dict:
+        """Return the ingest service definition for the given releases.
+
+        The site URL is only needed by the server; keeping it out of the ingest
+        environment means an ingress URL change does not alter this service.
+        """
+        return {
+            "override": "replace",
+            "summary": "manpages ingestion",
+            "command": str(INGEST_BINARY),
+            # Started explicitly by update_manpages when its inputs change,
+            # never implicitly by a replan.
+            "startup": "disabled",
+            "on-success": "ignore",
+            "environment": {**self._app_environment(releases), **(ingest_env or {})},
+        }
+
+    def update_manpages(self, releases, force=False, scope=None, ingest_env=None) -> list[str]:
+        """Update the manpages.
+
+        The ingest service is only restarted when the ingest fingerprint differs
+        from the one recorded for the last completed run, when configured releases
+        have not been ingested by a completed run, or when force is set. Releases
+        that a run still in progress is ingesting with the same fingerprint are
+        left to it. Runs triggered by added releases are scoped to just those
+        releases; scope adds further releases to the run. A run's releases are
+        only recorded as ingested once ingest reports the run completed, so a
+        failed run is retried by the next hook. Returns the releases for which
+        an ingest run was started.
+        """
         try:
-            self.container.restart("ingest")
+            configured = parse_releases(releases)
+            fingerprint = self.ingest_fingerprint(ingest_output(ingest_env or {}))
+            state = self._ingest_state()
+            done = sorted(set(state.get("releases", [])) & set(configured))
+            if force or state.get("fingerprint") != fingerprint:
+                pending = configured
+            else:
+                pending = sorted(set(configured) - set(done))
+            running = state.get("pending")
+            if not force and running and running["fingerprint"] == fingerprint and self.updating:
+                pending = sorted(set(pending) - set(running["releases"]))
+            if scope:
+                pending = sorted(set(pending) | set(parse_releases(scope)))
+
+            state["releases"] = done
+            if pending:
+                run = uuid.uuid4().hex
+                env = {**(ingest_env or {}), "MANPAGES_INGEST_RUN": run}
+                pending = self._start_ingest(pending, configured, env)
+                state["pending"] = {"run": run, "fingerprint": fingerprint, "releases": pending}
+            else:
+                logger.info("ingest inputs unchanged, skipping ingest")
+            self._store_ingest_state(state)
             self.purge_unused_manpages(releases)
         except (ProtocolError, ConnectionError, APIError) as e:
             logger.error("failed to ingest manpages: %s", e)
             raise
+        return pending
 
-    def purge_unused_manpages(self, releases):
-        """Purge unused manpages.
+    def _start_ingest(self, pending, configured, ingest_env=None) -> list[str]:
+        """(Re)start the ingest service for the given releases.
 
-        If a release is no longer configured in the application config, but
-        previously was, this function removes the manpages for that release.
+        A run that is still in progress is restarted with its releases merged
+        into the new scope, so adding releases in quick succession never drops
+        an unfinished one.
         """
-        # No releases have yet been downloaded, skip this step
+        if self.updating:
+            plan = self.container.get_plan().services.get("ingest")
+            if plan is not None:
+                running = RELEASES_PATTERN.findall(plan.environment.get("MANPAGES_RELEASES", ""))
+                pending = sorted((set(pending) | set(running)) & set(configured))
+
+        logger.info("starting ingest for '%s'", ", ".join(pending))
+        layer = ops.pebble.Layer(
+            {"services": {"ingest": self._ingest_service(", ".join(pending), ingest_env)}}
+        )
+        self.container.add_layer(INGEST_SCOPE_LAYER, layer, combine=True)
+        self.container.restart("ingest")
+        return pending
+
+    def ingest_fingerprint(self, output=None) -> str:
+        """Return a fingerprint of the non-release inputs that affect the ingest output.
+
+        output holds the ingest environment selecting what is written for each
+        page (see ingest_output).
+        """
+        inputs = {
+            "output": output or {},
+            "repos": [r.strip() for r in REPOS.split(",")],
+            "arch": ARCH,
+            "archive": ARCHIVE,
+            "ingest": self._ingest_version(),
+        }
+        data = json.dumps(inputs, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def _ingest_version(self) -> str:
+        """Identify the ingest binary shipped in the workload image."""
         try:
-            if not self.container.exists(WWW_DIR / "manpages"):
-                return
-        except (ProtocolError, ConnectionError, APIError) as e:
-            logger.error("failed to check existence of manpages directory: %s", e)
-            raise
+            info = self.container.list_files(INGEST_BINARY)[0]
+        except APIError as e:
+            if e.code != 404:
+                raise
+            return ""
+        except (PathError, IndexError):
+            return ""
+        return f"{info.size}:{info.last_modified.isoformat()}"
 
-        releases_list = RELEASES_PATTERN.findall(releases)
-        if not releases_list:
-            raise ValueError("failed to build manpages config: invalid releases specified")
+    def _ingest_state(self) -> dict:
+        """Return the ingest state: the fingerprint and releases of completed runs.
 
+        The run last started is recorded under "pending" until ingest reports it
+        completed, when its releases are promoted to the completed ones: added to
+        them, or replacing them when the run had a new fingerprint.
+        """
         try:
-            files = self.container.list_files(WWW_DIR / "manpages")
-        except (ProtocolError, ConnectionError, PathError, APIError) as e:
-            logger.error("failed to list manpages directory: %s", e)
-            raise
+            state = json.loads(self.container.pull(INGEST_STATE_PATH).read())
+        except PathError:
+            return {}
+        except json.JSONDecodeError as e:
+            logger.warning("ignoring corrupt ingest state: %s", e)
+            return {}
+        running = state.get("pending")
+        if running and self._completed_run() == running["run"]:
+            if state.get("fingerprint") == running["fingerprint"]:
+                releases = set(state.get("releases", [])) | set(running["releases"])
+            else:
+                releases = set(running["releases"])
+            state = {"fingerprint": running["fingerprint"], "releases": sorted(releases)}
+        return state
+
+    def _completed_run(self) -> str:
+        """Return the run ingest last reported completed, or an empty string."""
+        try:
+            return self.container.pull(INGEST_DONE_PATH).read().strip()
+        except PathError:
+            return ""
+
+    def _store_ingest_state(self, state):
+        """Record the ingest state."""
+        self.container.push(INGEST_STATE_PATH, json.dumps(state), make_dirs=True)
+
+    def purge_unused_manpages(self, releases):
+        """Purge unused manpages.
 
-        releases_on_disk = [f.name for f in files if f.type == ops.pebble.FileType.DIRECTORY]
+        If a release is no longer configured in the application config, but
+        previously was, its trees under manpages/ and manpages.gz/ are renamed
+        to tombstones, which the purge service deletes in the background.
+        """
+        releases_list = parse_releases(releases)
 
-        for release in releases_on_disk:
-            if release in releases_list:
-                continue
+        tombstoned = False
+        for tree in PURGE_TREES:
+            # No releases have yet been downloaded, skip this tree
+            try:
+                if not self.container.exists(tree):
+                    continue
+            except (ProtocolError, ConnectionError, APIError) as e:
+                logger.error("failed to check existence of %s: %s", tree, e)
+                raise
 
-            logger.info("purging manpages for '%s'", release)
             try:
-                self.container.remove_path(WWW_DIR / "manpages" / release, recursive=True)
+                files = self.container.list_files(tree)
             except (ProtocolError, ConnectionError, PathError, APIError) as e:
-                logger.error("failed to remove manpages for '%s': %s", release, e)
+                logger.error("failed to list %s: %s", tree, e)
                 raise
 
+            for f in files:
+                if f.type != ops.pebble.FileType.DIRECTORY:
+                    continue
+                if f.name.startswith(TOMBSTONE_PREFIX):
+                    # Left over from an interrupted purge.
+                    tombstoned = True
+                    continue
+                if f.name.startswith(".") or f.name in releases_list:
+                    continue
+                self._tombstone(tree, f.name)
+                tombstoned = True
+
+        if tombstoned and not self.purging:
+            logger.info("starting purge of removed releases")
+            self.container.restart("purge")
+
+    def _tombstone(self, tree, release):
+        """Atomically move a release tree out of the served namespace."""
+        src = tree / release
+        dst = tree / f"{TOMBSTONE_PREFIX}{release}-{int(time.time())}"
+        logger.info("purging manpages for '%s' (%s)", release, src)
+        try:
+            self.container.exec(["mv", "-T", str(src), str(dst)]).wait()
+        except (ProtocolError, ConnectionError, APIError, ExecError) as e:
+            logger.error("failed to move '%s' aside for purging: %s", src, e)
+            raise
+
     def health_error(self):
         """Return the ready-check error message if it is currently failing, else None."""
         try:
@@ -165,6 +451,19 @@ class Manpages:
         except Exception:
             return "health check failed"
 
+    def last_reindex(self):
+        """Return the most recent search index update reported by the server, else None.
+
+        The result has the update `time`, whether it was a `full` rebuild, and the
+        number of index entries `changed` by an incremental update.
+        """
+        try:
+            resp = urllib.request.urlopen(f"http://localhost:{ADMIN_PORT}/_/reindex", timeout=5)
+            data = json.loads(resp.read().decode("utf-8"))
+        except Exception:
+            return None
+        return data or None
+
     @property
     def updating(self) -> bool:
         """Report whether the manpages are currently being updated."""
@@ -174,3 +473,12 @@ class Manpages:
         except (ProtocolError, ConnectionError, APIError, ops.ModelError) as e:
             logger.error("failed to get manpages ingest service status: %s", e)
             return False
+
+    @property
+    def purging(self) -> bool:
+        """Report whether removed releases are currently being purged."""
+        try:
+            return self.container.get_service("purge").is_running()
+        except (ProtocolError, ConnectionError, APIError, ops.ModelError) as e:
+            logger.error("failed to get manpages purge service status: %s", e)
+            return False
@@ -7,16 +7,51 @@ These tests only cover those methods that do not require internet access,
 and do not attempt to manipulate the underlying machine.
 """
 
+import dataclasses
 from unittest.mock import patch
 
 import pytest
 from ops import BlockedStatus
 from ops.pebble import CheckLevel, CheckStatus, Layer, ServiceStatus
-from ops.testing import ActiveStatus, CheckInfo, Context, MaintenanceStatus, State, TCPPort
+from ops.testing import (
+    ActionFailed,
+    ActiveStatus,
+    CheckInfo,
+    Context,
+    Exec,
+    MaintenanceStatus,
+    Mount,
+    State,
+    TCPPort,
+)
 from scenario import Container
 
 from charm import ManpagesCharm
-from manpages import Manpages
+from manpages import Manpages, ingest_environment, server_environment
+
+DEFAULT_INGEST_CONFIG = {
+    "ingest-workers": 0,
+    "fetch-concurrency": 8,
+    "fetch-timeout": 300,
+    "fetch-retries": 2,
+    "fetch-backoff": "linear",
+    "fetch-backoff-base": 1,
+    "fetch-cache-size": 2048,
+    "converter": "exec",
+    "convert-cache-size": 4096,
+    "precompress": False,
+    "plain-text": False,
+    "fsync": False,
+    "storage-backend": "files",
+}
+DEFAULT_SERVER_CONFIG = {
+    "page-cache-size": 64,
+    "listing-cache-size": 32,
+    "cache-control-pages": "public, max-age=3600",
+    "cache-control-downloads": "public, max-age=86400",
+    "cache-control-sitemaps": "public, max-age=3600",
+    "sitemap-gzip": False,
+}
 
 
 @pytest.fixture
@@ -45,7 +80,12 @@ def test_manpages_pebble_ready(loaded_ctx):
 
     result = ctx.run(ctx.on.pebble_ready(container=container), state)
 
-    layer = manpages.pebble_layer("noble", "http://192.0.2.0:8080")
+    layer = manpages.pebble_layer(
+        "noble",
+        "http://192.0.2.0:8080",
+        ingest_environment(DEFAULT_INGEST_CONFIG),
+        server_environment(DEFAULT_SERVER_CONFIG),
+    )
     assert result.get_container("manpages").layers["manpages"] == layer
     checks = layer.checks
     assert "ready" in checks
@@ -58,25 +98,224 @@ def test_manpages_pebble_ready(loaded_ctx):
     assert result.unit_status == MaintenanceStatus("Updating manpages")
 
 
-def test_manpages_config_changed_purges_old_releases(loaded_ctx):
-    ctx, container = loaded_ctx
+def test_manpages_config_changed_purges_old_releases(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www", source=tmp_path)
+    container = Container(
+        name="manpages", can_connect=True, mounts={"www": mount}, execs={Exec(["mv"])}
+    )
     state = State(containers=[container], config={"releases": "noble"})
 
     result = ctx.run(ctx.on.config_changed(), state)
 
-    container_root_fs = result.get_container(container.name).get_filesystem(ctx)
-    noble_dir = container_root_fs / "app" / "www" / "manpages" / "noble"
-    # Simulate the actual fetch from online happening and populating the noble directory.
-    noble_dir.mkdir(parents=True, exist_ok=True)
-    assert noble_dir.exists()
+    # Simulate the actual fetch from online happening and populating the noble directories.
+    (tmp_path / "manpages" / "noble").mkdir(parents=True, exist_ok=True)
+    (tmp_path / "manpages.gz" / "noble").mkdir(parents=True, exist_ok=True)
 
-    # Reconfigure to remove the noble release and check the directory is pruned.
+    # Reconfigure to remove the noble release and check both trees are moved aside
+    # and handed to the purge service.
+    container = _finish_ingest(result.get_container("manpages"), tmp_path / "manpages")
     state = State(containers=[container], config={"releases": "questing"})
     result = ctx.run(ctx.on.config_changed(), state)
 
-    container_root_fs = result.get_container(container.name).get_filesystem(ctx)
-    noble_dir = container_root_fs / "app" / "www" / "manpages" / "noble"
-    assert not noble_dir.exists()
+    moved = [e.command for e in ctx.exec_history["manpages"]]
+    assert [c[:3] for c in moved] == [
+        ["mv", "-T", "/app/www/manpages/noble"],
+        ["mv", "-T", "/app/www/manpages.gz/noble"],
+    ]
+    assert moved[0][3].startswith("/app/www/manpages/.purge-noble-")
+    assert moved[1][3].startswith("/app/www/manpages.gz/.purge-noble-")
+    assert result.get_container("manpages").service_statuses["purge"] == ServiceStatus.ACTIVE
+
+
+def _finish_ingest(container, manpages_dir, completed=True):
+    """Return a copy of container with the ingest service exited.
+
+    When completed, the run is recorded as done in manpages_dir, the host
+    directory mounted at /app/www/manpages, as ingest does after a successful run.
+    """
+    if completed:
+        run = container.plan.services["ingest"].environment["MANPAGES_INGEST_RUN"]
+        (manpages_dir / ".ingest-done").write_text(run)
+    return dataclasses.replace(
+        container,
+        service_statuses={"manpages": ServiceStatus.ACTIVE, "ingest": ServiceStatus.INACTIVE},
+    )
+
+
+def test_manpages_config_changed_skips_unchanged_ingest(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www/manpages", source=tmp_path)
+    container = Container(name="manpages", can_connect=True, mounts={"manpages": mount})
+    state = State(containers=[container], config={"releases": "noble, jammy"})
+
+    result = ctx.run(ctx.on.config_changed(), state)
+    assert (tmp_path / ".ingest-state").exists()
+    assert result.get_container("manpages").service_statuses["ingest"] == ServiceStatus.ACTIVE
+
+    # Same releases in a different order must not restart the finished ingest run.
+    container = _finish_ingest(result.get_container("manpages"), tmp_path)
+    state = State(containers=[container], config={"releases": "jammy, noble"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    assert result.get_container("manpages").service_statuses["ingest"] == ServiceStatus.INACTIVE
+    assert result.unit_status == ActiveStatus()
+
+
+def test_manpages_config_changed_restarts_ingest_on_new_inputs(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www/manpages", source=tmp_path)
+    container = Container(name="manpages", can_connect=True, mounts={"manpages": mount})
+    state = State(containers=[container], config={"releases": "noble"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    container = _finish_ingest(result.get_container("manpages"), tmp_path)
+    state = State(containers=[container], config={"releases": "noble, jammy"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    container = result.get_container("manpages")
+    assert container.service_statuses["ingest"] == ServiceStatus.ACTIVE
+    # Only the newly added release is ingested.
+    assert container.plan.services["ingest"].environment["MANPAGES_RELEASES"] == "jammy"
+
+
+def test_manpages_config_changed_restarts_ingest_on_new_output(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www/manpages", source=tmp_path)
+    container = Container(name="manpages", can_connect=True, mounts={"manpages": mount})
+    state = State(containers=[container], config={"releases": "noble, jammy"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    # Tuning options that do not change the output apply from the next run.
+    container = _finish_ingest(result.get_container("manpages"), tmp_path)
+    config = {"releases": "noble, jammy", "converter": "batch"}
+    result = ctx.run(ctx.on.config_changed(), State(containers=[container], config=config))
+    assert result.get_container("manpages").service_statuses["ingest"] == ServiceStatus.INACTIVE
+
+    # Changing what is written for each page ingests every release again.
+    config = {**config, "storage-backend": "packed"}
+    result = ctx.run(ctx.on.config_changed(), State(containers=[container], config=config))
+    container = result.get_container("manpages")
+    assert container.service_statuses["ingest"] == ServiceStatus.ACTIVE
+    env = container.plan.services["ingest"].environment
+    assert env["MANPAGES_RELEASES"] == "jammy, noble"
+    assert env["MANPAGES_STORAGE_BACKEND"] == "packed"
+
+
+def test_manpages_config_changed_retries_failed_ingest(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www/manpages", source=tmp_path)
+    container = Container(name="manpages", can_connect=True, mounts={"manpages": mount})
+    state = State(containers=[container], config={"releases": "noble"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    # A run that exited without completing leaves its releases to the next hook.
+    container = _finish_ingest(result.get_container("manpages"), tmp_path, completed=False)
+    state = State(containers=[container], config={"releases": "noble"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    container = result.get_container("manpages")
+    assert container.service_statuses["ingest"] == ServiceStatus.ACTIVE
+    assert container.plan.services["ingest"].environment["MANPAGES_RELEASES"] == "noble"
+
+
+def test_manpages_config_changed_leaves_running_ingest(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www/manpages", source=tmp_path)
+    container = Container(name="manpages", can_connect=True, mounts={"manpages": mount})
+    state = State(containers=[container], config={"releases": "noble"})
+    result = ctx.run(ctx.on.config_changed(), state)
+    run = (
+        result.get_container("manpages").plan.services["ingest"].environment["MANPAGES_INGEST_RUN"]
+    )
+
+    # Another hook while the run is in progress does not restart it.
+    state = State(containers=[result.get_container("manpages")], config={"releases": "noble"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    env = result.get_container("manpages").plan.services["ingest"].environment
+    assert env["MANPAGES_INGEST_RUN"] == run
+
+
+def test_manpages_config_changed_removed_release_skips_ingest(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www/manpages", source=tmp_path)
+    container = Container(name="manpages", can_connect=True, mounts={"manpages": mount})
+    state = State(containers=[container], config={"releases": "noble, jammy"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    container = _finish_ingest(result.get_container("manpages"), tmp_path)
+    state = State(containers=[container], config={"releases": "noble"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    assert result.get_container("manpages").service_statuses["ingest"] == ServiceStatus.INACTIVE
+
+
+def test_update_manpages_action_forces_ingest(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www/manpages", source=tmp_path)
+    container = Container(name="manpages", can_connect=True, mounts={"manpages": mount})
+    state = State(containers=[container], config={"releases": "noble"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    container = _finish_ingest(result.get_container("manpages"), tmp_path)
+    state = State(containers=[container], config={"releases": "noble"})
+    result = ctx.run(ctx.on.action("update-manpages"), state)
+
+    container = result.get_container("manpages")
+    assert container.service_statuses["ingest"] == ServiceStatus.ACTIVE
+    assert container.plan.services["ingest"].environment["MANPAGES_RELEASES"] == "noble"
+    assert ctx.action_results == {"releases": "noble"}
+
+
+def test_update_manpages_action_scoped_releases(charm, tmp_path):
+    ctx = Context(charm)
+    mount = Mount(location="/app/www/manpages", source=tmp_path)
+    container = Container(name="manpages", can_connect=True, mounts={"manpages": mount})
+    state = State(containers=[container], config={"releases": "noble, jammy"})
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    container = _finish_ingest(result.get_container("manpages"), tmp_path)
+    state = State(containers=[container], config={"releases": "noble, jammy"})
+    result = ctx.run(ctx.on.action("update-manpages", params={"releases": "jammy"}), state)
+
+    container = result.get_container("manpages")
+    assert container.service_statuses["ingest"] == ServiceStatus.ACTIVE
+    assert container.plan.services["ingest"].environment["MANPAGES_RELEASES"] == "jammy"
+    assert ctx.action_results == {"releases": "jammy"}
+
+
+@patch(
+    "manpages.Manpages.last_reindex",
+    return_value={"time": "2026-10-18T06:00:00Z", "full": False, "changed": 42},
+)
+def test_update_manpages_action_reports_last_reindex(mock_reindex, loaded_ctx):
+    ctx, container = loaded_ctx
+    state = State(containers=[container], config={"releases": "noble"})
+    ctx.run(ctx.on.action("update-manpages"), state)
+
+    assert ctx.action_results == {
+        "releases": "noble",
+        "last-reindex-time": "2026-10-18T06:00:00Z",
+        "last-reindex-changes": "42",
+    }
+
+
+def test_update_manpages_action_rejects_unconfigured_release(loaded_ctx):
+    ctx, container = loaded_ctx
+    state = State(containers=[container], config={"releases": "noble"})
+
+    with pytest.raises(ActionFailed, match="releases not configured: jammy"):
+        ctx.run(ctx.on.action("update-manpages", params={"releases": "jammy"}), state)
+
+
+def test_ingest_layer_excludes_site_url(loaded_ctx):
+    _, container = loaded_ctx
+    layer = Manpages(container).pebble_layer("noble", "http://192.0.2.0:8080")
+
+    assert layer.services["manpages"].environment["MANPAGES_SITE"] == "http://192.0.2.0:8080"
+    assert "MANPAGES_SITE" not in layer.services["ingest"].environment
+    assert layer.services["ingest"].startup == "disabled"
 
 
 def test_manpages_config_changed_no_pebble(loaded_ctx_broken_container):
@@ -304,3 +543,125 @@ def test_update_status_active_when_ready_up(charm):
     result = ctx.run(ctx.on.update_status(), state)
 
     assert result.unit_status == ActiveStatus()
+
+
+def test_manpages_ingest_tuning_reaches_ingest(loaded_ctx):
+    ctx, container = loaded_ctx
+    config = {
+        "releases": "noble",
+        "ingest-workers": 16,
+        "fetch-concurrency": 32,
+        "fetch-timeout": 60,
+        "fetch-retries": 4,
+        "fetch-backoff": "exponential",
+        "fetch-backoff-base": 2,
+        "fetch-cache-size": 512,
+        "converter": "batch",
+        "convert-cache-size": 1024,
+        "precompress": True,
+        "plain-text": True,
+        "fsync": True,
+        "storage-backend": "packed",
+    }
+    state = State(containers=[container], config=config)
+
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    plan = result.get_container("manpages").plan
+    env = plan.services["ingest"].environment
+    assert env["MANPAGES_INGEST_WORKERS"] == "16"
+    assert env["MANPAGES_FETCH_CONCURRENCY"] == "32"
+    assert env["MANPAGES_FETCH_TIMEOUT"] == "60s"
+    assert env["MANPAGES_FETCH_RETRIES"] == "4"
+    assert env["MANPAGES_FETCH_BACKOFF"] == "exponential"
+    assert env["MANPAGES_FETCH_BACKOFF_BASE"] == "2s"
+    assert env["MANPAGES_CONVERTER"] == "batch"
+    assert env["MANPAGES_CONVERT_CACHE_SIZE_MB"] == "1024"
+    assert env["MANPAGES_PRECOMPRESS"] == "true"
+    assert env["MANPAGES_PLAIN_TEXT"] == "true"
+    assert env["MANPAGES_FSYNC"] == "true"
+    assert env["MANPAGES_STORAGE_BACKEND"] == "packed"
+    assert env["MANPAGES_FETCH_CACHE_DIR"] == "/app/www/manpages/.fetch-cache"
+    assert env["MANPAGES_FETCH_CACHE_SIZE_MB"] == "512"
+    assert "MANPAGES_FETCH_CONCURRENCY" not in plan.services["manpages"].environment
+
+
+def test_manpages_fetch_cache_disabled(loaded_ctx):
+    ctx, container = loaded_ctx
+    state = State(containers=[container], config={"releases": "noble", "fetch-cache-size": 0})
+
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    env = result.get_container("manpages").plan.services["ingest"].environment
+    assert "MANPAGES_FETCH_CACHE_DIR" not in env
+    assert "MANPAGES_FETCH_CACHE_SIZE_MB" not in env
+    assert "MANPAGES_PRECOMPRESS" not in env
+    assert "MANPAGES_PLAIN_TEXT" not in env
+    assert "MANPAGES_FSYNC" not in env
+
+
+def test_manpages_page_cache_size_reaches_server(loaded_ctx):
+    ctx, container = loaded_ctx
+    config = {"releases": "noble", "page-cache-size": 256, "listing-cache-size": 8}
+    state = State(containers=[container], config=config)
+
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    plan = result.get_container("manpages").plan
+    assert plan.services["manpages"].environment["MANPAGES_PAGE_CACHE_SIZE_MB"] == "256"
+    assert plan.services["manpages"].environment["MANPAGES_LISTING_CACHE_SIZE_MB"] == "8"
+    assert "MANPAGES_PAGE_CACHE_SIZE_MB" not in plan.services["ingest"].environment
+
+
+def test_manpages_cache_control_reaches_server(loaded_ctx):
+    ctx, container = loaded_ctx
+    config = {"releases": "noble", "cache-control-pages": "public, s-maxage=86400"}
+    state = State(containers=[container], config=config)
+
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    env = result.get_container("manpages").plan.services["manpages"].environment
+    assert env["MANPAGES_CACHE_CONTROL_PAGES"] == "public, s-maxage=86400"
+    assert env["MANPAGES_CACHE_CONTROL_DOWNLOADS"] == "public, max-age=86400"
+    assert "MANPAGES_SITEMAP_GZIP" not in env
+
+
+def test_manpages_sitemap_gzip_reaches_server(loaded_ctx):
+    ctx, container = loaded_ctx
+    state = State(containers=[container], config={"releases": "noble", "sitemap-gzip": True})
+
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    plan = result.get_container("manpages").plan
+    assert plan.services["manpages"].environment["MANPAGES_SITEMAP_GZIP"] == "true"
+    assert "MANPAGES_SITEMAP_GZIP" not in plan.services["ingest"].environment
+
+
+@pytest.mark.parametrize(
+    "option,value",
+    [
+        ("ingest-workers", -1),
+        ("fetch-concurrency", 0),
+        ("fetch-concurrency", 1000),
+        ("fetch-timeout", 0),
+        ("fetch-retries", -1),
+        ("fetch-backoff", "random"),
+        ("fetch-backoff-base", -1),
+        ("fetch-cache-size", -1),
+        ("converter", "daemon"),
+        ("convert-cache-size", -1),
+        ("storage-backend", "sqlite"),
+        ("page-cache-size", -1),
+        ("listing-cache-size", -1),
+        ("cache-control-sitemaps", ""),
+    ],
+)
+def test_manpages_invalid_ingest_tuning_blocks(loaded_ctx, option, value):
+    ctx, container = loaded_ctx
+    state = State(containers=[container], config={"releases": "noble", option: value})
+
+    result = ctx.run(ctx.on.config_changed(), state)
+
+    assert isinstance(result.unit_status, BlockedStatus)
+    assert option in result.unit_status.message
+    assert "manpages" not in result.get_container("manpages").layers